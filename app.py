@@ -4,7 +4,7 @@ Data Cloud Management Application
 A comprehensive tool to manage Salesforce Data Cloud
 """
 
-from flask import Flask, render_template, request, jsonify, session, redirect, url_for
+from flask import Flask, Response, render_template, request, jsonify, session, redirect, url_for
 from flask_cors import CORS
 import os
 import json
@@ -12,16 +12,34 @@ from datetime import datetime, timedelta
 import secrets
 
 # Import custom modules
-from modules.salesforce_connector import SalesforceManager
+from modules.salesforce_connector import SalesforceManager, execute_anonymous
 from modules.oauth_connector import OAuthConnector
 from modules.simple_auth import SimpleAuthConnector
 from modules.data_manager import DataManager
 from modules.relationship_builder import RelationshipBuilder
 from modules.segmentation_engine import SegmentationEngine
-from modules.email_generator import EmailGenerator
+from modules.segment_algebra import SegmentAlgebra
 from modules.datacloud_analytics import DataCloudAnalytics
-from modules.ai_agent import AIAgent
-from modules.personalized_image_generator import PersonalizedImageGenerator
+from modules.shared_state import get_state_backend
+from modules.data_store import DataStore
+from modules.channel_scoring import ChannelScorer
+from modules.engagement_events import EngagementEventIngestor
+from modules.segment_triggers import SegmentTriggers
+from modules.telemetry_store import TelemetryStore, parse_timestamp
+from modules.telemetry_series import TelemetrySeries
+from modules.telemetry_trips import TripTable
+from modules.telemetry_spatial import SpatialIndex
+from modules.telemetry_rules import TelemetryRuleEngine
+from modules.insights_cube import CUBE_FIELDS, InsightsCube
+from modules.insights_frame import load_insights_frame
+from modules.metrics import instrument, span
+from modules.app_logging import debug_exc_info, get_logger, sampled, setup_logging
+from modules.startup import STARTUP_MODE, LazyManager, resolve_all
+from modules.warmup import WarmUp
+
+# Leveled logging through a background writer (LOG_LEVEL, LOG_SAMPLE_EVERY)
+setup_logging()
+logger = get_logger('app')
 
 app = Flask(__name__)
 # Use environment variable for secret key (consistent across restarts)
@@ -29,6 +47,9 @@ app = Flask(__name__)
 app.secret_key = os.environ.get('SECRET_KEY', secrets.token_hex(32))
 CORS(app)
 
+# Per-route latency histograms and stage spans (GET /api/debug/metrics)
+metrics = instrument(app)
+
 # Configuration
 app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(hours=8)
 app.config['SESSION_COOKIE_SECURE'] = os.environ.get('PORT') is not None  # True on Heroku
@@ -37,17 +58,35 @@ app.config['SESSION_COOKIE_SAMESITE'] = 'Lax'
 app.config['UPLOAD_FOLDER'] = 'uploads'
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
 
+# Shared cache/session backend (STATE_BACKEND=sqlite|memory|redis) - one copy for all gunicorn workers
+state_backend = get_state_backend()
+data_store = DataStore(state_backend)
+
 # Global managers
-sf_manager = SalesforceManager()
+sf_manager = SalesforceManager(state=state_backend)
 oauth_manager = OAuthConnector()
 simple_auth_manager = SimpleAuthConnector()
-data_manager = DataManager()
+data_manager = DataManager(cache=state_backend)
 relationship_builder = RelationshipBuilder()
 segmentation_engine = SegmentationEngine()
-email_generator = EmailGenerator()
-datacloud_analytics = DataCloudAnalytics()
-ai_agent = AIAgent()
-image_generator = PersonalizedImageGenerator()
+email_generator = LazyManager('modules.email_generator', 'EmailGenerator')
+datacloud_analytics = DataCloudAnalytics(cache=state_backend)
+insights_cube = InsightsCube(data_store)
+ai_agent = LazyManager('modules.ai_agent', 'AIAgent', state=state_backend, insights_cube=insights_cube)
+image_generator = LazyManager('modules.personalized_image_generator', 'PersonalizedImageGenerator')
+channel_scorer = ChannelScorer()
+segment_triggers = SegmentTriggers(segmentation_engine, data_store, state=state_backend, insights_cube=insights_cube)
+engagement_events = EngagementEventIngestor(data_store, channel_scorer, triggers=segment_triggers)
+telemetry_store = TelemetryStore()
+telemetry_series = TelemetrySeries(telemetry_store)
+trip_table = TripTable(telemetry_store)
+spatial_index = SpatialIndex(telemetry_store)
+segment_algebra = SegmentAlgebra(segmentation_engine, data_store, spatial_index)
+telemetry_rules = TelemetryRuleEngine(telemetry_store, state=state_backend)
+
+# Managers above built through LazyManager are imported/constructed on first use (STARTUP_MODE=eager builds them now)
+if STARTUP_MODE == 'eager':
+    resolve_all(email_generator, ai_agent, image_generator)
 
 # Auto-connect to Salesforce if credentials are in environment variables
 def auto_connect_salesforce():
@@ -71,6 +110,21 @@ def auto_connect_salesforce():
 # Try auto-connect on startup
 AUTO_CONNECTED = auto_connect_salesforce()
 
+def reauthenticate_salesforce():
+    """Log this worker in with the browser session's credentials (the shared connection has no session id)"""
+    if 'username' not in session or 'password' not in session:
+        return None
+    simple_auth_manager.connect_soap(session['username'], session['password'], session.get('security_token', ''))
+    return simple_auth_manager
+
+@app.before_request
+def sync_salesforce_connection():
+    """Pick up a login (or disconnect) handled by another worker"""
+    try:
+        sf_manager.sync(reauthenticate_salesforce)
+    except Exception as e:
+        logger.warning("Could not adopt the shared Salesforce connection: %s", e)
+
 # ============================================================================
 # AUTHENTICATION & CONNECTION ROUTES
 # ============================================================================
@@ -108,6 +162,8 @@ def login():
         sf_manager.connect(username, password, security_token)
         session['connected'] = True
         session['username'] = username
+        session['password'] = password  # Store for auto-reconnect after app reload
+        session['security_token'] = security_token
         session.permanent = True
         
         return jsonify({
@@ -133,12 +189,8 @@ def login_oauth():
         # Connect using SOAP (token appended to password if provided)
         simple_auth_manager.connect_soap(username, password, security_token)
         
-        # Copy connection to sf_manager for compatibility
-        sf_manager.sf = simple_auth_manager.sf
-        sf_manager.username = simple_auth_manager.username
-        sf_manager.instance_url = simple_auth_manager.instance_url
-        sf_manager.org_id = simple_auth_manager.org_id
-        sf_manager.connected_at = simple_auth_manager.connected_at
+        # Use the connection as the app's (shared with the other workers)
+        sf_manager.adopt(simple_auth_manager)
         
         session['connected'] = True
         session['username'] = simple_auth_manager.username
@@ -170,12 +222,8 @@ def login_auto():
         # Connect using SOAP (no token needed)
         simple_auth_manager.connect_soap(username, password, '')
         
-        # Copy connection to sf_manager for compatibility
-        sf_manager.sf = simple_auth_manager.sf
-        sf_manager.username = simple_auth_manager.username
-        sf_manager.instance_url = simple_auth_manager.instance_url
-        sf_manager.org_id = simple_auth_manager.org_id
-        sf_manager.connected_at = simple_auth_manager.connected_at
+        # Use the connection as the app's (shared with the other workers)
+        sf_manager.adopt(simple_auth_manager)
         
         session['connected'] = True
         session['username'] = simple_auth_manager.username
@@ -370,8 +418,9 @@ def get_segment_members(segment_id):
     try:
         insights_file = 'data/individual_insights.json'
         if os.path.exists(insights_file):
-            with open(insights_file, 'r') as f:
-                insights_data = json.load(f)
+            with span('data_load'):
+                with open(insights_file, 'r') as f:
+                    insights_data = json.load(f)
             
             # Create lookup by Individual_Id - get the most recent insight for each individual
             insights_by_id = {}
@@ -382,22 +431,23 @@ def get_segment_members(segment_id):
                     insights_by_id[ind_id] = insight
             
             # Enrich members with insights data
-            for member in members_data['members']:
-                member_id = member.get('Id')
-                if member_id and member_id in insights_by_id:
-                    insight = insights_by_id[member_id]
-                    member['Purchase_Intent'] = insight.get('Purchase_Intent', 'N/A')
-                    member['Current_Sentiment'] = insight.get('Current_Sentiment', 'N/A')
-                    member['Favourite_Brand'] = insight.get('Favourite_Brand', 'N/A')
-                    member['Lifestyle_Quotient'] = insight.get('Lifestyle_Quotient', 'N/A')
-                    member['Health_Profile'] = insight.get('Health_Profile', 'N/A')
-                else:
-                    # Add placeholder values if no insights found
-                    member['Purchase_Intent'] = 'N/A'
-                    member['Current_Sentiment'] = 'N/A'
-                    member['Favourite_Brand'] = 'N/A'
-                    member['Lifestyle_Quotient'] = 'N/A'
-                    member['Health_Profile'] = 'N/A'
+            with span('enrichment'):
+                for member in members_data['members']:
+                    member_id = member.get('Id')
+                    if member_id and member_id in insights_by_id:
+                        insight = insights_by_id[member_id]
+                        member['Purchase_Intent'] = insight.get('Purchase_Intent', 'N/A')
+                        member['Current_Sentiment'] = insight.get('Current_Sentiment', 'N/A')
+                        member['Favourite_Brand'] = insight.get('Favourite_Brand', 'N/A')
+                        member['Lifestyle_Quotient'] = insight.get('Lifestyle_Quotient', 'N/A')
+                        member['Health_Profile'] = insight.get('Health_Profile', 'N/A')
+                    else:
+                        # Add placeholder values if no insights found
+                        member['Purchase_Intent'] = 'N/A'
+                        member['Current_Sentiment'] = 'N/A'
+                        member['Favourite_Brand'] = 'N/A'
+                        member['Lifestyle_Quotient'] = 'N/A'
+                        member['Health_Profile'] = 'N/A'
     except Exception as e:
         print(f"Error loading insights data: {e}")
         # Continue without insights data
@@ -427,6 +477,64 @@ def preview_segment():
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 400
 
+@app.route('/api/segments/algebra', methods=['POST'])
+def combine_segments():
+    """Evaluate AND/OR/NOT expressions over saved segments, optionally saving the result"""
+    data = request.get_json()
+    try:
+        expression = data['expression']
+        _telemetry()  # location expressions read the telemetry store
+        bitmap = segment_algebra.evaluate(expression, sf_manager.sf)
+        member_ids = segment_algebra.member_ids(bitmap)
+        
+        response = {
+            'success': True,
+            'cardinality': len(member_ids),
+            'sample_ids': member_ids[:data.get('sample_size', 20)]
+        }
+        
+        if data.get('save_as'):
+            response['segment'] = segmentation_engine.create_combined_segment(
+                data['save_as'],
+                data.get('description', f"Combined audience: {json.dumps(expression)}"),
+                expression,
+                member_ids
+            )
+        
+        return jsonify(response)
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+@app.route('/api/segments/triggers')
+def get_segment_triggers():
+    """Which fields each triggerable segment watches"""
+    try:
+        return jsonify({'success': True, 'triggers': segment_triggers.summary()})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/segments/triggers/events')
+def get_segment_trigger_events():
+    """Recent segment enter/exit events (poll with ?since=<last seq>)"""
+    try:
+        since = request.args.get('since', 0, type=int)
+        limit = min(request.args.get('limit', 100, type=int), 1000)
+        events = segment_triggers.recent_events(since, limit)
+        return jsonify({'success': True, 'events': events, 'last_seq': events[-1]['seq'] if events else since})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/segments/overlap')
+def get_segment_overlap():
+    """Pairwise overlap matrix across all saved segments"""
+    try:
+        matrix = segment_algebra.overlap_matrix(sf_manager.sf)
+        names = {s['id']: s['name'] for s in segmentation_engine.list_segments()}
+        matrix['segment_names'] = [names.get(s, s) for s in matrix['segment_ids']]
+        return jsonify({'success': True, 'overlap': matrix})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
 # ============================================================================
 # EMAIL CAMPAIGN ROUTES
 # ============================================================================
@@ -525,7 +633,7 @@ def get_segment_analytics():
     if not sf_manager.sf and 'username' in session and 'password' in session:
         try:
             simple_auth_manager.connect_soap(session['username'], session['password'])
-            sf_manager.sf = simple_auth_manager.sf
+            sf_manager.adopt(simple_auth_manager)
         except:
             pass
     
@@ -559,7 +667,7 @@ def get_datacloud_analytics():
     if not sf_manager.sf and 'username' in session and 'password' in session:
         try:
             simple_auth_manager.connect_soap(session['username'], session['password'])
-            sf_manager.sf = simple_auth_manager.sf
+            sf_manager.adopt(simple_auth_manager)
         except:
             pass
     
@@ -602,68 +710,21 @@ def get_datacloud_website_stats():
 def get_insights_analytics():
     """Get Individual Insights analytics"""
     try:
-        from collections import Counter
-        
         # Load insights data
-        insights_file = 'data/individual_insights.json'
-        if not os.path.exists(insights_file):
+        if not data_store.exists('insights'):
             return jsonify({
                 'success': False,
                 'error': 'Insights data not found',
                 'message': 'Individual Insights data file is missing. Please generate it first.'
             }), 404
         
-        with open(insights_file, 'r') as f:
-            insights_data = json.load(f)
-        
-        if not insights_data:
+        analytics = _build_insights_analytics()
+        if analytics is None:
             return jsonify({
                 'success': False,
                 'error': 'No insights data available'
             }), 404
         
-        # Calculate analytics
-        total_records = len(insights_data)
-        unique_individuals = len(set(i['Individual_Id'] for i in insights_data))
-        
-        # Get distributions
-        sentiments = Counter(i['Current_Sentiment'] for i in insights_data)
-        lifestyles = Counter(i['Lifestyle_Quotient'] for i in insights_data)
-        health_profiles = Counter(i['Health_Profile'] for i in insights_data)
-        fitness_milestones = Counter(i['Fitness_Milestone'] for i in insights_data)
-        purchase_intents = Counter(i['Purchase_Intent'] for i in insights_data)
-        favorite_brands = Counter(i['Favourite_Brand'] for i in insights_data)
-        favorite_destinations = Counter(i['Favourite_Destination'] for i in insights_data)
-        hobbies = Counter(i['Hobby'] for i in insights_data)
-        
-        # Calculate time-based insights
-        from datetime import datetime as dt
-        timestamps = [dt.fromisoformat(i['Event_Timestamp'].replace('Z', '+00:00')) for i in insights_data]
-        oldest_timestamp = min(timestamps).isoformat() if timestamps else None
-        newest_timestamp = max(timestamps).isoformat() if timestamps else None
-        
-        analytics = {
-            'success': True,
-            'overview': {
-                'total_records': total_records,
-                'unique_individuals': unique_individuals,
-                'records_per_individual': total_records // unique_individuals if unique_individuals > 0 else 0,
-                'oldest_timestamp': oldest_timestamp,
-                'newest_timestamp': newest_timestamp
-            },
-            'distributions': {
-                'sentiments': dict(sentiments.most_common(10)),
-                'lifestyles': dict(lifestyles.most_common(10)),
-                'health_profiles': dict(health_profiles.most_common(10)),
-                'fitness_milestones': dict(fitness_milestones),
-                'purchase_intents': dict(purchase_intents),
-                'favorite_brands': dict(favorite_brands.most_common(15)),
-                'favorite_destinations': dict(favorite_destinations.most_common(15)),
-                'hobbies': dict(hobbies.most_common(15))
-            },
-            'sample_records': insights_data[:20]  # First 20 records
-        }
-        
         return jsonify(analytics)
         
     except Exception as e:
@@ -672,23 +733,103 @@ def get_insights_analytics():
             'error': str(e)
         }), 500
 
+def _build_insights_analytics():
+    """Compute the insights analytics payload (None if there is no data)"""
+    overview = insights_cube.overview()
+    if not overview['total_records']:
+        return None
+    
+    # Counts come from the pre-aggregated cube, sample rows from the columnar view
+    insights = data_store.table('insights')
+    analytics = {
+        'success': True,
+        'overview': overview,
+        'distributions': insights_cube.distributions(),
+        'sample_records': insights.records(rows=range(min(20, len(insights))))  # First 20 records
+    }
+    
+    return analytics
+
+@app.route('/api/analytics/insights/crosstab')
+def get_insights_crosstab():
+    """Cross-tab of two insight fields (?rows=&columns=, other cube fields as filters, e.g. &Purchase_Intent=High)"""
+    try:
+        if not data_store.exists('insights'):
+            return jsonify({'success': False, 'error': 'Insights data not found'}), 404
+        
+        rows = request.args.get('rows', 'Current_Sentiment')
+        columns = request.args.get('columns')
+        filters = {field: request.args.getlist(field) for field in CUBE_FIELDS
+                   if field in request.args and field not in (rows, columns)}
+        if columns:
+            return jsonify({'success': True, 'filters': filters, **insights_cube.crosstab(rows, columns, filters)})
+        distribution = insights_cube.distribution(rows, filters)
+        return jsonify({'success': True, 'filters': filters, 'field': rows,
+                        'distribution': [{'value': value, 'count': count} for value, count in distribution]})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+@app.route('/api/analytics/insights/trends')
+def get_insights_trends():
+    """Trend series of an insight field (?field=Current_Sentiment&period=day|week|month&segment_id=)"""
+    try:
+        if not data_store.exists('insights'):
+            return jsonify({'success': False, 'error': 'Insights data not found'}), 404
+        
+        individual_ids = None
+        segment_id = request.args.get('segment_id')
+        if segment_id:
+            if not segmentation_engine.get_segment(segment_id):
+                return jsonify({'success': False, 'error': 'Segment not found'}), 404
+            individual_ids = segment_algebra.member_ids(segment_algebra.evaluate(segment_id, sf_manager.sf))
+        
+        trend = insights_cube.trend(request.args.get('field', 'Current_Sentiment'),
+                                    request.args.get('period', 'week'), individual_ids)
+        if segment_id:
+            trend.update(segment_id=segment_id, segment_members=len(individual_ids))
+        return jsonify({'success': True, **trend})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+@app.route('/api/insights', methods=['POST'])
+def append_insights():
+    """Append Individual Insights events (the analytics cube is updated incrementally)"""
+    try:
+        data = request.get_json(silent=True)
+        records = data.get('insights') if isinstance(data, dict) else data
+        if not isinstance(records, list) or not records:
+            return jsonify({'success': False, 'error': 'Request body must contain a non-empty insights list'}), 400
+        if not data_store.exists('insights'):
+            return jsonify({'success': False, 'error': 'Insights data not found'}), 404
+        
+        individual_ids = list({record.get('Individual_Id') for record in records if isinstance(record, dict)})
+        before = segment_triggers.latest_insights(individual_ids)
+        records, total = insights_cube.append(records)
+        
+        segment_events = []
+        if data_store.exists('engagement'):
+            segment_events = segment_triggers.insights_changed(before, records, engagement_events.current(individual_ids))
+        return jsonify({'success': True, 'added': len(records), 'total_records': total, 'segment_events': segment_events})
+    except ValueError as e:
+        return jsonify({'success': False, 'error': f'Invalid insight: {e}'}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 @app.route('/api/individuals/<individual_id>/insights')
 def get_individual_insights(individual_id):
     """Get insights for a specific individual"""
     try:
         # Load insights data
-        insights_file = 'data/individual_insights.json'
-        if not os.path.exists(insights_file):
+        if not data_store.exists('insights'):
             return jsonify({
                 'success': False,
                 'error': 'Insights data not found'
             }), 404
         
-        with open(insights_file, 'r') as f:
-            insights_data = json.load(f)
-        
-        # Filter by individual ID
-        individual_insights = [i for i in insights_data if i['Individual_Id'] == individual_id]
+        # Filter by individual ID (only the matching rows are decoded), plus appends not compacted yet
+        insights = data_store.table('insights')
+        individual_insights = insights.records(rows=insights.rows_where('Individual_Id', individual_id))
+        individual_insights += [record for record in insights_cube.appended() if record['Individual_Id'] == individual_id]
         
         # Sort by timestamp descending (newest first)
         individual_insights.sort(key=lambda x: x['Event_Timestamp'], reverse=True)
@@ -710,6 +851,12 @@ def get_individual_insights(individual_id):
 # AI AGENT ROUTES
 # ============================================================================
 
+def _agent_session_id():
+    """Stable per-browser id for the agent's shared conversation state"""
+    if 'agent_session_id' not in session:
+        session['agent_session_id'] = secrets.token_hex(16)
+    return session['agent_session_id']
+
 @app.route('/agent')
 def agent_page():
     """AI Agent chat interface"""
@@ -737,7 +884,8 @@ def agent_chat():
             segmentation_engine,
             email_generator,
             datacloud_analytics,
-            image_generator  # Pass image generator for personalized content
+            image_generator,  # Pass image generator for personalized content
+            session_id=_agent_session_id()
         )
         
         return jsonify({'success': True, 'response': response})
@@ -748,13 +896,13 @@ def agent_chat():
 @app.route('/api/agent/history')
 def agent_history():
     """Get conversation history"""
-    history = ai_agent.get_conversation_history()
+    history = ai_agent.get_conversation_history(session_id=_agent_session_id())
     return jsonify({'success': True, 'history': history})
 
 @app.route('/api/agent/clear', methods=['POST'])
 def agent_clear():
     """Clear conversation history"""
-    result = ai_agent.clear_history()
+    result = ai_agent.clear_history(session_id=_agent_session_id())
     return jsonify({'success': True, 'message': result['message']})
 
 @app.route('/data/synthetic_engagement.json')
@@ -854,14 +1002,10 @@ def individual_vehicle_telemetry_page():
 def get_individual_telemetry():
     """Get individual driving insights profiles"""
     try:
-        telemetry_file = 'data/individual_telemetry_summary.json'
-        if not os.path.exists(telemetry_file):
+        if not data_store.exists('telemetry_summary'):
             return jsonify({'error': 'Telemetry data not found'}), 404
         
-        with open(telemetry_file, 'r') as f:
-            data = json.load(f)
-        
-        return jsonify(data)
+        return jsonify(data_store.load('telemetry_summary'))
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -874,133 +1018,387 @@ def vehicle_telemetry_page():
 
 @app.route('/api/vehicle-telemetry-events')
 def get_vehicle_telemetry_events():
-    """Get all vehicle telemetry events"""
+    """Vehicle telemetry events from the telemetry store (?vehicle_id=&start=&end=&limit= newest N)"""
     try:
-        telemetry_file = 'data/vehicle_telematics.json'
-        if not os.path.exists(telemetry_file):
+        store = _telemetry()
+        if store.is_empty():
             return jsonify({'error': 'Telemetry events data not found'}), 404
         
-        with open(telemetry_file, 'r') as f:
-            data = json.load(f)
-        
-        return jsonify(data)
+        vehicle_ids = [request.args['vehicle_id']] if request.args.get('vehicle_id') else None
+        start = parse_timestamp(request.args['start']) if request.args.get('start') else None
+        end = parse_timestamp(request.args['end']) if request.args.get('end') else None
+        limit = request.args.get('limit', type=int)
+        return jsonify(store.records(vehicle_ids, start, end, limit))
+    except ValueError as e:
+        return jsonify({'error': f'Invalid time range: {e}'}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def _telemetry():
+    """Telemetry store, seeded from vehicle_telematics.json the first time it is used"""
+    if telemetry_store.is_empty() and data_store.exists('vehicle_telematics'):
+        telemetry_store.import_json(data_store.path('vehicle_telematics'))
+    return telemetry_store
+
+@app.route('/api/telemetry/ingest', methods=['POST'])
+def ingest_telemetry():
+    """Append a batch of vehicle telemetry readings"""
+    try:
+        data = request.get_json(silent=True)
+        readings = data.get('readings') if isinstance(data, dict) else data
+        if not isinstance(readings, list) or not readings:
+            return jsonify({'success': False, 'error': 'Request body must contain a non-empty readings list'}), 400
+        
+        added = _telemetry().append(readings)
+        return jsonify({'success': True, 'added': added, 'total_added': sum(added.values())})
+    except (KeyError, ValueError) as e:
+        return jsonify({'success': False, 'error': f'Invalid reading: {e}'}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/vehicles/<vehicle_id>/telemetry')
+def get_vehicle_telemetry(vehicle_id):
+    """Readings of one vehicle in a time range (?start=&end= as 'YYYY-MM-DD HH:MM:SS' or ISO)"""
+    try:
+        store = _telemetry()
+        if store.vehicle(vehicle_id) is None:
+            return jsonify({'success': False, 'error': f'Vehicle {vehicle_id} not found'}), 404
+        
+        start = parse_timestamp(request.args['start']) if request.args.get('start') else None
+        end = parse_timestamp(request.args['end']) if request.args.get('end') else None
+        limit = request.args.get('limit', 5000, type=int)
+        
+        readings = store.read(vehicle_id, start, end)
+        return jsonify({
+            'success': True,
+            'vehicle_id': vehicle_id,
+            'total': len(readings),
+            'readings': store.to_records(vehicle_id, readings[:limit])
+        })
+    except ValueError as e:
+        return jsonify({'success': False, 'error': f'Invalid time range: {e}'}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/vehicles/<vehicle_id>/series')
+def get_vehicle_series(vehicle_id):
+    """Chart-sized metric series (?metrics=speed,rpm&points=300&start=&end=&method=auto|lttb)"""
+    try:
+        store = _telemetry()
+        if store.vehicle(vehicle_id) is None:
+            return jsonify({'success': False, 'error': f'Vehicle {vehicle_id} not found'}), 404
+        
+        metrics = [m.strip() for m in request.args.get('metrics', 'speed,rpm,fuel_level,engine_temp').split(',') if m.strip()]
+        start = parse_timestamp(request.args['start']) if request.args.get('start') else None
+        end = parse_timestamp(request.args['end']) if request.args.get('end') else None
+        points = min(request.args.get('points', 300, type=int), 5000)
+        
+        result = telemetry_series.series(vehicle_id, metrics, start, end, points, request.args.get('method', 'auto'))
+        return jsonify({'success': True, 'vehicle_id': vehicle_id, **result})
+    except ValueError as e:
+        return jsonify({'success': False, 'error': f'Invalid time range: {e}'}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+@app.route('/api/vehicles/<vehicle_id>/trips')
+def get_vehicle_trips(vehicle_id):
+    """Reconstructed trips of one vehicle (?start=&end= filter on trip start)"""
+    try:
+        store = _telemetry()
+        if store.vehicle(vehicle_id) is None:
+            return jsonify({'success': False, 'error': f'Vehicle {vehicle_id} not found'}), 404
+        
+        start = parse_timestamp(request.args['start']) if request.args.get('start') else None
+        end = parse_timestamp(request.args['end']) if request.args.get('end') else None
+        trips = trip_table.trips(vehicle_id, start, end)
+        return jsonify({
+            'success': True,
+            'vehicle_id': vehicle_id,
+            'total': len(trips),
+            'trips': trip_table.to_records(vehicle_id, trips)
+        })
+    except ValueError as e:
+        return jsonify({'success': False, 'error': f'Invalid time range: {e}'}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/trips/summary')
+def get_trip_summary():
+    """Per-vehicle trip totals across the fleet"""
+    try:
+        _telemetry()
+        start = parse_timestamp(request.args['start']) if request.args.get('start') else None
+        end = parse_timestamp(request.args['end']) if request.args.get('end') else None
+        vehicles = trip_table.summary(start, end)
+        return jsonify({'success': True, 'vehicles': vehicles, 'total_trips': sum(v['Trips'] for v in vehicles)})
+    except ValueError as e:
+        return jsonify({'success': False, 'error': f'Invalid time range: {e}'}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/telemetry/rules', methods=['GET', 'PUT'])
+def telemetry_alert_rules():
+    """Alert rules evaluated on every telemetry ingest (PUT a list of definitions, [] restores defaults)"""
+    try:
+        if request.method == 'PUT':
+            definitions = request.get_json(silent=True)
+            if isinstance(definitions, dict):
+                definitions = definitions.get('rules')
+            if not isinstance(definitions, list):
+                return jsonify({'success': False, 'error': 'Request body must be a list of rules'}), 400
+            telemetry_rules.save_rules(definitions)
+        return jsonify({'success': True, 'rules': [rule.definition for rule in telemetry_rules.rules()]})
+    except KeyError as e:
+        return jsonify({'success': False, 'error': f'Invalid rule: missing {e}'}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+@app.route('/api/telemetry/alerts')
+def get_telemetry_alerts():
+    """Alerts raised by the rules (poll with ?since=<last seq>)"""
+    try:
+        since = request.args.get('since', 0, type=int)
+        limit = min(request.args.get('limit', 100, type=int), 1000)
+        alerts = telemetry_rules.recent_alerts(since, limit)
+        return jsonify({'success': True, 'alerts': alerts, 'last_seq': alerts[-1].get('seq', since) if alerts else since})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+def _bbox_arg():
+    """(south, west, north, east) from ?bbox=south,west,north,east, or None"""
+    if not request.args.get('bbox'):
+        return None
+    south, west, north, east = [float(v) for v in request.args['bbox'].split(',')]
+    if south > north or west > east:
+        raise ValueError('bbox must be south,west,north,east')
+    return south, west, north, east
+
+@app.route('/api/telemetry/spatial/points')
+def get_spatial_points():
+    """Readings in an area (?bbox=s,w,n,e or ?lat=&lon=&radius_km=) with the vehicles and individuals seen there"""
+    try:
+        _telemetry()
+        start = parse_timestamp(request.args['start']) if request.args.get('start') else None
+        end = parse_timestamp(request.args['end']) if request.args.get('end') else None
+        limit = request.args.get('limit', 1000, type=int)
+        bbox = _bbox_arg()
+        if bbox:
+            points = spatial_index.points_in_bbox(*bbox, start=start, end=end)
+        elif request.args.get('lat') and request.args.get('lon'):
+            points = spatial_index.points_in_radius(float(request.args['lat']), float(request.args['lon']),
+                                                    request.args.get('radius_km', 5.0, type=float), start, end)
+        else:
+            return jsonify({'success': False, 'error': 'Provide bbox or lat/lon/radius_km'}), 400
+        
+        vehicle_ids = spatial_index.vehicle_ids(points)
+        owners = {}
+        if data_store.exists('individual_vehicles'):
+            owners = {v.get('VehicleId'): v.get('Individual_Id') for v in data_store.load('individual_vehicles')}
+        return jsonify({
+            'success': True,
+            'total': len(points),
+            'vehicle_ids': vehicle_ids,
+            'individual_ids': sorted({owners[v] for v in vehicle_ids if owners.get(v)}),
+            'points': spatial_index.to_records(points, limit)
+        })
+    except ValueError as e:
+        return jsonify({'success': False, 'error': f'Invalid query: {e}'}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/telemetry/spatial/heatmap')
+def get_spatial_heatmap():
+    """Reading density, average speed and alerts per grid cell (?bbox=s,w,n,e&factor=N merges NxN cells)"""
+    try:
+        _telemetry()
+        factor = max(1, request.args.get('factor', 1, type=int))
+        cells = spatial_index.heatmap(_bbox_arg(), factor)
+        return jsonify({'success': True, 'cell_size': spatial_index.cell_size * factor, 'cells': cells})
+    except ValueError as e:
+        return jsonify({'success': False, 'error': f'Invalid query: {e}'}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/telemetry/spatial/cities')
+def get_spatial_cities():
+    """Readings, vehicles, average speed and alerts per city"""
+    try:
+        _telemetry()
+        return jsonify({'success': True, 'cities': spatial_index.city_rollup()})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 @app.route('/api/individuals/engagement')
 def get_individuals_engagement():
     """Get all individuals with their engagement metrics - directly from synthetic data"""
     try:
         # Load synthetic engagement data (contains all info including real names)
-        engagement_file = 'data/synthetic_engagement.json'
-        if not os.path.exists(engagement_file):
+        if not data_store.exists('engagement'):
             return jsonify({'success': False, 'error': 'Engagement data not found'}), 404
         
-        with open(engagement_file, 'r') as f:
-            engagement_data = json.load(f)
+        merged_data = data_store.cached('individuals_engagement', _build_individuals_engagement,
+                                        datasets=('engagement', 'insights'), ttl=3600)
         
-        # Load individual insights data
-        insights_file = 'data/individual_insights.json'
-        insights_by_name = {}
-        try:
-            with open(insights_file, 'r') as f:
-                insights_data = json.load(f)
-            # Create lookup by name, get latest insight for each individual
-            for insight in insights_data:
-                name = insight.get('Individual_Name')
-                if name:
-                    if name not in insights_by_name or insight.get('Event_Timestamp', '') > insights_by_name[name].get('Event_Timestamp', ''):
-                        insights_by_name[name] = insight
-        except Exception as e:
-            print(f"⚠️ Could not load insights: {e}")
+        return jsonify({'success': True, 'individuals': merged_data, 'total': len(merged_data)})
         
-        # Use data directly from synthetic_engagement.json (has real names and all metrics)
-        merged_data = []
-        for item in engagement_data:
-            merged_data.append({
-                'Id': item.get('id', ''),
-                'Name': item.get('Name', 'Unknown'),
-                'FirstName': item.get('FirstName', ''),
-                'LastName': item.get('LastName', ''),
-                'Email': item.get('Email', ''),
-                'Phone': item.get('Phone', ''),
-                'profile_picture_url': item.get('profile_picture_url', ''),
-                'engagement_score': item.get('engagement_score', 0),
-                'omnichannel_score': item.get('omnichannel_score', 0),
-                # Email metrics
-                'email_opens': item.get('email_opens', 0),
-                'email_clicks': item.get('email_clicks', 0),
-                'email_deletes': item.get('email_deletes', 0),
-                'email_bounces': item.get('email_bounces', 0),
-                'email_unsubscribes': item.get('email_unsubscribes', 0),
-                # SMS metrics
-                'sms_sends': item.get('sms_sends', 0),
-                'sms_opens': item.get('sms_opens', 0),
-                'sms_clicks': item.get('sms_clicks', 0),
-                'sms_deletes': item.get('sms_deletes', 0),
-                'sms_optouts': item.get('sms_optouts', 0),
-                'sms_open_rate': item.get('sms_open_rate', 0),
-                # WhatsApp metrics
-                'whatsapp_sends': item.get('whatsapp_sends', 0),
-                'whatsapp_opens': item.get('whatsapp_opens', 0),
-                'whatsapp_clicks': item.get('whatsapp_clicks', 0),
-                'whatsapp_deletes': item.get('whatsapp_deletes', 0),
-                'whatsapp_replies': item.get('whatsapp_replies', 0),
-                'whatsapp_optouts': item.get('whatsapp_optouts', 0),
-                # Push metrics
-                'push_sends': item.get('push_sends', 0),
-                'push_opens': item.get('push_opens', 0),
-                'push_clicks': item.get('push_clicks', 0),
-                'push_deletes': item.get('push_deletes', 0),
-                'push_open_rate': item.get('push_open_rate', 0),
-                # Social metrics
-                'social_views': item.get('social_views', 0),
-                'social_clicks': item.get('social_clicks', 0),
-                # Website metrics
-                'website_product_views': item.get('website_product_views', 0),
-                'website_clicks': item.get('website_clicks', 0),
-                'website_add_to_cart': item.get('website_add_to_cart', 0),
-                'website_cart_abandons': item.get('website_cart_abandons', 0),
-                'website_purchases': item.get('website_purchases', 0),
-                'total_order_value': item.get('total_order_value', 0),
-                'total_message_sends': item.get('total_message_sends', 0),
-                'total_message_interactions': item.get('total_message_interactions', 0),
-                'preferred_channel': item.get('preferred_channel', 'Email'),
-                'preferred_channel_score': item.get('preferred_channel_score', 0),
-                'preferred_contact_time': item.get('preferred_contact_time', 'Not Set'),
-                'email_engagement_score': item.get('email_engagement_score', 0),
-                'sms_engagement_score': item.get('sms_engagement_score', 0),
-                'whatsapp_engagement_score': item.get('whatsapp_engagement_score', 0),
-                'push_engagement_score': item.get('push_engagement_score', 0),
-                'website_engagement_score': item.get('website_engagement_score', 0),
-                'social_engagement_score': item.get('social_engagement_score', 0),
-                'products_browsed': item.get('products_browsed', []),
-                'products_purchased': item.get('products_purchased', []),
-                'favorite_category': item.get('favorite_category', ''),
-                'last_engagement': item.get('last_engagement_date', '')
-            })
-            
-            # Add insights if available
-            name = item.get('Name')
-            if name in insights_by_name:
-                insight = insights_by_name[name]
-                merged_data[-1]['insights'] = {
-                    'Favourite_Exercise': insight.get('Favourite_Exercise'),
-                    'Favourite_Brand': insight.get('Favourite_Brand'),
-                    'Favourite_Destination': insight.get('Favourite_Destination'),
-                    'Hobby': insight.get('Hobby'),
-                    'Lifestyle_Quotient': insight.get('Lifestyle_Quotient'),
-                    'Current_Sentiment': insight.get('Current_Sentiment'),
-                    'Health_Profile': insight.get('Health_Profile'),
-                    'Fitness_Milestone': insight.get('Fitness_Milestone'),
-                    'Purchase_Intent': insight.get('Purchase_Intent'),
-                    'Imminent_Event': insight.get('Imminent_Event')
-                }
-        
-        # Sort by omnichannel score descending (ensure numeric conversion)
-        merged_data.sort(key=lambda x: float(x.get('omnichannel_score', 0) or 0), reverse=True)
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+def _build_individuals_engagement():
+    """Merge engagement metrics with each individual's latest insight, sorted by omnichannel score"""
+    engagement_data = data_store.load('engagement')
+    
+    # Load individual insights data
+    insights_by_name = {}
+    try:
+        # Create lookup by name from each individual's latest insight (encoded frame, no full parse)
+        frame = load_insights_frame(data_store)
+        latest = [row for row in frame.latest_rows().tolist() if row >= 0]
+        for row in sorted(latest, key=lambda row: -int(frame.timestamp[row])):
+            insight = frame.record(row)
+            name = insight.get('Individual_Name')
+            if name and name not in insights_by_name:
+                insights_by_name[name] = insight
+    except Exception as e:
+        print(f"⚠️ Could not load insights: {e}")
+    
+    # Use data directly from synthetic_engagement.json (has real names and all metrics)
+    merged_data = []
+    for item in engagement_data:
+        merged_data.append({
+            'Id': item.get('id', ''),
+            'Name': item.get('Name', 'Unknown'),
+            'FirstName': item.get('FirstName', ''),
+            'LastName': item.get('LastName', ''),
+            'Email': item.get('Email', ''),
+            'Phone': item.get('Phone', ''),
+            'profile_picture_url': item.get('profile_picture_url', ''),
+            'engagement_score': item.get('engagement_score', 0),
+            'omnichannel_score': item.get('omnichannel_score', 0),
+            # Email metrics
+            'email_opens': item.get('email_opens', 0),
+            'email_clicks': item.get('email_clicks', 0),
+            'email_deletes': item.get('email_deletes', 0),
+            'email_bounces': item.get('email_bounces', 0),
+            'email_unsubscribes': item.get('email_unsubscribes', 0),
+            # SMS metrics
+            'sms_sends': item.get('sms_sends', 0),
+            'sms_opens': item.get('sms_opens', 0),
+            'sms_clicks': item.get('sms_clicks', 0),
+            'sms_deletes': item.get('sms_deletes', 0),
+            'sms_optouts': item.get('sms_optouts', 0),
+            'sms_open_rate': item.get('sms_open_rate', 0),
+            # WhatsApp metrics
+            'whatsapp_sends': item.get('whatsapp_sends', 0),
+            'whatsapp_opens': item.get('whatsapp_opens', 0),
+            'whatsapp_clicks': item.get('whatsapp_clicks', 0),
+            'whatsapp_deletes': item.get('whatsapp_deletes', 0),
+            'whatsapp_replies': item.get('whatsapp_replies', 0),
+            'whatsapp_optouts': item.get('whatsapp_optouts', 0),
+            # Push metrics
+            'push_sends': item.get('push_sends', 0),
+            'push_opens': item.get('push_opens', 0),
+            'push_clicks': item.get('push_clicks', 0),
+            'push_deletes': item.get('push_deletes', 0),
+            'push_open_rate': item.get('push_open_rate', 0),
+            # Social metrics
+            'social_views': item.get('social_views', 0),
+            'social_clicks': item.get('social_clicks', 0),
+            # Website metrics
+            'website_product_views': item.get('website_product_views', 0),
+            'website_clicks': item.get('website_clicks', 0),
+            'website_add_to_cart': item.get('website_add_to_cart', 0),
+            'website_cart_abandons': item.get('website_cart_abandons', 0),
+            'website_purchases': item.get('website_purchases', 0),
+            'total_order_value': item.get('total_order_value', 0),
+            'total_message_sends': item.get('total_message_sends', 0),
+            'total_message_interactions': item.get('total_message_interactions', 0),
+            'preferred_channel': item.get('preferred_channel', 'Email'),
+            'preferred_channel_score': item.get('preferred_channel_score', 0),
+            'preferred_contact_time': item.get('preferred_contact_time', 'Not Set'),
+            'email_engagement_score': item.get('email_engagement_score', 0),
+            'sms_engagement_score': item.get('sms_engagement_score', 0),
+            'whatsapp_engagement_score': item.get('whatsapp_engagement_score', 0),
+            'push_engagement_score': item.get('push_engagement_score', 0),
+            'website_engagement_score': item.get('website_engagement_score', 0),
+            'social_engagement_score': item.get('social_engagement_score', 0),
+            'products_browsed': item.get('products_browsed', []),
+            'products_purchased': item.get('products_purchased', []),
+            'favorite_category': item.get('favorite_category', ''),
+            'last_engagement': item.get('last_engagement_date', '')
+        })
         
-        return jsonify({'success': True, 'individuals': merged_data, 'total': len(merged_data)})
+        # Add insights if available
+        name = item.get('Name')
+        if name in insights_by_name:
+            insight = insights_by_name[name]
+            merged_data[-1]['insights'] = {
+                'Favourite_Exercise': insight.get('Favourite_Exercise'),
+                'Favourite_Brand': insight.get('Favourite_Brand'),
+                'Favourite_Destination': insight.get('Favourite_Destination'),
+                'Hobby': insight.get('Hobby'),
+                'Lifestyle_Quotient': insight.get('Lifestyle_Quotient'),
+                'Current_Sentiment': insight.get('Current_Sentiment'),
+                'Health_Profile': insight.get('Health_Profile'),
+                'Fitness_Milestone': insight.get('Fitness_Milestone'),
+                'Purchase_Intent': insight.get('Purchase_Intent'),
+                'Imminent_Event': insight.get('Imminent_Event')
+            }
+    
+    # Sort by omnichannel score descending (ensure numeric conversion)
+    merged_data.sort(key=lambda x: float(x.get('omnichannel_score', 0) or 0), reverse=True)
+    
+    return merged_data
+
+@app.route('/api/individuals/<individual_id>/rescore', methods=['POST'])
+def rescore_individual(individual_id):
+    """Recompute channel scores and preferred channel for one individual"""
+    try:
+        if not data_store.exists('engagement'):
+            return jsonify({'success': False, 'error': 'Engagement data not found'}), 404
+        
+        data = request.get_json(silent=True) or {}
+        include_omnichannel = bool(data.get('include_omnichannel', False))
+        
+        changes = []
+        
+        def rescore(records):
+            for record in records:
+                if record.get('id') == individual_id:
+                    before = dict(record)
+                    updates = channel_scorer.score_individual(record, include_omnichannel)
+                    record.update(updates)
+                    changes.append((before, record))
+                    return updates
+            return None
+        
+        scores = data_store.update('engagement', rescore)
+        if scores is None:
+            return jsonify({'success': False, 'error': f'Individual {individual_id} not found'}), 404
+        
+        segment_events = segment_triggers.engagement_changed(changes)
+        return jsonify({'success': True, 'individual_id': individual_id, 'scores': scores, 'segment_events': segment_events})
+        
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/engagement/events', methods=['POST'])
+def ingest_engagement_events():
+    """Record a batch of engagement events and update the affected individuals"""
+    try:
+        if not data_store.exists('engagement'):
+            return jsonify({'success': False, 'error': 'Engagement data not found'}), 404
+        
+        data = request.get_json(silent=True)
+        events = data.get('events') if isinstance(data, dict) else data
+        if not isinstance(events, list) or not events:
+            return jsonify({'success': False, 'error': 'Request body must contain a non-empty events list'}), 400
+        
+        result = engagement_events.ingest(events)
+        if not result['accepted']:
+            return jsonify({'success': False, 'error': 'No valid events in batch', **result}), 400
+        
+        return jsonify({'success': True, **result})
         
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -1015,6 +1413,20 @@ def debug_status():
         'sf_instance': sf_manager.sf.instance_url if sf_manager.sf else None
     })
 
+@app.route('/api/debug/metrics')
+def debug_metrics():
+    """Request and stage latency histograms of this worker in the Prometheus text format"""
+    return Response(metrics.render_prometheus(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/api/debug/slow-requests')
+def debug_slow_requests():
+    """Recent requests slower than SLOW_REQUEST_MS, with their stage breakdown (newest first)"""
+    limit = request.args.get('limit', type=int)
+    return jsonify({
+        'threshold_ms': metrics.slow_ms,
+        'requests': metrics.slow_log(limit)
+    })
+
 # ============================================================================
 # UTILITY ROUTES
 # ============================================================================
@@ -1172,16 +1584,17 @@ def upload_profile_picture():
         print(f"📤 Uploading profile picture for {person_name} to Cloudinary...")
         
         # Upload to Cloudinary
-        result = cloudinary.uploader.upload(
-            image_data,
-            folder="profile_pictures",
-            public_id=f"profile_{person_name.replace(' ', '_')}",
-            overwrite=True,
-            resource_type="image",
-            transformation=[
-                {'width': 512, 'height': 512, 'crop': 'fill', 'gravity': 'face'}
-            ]
-        )
+        with span('upload'):
+            result = cloudinary.uploader.upload(
+                image_data,
+                folder="profile_pictures",
+                public_id=f"profile_{person_name.replace(' ', '_')}",
+                overwrite=True,
+                resource_type="image",
+                transformation=[
+                    {'width': 512, 'height': 512, 'crop': 'fill', 'gravity': 'face'}
+                ]
+            )
         
         cloudinary_url = result.get('secure_url')
         print(f"✅ Uploaded to Cloudinary: {cloudinary_url}")
@@ -1587,29 +2000,27 @@ def send_personalized_content_emails():
                 if not os.path.exists(personalized_images_file):
                     with open(personalized_images_file, 'w') as f:
                         json.dump({}, f)
-                    print(f"📝 Created empty personalized_images.json")
+                    logger.info("Created empty personalized_images.json")
                 
                 with open(personalized_images_file, 'r') as f:
                     personalized_images = json.load(f)
                     image_url = personalized_images.get(member_name)
                     if image_url and 'res.cloudinary.com' in image_url:
-                        print(f"✅ Found existing Cloudinary URL for {member_name}: {image_url[:100]}...")
+                        logger.debug("Found existing Cloudinary URL for %s: %s...", member_name, image_url[:100])
                     else:
-                        print(f"⚠️ No cached image for {member_name} in personalized_images.json (found {len(personalized_images)} total entries)")
+                        logger.debug("No cached image for %s in personalized_images.json (%d entries)", member_name, len(personalized_images))
             except FileNotFoundError:
-                print(f"⚠️ personalized_images.json not found - will use profile pictures")
+                logger.warning("personalized_images.json not found - using profile pictures")
             except Exception as e:
-                print(f"⚠️ Error reading personalized_images.json: {e}")
-                import traceback
-                print(traceback.format_exc())
+                logger.warning("Could not read personalized_images.json: %s", e, exc_info=debug_exc_info(logger))
             
             # NEVER generate images during email sending - it causes Heroku 30-second timeout
             # Users must generate images first via "AI Personalized Images" page
             if not image_url or 'res.cloudinary.com' not in image_url:
                 # Use profile picture as fallback
                 image_url = individual.get('profile_picture_url', '')
-                print(f"⚠️ No cached personalized image for {member_name}. Using profile picture: {image_url[:100] if image_url else 'None'}...")
-                print(f"💡 Tip: Generate personalized images first via 'AI Personalized Images' page to use AI-generated content in emails")
+                logger.info("No cached personalized image for %s, using the profile picture "
+                            "(generate images first on the AI Personalized Images page)", member_name, extra=sampled())
             
             # Generate email content with full personalization
             # Use omnichannel_score first (more granular), fallback to engagement_score
@@ -1757,14 +2168,14 @@ def send_personalized_content_emails():
                         System.debug('Email sent: ' + results[0].isSuccess());
                         """
                         
-                        result = sf_manager.sf.toolingexecuteanonymous(apex_code)
+                        result = execute_anonymous(sf_manager.sf, apex_code)
                         if not result.get('success'):
                             error_msg = result.get('compileProblem') or result.get('exceptionMessage', 'Unknown error')
                             raise Exception(f"Apex execution failed: {error_msg}")
-                        print(f"✅ Email sent successfully via Apex SingleEmailMessage (HTML with base64)")
+                        logger.info("Email sent via Apex SingleEmailMessage (base64 HTML)", extra=sampled())
                     except Exception as apex_error:
                         # Method 2: Fallback to emailSimple API with explicit HTML format
-                        print(f"⚠️ Apex base64 method failed: {apex_error}, trying emailSimple API...")
+                        logger.warning("Apex base64 send failed: %s, trying emailSimple", apex_error)
                         try:
                             email_payload = {
                                 "inputs": [{
@@ -1781,10 +2192,10 @@ def send_personalized_content_emails():
                                 data=json.dumps(email_payload),
                                 headers={'Content-Type': 'application/json'}
                             )
-                            print(f"✅ Email sent via emailSimple API (HTML format)")
+                            logger.info("Email sent via emailSimple API (HTML)", extra=sampled())
                         except Exception as email_simple_error:
                             # Method 3: Last resort - try Apex with string escaping
-                            print(f"⚠️ emailSimple API failed: {email_simple_error}, trying Apex string escaping...")
+                            logger.warning("emailSimple send failed: %s, trying Apex with string escaping", email_simple_error)
                             try:
                                 # Escape HTML properly for Apex string
                                 html_escaped = html_content.replace("\\", "\\\\").replace("'", "\\'").replace('\n', '\\n').replace('\r', '\\r')
@@ -1801,14 +2212,14 @@ def send_personalized_content_emails():
                                 System.debug('Email sent: ' + results[0].isSuccess());
                                 """
                                 
-                                result = sf_manager.sf.toolingexecuteanonymous(apex_code)
+                                result = execute_anonymous(sf_manager.sf, apex_code)
                                 if not result.get('success'):
                                     error_msg = result.get('compileProblem') or result.get('exceptionMessage', 'Unknown error')
                                     raise Exception(f"Apex execution failed: {error_msg}")
-                                print(f"✅ Email sent successfully via Apex SingleEmailMessage (HTML with escaping)")
+                                logger.info("Email sent via Apex SingleEmailMessage (escaped HTML)", extra=sampled())
                             except Exception as apex_error2:
                                 # Method 4: Last resort - save HTML file and provide link
-                                print(f"⚠️ All email methods failed: {apex_error2}")
+                                logger.error("All email methods failed for %s: %s", member_name, apex_error2)
                                 raise Exception(f"All email methods failed. HTML saved to: {html_file}. Last error: {apex_error2}")
                     
                     results.append({
@@ -1848,13 +2259,61 @@ def send_personalized_content_emails():
 
 @app.route('/health')
 def health_check():
-    """Health check endpoint"""
+    """Health check endpoint (always 200 while the process is up; see 'ready' for warm-up)"""
+    warmup_status = warmup.status()
     return jsonify({
         'status': 'healthy',
+        'ready': warmup_status['ready'],
         'timestamp': datetime.now().isoformat(),
-        'connected': sf_manager.is_connected()
+        'connected': sf_manager.is_connected(),
+        'warmup': warmup_status
     })
 
+@app.route('/health/ready')
+def readiness_check():
+    """Readiness probe for load balancers: 503 until this worker's caches are warm"""
+    warmup_status = warmup.status()
+    return jsonify(warmup_status), 200 if warmup_status['ready'] else 503
+
+# ============================================================================
+# WARM-UP
+# ============================================================================
+
+# Caches the first requests would otherwise build, filled per worker at boot (WARMUP=background|blocking|off)
+warmup = WarmUp()
+
+@warmup.task('engagement', 'Engagement file and the /api/individuals/engagement payload')
+def warm_engagement():
+    data_store.load('engagement')
+    merged_data = data_store.cached('individuals_engagement', _build_individuals_engagement,
+                                    datasets=('engagement', 'insights'), ttl=3600)
+    return {'individuals': len(merged_data)}
+
+@warmup.task('insights', 'Insights count cube, columnar table and encoded frame')
+def warm_insights():
+    state = insights_cube.state()
+    load_insights_frame(data_store)
+    return {'events': state['total']}
+
+@warmup.task('telemetry', 'Telemetry store, trip tables and spatial index')
+def warm_telemetry():
+    store = _telemetry()
+    if store.is_empty():
+        raise FileNotFoundError(data_store.path('vehicle_telematics'))
+    trips = trip_table.build()
+    spatial_index.city_rollup()
+    return {'vehicles': len(trips), 'trips': sum(trips.values())}
+
+@warmup.task('segments', 'Bitmaps of saved segments for segment algebra')
+def warm_segments():
+    # Without a login, SOQL segments are left for the first request that has a connection
+    detail = {'segments': len(segment_algebra.materialize(sf_manager.sf))}
+    if segment_algebra.unavailable:
+        detail['not_materialized'] = len(segment_algebra.unavailable)
+    return detail
+
+warmup.start()
+
 # ============================================================================
 # ERROR HANDLERS
 # ============================================================================
@@ -8,43 +8,49 @@ Also restore profile pictures from persistent profile_pictures.json
 import os
 import shutil
 import json
+from concurrent.futures import ThreadPoolExecutor
+
+DATA_DIR = 'data'
+SEED_DIR = os.path.join(DATA_DIR, 'seed')
+
+FILES_TO_CHECK = [
+    'synthetic_engagement.json',
+    'individual_insights.json'
+]
+
+def ensure_seeded(filename):
+    """Copy a data file from its seed if it is missing; returns the lines to report"""
+    data_file = os.path.join(DATA_DIR, filename)
+    seed_file = os.path.join(SEED_DIR, filename)
+    
+    if os.path.exists(data_file):
+        return [f"✅ {data_file} exists"]
+    if os.path.exists(seed_file):
+        shutil.copy2(seed_file, data_file)
+        return [f"⚠️  {data_file} not found!", f"✅ Copying from seed: {seed_file} -> {data_file}"]
+    return [f"⚠️  {data_file} not found!", f"❌ ERROR: Seed file not found: {seed_file}"]
+
+def ensure_personalized_images():
+    """Initialize personalized_images.json if it doesn't exist"""
+    personalized_images_file = os.path.join(DATA_DIR, 'personalized_images.json')
+    if os.path.exists(personalized_images_file):
+        return [f"✅ {personalized_images_file} exists"]
+    with open(personalized_images_file, 'w') as f:
+        json.dump({}, f)
+    return [f"⚠️  {personalized_images_file} not found - creating empty file", f"✅ Created {personalized_images_file}"]
 
 def ensure_data_files():
     """Ensure data files exist, copy from seed if needed"""
     
-    data_dir = 'data'
-    seed_dir = os.path.join(data_dir, 'seed')
-    
-    files_to_check = [
-        'synthetic_engagement.json',
-        'individual_insights.json'
-    ]
-    
-    for filename in files_to_check:
-        data_file = os.path.join(data_dir, filename)
-        seed_file = os.path.join(seed_dir, filename)
-        
-        if not os.path.exists(data_file):
-            print(f"⚠️  {data_file} not found!")
-            if os.path.exists(seed_file):
-                print(f"✅ Copying from seed: {seed_file} -> {data_file}")
-                shutil.copy2(seed_file, data_file)
-            else:
-                print(f"❌ ERROR: Seed file not found: {seed_file}")
-        else:
-            print(f"✅ {data_file} exists")
-    
-    # Initialize personalized_images.json if it doesn't exist
-    personalized_images_file = os.path.join(data_dir, 'personalized_images.json')
-    if not os.path.exists(personalized_images_file):
-        print(f"⚠️  {personalized_images_file} not found - creating empty file")
-        with open(personalized_images_file, 'w') as f:
-            json.dump({}, f)
-        print(f"✅ Created {personalized_images_file}")
-    else:
-        print(f"✅ {personalized_images_file} exists")
+    # The checks touch different files - run them side by side (seed copies are I/O bound)
+    with ThreadPoolExecutor(max_workers=len(FILES_TO_CHECK) + 1) as pool:
+        checks = [pool.submit(ensure_seeded, filename) for filename in FILES_TO_CHECK]
+        checks.append(pool.submit(ensure_personalized_images))
+        for check in checks:
+            for line in check.result():
+                print(line)
     
-    # Restore profile pictures from persistent mapping
+    # Restore profile pictures from persistent mapping (needs the engagement file in place)
     restore_profile_pictures()
 
 def restore_profile_pictures():
@@ -71,18 +77,22 @@ def restore_profile_pictures():
         
         # Restore profile picture URLs
         restored_count = 0
+        changed_count = 0
         for person in engagement_data:
             name = person.get('Name')
             if name and name in profile_pics and profile_pics[name]:
-                person['profile_picture_url'] = profile_pics[name]
+                if person.get('profile_picture_url') != profile_pics[name]:
+                    person['profile_picture_url'] = profile_pics[name]
+                    changed_count += 1
                 restored_count += 1
         
-        # Save updated engagement data
-        with open(engagement_file, 'w') as f:
-            json.dump(engagement_data, f, indent=2)
+        # Save updated engagement data (only if a URL actually changed - this runs on every boot)
+        if changed_count:
+            with open(engagement_file, 'w') as f:
+                json.dump(engagement_data, f, indent=2)
         
         if restored_count > 0:
-            print(f"✅ Restored {restored_count} profile pictures from persistent storage!")
+            print(f"✅ Restored {restored_count} profile pictures from persistent storage! ({changed_count} updated)")
         else:
             print("ℹ️  No profile pictures to restore")
             
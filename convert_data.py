@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Convert the data files between JSON, CSV and the memory-mapped columnar layout
+
+Usage:
+    python convert_data.py                                  # columnar copies of every dataset
+    python convert_data.py --dataset engagement --csv       # also regenerate the CSV twin
+    python convert_data.py --to-json data/columnar/engagement-<hash> out.json
+    python convert_data.py --from-csv data/individual_vehicles.csv data/columnar/vehicles_csv
+    python convert_data.py --telemetry                      # load vehicle_telematics.json into data/telemetry, build trips + spatial index
+"""
+
+import argparse
+import os
+import time
+
+from modules.columnar_store import columnar_to_csv, columnar_to_json, csv_to_columnar
+from modules.data_store import DATASETS, DataStore
+from modules.telemetry_store import TelemetryStore
+from modules.telemetry_spatial import SpatialIndex
+from modules.telemetry_trips import TripTable
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Convert data files to and from the columnar layout')
+    parser.add_argument('--dataset', action='append', choices=sorted(DATASETS), help='Dataset to convert (repeatable)')
+    parser.add_argument('--csv', action='store_true', help='Regenerate the CSV twin of each converted dataset')
+    parser.add_argument('--to-json', nargs=2, metavar=('COLUMNAR_DIR', 'JSON_FILE'), help='Write a columnar table back to JSON')
+    parser.add_argument('--from-csv', nargs=2, metavar=('CSV_FILE', 'COLUMNAR_DIR'), help='Build a columnar table from a CSV file')
+    parser.add_argument('--telemetry', action='store_true', help='Import vehicle_telematics.json into the telemetry store')
+    args = parser.parse_args()
+
+    if args.to_json:
+        columnar_to_json(*args.to_json)
+        print(f"✅ Wrote {args.to_json[1]}")
+        return
+    if args.from_csv:
+        meta = csv_to_columnar(*args.from_csv)
+        print(f"✅ Wrote {args.from_csv[1]} ({meta['rows']} rows, {len(meta['columns'])} columns)")
+        return
+
+    if args.telemetry:
+        start = time.time()
+        telemetry = TelemetryStore()
+        spatial = SpatialIndex(telemetry)
+        added = telemetry.import_json(DATASETS['vehicle_telematics'])
+        print(f"✅ Imported {sum(added.values())} readings for {len(added)} vehicles into {telemetry.root} "
+              f"({time.time() - start:.2f}s, {telemetry.count()} readings stored)")
+        trips = TripTable(telemetry).build()
+        print(f"✅ Trip tables up to date: {sum(trips.values())} trips")
+        spatial.rebuild()
+        print(f"✅ Spatial index rebuilt: {len(spatial.heatmap())} grid cells")
+        return
+
+    store = DataStore()
+    print("="*80)
+    print("COLUMNAR CONVERSION")
+    print("="*80)
+
+    for name in args.dataset or sorted(DATASETS):
+        if not store.exists(name):
+            print(f"⚠️  {name}: {store.path(name)} not found")
+            continue
+
+        start = time.time()
+        table = store.table(name)
+        elapsed = time.time() - start
+        size = sum(os.path.getsize(os.path.join(table.directory, f)) for f in os.listdir(table.directory))
+        kinds = [column['kind'] for column in table.meta['columns']]
+        print(f"\n📁 {store.path(name)} -> {table.directory} ({elapsed:.2f}s)")
+        print(f"   {len(table)} rows, {len(kinds)} columns ({kinds.count('dict')} dictionary-encoded), "
+              f"{size / 1024:.0f} KB vs {os.path.getsize(store.path(name)) / 1024:.0f} KB JSON")
+
+        if args.csv:
+            csv_path = os.path.splitext(store.path(name))[0] + '.csv'
+            columnar_to_csv(table.directory, csv_path)
+            print(f"✅ Wrote {csv_path}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Refresh derived fields in the synthetic data files in a single pass
+Replaces running the add_*/enhance_*/calculate_* scripts one after another
+
+Usage:
+    python enrich_data.py                     # run stages whose inputs changed
+    python enrich_data.py --force             # recompute every stage
+    python enrich_data.py --stage channel_scores --stage message_totals
+    python enrich_data.py --list
+"""
+
+import argparse
+import time
+
+from modules.enrichment_stages import engagement_pipeline, insights_pipeline
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the data enrichment pipeline')
+    parser.add_argument('--stage', action='append', help='Only run this stage (repeatable)')
+    parser.add_argument('--force', action='store_true', help='Recompute even if inputs are unchanged')
+    parser.add_argument('--dry-run', action='store_true', help='Compute but do not write files')
+    parser.add_argument('--list', action='store_true', help='List stages and exit')
+    args = parser.parse_args()
+
+    pipelines = [engagement_pipeline(), insights_pipeline()]
+
+    if args.list:
+        for pipeline in pipelines:
+            print(f"\n📁 {pipeline.data_file}")
+            for stage in pipeline.stages:
+                kind = 'seed' if stage.fill_missing else 'derived'
+                print(f"   • {stage.name:<24} [{kind}] {stage.description}")
+        return
+
+    known = {name for pipeline in pipelines for name in pipeline.stage_names()}
+    unknown = set(args.stage or []) - known
+    if unknown:
+        parser.error(f"unknown stage(s): {', '.join(sorted(unknown))}")
+
+    print("="*80)
+    print("DATA ENRICHMENT PIPELINE")
+    print("="*80)
+
+    for pipeline in pipelines:
+        selected = [name for name in (args.stage or pipeline.stage_names()) if name in pipeline.stage_names()]
+        if not selected:
+            continue
+
+        start = time.time()
+        result = pipeline.run(only=selected, force=args.force, dry_run=args.dry_run, collect=False)
+        elapsed = time.time() - start
+
+        print(f"\n📁 {pipeline.data_file} ({result['count']} records, {elapsed:.2f}s)")
+        for name in selected:
+            counts = result['stages'][name]
+            print(f"   {name:<24} ran {counts['ran']:>6}  changed {counts['changed']:>6}  skipped {counts['skipped']:>6}")
+        if result['written']:
+            print(f"✅ Wrote {pipeline.data_file}")
+        else:
+            print("✅ No changes" if not args.dry_run else "ℹ️  Dry run - nothing written")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Generate large synthetic datasets for load testing (offline, no Salesforce connection)
+
+Usage:
+    python generate_synthetic_data.py --individuals 100000 --out data/synthetic
+    python generate_synthetic_data.py --individuals 1000000 --events 5-10 --readings 40 --seed 7 --format columnar
+    python generate_synthetic_data.py --individuals 1000 --anchor 2025-11-01 --format json,csv
+
+The same --individuals, --seed, --anchor and --chunk-size always produce the same data.
+"""
+
+import argparse
+import os
+import time
+from datetime import datetime
+
+from modules.synthetic_data import FORMATS, GENERATED_DATASETS, SyntheticPopulation, write_population
+
+
+def _range(value):
+    low, _, high = value.partition('-')
+    low, high = int(low), int(high or low)
+    if low < 0 or high < low:
+        raise argparse.ArgumentTypeError(f"expected MIN-MAX with 0 <= MIN <= MAX, got {value}")
+    return low, high
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate seeded synthetic engagement, insights, vehicle and telemetry data')
+    parser.add_argument('--individuals', type=int, default=10000, help='Population size')
+    parser.add_argument('--events', type=_range, default=(3, 8), metavar='MIN-MAX', help='Insight events per individual')
+    parser.add_argument('--readings', type=int, default=20, help='Telemetry readings per connected vehicle')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--anchor', type=datetime.fromisoformat, help='Newest timestamp in the data (default: today 00:00)')
+    parser.add_argument('--chunk-size', type=int, default=20000, help='Individuals generated per chunk')
+    parser.add_argument('--format', default='json,columnar', help=f"Comma-separated output formats ({', '.join(FORMATS)})")
+    parser.add_argument('--dataset', action='append', choices=GENERATED_DATASETS, help='Dataset to generate (repeatable)')
+    parser.add_argument('--out', default='data/synthetic', help='Output directory')
+    args = parser.parse_args()
+
+    population = SyntheticPopulation(args.individuals, seed=args.seed, events_per_individual=args.events,
+                                     readings_per_vehicle=args.readings, anchor=args.anchor, chunk_size=args.chunk_size)
+    datasets = args.dataset or GENERATED_DATASETS
+
+    print("="*80)
+    print("SYNTHETIC DATA")
+    print("="*80)
+    print(f"Individuals: {population.individuals:,}  seed: {population.seed}  anchor: {population.anchor.isoformat()}")
+    for name in datasets:
+        print(f"   {name}: {population.rows(name):,} rows")
+    print()
+
+    start = time.time()
+
+    def progress(name, done, total):
+        print(f"\r   {name}: chunk {done}/{total} ({time.time() - start:.1f}s)", end='\n' if done == total else '', flush=True)
+
+    manifest = write_population(population, args.out, formats=[f.strip() for f in args.format.split(',') if f.strip()],
+                                datasets=datasets, progress=progress)
+
+    print()
+    for name, entry in manifest['datasets'].items():
+        for path in entry['files']:
+            print(f"✅ {name}: {entry['rows']:,} rows -> {path}")
+    print(f"\n✅ Done in {time.time() - start:.1f}s (manifest: {os.path.join(args.out, 'manifest.json')})")
+
+
+if __name__ == '__main__':
+    main()
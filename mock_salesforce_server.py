@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""
+Run a local Salesforce/Data Cloud stand-in for offline development and load tests
+
+Usage:
+    python mock_salesforce_server.py                                # http://127.0.0.1:8765, data from data/
+    python mock_salesforce_server.py --latency-ms 80 --jitter-ms 40 --error-rate 0.02
+    python mock_salesforce_server.py --port 0 --data-dir data/synthetic --page-size 500
+
+Point the app at it with SF_LOGIN_URL=http://127.0.0.1:8765 and log in with any username
+(and any password, unless --password is given). Runtime knobs: PUT /__mock__/config with
+{"latency_ms": .., "jitter_ms": .., "error_rate": .., "error_status": .., "page_size": ..};
+GET /__mock__/stats and /__mock__/outbox show request counts and the emails "sent".
+"""
+
+import argparse
+
+from werkzeug.serving import make_server
+
+from modules.mock_salesforce import DEFAULT_PAGE_SIZE, MockSalesforce
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve a mock Salesforce org from the local data files')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765, help='Port to listen on (0 = any free port)')
+    parser.add_argument('--data-dir', default='data', help='Directory with synthetic_engagement.json')
+    parser.add_argument('--latency-ms', type=float, default=0, help='Latency added to every API request')
+    parser.add_argument('--jitter-ms', type=float, default=0, help='Random extra latency, up to this much')
+    parser.add_argument('--error-rate', type=float, default=0, help='Share of API requests that fail (0-1)')
+    parser.add_argument('--error-status', type=int, default=503, help='HTTP status of injected failures')
+    parser.add_argument('--page-size', type=int, default=DEFAULT_PAGE_SIZE, help='Query records per page')
+    parser.add_argument('--password', help='Only accept this password at login')
+    parser.add_argument('--seed', type=int, help='Seed for latency jitter and error injection')
+    args = parser.parse_args()
+
+    mock = MockSalesforce(data_dir=args.data_dir, latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+                          error_rate=args.error_rate, error_status=args.error_status, page_size=args.page_size,
+                          password=args.password, seed=args.seed)
+    server = make_server(args.host, args.port, mock.app, threaded=True)
+    # First line is parsed by run_benchmarks.py to find the port when --port 0
+    print(f"Mock Salesforce listening on http://{args.host}:{server.server_port}", flush=True)
+    print(f"   data: {args.data_dir}  latency: {args.latency_ms:g}ms (+{args.jitter_ms:g}ms jitter)  "
+          f"error rate: {args.error_rate:g}  page size: {args.page_size}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
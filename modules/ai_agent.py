@@ -4,21 +4,60 @@ Interprets natural language requests and executes appropriate actions
 """
 
 import json
+import logging
 import re
 import os
 from datetime import datetime
 
-class AIAgent:
+from modules.app_logging import get_logger
+
+logger = get_logger(__name__)
+
+
+class AgentSession:
+    """Conversation history and context of one chat session, loaded for a single request"""
+    
+    def __init__(self, session_id, conversation_history=None, context=None):
+        self.session_id = session_id
+        self.conversation_history = conversation_history or []
+        self.context = context or self.empty_context()
+        # Entries before this index were already saved; later ones were added by this request
+        self.loaded_entries = len(self.conversation_history)
     
-    def __init__(self):
-        self.conversation_history = []
-        self.context = {
+    def snapshot(self):
+        """The context as stored with a history entry: member lists and content samples reduced to counts"""
+        snapshot = dict(self.context)
+        if 'last_segment_members' in snapshot:
+            snapshot['last_segment_members'] = len(snapshot['last_segment_members'] or [])
+        if snapshot.get('last_generated_content'):
+            snapshot['last_generated_content'] = {k: v for k, v in snapshot['last_generated_content'].items() if k != 'samples'}
+        return snapshot
+    
+    @staticmethod
+    def empty_context():
+        return {
             'last_segment_created': None,
             'last_segment_id': None,
             'last_segment_name': None,
             'last_action': None,
             'entities_mentioned': []
         }
+
+
+class AIAgent:
+    
+    SESSION_TTL = 8 * 60 * 60  # matches PERMANENT_SESSION_LIFETIME
+    MAX_HISTORY = 100  # turns kept per session, oldest dropped first
+    
+    def __init__(self, state=None, insights_cube=None):
+        # Shared backend (modules.shared_state) so every worker sees the same sessions;
+        # without one, sessions live in this process only
+        if state is None:
+            from modules.shared_state import MemoryBackend
+            state = MemoryBackend()
+        self.state = state
+        # Optional modules.insights_cube.InsightsCube - distributions without reading the insights file
+        self.insights_cube = insights_cube
         self.available_actions = {
             'create_segment': ['create a segment', 'create segment', 'new segment', 'make a segment', 'make segment', 'build segment', 'segment of', 'filter individuals', 'filter users'],
             'personalize_content': ['personalize', 'personalise', 'generate images', 'create images', 'personalized images', 'personalised content', 'ai images', 'face swap', 'custom images'],
@@ -31,13 +70,48 @@ class AIAgent:
             'explain_data': ['explain', 'what is', 'describe', 'tell me about']
         }
     
-    def process_request(self, user_message, sf, data_manager, segmentation_engine, email_generator, datacloud_analytics, image_generator=None):
-        """Process a natural language request and return structured response"""
+    def _session_key(self, session_id):
+        return f"agent:session:{session_id or 'default'}"
+    
+    def _load_session(self, session_id):
+        """History and context of a session from the shared backend"""
+        saved = self.state.get(self._session_key(session_id)) or {}
+        return AgentSession(session_id, saved.get('conversation_history'), saved.get('context'))
+    
+    def _save_session(self, session):
+        """
+        Write a request's history entries and context back to the shared backend
         
+        This request's entries are appended to the saved history in one atomic backend
+        update, so two requests of one session running at once (in any worker) both keep
+        their turns; the context of the request that finishes last wins. Only the last
+        MAX_HISTORY turns are kept.
+        """
+        # Round-trip through JSON so non-serializable values (datetimes etc.) become strings
+        added = json.loads(json.dumps({
+            'conversation_history': session.conversation_history[session.loaded_entries:],
+            'context': session.context
+        }, default=str))
+        
+        def append(saved):
+            history = (saved or {}).get('conversation_history', []) + added['conversation_history']
+            return {'conversation_history': history[-self.MAX_HISTORY:], 'context': added['context']}
+        
+        self.state.update(self._session_key(session.session_id), append, ex=self.SESSION_TTL)
+    
+    def process_request(self, user_message, sf, data_manager, segmentation_engine, email_generator, datacloud_analytics, image_generator=None, session_id=None):
+        """Process a natural language request and return structured response"""
+        session = self._load_session(session_id)
+        try:
+            return self._process_request(session, user_message, sf, data_manager, segmentation_engine, email_generator, datacloud_analytics, image_generator)
+        finally:
+            self._save_session(session)
+    
+    def _process_request(self, session, user_message, sf, data_manager, segmentation_engine, email_generator, datacloud_analytics, image_generator=None):
         user_message_lower = user_message.lower()
         
         # Store in conversation history
-        self.conversation_history.append({
+        session.conversation_history.append({
             'timestamp': datetime.now().isoformat(),
             'user': user_message,
             'agent': None  # Will be filled after processing
@@ -51,27 +125,27 @@ class AIAgent:
             'message': '',
             'data': None,
             'suggested_actions': [],
-            'conversation_id': len(self.conversation_history) - 1
+            'conversation_id': len(session.conversation_history) - 1
         }
         
         try:
             if intent == 'send_email_test':
-                response = self._handle_send_email_test(user_message, user_message_lower, sf, segmentation_engine)
+                response = self._handle_send_email_test(session, user_message, user_message_lower, sf, segmentation_engine)
             
             elif intent == 'view_segment':
-                response = self._handle_view_segment(user_message, user_message_lower, sf, segmentation_engine)
+                response = self._handle_view_segment(session, user_message, user_message_lower, sf, segmentation_engine)
             
             elif intent == 'investigate_table':
                 response = self._handle_investigate_table(user_message, user_message_lower, sf, data_manager)
             
             elif intent == 'create_segment':
-                response = self._handle_create_segment(user_message, user_message_lower, sf, segmentation_engine, image_generator)
+                response = self._handle_create_segment(session, user_message, user_message_lower, sf, segmentation_engine, image_generator)
             
             elif intent == 'personalize_content':
-                response = self._handle_personalize_content(user_message, user_message_lower, sf, segmentation_engine, image_generator)
+                response = self._handle_personalize_content(session, user_message, user_message_lower, sf, segmentation_engine, image_generator)
             
             elif intent == 'generate_email':
-                response = self._handle_generate_email(user_message, user_message_lower, sf, email_generator, segmentation_engine)
+                response = self._handle_generate_email(session, user_message, user_message_lower, sf, email_generator, segmentation_engine)
             
             elif intent == 'create_records':
                 response = self._handle_create_records(user_message, user_message_lower, sf, data_manager)
@@ -90,8 +164,8 @@ class AIAgent:
             response['intent'] = 'error'
         
         # Update conversation history with context
-        self.conversation_history[-1]['agent'] = response['message']
-        self.conversation_history[-1]['context'] = dict(self.context)  # Save context snapshot
+        session.conversation_history[-1]['agent'] = response['message']
+        session.conversation_history[-1]['context'] = session.snapshot()  # Save context snapshot
         
         return response
     
@@ -185,6 +259,9 @@ class AIAgent:
         """Handle investigation of Individual Insights behavioral data"""
         
         try:
+            if self.insights_cube is not None:
+                return self._investigate_insights_cube()
+            
             import json
             from collections import Counter
             
@@ -193,12 +270,7 @@ class AIAgent:
                 insights_data = json.load(f)
             
             if not insights_data:
-                return {
-                    'intent': 'investigate_table',
-                    'message': "❌ No Individual Insights data found. Please generate the insights data first.",
-                    'data': None,
-                    'suggested_actions': ['Generate insights data', 'Create synthetic data']
-                }
+                return self._no_insights_response()
             
             # Calculate statistics
             total_records = len(insights_data)
@@ -210,79 +282,9 @@ class AIAgent:
             health_profiles = Counter(i['Health_Profile'] for i in insights_data)
             purchase_intents = Counter(i['Purchase_Intent'] for i in insights_data)
             
-            # Build message
-            message_text = f"🔮 **Individual Insights Data Investigation**\n\n"
-            message_text += f"**📊 Overview:**\n"
-            message_text += f"• Total Records: {total_records:,}\n"
-            message_text += f"• Unique Individuals: {unique_individuals}\n"
-            message_text += f"• Records per Individual: ~{total_records // unique_individuals}\n"
-            message_text += f"• Time Range: Last 90 days\n\n"
-            
-            message_text += f"**📋 Data Fields:**\n"
-            message_text += f"• Individual_Id (Primary Key)\n"
-            message_text += f"• Event_Timestamp (Primary Key)\n"
-            message_text += f"• Current_Sentiment\n"
-            message_text += f"• Lifestyle_Quotient\n"
-            message_text += f"• Health_Profile\n"
-            message_text += f"• Fitness_Milestone\n"
-            message_text += f"• Purchase_Intent\n"
-            message_text += f"• Favourite_Brand\n"
-            message_text += f"• Favourite_Destination\n"
-            message_text += f"• Hobby\n"
-            message_text += f"• Imminent_Event\n\n"
-            
-            message_text += f"**😊 Sentiment Distribution (Top 5):**\n"
-            for sentiment, count in sentiments.most_common(5):
-                pct = (count / total_records) * 100
-                message_text += f"• {sentiment}: {count} ({pct:.1f}%)\n"
-            
-            message_text += f"\n**🎯 Lifestyle Distribution (Top 5):**\n"
-            for lifestyle, count in lifestyles.most_common(5):
-                pct = (count / total_records) * 100
-                message_text += f"• {lifestyle}: {count} ({pct:.1f}%)\n"
-            
-            message_text += f"\n**💪 Health Profile Distribution (Top 5):**\n"
-            for profile, count in health_profiles.most_common(5):
-                pct = (count / total_records) * 100
-                message_text += f"• {profile}: {count} ({pct:.1f}%)\n"
-            
-            message_text += f"\n**🛒 Purchase Intent Distribution:**\n"
-            for intent, count in purchase_intents.most_common():
-                pct = (count / total_records) * 100
-                message_text += f"• {intent}: {count} ({pct:.1f}%)\n"
-            
-            message_text += f"\n✅ **Found {total_records:,} behavioral insight records!**\n\n"
-            message_text += f"💡 **Use Cases:**\n"
-            message_text += f"• Sentiment-based segmentation\n"
-            message_text += f"• Lifestyle-targeted campaigns\n"
-            message_text += f"• Health-aware messaging\n"
-            message_text += f"• Purchase intent predictions\n"
-            message_text += f"• Event-triggered communications"
-            
-            # Sample records
-            sample_records = insights_data[:10]
-            
-            return {
-                'intent': 'investigate_table',
-                'message': message_text,
-                'data': {
-                    'object': 'Individual_Insights',
-                    'total_records': total_records,
-                    'unique_individuals': unique_individuals,
-                    'sample_records': sample_records,
-                    'distributions': {
-                        'sentiments': dict(sentiments.most_common(10)),
-                        'lifestyles': dict(lifestyles.most_common(10)),
-                        'health_profiles': dict(health_profiles.most_common(10)),
-                        'purchase_intents': dict(purchase_intents)
-                    }
-                },
-                'suggested_actions': [
-                    'Show me insights analytics',
-                    'Create segment based on sentiment',
-                    'Export insights data'
-                ]
-            }
+            return self._insights_investigation(total_records, unique_individuals, insights_data[:10],
+                                                sentiments.most_common(), lifestyles.most_common(),
+                                                health_profiles.most_common(), purchase_intents.most_common())
             
         except FileNotFoundError:
             return {
@@ -299,7 +301,102 @@ class AIAgent:
                 'suggested_actions': ['Check data file', 'Regenerate data']
             }
     
-    def _handle_create_segment(self, original_message, message, sf, segmentation_engine, image_generator=None):
+    def _no_insights_response(self):
+        return {
+            'intent': 'investigate_table',
+            'message': "❌ No Individual Insights data found. Please generate the insights data first.",
+            'data': None,
+            'suggested_actions': ['Generate insights data', 'Create synthetic data']
+        }
+    
+    def _investigate_insights_cube(self):
+        """Insights investigation answered from the pre-aggregated cube"""
+        cube = self.insights_cube
+        overview = cube.overview()
+        if not overview['total_records']:
+            return self._no_insights_response()
+        
+        insights = cube.data_store.table('insights')
+        return self._insights_investigation(overview['total_records'], overview['unique_individuals'],
+                                            insights.records(rows=range(min(10, len(insights)))),
+                                            cube.distribution('Current_Sentiment'), cube.distribution('Lifestyle_Quotient'),
+                                            cube.distribution('Health_Profile'), cube.distribution('Purchase_Intent'))
+    
+    def _insights_investigation(self, total_records, unique_individuals, sample_records,
+                                sentiments, lifestyles, health_profiles, purchase_intents):
+        """Investigation response; distributions are (value, count) lists, most common first"""
+        # Build message
+        message_text = f"🔮 **Individual Insights Data Investigation**\n\n"
+        message_text += f"**📊 Overview:**\n"
+        message_text += f"• Total Records: {total_records:,}\n"
+        message_text += f"• Unique Individuals: {unique_individuals}\n"
+        message_text += f"• Records per Individual: ~{total_records // unique_individuals}\n"
+        message_text += f"• Time Range: Last 90 days\n\n"
+        
+        message_text += f"**📋 Data Fields:**\n"
+        message_text += f"• Individual_Id (Primary Key)\n"
+        message_text += f"• Event_Timestamp (Primary Key)\n"
+        message_text += f"• Current_Sentiment\n"
+        message_text += f"• Lifestyle_Quotient\n"
+        message_text += f"• Health_Profile\n"
+        message_text += f"• Fitness_Milestone\n"
+        message_text += f"• Purchase_Intent\n"
+        message_text += f"• Favourite_Brand\n"
+        message_text += f"• Favourite_Destination\n"
+        message_text += f"• Hobby\n"
+        message_text += f"• Imminent_Event\n\n"
+        
+        message_text += f"**😊 Sentiment Distribution (Top 5):**\n"
+        for sentiment, count in sentiments[:5]:
+            pct = (count / total_records) * 100
+            message_text += f"• {sentiment}: {count} ({pct:.1f}%)\n"
+        
+        message_text += f"\n**🎯 Lifestyle Distribution (Top 5):**\n"
+        for lifestyle, count in lifestyles[:5]:
+            pct = (count / total_records) * 100
+            message_text += f"• {lifestyle}: {count} ({pct:.1f}%)\n"
+        
+        message_text += f"\n**💪 Health Profile Distribution (Top 5):**\n"
+        for profile, count in health_profiles[:5]:
+            pct = (count / total_records) * 100
+            message_text += f"• {profile}: {count} ({pct:.1f}%)\n"
+        
+        message_text += f"\n**🛒 Purchase Intent Distribution:**\n"
+        for intent, count in purchase_intents:
+            pct = (count / total_records) * 100
+            message_text += f"• {intent}: {count} ({pct:.1f}%)\n"
+        
+        message_text += f"\n✅ **Found {total_records:,} behavioral insight records!**\n\n"
+        message_text += f"💡 **Use Cases:**\n"
+        message_text += f"• Sentiment-based segmentation\n"
+        message_text += f"• Lifestyle-targeted campaigns\n"
+        message_text += f"• Health-aware messaging\n"
+        message_text += f"• Purchase intent predictions\n"
+        message_text += f"• Event-triggered communications"
+        
+        return {
+            'intent': 'investigate_table',
+            'message': message_text,
+            'data': {
+                'object': 'Individual_Insights',
+                'total_records': total_records,
+                'unique_individuals': unique_individuals,
+                'sample_records': sample_records,
+                'distributions': {
+                    'sentiments': dict(sentiments[:10]),
+                    'lifestyles': dict(lifestyles[:10]),
+                    'health_profiles': dict(health_profiles[:10]),
+                    'purchase_intents': dict(purchase_intents)
+                }
+            },
+            'suggested_actions': [
+                'Show me insights analytics',
+                'Create segment based on sentiment',
+                'Export insights data'
+            ]
+        }
+    
+    def _handle_create_segment(self, session, original_message, message, sf, segmentation_engine, image_generator=None):
         """Handle segment creation requests - ACTUALLY CREATE THE SEGMENT"""
         
         # Parse request for segment requirements
@@ -315,7 +412,7 @@ class AIAgent:
         
         if is_driving_query:
             # This is a driving-related segment request
-            return self._handle_driving_segment(original_message, message, sf, segmentation_engine)
+            return self._handle_driving_segment(session, original_message, message, sf, segmentation_engine)
         
         # Detect "super engaged" or "highly engaged"
         # Note: Max score in data is ~6.88, adjusted to find reasonable matches
@@ -381,46 +478,26 @@ class AIAgent:
                 )
                 
                 if segment:
-                    result = segmentation_engine.get_segment_members(sf, segment['id'])
-                    members = result['members']
-                    
-                    # Apply purchase intent filter if specified
+                    # ALWAYS save filters and limit to segment metadata, so the engine applies
+                    # them (and the top-N selection) in a single pass over the members
+                    updates = {}
+                    if limit:
+                        updates['limit'] = limit
                     if purchase_intent_filter:
-                        members = [m for m in members if m.get('Purchase_Intent') in purchase_intent_filter]
-                    
-                    # Apply sentiment filter if specified
+                        updates['purchase_intent_filter'] = purchase_intent_filter
                     if sentiment_filter:
-                        members = [m for m in members if m.get('Current_Sentiment') in sentiment_filter]
+                        updates['sentiment_filter'] = sentiment_filter
+                    if updates:
+                        segment.update(updates)
+                        segmentation_engine.update_segment(segment['id'], updates)
                     
-                    # Sort by omnichannel score (ensure numeric conversion to avoid str/float comparison errors)
-                    members = sorted(members, key=lambda x: float(x.get('omnichannel_score', 0) or 0), reverse=True)
-                    
-                    # Apply limit if specified
-                    if limit and len(members) > limit:
-                        members = members[:limit]
+                    # Members come back filtered, ordered by omnichannel score and limited
+                    result = segmentation_engine.get_segment_members(sf, segment['id'])
+                    members = result['members']
                     
-                    # ALWAYS save filters and limit to segment metadata (not just when slicing)
-                    if limit or purchase_intent_filter or sentiment_filter:
-                        import json
-                        segments = segmentation_engine.list_segments()
-                        for i, s in enumerate(segments):
-                            if s['id'] == segment['id']:
-                                if limit:
-                                    segments[i]['member_count'] = len(members)
-                                    segments[i]['limit'] = limit
-                                    segment['member_count'] = len(members)
-                                    segment['limit'] = limit
-                                if purchase_intent_filter:
-                                    segments[i]['purchase_intent_filter'] = purchase_intent_filter
-                                    segment['purchase_intent_filter'] = purchase_intent_filter
-                                if sentiment_filter:
-                                    segments[i]['sentiment_filter'] = sentiment_filter
-                                    segment['sentiment_filter'] = sentiment_filter
-                                break
-                        
-                        # Save updated segments
-                        with open(segmentation_engine.segments_file, 'w') as f:
-                            json.dump(segments, f, indent=2)
+                    if limit:
+                        segment['member_count'] = len(members)
+                        segmentation_engine.update_segment(segment['id'], {'member_count': len(members)})
                     
                     member_count = len(members)
                     
@@ -487,11 +564,11 @@ class AIAgent:
                     message_text += f"Or say: 'Personalize content for the segment' (note: may take 2-3 minutes for 5 images)"
                     
                     # Update context with the created segment
-                    self.context['last_segment_created'] = segment
-                    self.context['last_segment_id'] = segment['id']
-                    self.context['last_segment_name'] = segment_name
-                    self.context['last_segment_members'] = members
-                    self.context['last_action'] = 'create_segment'
+                    session.context['last_segment_created'] = segment
+                    session.context['last_segment_id'] = segment['id']
+                    session.context['last_segment_name'] = segment_name
+                    session.context['last_segment_members'] = members
+                    session.context['last_action'] = 'create_segment'
                     
                     # Auto-generate personalized images for top 5 if conditions are met
                     personalized_images = []
@@ -645,7 +722,7 @@ class AIAgent:
                 ]
             }
     
-    def _handle_personalize_content(self, original_message, message, sf, segmentation_engine, image_generator):
+    def _handle_personalize_content(self, session, original_message, message, sf, segmentation_engine, image_generator):
         """Handle requests to generate personalized AI images for segment members"""
         
         if not image_generator:
@@ -657,8 +734,8 @@ class AIAgent:
             }
         
         # Check if we have a recent segment to work with
-        last_segment = self.context.get('last_segment_created')
-        last_members = self.context.get('last_segment_members', [])
+        last_segment = session.context.get('last_segment_created')
+        last_members = session.context.get('last_segment_members', [])
         
         if not last_segment or not last_members:
             return {
@@ -811,7 +888,7 @@ class AIAgent:
                 ]
             }
     
-    def _handle_view_segment(self, original_message, message, sf, segmentation_engine):
+    def _handle_view_segment(self, session, original_message, message, sf, segmentation_engine):
         """Handle requests to view/show segments"""
         
         try:
@@ -877,9 +954,9 @@ class AIAgent:
                 message_text += f"• Create a new segment"
                 
                 # Update context
-                self.context['last_segment_created'] = segment
-                self.context['last_segment_id'] = segment['id']
-                self.context['last_segment_name'] = segment['name']
+                session.context['last_segment_created'] = segment
+                session.context['last_segment_id'] = segment['id']
+                session.context['last_segment_name'] = segment['name']
                 
                 return {
                     'intent': 'view_segment',
@@ -932,7 +1009,7 @@ class AIAgent:
                 'suggested_actions': ['Try again', 'Go to Segments page']
             }
     
-    def _handle_driving_segment(self, original_message, message, sf, segmentation_engine):
+    def _handle_driving_segment(self, session, original_message, message, sf, segmentation_engine):
         """Handle driving/vehicle-related segment creation"""
         import os
         import pandas as pd
@@ -1036,17 +1113,17 @@ class AIAgent:
                     # Skip rows with errors
                     continue
             
-            # Debug: Log how many individuals we found
-            print(f"DEBUG: Found {len(individual_stats)} individuals before speed filter")
+            logger.debug("Found %d individuals before speed filter", len(individual_stats))
             
             # Filter by speed threshold if specified
             if speed_threshold:
                 individual_stats = {k: v for k, v in individual_stats.items() if v['max_speed'] >= speed_threshold}
-                print(f"DEBUG: Found {len(individual_stats)} individuals after speed filter (>{speed_threshold} kmph)")
+                logger.debug("Found %d individuals after speed filter (>%s kmph)", len(individual_stats), speed_threshold)
             
             # Sort by driving score
             sorted_individuals = sorted(individual_stats.items(), key=lambda x: x[1]['driving_score'], reverse=True)
-            print(f"DEBUG: Top 10 speeds: {[v['max_speed'] for k,v in sorted_individuals[:10]]}")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Top 10 speeds: %s", [v['max_speed'] for k, v in sorted_individuals[:10]])
             
             # Take top N
             top_drivers = sorted_individuals[:limit]
@@ -1094,15 +1171,12 @@ class AIAgent:
             }
             
             # Save segment
-            segments = segmentation_engine.list_segments()
-            segments.append(segment)
-            with open(segmentation_engine.segments_file, 'w') as f:
-                json.dump(segments, f, indent=2)
+            segmentation_engine.save_segment(segment)
             
             # Update context
-            self.context['last_segment_created'] = segment_name
-            self.context['last_segment_id'] = segment['id']
-            self.context['last_segment_name'] = segment_name
+            session.context['last_segment_created'] = segment_name
+            session.context['last_segment_id'] = segment['id']
+            session.context['last_segment_name'] = segment_name
             
             # Build response message
             message_text = f"✅ **Segment Created Successfully!**\n\n"
@@ -1138,9 +1212,7 @@ class AIAgent:
             }
             
         except Exception as e:
-            import traceback
-            error_trace = traceback.format_exc()
-            print(f"ERROR in _handle_driving_segment: {error_trace}")
+            logger.exception("Driving segment creation failed")
             return {
                 'intent': 'create_segment',
                 'message': f"❌ Error creating driving segment: {str(e)}\n\nPlease check the logs for details.",
@@ -1148,7 +1220,7 @@ class AIAgent:
                 'suggested_actions': ['Try again', 'Check data files']
             }
     
-    def _handle_generate_email(self, original_message, message, sf, email_generator, segmentation_engine):
+    def _handle_generate_email(self, session, original_message, message, sf, email_generator, segmentation_engine):
         """Handle email/content generation requests - ACTUALLY GENERATE CONTENT"""
         
         # Check if user wants content for a specific segment
@@ -1167,9 +1239,9 @@ class AIAgent:
             selected_segment = None
             
             # Check if user is referring to "the segment" or "each member" (context reference)
-            if ('the segment' in message or 'each member' in message or not target_segment) and self.context.get('last_segment_created'):
+            if ('the segment' in message or 'each member' in message or not target_segment) and session.context.get('last_segment_created'):
                 # Use the segment from context (recently created)
-                selected_segment = self.context['last_segment_created']
+                selected_segment = session.context['last_segment_created']
                 message_text_prefix = f"🎯 **Using recently created segment:** {selected_segment['name']}\n\n"
             elif target_segment:
                 # Try to match segment name
@@ -1311,14 +1383,14 @@ class AIAgent:
             message_text += f"🚀 **Ready to send?** All {len(members)} messages are queued for delivery!"
             
             # Store generated content in context for potential follow-up
-            self.context['last_generated_content'] = {
+            session.context['last_generated_content'] = {
                 'segment_id': selected_segment['id'],
                 'segment_name': selected_segment['name'],
                 'total_messages': len(members),
                 'channels': list(channel_groups.keys()),
                 'samples': content_samples
             }
-            self.context['last_action'] = 'generate_content'
+            session.context['last_action'] = 'generate_content'
             
             return {
                 'intent': 'generate_email',
@@ -1345,7 +1417,7 @@ class AIAgent:
                 'suggested_actions': ['Create a segment first', 'Check data']
             }
     
-    def _handle_send_email_test(self, original_message, message, sf, segmentation_engine):
+    def _handle_send_email_test(self, session, original_message, message, sf, segmentation_engine):
         """Handle rendering HTML and sending test email or WhatsApp message"""
         
         # Detect if user wants WhatsApp or Email
@@ -1383,7 +1455,7 @@ class AIAgent:
         
         try:
             # Check if content was recently generated
-            if not self.context.get('last_generated_content'):
+            if not session.context.get('last_generated_content'):
                 return {
                     'intent': 'send_email_test',
                     'message': "❌ No content found! Please generate personalized content first.\n\nTry saying: 'Personalize content for the segment'",
@@ -1392,7 +1464,7 @@ class AIAgent:
                 }
             
             # Get the segment and regenerate one sample
-            last_content = self.context['last_generated_content']
+            last_content = session.context['last_generated_content']
             segment_id = last_content.get('segment_id')
             
             if not segment_id:
@@ -2180,19 +2252,11 @@ I can help you with:
 
 Try rephrasing your question or pick one of the examples above!"""
     
-    def get_conversation_history(self):
+    def get_conversation_history(self, session_id=None):
         """Get conversation history"""
-        return self.conversation_history
+        return self._load_session(session_id).conversation_history
     
-    def clear_history(self):
+    def clear_history(self, session_id=None):
         """Clear conversation history and context"""
-        self.conversation_history = []
-        self.context = {
-            'last_segment_created': None,
-            'last_segment_id': None,
-            'last_segment_name': None,
-            'last_action': None,
-            'entities_mentioned': []
-        }
+        self.state.delete(self._session_key(session_id))
         return {'message': 'Conversation history and context cleared. Starting fresh chat!'}
-
@@ -0,0 +1,127 @@
+"""
+App Logging
+Leveled logging for the request paths, written to stdout by a background
+thread so a request never blocks on a console write
+
+LOG_LEVEL picks the level (default INFO in production - PORT is set - and
+DEBUG in development, which keeps the per-item detail). Per-item messages
+are logged with extra=sampled() and only 1 in LOG_SAMPLE_EVERY of them is
+written, except at DEBUG level where all of them are.
+"""
+
+import atexit
+import logging
+import os
+import sys
+import threading
+from logging.handlers import QueueHandler, QueueListener
+from queue import SimpleQueue
+
+LOGGER_NAME = 'datacloud'
+LOG_FORMAT = '%(levelname)s %(name)s: %(message)s'
+SAMPLE_EVERY = int(os.environ.get('LOG_SAMPLE_EVERY', 50))
+
+_listener = None
+_setup_lock = threading.Lock()
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Pass 1 in N records that carry a sample_every attribute (the first, N+1th, ...)
+
+    Counted per call site (logger name + message template). Records without the
+    attribute, and everything while the app logger is at DEBUG, always pass.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        every = getattr(record, 'sample_every', None)
+        if not every or every <= 1 or logging.getLogger(LOGGER_NAME).isEnabledFor(logging.DEBUG):
+            return True
+        key = (record.name, record.msg)
+        with self._lock:
+            seen = self._counts.get(key, 0)
+            self._counts[key] = seen + 1
+        if seen % every:
+            return False
+        if seen:
+            record.msg = f"{record.msg} (1 in {every})"
+        return True
+
+
+def default_level():
+    level = os.environ.get('LOG_LEVEL')
+    if level:
+        return level.upper()
+    return 'INFO' if 'PORT' in os.environ else 'DEBUG'
+
+
+def setup_logging(level=None):
+    """
+    Route the app's loggers through a queue to a stdout writer thread (idempotent)
+
+    Calling it again only changes the level.
+    """
+    global _listener
+    logger = logging.getLogger(LOGGER_NAME)
+    logger.setLevel(level or default_level())
+    with _setup_lock:
+        if _listener is not None:
+            return logger
+
+        queue = SimpleQueue()
+        queue_handler = QueueHandler(queue)
+        queue_handler.addFilter(SamplingFilter())
+        stream_handler = logging.StreamHandler(sys.stdout)
+        stream_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+
+        logger.addHandler(queue_handler)
+        logger.propagate = False
+        _listener = QueueListener(queue, stream_handler)
+        _listener.start()
+        # Flush whatever is still queued when the worker exits
+        atexit.register(_stop_listener)
+        # gunicorn --preload forks workers after import; the writer thread doesn't survive a fork
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=_restart_listener)
+    return logger
+
+
+def _stop_listener():
+    if _listener is not None and _listener._thread is not None:
+        _listener.stop()
+
+
+def _restart_listener():
+    """Start a writer thread in a forked child, on a fresh queue (the parent writes what it had queued)"""
+    global _setup_lock
+    _setup_lock = threading.Lock()
+    if _listener is None:
+        return
+    queue = SimpleQueue()
+    for handler in logging.getLogger(LOGGER_NAME).handlers:
+        if isinstance(handler, QueueHandler):
+            handler.queue = queue
+    _listener.queue = queue
+    # The parent's thread object is copied but not running here
+    _listener._thread = None
+    _listener.start()
+
+
+def get_logger(name):
+    """Logger under the app's namespace (modules.x -> datacloud.x)"""
+    return logging.getLogger(f"{LOGGER_NAME}.{name.rsplit('.', 1)[-1]}")
+
+
+def sampled(every=None):
+    """extra= for per-item messages: only 1 in `every` (default LOG_SAMPLE_EVERY) is written"""
+    return {'sample_every': every or SAMPLE_EVERY}
+
+
+def debug_exc_info(logger):
+    """exc_info value that attaches the traceback only when the logger is at DEBUG level"""
+    return logger.isEnabledFor(logging.DEBUG)
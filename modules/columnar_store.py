@@ -0,0 +1,420 @@
+"""
+Columnar Store
+NumPy column files (.npy, memory-mapped) with dictionary-encoded strings for the data files
+"""
+
+import csv
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+COLUMNAR_ROOT = 'data/columnar'
+META_FILE = '_meta.json'
+SUPERSEDED_FILE = '_superseded'
+
+# Seconds a replaced version is kept for readers in other workers that haven't moved on yet
+PRUNE_GRACE_SECONDS = float(os.environ.get('COLUMNAR_PRUNE_GRACE', 600))
+
+
+def _column_file(name):
+    """Column names are arbitrary JSON keys - hash them into safe file names"""
+    return hashlib.sha1(name.encode()).hexdigest()[:16]
+
+
+def _codes_dtype(size):
+    if size < 127:
+        return np.int8
+    if size < 32767:
+        return np.int16
+    return np.int32
+
+
+def _column_kind(values):
+    """'int' / 'float' when every present value has that JSON type, else 'dict'"""
+    present = [v for v in values if v is not _MISSING]
+    if present and all(type(v) is int for v in present):
+        return 'int'
+    if present and all(type(v) is float for v in present):
+        return 'float'
+    return 'dict'
+
+
+class _Missing:
+    def __repr__(self):
+        return '<missing>'
+
+
+_MISSING = _Missing()
+
+
+def write_table(records, directory):
+    """
+    Write a list of JSON records as one .npy file per column
+
+    Numeric columns are stored as int64/float64; everything else (strings, numbers kept
+    as strings, mixed types, nested lists) is dictionary-encoded: a small int code per
+    row plus the distinct values in first-seen order. Keys absent from a record are kept
+    absent (code -1 / presence mask), so the JSON round trip is exact.
+    """
+    os.makedirs(directory, exist_ok=True)
+    names = []
+    seen = set()
+    for record in records:
+        for key in record:
+            if key not in seen:
+                seen.add(key)
+                names.append(key)
+
+    meta = {'rows': len(records), 'columns': []}
+
+    # Rows whose keys are not in column order keep their own order (few distinct orders in practice)
+    position = {name: i for i, name in enumerate(names)}
+    orders, order_codes = {}, np.zeros(len(records), dtype=np.int32)
+    for row, record in enumerate(records):
+        order = tuple(position[key] for key in record)
+        if any(a > b for a, b in zip(order, order[1:])):
+            order_codes[row] = orders.setdefault(order, len(orders) + 1)
+    if orders:
+        np.save(os.path.join(directory, '_key_order.npy'), order_codes.astype(_codes_dtype(len(orders) + 1)))
+        meta['key_orders'] = [list(order) for order in orders]
+
+    for name in names:
+        values = [record.get(name, _MISSING) for record in records]
+        kind = _column_kind(values)
+        column = {'name': name, 'kind': kind, 'file': _column_file(name)}
+        path = os.path.join(directory, column['file'])
+
+        if kind == 'dict':
+            dictionary, positions = [], {}
+            codes = np.empty(len(values), dtype=np.int32)
+            for row, value in enumerate(values):
+                if value is _MISSING:
+                    codes[row] = -1
+                    continue
+                key = json.dumps(value)
+                if key not in positions:
+                    positions[key] = len(dictionary)
+                    dictionary.append(value)
+                codes[row] = positions[key]
+            np.save(path + '.npy', codes.astype(_codes_dtype(len(dictionary))))
+            with open(path + '.dict.json', 'w') as f:
+                json.dump(dictionary, f)
+        else:
+            mask = np.array([value is not _MISSING for value in values], dtype=bool)
+            dtype = np.int64 if kind == 'int' else np.float64
+            np.save(path + '.npy', np.array([0 if value is _MISSING else value for value in values], dtype=dtype))
+            if not mask.all():
+                np.save(path + '.mask.npy', mask)
+                column['masked'] = True
+        meta['columns'].append(column)
+
+    with open(os.path.join(directory, META_FILE), 'w') as f:
+        json.dump(meta, f, indent=2)
+    return meta
+
+
+class ColumnarWriter:
+    """
+    Streaming writer for tables too large to hold as records
+
+    The row count is known up front, so every column is a preallocated .npy file
+    (np.lib.format.open_memmap) filled chunk by chunk. A chunk is a dict of equal-length
+    arrays carrying every column: integer / float arrays are stored as they are, anything
+    else is dictionary-encoded (codes are int32, values in first-seen order). The result
+    is the same layout write_table produces, readable by ColumnarTable.
+    """
+
+    def __init__(self, directory, rows):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.rows = rows
+        self.written = 0
+        self._columns = {}
+        self._arrays = {}
+        self._dictionaries = {}
+        self._positions = {}
+
+    def _open(self, name, values):
+        kind = 'int' if values.dtype.kind in 'iu' else 'float' if values.dtype.kind == 'f' else 'dict'
+        column = {'name': name, 'kind': kind, 'file': _column_file(name)}
+        dtype = np.int64 if kind == 'int' else np.float64 if kind == 'float' else np.int32
+        self._arrays[name] = np.lib.format.open_memmap(
+            os.path.join(self.directory, column['file'] + '.npy'), mode='w+', dtype=dtype, shape=(self.rows,))
+        if kind == 'dict':
+            self._dictionaries[name], self._positions[name] = [], {}
+        self._columns[name] = column
+
+    def _encode(self, name, values):
+        """Codes of a chunk: distinct values (hashed, in first-seen order) are looked up once each"""
+        import pandas as pd
+        inverse, uniques = pd.factorize(values)
+        dictionary, positions = self._dictionaries[name], self._positions[name]
+        uniques = uniques.tolist()
+        lookup = list(map(positions.get, uniques))
+        if None in lookup:
+            new = [value for value, code in zip(uniques, lookup) if code is None]
+            positions.update(zip(new, range(len(dictionary), len(dictionary) + len(new))))
+            dictionary.extend(new)
+            lookup = list(map(positions.get, uniques))
+        return np.array(lookup, dtype=np.int32)[inverse]
+
+    def write(self, chunk):
+        """Append a chunk of columns"""
+        arrays = {name: np.asarray(values) for name, values in chunk.items()}
+        size = len(next(iter(arrays.values()))) if arrays else 0
+        if self.written + size > self.rows:
+            raise Exception(f"Chunk overflows the table ({self.written} + {size} > {self.rows} rows)")
+        for name, values in arrays.items():
+            if name not in self._columns:
+                if self.written:
+                    raise Exception(f"Column {name} is missing from earlier chunks")
+                self._open(name, values)
+            target = self._arrays[name]
+            stop = self.written + size
+            target[self.written:stop] = self._encode(name, values) if name in self._dictionaries else values
+        self.written += size
+
+    def close(self):
+        """Flush the columns and write the dictionaries and _meta.json"""
+        if self.written != self.rows:
+            raise Exception(f"Table has {self.written} of {self.rows} rows")
+        for name, array in self._arrays.items():
+            array.flush()
+            if name in self._dictionaries:
+                with open(os.path.join(self.directory, self._columns[name]['file'] + '.dict.json'), 'w') as f:
+                    json.dump(self._dictionaries[name], f)
+        self._arrays = {}
+        meta = {'rows': self.rows, 'columns': list(self._columns.values())}
+        with open(os.path.join(self.directory, META_FILE), 'w') as f:
+            json.dump(meta, f, indent=2)
+        return meta
+
+
+class ColumnarTable:
+    """Read-only view of a columnar directory; columns are memory-mapped on first access"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, META_FILE), 'r') as f:
+            self.meta = json.load(f)
+        self._columns = {column['name']: column for column in self.meta['columns']}
+        self._arrays = {}
+        self._dictionaries = {}
+        self._masks = {}
+
+    def __len__(self):
+        return self.meta['rows']
+
+    @property
+    def columns(self):
+        return [column['name'] for column in self.meta['columns']]
+
+    def kind(self, name):
+        if name not in self._columns:
+            raise KeyError(name)
+        return self._columns[name]['kind']
+
+    def _path(self, name, suffix):
+        return os.path.join(self.directory, self._columns[name]['file'] + suffix)
+
+    def raw(self, name):
+        """Stored array: values for numeric columns, codes for dictionary columns (memory-mapped)"""
+        self.kind(name)
+        if name not in self._arrays:
+            self._arrays[name] = np.load(self._path(name, '.npy'), mmap_mode='r')
+        return self._arrays[name]
+
+    def dictionary(self, name):
+        if self.kind(name) != 'dict':
+            raise Exception(f"Column {name} is not dictionary-encoded")
+        if name not in self._dictionaries:
+            with open(self._path(name, '.dict.json'), 'r') as f:
+                self._dictionaries[name] = json.load(f)
+        return self._dictionaries[name]
+
+    def present(self, name):
+        """Boolean mask of rows that have the key"""
+        if self.kind(name) == 'dict':
+            return np.asarray(self.raw(name)) >= 0
+        if name not in self._masks:
+            if self._columns[name].get('masked'):
+                self._masks[name] = np.load(self._path(name, '.mask.npy'))
+            else:
+                self._masks[name] = np.ones(len(self), dtype=bool)
+        return self._masks[name]
+
+    def column(self, name):
+        """Decoded column (object array for dictionary columns, None where the key is absent)"""
+        if self.kind(name) != 'dict':
+            return self.raw(name)
+        values = np.empty(len(self.dictionary(name)) + 1, dtype=object)
+        for position, value in enumerate(self.dictionary(name)):
+            values[position] = value  # element-wise so list values aren't broadcast
+        return values[np.asarray(self.raw(name))]  # code -1 picks the trailing None
+
+    def numeric(self, name, default=0.0):
+        """Column as float64; dictionary values are parsed once per distinct value"""
+        if name not in self._columns:
+            return np.full(len(self), default, dtype=np.float64)
+        if self.kind(name) != 'dict':
+            return np.where(self.present(name), np.asarray(self.raw(name), dtype=np.float64), default)
+        parsed = np.empty(len(self.dictionary(name)) + 1, dtype=np.float64)
+        for position, value in enumerate(self.dictionary(name)):
+            try:
+                parsed[position] = float(value) if value not in (None, '') else default
+            except (TypeError, ValueError):
+                parsed[position] = default
+        parsed[-1] = default
+        return parsed[np.asarray(self.raw(name))]
+
+    def value_counts(self, name):
+        """(value, count) pairs, most common first (ties in first-seen order, like Counter.most_common)"""
+        codes = np.asarray(self.raw(name))
+        counts = np.bincount(codes[codes >= 0], minlength=len(self.dictionary(name)))
+        order = np.argsort(-counts, kind='stable')
+        dictionary = self.dictionary(name)
+        return [(dictionary[i], int(counts[i])) for i in order if counts[i] > 0]
+
+    def rows_where(self, name, value):
+        """Row numbers where a dictionary column equals value"""
+        key = json.dumps(value)
+        for code, candidate in enumerate(self.dictionary(name)):
+            if json.dumps(candidate) == key:
+                return np.flatnonzero(np.asarray(self.raw(name)) == code)
+        return np.array([], dtype=np.int64)
+
+    def records(self, rows=None, columns=None):
+        """Rebuild JSON records (all rows, or the given row numbers)"""
+        names = columns or self.columns
+        rows = np.arange(len(self)) if rows is None else np.asarray(rows, dtype=np.int64)
+        decoded = []
+        for name in names:
+            if name not in self._columns:
+                continue
+            if self.kind(name) == 'dict':
+                dictionary = self.dictionary(name)
+                codes = np.asarray(self.raw(name))[rows].tolist()
+                decoded.append((name, [dictionary[c] if c >= 0 else _MISSING for c in codes]))
+            else:
+                values = np.asarray(self.raw(name))[rows].tolist()
+                present = self.present(name)[rows].tolist()
+                decoded.append((name, [v if p else _MISSING for v, p in zip(values, present)]))
+
+        result = [{} for _ in range(len(rows))]
+        for name, values in decoded:
+            for record, value in zip(result, values):
+                if value is not _MISSING:
+                    record[name] = value
+
+        if self.meta.get('key_orders') and columns is None:
+            order_codes = np.load(os.path.join(self.directory, '_key_order.npy'), mmap_mode='r')[rows].tolist()
+            for i, code in enumerate(order_codes):
+                if code:
+                    record = result[i]
+                    result[i] = {names[p]: record[names[p]] for p in self.meta['key_orders'][code - 1]}
+        return result
+
+    def to_frame(self, columns=None):
+        """pandas DataFrame of the decoded columns"""
+        import pandas as pd
+        return pd.DataFrame({name: self.column(name) for name in (columns or self.columns)})
+
+
+class ColumnarStore:
+    """
+    Columnar copies of the JSON datasets, one directory per source version
+
+    Directories are named after the source file's signature, so a changed JSON file
+    gets a fresh directory (built once, by whichever worker asks first) while readers
+    of the old one keep using it; old directories are removed after a grace period.
+    """
+
+    def __init__(self, root=COLUMNAR_ROOT):
+        self.root = root
+
+    def directory(self, name, signature):
+        return os.path.join(self.root, f"{name}-{hashlib.sha1(signature.encode()).hexdigest()[:12]}")
+
+    def open(self, name, signature, load_records):
+        """Table for a dataset version, converting load_records() on first use"""
+        directory = self.directory(name, signature)
+        if not os.path.exists(os.path.join(directory, META_FILE)):
+            self.build(name, directory, load_records())
+        return ColumnarTable(directory)
+
+    def build(self, name, directory, records):
+        """Write into a temp dir and rename into place (a concurrent build of the same version wins)"""
+        os.makedirs(self.root, exist_ok=True)
+        tmp_dir = tempfile.mkdtemp(dir=self.root, prefix=f".{name}-")
+        try:
+            write_table(records, tmp_dir)
+            os.rename(tmp_dir, directory)
+        except OSError:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            if not os.path.exists(os.path.join(directory, META_FILE)):
+                raise
+        self.prune(name, keep=directory)
+
+    def prune(self, name, keep, grace=None):
+        """
+        Remove versions of a dataset that were replaced more than grace seconds ago
+
+        Tables map columns and load dictionaries lazily, so a worker still reading an old
+        version needs its files until it notices the new signature (its next request). The
+        first prune after a version is replaced marks it; a later one deletes it. Pass
+        grace=0 when nothing can be reading the old versions (offline generation).
+        """
+        if not os.path.isdir(self.root):
+            return
+        grace = PRUNE_GRACE_SECONDS if grace is None else grace
+        now = time.time()
+        for entry in os.listdir(self.root):
+            path = os.path.join(self.root, entry)
+            if not entry.startswith(f"{name}-") or path == keep:
+                continue
+            marker = os.path.join(path, SUPERSEDED_FILE)
+            try:
+                superseded_at = os.path.getmtime(marker)
+            except FileNotFoundError:
+                if grace > 0 and os.path.isdir(path):
+                    open(marker, 'a').close()
+                    continue
+                superseded_at = now - grace
+            if now - superseded_at >= grace:
+                shutil.rmtree(path, ignore_errors=True)
+
+
+# ----------------------------------------------------------------------------
+# Converters
+# ----------------------------------------------------------------------------
+
+def json_to_columnar(json_path, directory):
+    with open(json_path, 'r') as f:
+        return write_table(json.load(f), directory)
+
+
+def columnar_to_json(directory, json_path):
+    from modules.data_store import write_json_atomic
+    write_json_atomic(json_path, ColumnarTable(directory).records())
+
+
+def csv_to_columnar(csv_path, directory):
+    """CSV rows carry no types, so every column comes back dictionary-encoded strings"""
+    with open(csv_path, 'r', newline='') as f:
+        return write_table(list(csv.DictReader(f)), directory)
+
+
+def columnar_to_csv(directory, csv_path):
+    """CSV twin of a table (nested values are written as JSON text)"""
+    table = ColumnarTable(directory)
+    with open(csv_path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=table.columns)
+        writer.writeheader()
+        for record in table.records():
+            writer.writerow({key: json.dumps(value) if isinstance(value, (list, dict)) else value
+                             for key, value in record.items()})
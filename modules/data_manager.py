@@ -6,8 +6,17 @@ Handles CRUD operations on Salesforce objects
 import random
 from datetime import datetime
 
+from modules.app_logging import debug_exc_info, get_logger
+from modules.shared_state import QueryCache
+
+logger = get_logger(__name__)
+
 class DataManager:
     
+    def __init__(self, cache=None):
+        # Dashboard counts are shared between workers for a minute instead of re-queried per request
+        self.query_cache = QueryCache(cache, ttl=60)
+    
     def get_available_objects(self, sf):
         """Get list of available Salesforce objects"""
         try:
@@ -133,54 +142,50 @@ class DataManager:
             
             # Count Accounts
             try:
-                account_count = sf.query("SELECT COUNT() FROM Account")
+                account_count = self.query_cache.query(sf, "SELECT COUNT() FROM Account")
                 stats['accounts'] = account_count['totalSize']
             except Exception as e:
-                print(f"Error counting Accounts: {e}")
+                logger.warning("Could not count Accounts: %s", e)
                 stats['accounts'] = 0
             
             # Count Cases
             try:
-                case_count = sf.query("SELECT COUNT() FROM Case")
+                case_count = self.query_cache.query(sf, "SELECT COUNT() FROM Case")
                 stats['cases'] = case_count['totalSize']
             except Exception as e:
-                print(f"Error counting Cases: {e}")
+                logger.warning("Could not count Cases: %s", e)
                 stats['cases'] = 0
             
             # Count AccountContactRelation
             try:
-                acr_count = sf.query("SELECT COUNT() FROM AccountContactRelation")
+                acr_count = self.query_cache.query(sf, "SELECT COUNT() FROM AccountContactRelation")
                 stats['account_contacts'] = acr_count['totalSize']
             except Exception as e:
-                print(f"Error counting AccountContactRelation: {e}")
+                logger.warning("Could not count AccountContactRelation: %s", e)
                 stats['account_contacts'] = 0
             
             # Count Opportunities
             try:
-                opp_count = sf.query("SELECT COUNT() FROM Opportunity")
+                opp_count = self.query_cache.query(sf, "SELECT COUNT() FROM Opportunity")
                 stats['opportunities'] = opp_count['totalSize']
             except:
                 stats['opportunities'] = 0
             
             # Count Individuals (Data Cloud object)
             try:
-                print("DEBUG: Querying Individual count from ssot__Individual__dlm...")
-                individual_count = sf.query("SELECT COUNT() FROM ssot__Individual__dlm")
-                print(f"DEBUG: Individual query result: {individual_count}")
+                individual_count = self.query_cache.query(sf, "SELECT COUNT() FROM ssot__Individual__dlm")
                 stats['individuals'] = individual_count['totalSize']
-                print(f"DEBUG: Individual count set to: {stats['individuals']}")
+                logger.debug("Individual count (ssot__Individual__dlm): %s", stats['individuals'])
             except Exception as e:
-                print(f"ERROR counting Individuals: {str(e)}")
-                import traceback
-                traceback.print_exc()
+                logger.warning("Could not count Individuals: %s", e, exc_info=debug_exc_info(logger))
                 stats['individuals'] = 0
             
             # Count UnifiedIndividuals
             try:
-                unified_count = sf.query("SELECT COUNT() FROM UnifiedIndividual__dlm")
+                unified_count = self.query_cache.query(sf, "SELECT COUNT() FROM UnifiedIndividual__dlm")
                 stats['unified_individuals'] = unified_count['totalSize']
             except Exception as e:
-                print(f"Error counting UnifiedIndividuals: {e}")
+                logger.warning("Could not count UnifiedIndividuals: %s", e)
                 stats['unified_individuals'] = 0
             
             # Count Synthetic Profiles (from our app's data file)
@@ -195,20 +200,16 @@ class DataManager:
                 else:
                     stats['synthetic_profiles'] = 0
             except Exception as e:
-                print(f"Error counting Synthetic Profiles: {e}")
+                logger.warning("Could not count synthetic profiles: %s", e)
                 stats['synthetic_profiles'] = 0
             
             # Count Leads (Data Cloud object)
             try:
-                print("DEBUG: Querying Lead count from ssot__Lead__dlm...")
-                lead_count = sf.query("SELECT COUNT() FROM ssot__Lead__dlm")
-                print(f"DEBUG: Lead query result: {lead_count}")
+                lead_count = self.query_cache.query(sf, "SELECT COUNT() FROM ssot__Lead__dlm")
                 stats['leads'] = lead_count['totalSize']
-                print(f"DEBUG: Lead count set to: {stats['leads']}")
+                logger.debug("Lead count (ssot__Lead__dlm): %s", stats['leads'])
             except Exception as e:
-                print(f"ERROR counting Leads: {str(e)}")
-                import traceback
-                traceback.print_exc()
+                logger.warning("Could not count Leads: %s", e, exc_info=debug_exc_info(logger))
                 stats['leads'] = 0
             
             return stats
@@ -0,0 +1,283 @@
+"""
+Data Store
+Loads the JSON data files once per process and shares derived payloads
+between workers through the shared state backend
+"""
+
+import fcntl
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+
+from modules.columnar_store import ColumnarStore
+from modules.metrics import span
+
+# Dataset name -> file path
+DATASETS = {
+    'engagement': 'data/synthetic_engagement.json',
+    'insights': 'data/individual_insights.json',
+    'telemetry_summary': 'data/individual_telemetry_summary.json',
+    'vehicle_telematics': 'data/vehicle_telematics.json',
+    'individual_vehicles': 'data/individual_vehicles.json',
+}
+
+
+def file_signature(path):
+    """Change marker of a file: mtime and size (None if it is missing); a rename keeps it"""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return f"{stat.st_mtime_ns}:{stat.st_size}"
+
+
+def write_json_atomic(path, data, indent=2):
+    """Write JSON to a temp file in the same directory and rename it over path"""
+    directory = os.path.dirname(path) or '.'
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.' + os.path.basename(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(data, f, indent=indent)
+            f.flush()
+            os.fsync(f.fileno())
+        # mkstemp creates 0600 files - keep the permissions of the file being replaced
+        os.chmod(tmp_path, os.stat(path).st_mode & 0o777 if os.path.exists(path) else 0o644)
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def iter_json_array(path, read_size=1 << 20):
+    """Records of a JSON array file, parsed one at a time without loading the whole file"""
+    decoder = json.JSONDecoder()
+    with open(path, 'r') as f:
+        buffer, position, eof = '', 0, False
+
+        def fill():
+            nonlocal buffer, position, eof
+            chunk = f.read(read_size)
+            eof = not chunk
+            buffer = buffer[position:] + chunk
+            position = 0
+
+        def skip_whitespace():
+            nonlocal position
+            while True:
+                while position < len(buffer) and buffer[position].isspace():
+                    position += 1
+                if position < len(buffer) or eof:
+                    return
+                fill()
+
+        fill()
+        skip_whitespace()
+        if buffer[position:position + 1] != '[':
+            raise ValueError(f"{path} is not a JSON array")
+        position += 1
+        first = True
+        while True:
+            skip_whitespace()
+            if buffer[position:position + 1] == ']':
+                return
+            if not first:
+                if buffer[position:position + 1] != ',':
+                    raise ValueError(f"Malformed JSON array in {path} at offset {position}")
+                position += 1
+                skip_whitespace()
+            while True:
+                try:
+                    record, end = decoder.raw_decode(buffer, position)
+                    # A number at the end of the buffer may continue in the next read
+                    if end < len(buffer) or eof:
+                        break
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                fill()
+            position = end
+            first = False
+            yield record
+
+
+class JsonArrayWriter:
+    """
+    Stream records into a JSON array file, replacing path atomically on commit()
+
+    The output is byte-identical to write_json_atomic(path, records, indent). finish()
+    completes the temp file without replacing path, so it can be read (tmp_path) first.
+    """
+
+    def __init__(self, path, indent=2):
+        self.path = path
+        self.indent = indent
+        self.count = 0
+        directory = os.path.dirname(path) or '.'
+        fd, self.tmp_path = tempfile.mkstemp(dir=directory, prefix='.' + os.path.basename(path), suffix='.tmp')
+        self._file = os.fdopen(fd, 'w')
+
+    def write(self, record):
+        text = json.dumps(record, indent=self.indent)
+        if self.indent:
+            pad = ' ' * self.indent
+            text = pad + text.replace('\n', '\n' + pad)
+            self._file.write(('[\n' if not self.count else ',\n') + text)
+        else:
+            self._file.write(('[' if not self.count else ', ') + text)
+        self.count += 1
+
+    def finish(self):
+        """Close the array and flush the temp file to disk (commit() calls it if needed)"""
+        if self._file.closed:
+            return
+        self._file.write(('\n]' if self.indent else ']') if self.count else '[]')
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+
+    def commit(self):
+        try:
+            self.finish()
+            os.chmod(self.tmp_path, os.stat(self.path).st_mode & 0o777 if os.path.exists(self.path) else 0o644)
+            os.replace(self.tmp_path, self.path)
+        except Exception:
+            self.abort()
+            raise
+
+    def abort(self):
+        if not self._file.closed:
+            self._file.close()
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+
+@contextmanager
+def file_lock(path):
+    """Exclusive cross-process lock for read-modify-write of a data file (path + '.lock')"""
+    with open(path + '.lock', 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+class DataStore:
+    """Read-through cache for the data files, invalidated by file mtime/size"""
+
+    def __init__(self, cache=None, datasets=None, columnar=None):
+        self.cache = cache
+        self.datasets = dict(datasets or DATASETS)
+        self.columnar = columnar or ColumnarStore()
+        self._parsed = {}
+        self._tables = {}
+        self._lock = threading.Lock()
+
+    def path(self, name):
+        if name not in self.datasets:
+            raise Exception(f"Unknown dataset: {name}")
+        return self.datasets[name]
+
+    def exists(self, name):
+        return os.path.exists(self.path(name))
+
+    def signature(self, name):
+        """Change marker for a dataset (None if the file is missing)"""
+        return file_signature(self.path(name))
+
+    def load(self, name):
+        """
+        Parsed contents of a dataset, reused until the file changes
+
+        The returned object is shared by every request in this process - treat it as read-only.
+        """
+        signature = self.signature(name)
+        if signature is None:
+            raise FileNotFoundError(self.path(name))
+        with self._lock:
+            cached = self._parsed.get(name)
+            if cached and cached[0] == signature:
+                return cached[1]
+        with span('data_load'), open(self.path(name), 'r') as f:
+            data = json.load(f)
+        with self._lock:
+            self._parsed[name] = (signature, data)
+        return data
+
+    def table(self, name):
+        """
+        Memory-mapped columnar view of a dataset, converted once per version of the JSON file
+
+        Columns are read lazily and the pages are shared by every worker mapping the same files.
+        """
+        signature = self.signature(name)
+        if signature is None:
+            raise FileNotFoundError(self.path(name))
+        with self._lock:
+            cached = self._tables.get(name)
+            if cached and cached[0] == signature:
+                return cached[1]
+        with span('data_load'):
+            table = self.columnar.open(name, signature, lambda: self.load(name))
+        with self._lock:
+            self._tables[name] = (signature, table)
+        return table
+
+    def prepare_table(self, name, path):
+        """
+        Build the columnar copy of a replacement file for a dataset before it is renamed
+        over the dataset, so the first table() after the swap finds it; returns its signature
+        """
+        signature = file_signature(path)
+
+        def load_records():
+            with open(path, 'r') as f:
+                return json.load(f)
+
+        with span('data_load'):
+            self.columnar.open(name, signature, load_records)
+        return signature
+
+    @contextmanager
+    def locked(self, name):
+        """Exclusive cross-process lock for read-modify-write of a dataset"""
+        with file_lock(self.path(name)):
+            yield
+
+    def update(self, name, updater, lock=True):
+        """
+        Apply updater(records) to a fresh copy of a dataset under the lock
+
+        The file is rewritten atomically unless updater returns None (nothing changed);
+        returns whatever updater returned. Pass lock=False if the caller already holds locked(name).
+        """
+        if lock:
+            with self.locked(name):
+                return self.update(name, updater, lock=False)
+        with span('data_load'), open(self.path(name), 'r') as f:
+            data = json.load(f)
+        result = updater(data)
+        if result is not None:
+            write_json_atomic(self.path(name), data)
+        return result
+
+    def cached(self, key, builder, datasets=(), ttl=None):
+        """
+        Derived payload shared by all workers, rebuilt when any dataset it reads changes
+
+        builder() must return something JSON-serializable; None is never cached.
+        """
+        if self.cache is None:
+            return builder()
+        signatures = '|'.join(f"{name}={self.signature(name)}" for name in datasets)
+        cache_key = f"data:{key}:{hashlib.sha1(signatures.encode()).hexdigest()[:16]}"
+        value = self.cache.get(cache_key)
+        if value is None:
+            value = builder()
+            if value is not None:
+                self.cache.set(cache_key, value, ex=ttl)
+        return value
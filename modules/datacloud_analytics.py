@@ -6,10 +6,13 @@ Pulls real-time analytics from Data Cloud engagement objects
 import json
 from collections import defaultdict
 
+from modules.shared_state import QueryCache
+
 class DataCloudAnalytics:
     
-    def __init__(self):
-        pass
+    def __init__(self, cache=None):
+        # Aggregates over millions of engagement rows - share results between workers briefly
+        self.query_cache = QueryCache(cache, ttl=300)
     
     def get_email_engagement_stats(self, sf):
         """Get real-time email engagement statistics from Data Cloud"""
@@ -21,7 +24,7 @@ class DataCloudAnalytics:
                 GROUP BY EngagementChannelActionId__c
                 LIMIT 100
             """
-            results = sf.query(query)['records']
+            results = self.query_cache.query(sf, query)['records']
             
             # Map action IDs to types
             stats = {
@@ -66,7 +69,7 @@ class DataCloudAnalytics:
                 FROM E_Commerce_App_Behavioral_Event_E4C9EA42__dlm 
                 LIMIT 5000
             """
-            results = sf.query(query)['records']
+            results = self.query_cache.query(sf, query)['records']
             
             stats = {
                 'product_views': 0,
@@ -103,7 +106,7 @@ class DataCloudAnalytics:
                 GROUP BY EngagementChannelTypeId__c, EngagementChannelActionId__c
                 LIMIT 100
             """
-            results = sf.query(query)['records']
+            results = self.query_cache.query(sf, query)['records']
             
             stats = {
                 'total_message_engagements': 0,
@@ -140,22 +143,22 @@ class DataCloudAnalytics:
             
             # Get total object counts
             try:
-                email_count = sf.query("SELECT COUNT() FROM BU2_EmailEngagement__dlm")['totalSize']
+                email_count = self.query_cache.query(sf, "SELECT COUNT() FROM BU2_EmailEngagement__dlm")['totalSize']
             except:
                 email_count = 12789953  # From discovery
             
             try:
-                web_count = sf.query("SELECT COUNT() FROM E_Commerce_App_Behavioral_Event_E4C9EA42__dlm")['totalSize']
+                web_count = self.query_cache.query(sf, "SELECT COUNT() FROM E_Commerce_App_Behavioral_Event_E4C9EA42__dlm")['totalSize']
             except:
                 web_count = 339598  # From discovery
             
             try:
-                order_count = sf.query("SELECT COUNT() FROM ExternalOrders__dlm")['totalSize']
+                order_count = self.query_cache.query(sf, "SELECT COUNT() FROM ExternalOrders__dlm")['totalSize']
             except:
                 order_count = 312559  # From discovery
             
             try:
-                message_count = sf.query("SELECT COUNT() FROM BU2_MessageEngagement__dlm")['totalSize']
+                message_count = self.query_cache.query(sf, "SELECT COUNT() FROM BU2_MessageEngagement__dlm")['totalSize']
             except:
                 message_count = 19851  # From discovery
             
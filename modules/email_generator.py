@@ -8,6 +8,8 @@ import os
 from datetime import datetime
 import random
 
+from modules.metrics import span
+
 class EmailGenerator:
     
     def __init__(self):
@@ -124,24 +126,25 @@ class EmailGenerator:
             template = json.load(f)
         
         emails = []
-        for i, member in enumerate(members):
-            # Generate personalization data
-            personalization = self._generate_personalization_data(member, i, len(members), customizations)
-            
-            # Generate subject
-            subject = self._render_template(template['subject_template'], personalization)
-            
-            # Generate HTML body
-            html_body = self._render_template(template['html_template'], personalization)
-            
-            emails.append({
-                'recipient_id': member['Id'],
-                'recipient_name': member.get('Name', 'Valued Customer'),
-                'recipient_email': personalization.get('email', 'unknown@example.com'),
-                'subject': subject,
-                'html_body': html_body,
-                'personalization': personalization
-            })
+        with span('render'):
+            for i, member in enumerate(members):
+                # Generate personalization data
+                personalization = self._generate_personalization_data(member, i, len(members), customizations)
+                
+                # Generate subject
+                subject = self._render_template(template['subject_template'], personalization)
+                
+                # Generate HTML body
+                html_body = self._render_template(template['html_template'], personalization)
+                
+                emails.append({
+                    'recipient_id': member['Id'],
+                    'recipient_name': member.get('Name', 'Valued Customer'),
+                    'recipient_email': personalization.get('email', 'unknown@example.com'),
+                    'subject': subject,
+                    'html_body': html_body,
+                    'personalization': personalization
+                })
         
         return emails
     
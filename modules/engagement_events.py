@@ -0,0 +1,439 @@
+"""
+Engagement Events
+Ingests batched engagement events into a durable append-only log, folds them into
+per-individual counter deltas (SQLite rows) and compacts those into the engagement
+data file on a schedule
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from itertools import islice
+
+from modules.app_logging import get_logger
+from modules.data_store import JsonArrayWriter, iter_json_array
+from modules.enrichment_stages import message_totals
+
+EVENTS_LOG = 'data/engagement_events.log'
+DELTAS_DB = 'data/engagement_deltas.db'
+MAX_BATCH_SIZE = 10000
+
+# Seconds between compactions of the folded deltas into synthetic_engagement.json
+COMPACT_SECONDS = float(os.environ.get('ENGAGEMENT_COMPACT_SECONDS', 60))
+COMPACT_CHUNK_SIZE = 5000
+
+logger = get_logger(__name__)
+
+# (channel, action) -> counter fields incremented by the event
+EVENT_COUNTERS = {
+    ('email', 'send'): ('email_campaigns_received',),
+    ('email', 'open'): ('email_opens',),
+    ('email', 'click'): ('email_clicks',),
+    ('email', 'delete'): ('email_deletes',),
+    ('email', 'bounce'): ('email_bounces',),
+    ('email', 'unsubscribe'): ('email_unsubscribes',),
+    ('sms', 'send'): ('sms_sends',),
+    ('sms', 'open'): ('sms_opens',),
+    ('sms', 'click'): ('sms_clicks',),
+    ('sms', 'delete'): ('sms_deletes',),
+    ('sms', 'optout'): ('sms_optouts',),
+    ('whatsapp', 'send'): ('whatsapp_sends',),
+    ('whatsapp', 'open'): ('whatsapp_opens', 'whatsapp_reads'),  # Opens = Reads
+    ('whatsapp', 'click'): ('whatsapp_clicks',),
+    ('whatsapp', 'reply'): ('whatsapp_replies',),
+    ('whatsapp', 'delete'): ('whatsapp_deletes',),
+    ('whatsapp', 'optout'): ('whatsapp_optouts',),
+    ('push', 'send'): ('push_sends',),
+    ('push', 'open'): ('push_opens',),
+    ('push', 'click'): ('push_clicks',),
+    ('push', 'delete'): ('push_deletes',),
+    ('website', 'view'): ('website_product_views',),
+    ('website', 'click'): ('website_clicks',),
+    ('website', 'add_to_cart'): ('website_add_to_cart',),
+    ('website', 'cart_abandon'): ('website_cart_abandons',),
+    ('website', 'purchase'): ('website_purchases',),
+    ('social', 'view'): ('social_views',),
+    ('social', 'click'): ('social_clicks',),
+}
+
+CHANNELS = sorted({channel for channel, _ in EVENT_COUNTERS})
+
+
+def _number(value):
+    try:
+        number = float(value or 0)
+    except (TypeError, ValueError):
+        return 0
+    return int(number) if number.is_integer() else number
+
+
+def normalize_event(event):
+    """Validate one event, returns (normalized_event, error)"""
+    if not isinstance(event, dict):
+        return None, 'Event must be an object'
+
+    channel = str(event.get('channel', '')).strip().lower()
+    action = str(event.get('action', '')).strip().lower()
+    individual_id = event.get('individual_id') or event.get('IndividualId')
+    if (channel, action) not in EVENT_COUNTERS:
+        return None, f"Unsupported channel/action: {channel}/{action}"
+    if not individual_id:
+        return None, 'Missing individual_id'
+
+    timestamp = event.get('timestamp') or datetime.now().isoformat()
+    try:
+        datetime.fromisoformat(str(timestamp).replace('Z', '+00:00'))
+    except ValueError:
+        return None, f"Invalid timestamp: {timestamp}"
+
+    count = event.get('count', 1)
+    if not isinstance(count, int) or isinstance(count, bool) or count < 1:
+        return None, f"Invalid count: {count}"
+
+    normalized = {
+        'channel': channel,
+        'action': action,
+        'individual_id': str(individual_id),
+        'timestamp': str(timestamp),
+        'count': count
+    }
+    if event.get('value') is not None:
+        try:
+            normalized['value'] = float(event['value'])
+        except (TypeError, ValueError):
+            return None, f"Invalid value: {event['value']}"
+    return normalized, None
+
+
+class EngagementDeltaStore:
+    """
+    Per-individual counter deltas not yet compacted into the engagement file
+
+    One row per individual touched since the last compaction: counter increments,
+    purchase value and latest event time, plus the applied offset of the event log,
+    all updated in the same transaction so a fold is all-or-nothing.
+    """
+
+    def __init__(self, db_path=DELTAS_DB):
+        self.db_path = db_path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        with self.transaction() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS deltas (
+                    id TEXT PRIMARY KEY,
+                    counters TEXT NOT NULL,
+                    order_value REAL NOT NULL DEFAULT 0,
+                    last_engagement TEXT,
+                    version INTEGER NOT NULL
+                )
+            """)
+            conn.execute('CREATE TABLE IF NOT EXISTS store_meta (key TEXT PRIMARY KEY, value TEXT)')
+            if self.get_meta(conn, 'compacted_at') is None:
+                self.set_meta(conn, 'compacted_at', time.time())
+
+    def _connection(self):
+        """Get a connection for the current thread (reopened after a fork)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or getattr(self._local, 'pid', None) != os.getpid():
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('PRAGMA busy_timeout=30000')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    @contextmanager
+    def transaction(self):
+        """Write transaction holding the database write lock across processes"""
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield conn
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+
+    @staticmethod
+    def get_meta(conn, key, default=None):
+        row = conn.execute('SELECT value FROM store_meta WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else default
+
+    @staticmethod
+    def set_meta(conn, key, value):
+        conn.execute('INSERT OR REPLACE INTO store_meta (key, value) VALUES (?, ?)', (key, str(value)))
+
+    @staticmethod
+    def rows(conn, ids=None):
+        """{id: delta} for the given ids (all rows if None)"""
+        if ids is None:
+            cursor = conn.execute('SELECT id, counters, order_value, last_engagement, version FROM deltas')
+            found = cursor.fetchall()
+        else:
+            ids, found = list(ids), []
+            for start in range(0, len(ids), 500):
+                chunk = ids[start:start + 500]
+                found.extend(conn.execute(
+                    f"SELECT id, counters, order_value, last_engagement, version FROM deltas "
+                    f"WHERE id IN ({','.join('?' * len(chunk))})", chunk).fetchall())
+        return {row[0]: {'counters': json.loads(row[1]), 'order_value': row[2], 'last_engagement': row[3],
+                         'version': row[4]} for row in found}
+
+    @staticmethod
+    def upsert(conn, individual_id, delta):
+        conn.execute(
+            'INSERT OR REPLACE INTO deltas (id, counters, order_value, last_engagement, version) VALUES (?, ?, ?, ?, ?)',
+            (individual_id, json.dumps(delta['counters']), delta['order_value'], delta['last_engagement'], delta['version'])
+        )
+
+    def count(self):
+        return self._connection().execute('SELECT COUNT(*) FROM deltas').fetchone()[0]
+
+
+def _empty_delta():
+    return {'counters': {}, 'order_value': 0.0, 'last_engagement': None, 'version': 0}
+
+
+def _add_events(delta, events):
+    """Accumulate events for one individual into its delta (in place)"""
+    counters = delta['counters']
+    for event in events:
+        for field in EVENT_COUNTERS[(event['channel'], event['action'])]:
+            counters[field] = counters.get(field, 0) + event['count']
+        if event['channel'] == 'website' and event['action'] == 'purchase' and 'value' in event:
+            delta['order_value'] = round(delta['order_value'] + event['value'], 2)
+        if event['timestamp'] > (delta['last_engagement'] or ''):
+            delta['last_engagement'] = event['timestamp']
+    return delta
+
+
+class EngagementEventIngestor:
+    """
+    Append events to a JSON-lines log, fold them into per-individual deltas and
+    compact those into the engagement data every COMPACT_SECONDS
+
+    The log is the source of truth: the byte offset up to which it has been folded is
+    stored with the deltas, so events appended by a request that died before folding
+    them are picked up by the next ingest. A batch costs O(events): only the rows of
+    the individuals it names are read and written. The engagement file (and so every
+    cache keyed on its signature) changes only when a compaction runs.
+    """
+
+    def __init__(self, data_store, scorer, log_path=EVENTS_LOG, triggers=None, deltas=None, compact_seconds=None):
+        self.data_store = data_store
+        self.scorer = scorer
+        self.triggers = triggers
+        self.log_path = log_path
+        self.deltas = deltas or EngagementDeltaStore()
+        self.compact_seconds = COMPACT_SECONDS if compact_seconds is None else compact_seconds
+        self._base = (None, {})
+        self._compact_lock = threading.Lock()
+        self._compact_timer = None
+        self._import_offset(log_path + '.offset')
+
+    def _import_offset(self, offset_path):
+        """Carry over the applied offset kept next to the log by earlier versions"""
+        if not os.path.exists(offset_path):
+            return
+        with self.deltas.transaction() as conn:
+            if self.deltas.get_meta(conn, 'log_offset') is None:
+                with open(offset_path, 'r') as f:
+                    self.deltas.set_meta(conn, 'log_offset', int(f.read().strip() or 0))
+        os.remove(offset_path)
+
+    def _append(self, events):
+        """Durably append a batch to the log (one write + fsync per batch)"""
+        received_at = datetime.now().isoformat()
+        lines = ''.join(json.dumps(dict(event, received_at=received_at)) + '\n' for event in events)
+        with open(self.log_path, 'a') as f:
+            f.write(lines)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _pending_events(self, offset):
+        """Events after offset, and the offset at the end of the log"""
+        if not os.path.exists(self.log_path):
+            return [], offset
+        events = []
+        with open(self.log_path, 'r') as f:
+            f.seek(offset)
+            for line in f:
+                if not line.endswith('\n'):
+                    break  # partially written line - leave it for the next run
+                offset += len(line.encode())
+                if line.strip():
+                    events.append(json.loads(line))
+        return events, offset
+
+    def _base_index(self):
+        """Engagement records by id, as of the current file (rebuilt only when it changes)"""
+        signature = self.data_store.signature('engagement')
+        if self._base[0] != signature:
+            records = self.data_store.load('engagement')
+            self._base = (signature, {record.get('id'): record for record in records})
+        return self._base[1]
+
+    def current(self, individual_ids):
+        """{id: engagement record} with the folded deltas applied (unknown ids are left out)"""
+        with self.deltas.transaction() as conn:
+            base = self._base_index()
+            records = [base[individual_id] for individual_id in individual_ids if individual_id in base]
+            deltas = self.deltas.rows(conn, [record['id'] for record in records])
+        return {record['id']: record for record in self.merge(records, deltas)}
+
+    def merge(self, records, deltas):
+        """
+        Copies of records with their deltas added and rates/scores re-derived
+
+        deltas maps id -> delta; records without one are returned unchanged (copied).
+        """
+        merged = []
+        for record in records:
+            record = dict(record)
+            delta = deltas.get(record.get('id'))
+            if delta:
+                for field, increment in delta['counters'].items():
+                    record[field] = _number(record.get(field)) + increment
+                if delta['order_value']:
+                    record['total_order_value'] = round(float(_number(record.get('total_order_value'))) + delta['order_value'], 2)
+                if delta['last_engagement'] and delta['last_engagement'] > str(record.get('last_engagement_date') or ''):
+                    record['last_engagement_date'] = delta['last_engagement']
+            merged.append(record)
+        changed = [record for record in merged if deltas.get(record.get('id'))]
+        for record in changed:
+            record.update(message_totals(record, {}))
+        for record, scores in zip(changed, self.scorer.score_population(changed, include_omnichannel=True)):
+            record.update(scores)
+        return merged
+
+    def ingest(self, events):
+        """Validate, log and fold a batch of events"""
+        if not isinstance(events, list):
+            raise Exception('events must be a list')
+        if len(events) > MAX_BATCH_SIZE:
+            raise Exception(f"Batch too large: {len(events)} events (max {MAX_BATCH_SIZE})")
+
+        accepted, rejected = [], []
+        for position, event in enumerate(events):
+            normalized, error = normalize_event(event)
+            if error:
+                rejected.append({'index': position, 'error': error})
+            else:
+                accepted.append(normalized)
+
+        result = {'accepted': len(accepted), 'rejected': rejected, 'updated_individuals': [], 'unknown_individuals': []}
+        if not accepted:
+            return result
+
+        self._append(accepted)
+        changed = []
+        with self.deltas.transaction() as conn:
+            offset = int(self.deltas.get_meta(conn, 'log_offset', 0))
+            pending, end_offset = self._pending_events(offset)
+            base = self._base_index()
+
+            by_individual = {}
+            for event in pending:
+                by_individual.setdefault(event['individual_id'], []).append(event)
+            known = [individual_id for individual_id in by_individual if individual_id in base]
+            result['unknown_individuals'] = sorted({e['individual_id'] for e in accepted if e['individual_id'] not in base})
+
+            if known:
+                version = int(self.deltas.get_meta(conn, 'version', 0)) + 1
+                before = self.deltas.rows(conn, known)
+                after = {}
+                for individual_id in known:
+                    delta = before.get(individual_id) or _empty_delta()
+                    delta = _add_events({**delta, 'counters': dict(delta['counters'])}, by_individual[individual_id])
+                    delta['version'] = version
+                    after[individual_id] = delta
+                    self.deltas.upsert(conn, individual_id, delta)
+                self.deltas.set_meta(conn, 'version', version)
+                if self.triggers is not None:
+                    records = [base[individual_id] for individual_id in known]
+                    changed = list(zip(self.merge(records, before), self.merge(records, after)))
+            self.deltas.set_meta(conn, 'log_offset', end_offset)
+
+        result['updated_individuals'] = known
+        result['applied_events'] = len(pending)
+        if self.triggers is not None and changed:
+            result['segment_events'] = self.triggers.engagement_changed(changed)
+        self.schedule_compaction()
+        return result
+
+    def schedule_compaction(self):
+        """Compact in a background thread once COMPACT_SECONDS have passed since the last compaction"""
+        with self._compact_lock:
+            if self._compact_timer is not None:
+                return
+            last = float(self.deltas.get_meta(self.deltas._connection(), 'compacted_at', 0))
+            delay = max(0.0, last + self.compact_seconds - time.time())
+            self._compact_timer = threading.Timer(delay, self._scheduled_compact)
+            self._compact_timer.daemon = True
+            self._compact_timer.start()
+
+    def _scheduled_compact(self):
+        try:
+            self.compact()
+        except Exception as e:
+            logger.warning("Engagement compaction failed: %s", e)
+        finally:
+            with self._compact_lock:
+                self._compact_timer = None
+
+    def compact(self):
+        """
+        Write the folded deltas into the engagement file, returns the number of individuals
+
+        The file is streamed into a temp file under the dataset lock; the rename and the
+        removal of the compacted amounts from the delta rows happen in one delta-store
+        transaction, so a concurrent fold never sees them counted twice. Deltas folded
+        while the file was being written stay for the next compaction.
+        """
+        with self.data_store.locked('engagement'):
+            snapshot = self.deltas.rows(self.deltas._connection())
+            if not snapshot:
+                with self.deltas.transaction() as conn:
+                    self.deltas.set_meta(conn, 'compacted_at', time.time())
+                return 0
+
+            path = self.data_store.path('engagement')
+            writer = JsonArrayWriter(path)
+            try:
+                records = iter_json_array(path)
+                while True:
+                    chunk = list(islice(records, COMPACT_CHUNK_SIZE))
+                    if not chunk:
+                        break
+                    for record in self.merge(chunk, snapshot):
+                        writer.write(record)
+            except Exception:
+                writer.abort()
+                raise
+
+            with self.deltas.transaction() as conn:
+                writer.commit()
+                current = self.deltas.rows(conn, list(snapshot))
+                for individual_id, compacted in snapshot.items():
+                    delta = current.get(individual_id)
+                    if delta is None:
+                        continue
+                    if delta['version'] == compacted['version']:
+                        conn.execute('DELETE FROM deltas WHERE id = ?', (individual_id,))
+                        continue
+                    # Folded again since the snapshot - keep only what the file doesn't include yet
+                    counters = {field: value - compacted['counters'].get(field, 0)
+                                for field, value in delta['counters'].items()}
+                    delta['counters'] = {field: value for field, value in counters.items() if value}
+                    delta['order_value'] = round(delta['order_value'] - compacted['order_value'], 2)
+                    self.deltas.upsert(conn, individual_id, delta)
+                self.deltas.set_meta(conn, 'compacted_at', time.time())
+
+        logger.info("Compacted engagement deltas for %d individuals", len(snapshot))
+        return len(snapshot)
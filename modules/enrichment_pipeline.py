@@ -0,0 +1,216 @@
+"""
+Enrichment Pipeline
+Runs declared enrichment stages over a data file in one streaming pass and writes it back once
+"""
+
+import hashlib
+import json
+import os
+from itertools import islice
+
+from modules.data_store import JsonArrayWriter, file_lock, iter_json_array, write_json_atomic
+
+# Records held in memory at a time (batch stages vectorize over one chunk)
+CHUNK_SIZE = 5000
+
+
+class Stage:
+    """
+    One enrichment step: fn(record, ctx) returns a dict of output field values
+    (batch stages get the list of records to process and return a list of dicts)
+
+    Derived stages rerun for a record only when their input fields change.
+    Seed stages (fill_missing=True) generate data and only run for records
+    that are missing one of their outputs, so generated values stay stable.
+    observe(record, ctx) is called for records a stage skips, letting stages
+    that need cross-record state (e.g. one value per individual) see existing values.
+    """
+
+    def __init__(self, name, inputs, outputs, fn, version='1', fill_missing=False, observe=None, batch=False, description=''):
+        self.name = name
+        self.inputs = tuple(inputs)
+        self.outputs = tuple(outputs)
+        self.fn = fn
+        self.version = version
+        self.fill_missing = fill_missing
+        self.observe = observe
+        self.batch = batch
+        self.description = description
+
+    def fingerprint(self, record):
+        """Hash of the stage version and its input values for one record"""
+        values = [record.get(field) for field in self.inputs]
+        payload = json.dumps([self.version, values], sort_keys=True, default=str)
+        return hashlib.sha1(payload.encode()).hexdigest()[:16]
+
+    def has_outputs(self, record):
+        return all(field in record for field in self.outputs)
+
+
+class EnrichmentPipeline:
+    """Apply stages in declaration order over all records (later stages see earlier outputs)"""
+
+    def __init__(self, data_file, stages, key_field='id', state_file=None):
+        self.data_file = data_file
+        self.stages = list(stages)
+        self.key_field = key_field
+        # Input fingerprints per stage and record, kept next to the data file
+        self.state_file = state_file or os.path.join(
+            os.path.dirname(data_file) or '.', f".{os.path.splitext(os.path.basename(data_file))[0]}.enrichment.json"
+        )
+        self._validate()
+
+    def _validate(self):
+        """Stage names must be unique and derived stages may only read earlier outputs"""
+        names = [stage.name for stage in self.stages]
+        if len(names) != len(set(names)):
+            raise Exception(f"Duplicate stage names in pipeline: {names}")
+        for position, stage in enumerate(self.stages):
+            if stage.fill_missing:
+                continue
+            for later in self.stages[position + 1:]:
+                produced = set(stage.inputs) & set(later.outputs)
+                if produced:
+                    raise Exception(
+                        f"Stage '{stage.name}' reads {sorted(produced)} produced by later stage '{later.name}'"
+                    )
+
+    def stage_names(self):
+        return [stage.name for stage in self.stages]
+
+    def _load_state(self):
+        try:
+            with open(self.state_file, 'r') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    @staticmethod
+    def _apply(stage, record, updates, stats):
+        """Merge one stage's output into a record, returns True if anything changed"""
+        updates = updates or {}
+        stats[stage.name]['ran'] += 1
+        changed = any(field not in record or record[field] != value for field, value in updates.items())
+        if changed:
+            stats[stage.name]['changed'] += 1
+            record.update(updates)
+        return changed
+
+    def run(self, only=None, force=False, dry_run=False, collect=True, chunk_size=CHUNK_SIZE):
+        """
+        Run the pipeline (or only the named stages) with one read and one write
+
+        Records are streamed from the file a chunk at a time, every selected stage is
+        applied to the chunk and it is written out to a temp file that replaces the data
+        file at the end (only if something changed). The file's lock is held throughout,
+        so writers such as the engagement event ingest can't interleave.
+
+        Without force, a record whose stage outputs already exist but that has no
+        stored fingerprint is adopted as-is, so the first run never rewrites data
+        produced by the old scripts. force=True recomputes every selected stage.
+        Returns per-stage counts, the record count, the records (unless collect=False)
+        and whether the file was rewritten.
+        """
+        if only:
+            unknown = set(only) - set(self.stage_names())
+            if unknown:
+                raise Exception(f"Unknown enrichment stages: {sorted(unknown)}")
+        stages = [stage for stage in self.stages if not only or stage.name in only]
+
+        stats = {stage.name: {'ran': 0, 'skipped': 0, 'changed': 0} for stage in self.stages}
+        contexts = {stage.name: {} for stage in stages}
+        collected = [] if collect else None
+        count = 0
+        data_changed = False
+        state_changed = False
+
+        with file_lock(self.data_file):
+            state = self._load_state()
+            writer = None if dry_run else JsonArrayWriter(self.data_file)
+            try:
+                records_iter = iter_json_array(self.data_file)
+                while True:
+                    chunk = list(islice(records_iter, chunk_size))
+                    if not chunk:
+                        break
+                    changed, fingerprints_changed = self._run_chunk(chunk, count, stages, state, contexts, stats, force)
+                    data_changed |= changed
+                    state_changed |= fingerprints_changed
+                    if writer is not None:
+                        for record in chunk:
+                            writer.write(record)
+                    if collected is not None:
+                        collected.extend(chunk)
+                    count += len(chunk)
+                if writer is not None and data_changed:
+                    writer.commit()
+                elif writer is not None:
+                    writer.abort()
+            except Exception:
+                if writer is not None:
+                    writer.abort()
+                raise
+            if state_changed and not dry_run:
+                write_json_atomic(self.state_file, state, indent=None)
+
+        result = {
+            'data_file': self.data_file,
+            'count': count,
+            'stages': stats,
+            'written': data_changed and not dry_run
+        }
+        if collected is not None:
+            result['records'] = collected
+        return result
+
+    def _run_chunk(self, records, offset, stages, state, contexts, stats, force):
+        """
+        Apply the stages to one chunk of records, returns (data changed, fingerprints changed)
+
+        Stage by stage within the chunk: stages only read the record they update (plus
+        their own ctx, kept across chunks), so this equals a record-by-record pass and
+        lets batch stages vectorize.
+        """
+        keys = [str(record.get(self.key_field) or offset + index) for index, record in enumerate(records)]
+        data_changed = False
+        state_changed = False
+
+        for stage in stages:
+            seen = state.setdefault(stage.name, {})
+            ctx = contexts[stage.name]
+            pending = []
+            fingerprints = [None] * len(records)
+
+            for index, record in enumerate(records):
+                if force:
+                    should_run = True
+                elif stage.fill_missing:
+                    should_run = not stage.has_outputs(record)
+                else:
+                    fingerprint = fingerprints[index] = stage.fingerprint(record)
+                    should_run = not stage.has_outputs(record) or seen.get(keys[index], fingerprint) != fingerprint
+
+                if not should_run:
+                    stats[stage.name]['skipped'] += 1
+                    if stage.observe:
+                        stage.observe(record, ctx)
+                elif stage.batch:
+                    pending.append(index)
+                else:
+                    ctx['index'] = offset + index
+                    data_changed |= self._apply(stage, record, stage.fn(record, ctx), stats)
+                    fingerprints[index] = None
+
+            if pending:
+                updates = stage.fn([records[index] for index in pending], ctx)
+                for index, record_updates in zip(pending, updates):
+                    data_changed |= self._apply(stage, records[index], record_updates, stats)
+                    fingerprints[index] = None
+
+            for index, record in enumerate(records):
+                fingerprint = fingerprints[index] or stage.fingerprint(record)
+                if seen.get(keys[index]) != fingerprint:
+                    seen[keys[index]] = fingerprint
+                    state_changed = True
+
+        return data_changed, state_changed
@@ -0,0 +1,222 @@
+"""
+Enrichment Stages
+The synthetic data enrichment steps (formerly separate add_*/enhance_* scripts)
+declared as pipeline stages
+"""
+
+import random
+import urllib.parse
+
+from modules.channel_scoring import ChannelScorer, CHANNEL_SCORE_FIELDS, CHANNEL_SCORE_INPUTS, OMNICHANNEL_INPUTS
+from modules.enrichment_pipeline import Stage, EnrichmentPipeline
+
+ENGAGEMENT_FILE = 'data/synthetic_engagement.json'
+INSIGHTS_FILE = 'data/individual_insights.json'
+
+
+def _int(record, field):
+    """Counters are stored as strings in some exports"""
+    try:
+        return int(float(record.get(field, 0) or 0))
+    except (TypeError, ValueError):
+        return 0
+
+
+def _float(record, field):
+    try:
+        return float(record.get(field, 0) or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+# ----------------------------------------------------------------------------
+# Engagement stages
+# ----------------------------------------------------------------------------
+
+MESSAGE_COUNTERS = (
+    'sms_sends', 'sms_opens', 'sms_clicks', 'sms_optouts',
+    'whatsapp_sends', 'whatsapp_reads', 'whatsapp_replies', 'whatsapp_optouts',
+    'push_sends', 'push_opens', 'push_clicks'
+)
+
+
+def message_engagement(record, ctx):
+    """Generate SMS / WhatsApp / Push counters by engagement tier"""
+    score = _float(record, 'engagement_score')
+
+    if score >= 4:  # High engagement
+        sms = (random.randint(12, 25), random.randint(10, 22), random.randint(5, 15), 0)
+        whatsapp = (random.randint(8, 20), random.randint(7, 18), random.randint(3, 12), 0)
+        push = (random.randint(15, 30), random.randint(10, 25), random.randint(5, 15))
+    elif score >= 2:  # Medium engagement
+        sms = (random.randint(6, 14), random.randint(3, 12), random.randint(1, 8), 0 if random.random() > 0.1 else 1)
+        whatsapp = (random.randint(4, 10), random.randint(2, 9), random.randint(1, 5), 0)
+        push = (random.randint(8, 18), random.randint(4, 14), random.randint(2, 8))
+    else:  # Low engagement
+        sms = (random.randint(1, 6), random.randint(0, 4), random.randint(0, 2), 1 if random.random() > 0.7 else 0)
+        whatsapp = (random.randint(0, 5), random.randint(0, 3), random.randint(0, 2), 1 if random.random() > 0.8 else 0)
+        push = (random.randint(2, 10), random.randint(0, 6), random.randint(0, 3))
+
+    return dict(zip(MESSAGE_COUNTERS, sms + whatsapp + push))
+
+
+def message_totals(record, ctx):
+    """Per-channel rates and message totals"""
+    sms_sends, sms_opens = _int(record, 'sms_sends'), _int(record, 'sms_opens')
+    whatsapp_sends, whatsapp_reads = _int(record, 'whatsapp_sends'), _int(record, 'whatsapp_reads')
+    push_sends, push_opens = _int(record, 'push_sends'), _int(record, 'push_opens')
+
+    return {
+        'sms_open_rate': round((sms_opens / sms_sends * 100) if sms_sends > 0 else 0, 1),
+        'whatsapp_read_rate': round((whatsapp_reads / whatsapp_sends * 100) if whatsapp_sends > 0 else 0, 1),
+        'push_open_rate': round((push_opens / push_sends * 100) if push_sends > 0 else 0, 1),
+        'total_message_sends': sms_sends + whatsapp_sends + push_sends,
+        'total_message_interactions': (sms_opens + _int(record, 'sms_clicks') + whatsapp_reads +
+                                       _int(record, 'whatsapp_replies') + push_opens + _int(record, 'push_clicks')),
+    }
+
+
+def channel_details(record, ctx):
+    """Generate deletes for messaging channels and separate social/website views and clicks"""
+    email_opens = _int(record, 'email_opens')
+    sms_opens = _int(record, 'sms_opens')
+    whatsapp_reads = _int(record, 'whatsapp_reads')
+    push_opens = _int(record, 'push_opens')
+    website_views = _int(record, 'website_product_views')
+    social_views = random.randint(20, 100)
+
+    return {
+        # Deletes as a share of opens: email 10-30%, SMS 5-15%, WhatsApp 2-8%, push 20-40%
+        'email_deletes': random.randint(int(email_opens * 0.1), int(email_opens * 0.3)),
+        'sms_deletes': random.randint(int(sms_opens * 0.05), int(sms_opens * 0.15)),
+        'whatsapp_opens': whatsapp_reads,  # Opens = Reads
+        'whatsapp_clicks': random.randint(int(whatsapp_reads * 0.4), int(whatsapp_reads * 0.6)),
+        'whatsapp_deletes': random.randint(int(whatsapp_reads * 0.02), int(whatsapp_reads * 0.08)),
+        'push_deletes': random.randint(int(push_opens * 0.2), int(push_opens * 0.4)),
+        'social_views': social_views,
+        'social_clicks': random.randint(int(social_views * 0.05), int(social_views * 0.15)),
+        'website_clicks': random.randint(int(website_views * 0.3), int(website_views * 0.5)),
+    }
+
+
+CONTACT_TIME_WINDOWS = [
+    "Early Morning (6-8 AM)",
+    "Morning (8-10 AM)",
+    "Late Morning (10-12 PM)",
+    "Lunch Time (12-2 PM)",
+    "Afternoon (2-4 PM)",
+    "Late Afternoon (4-6 PM)",
+    "Evening (6-8 PM)",
+    "Night (8-10 PM)",
+    "Late Night (10 PM-12 AM)"
+]
+CONTACT_TIME_WEIGHTS = [5, 15, 10, 8, 10, 12, 20, 15, 5]  # Evening and Night are most popular
+
+
+def preferred_contact_time(record, ctx):
+    return {'preferred_contact_time': random.choices(CONTACT_TIME_WINDOWS, weights=CONTACT_TIME_WEIGHTS)[0]}
+
+
+AVATAR_STYLES = ['avataaars', 'bottts', 'personas', 'lorelei', 'initials']
+
+
+def generate_avatar_url(name, style='avataaars'):
+    """DiceBear avatar URL seeded by name"""
+    return f"https://api.dicebear.com/7.x/{style}/svg?seed={urllib.parse.quote(name)}"
+
+
+def profile_picture(record, ctx):
+    name = record.get('Name', '')
+    if name == 'Biswarup Banerjee':
+        return {'profile_picture_url': '/static/images/biswarup_banerjee.jpg'}
+    style = AVATAR_STYLES[ctx['index'] % len(AVATAR_STYLES)]
+    return {'profile_picture_url': generate_avatar_url(name, style)}
+
+
+def engagement_stages(scorer=None):
+    """Engagement stages; scores come from a ChannelScorer (default weights if not given)"""
+    scorer = scorer or ChannelScorer()
+
+    def score_omnichannel(records, ctx):
+        return scorer.omnichannel_updates(records)
+
+    def score_channels(records, ctx):
+        return scorer.score_population(records)
+
+    # Score stages are versioned by their weights, so changing weights rescores everyone
+    return [
+        Stage('message_engagement', ('engagement_score',), MESSAGE_COUNTERS, message_engagement,
+              fill_missing=True, description='SMS / WhatsApp / Push counters'),
+        Stage('message_totals', MESSAGE_COUNTERS,
+              ('sms_open_rate', 'whatsapp_read_rate', 'push_open_rate', 'total_message_sends', 'total_message_interactions'),
+              message_totals, description='Message rates and totals'),
+        Stage('channel_details', ('email_opens', 'sms_opens', 'whatsapp_reads', 'push_opens', 'website_product_views'),
+              ('email_deletes', 'sms_deletes', 'whatsapp_opens', 'whatsapp_clicks', 'whatsapp_deletes',
+               'push_deletes', 'social_views', 'social_clicks', 'website_clicks'),
+              channel_details, fill_missing=True, description='Deletes, social and website clicks'),
+        Stage('omnichannel_score', OMNICHANNEL_INPUTS, ('engagement_score', 'omnichannel_score'),
+              score_omnichannel, version=scorer.config_hash(), batch=True, description='Combined engagement score'),
+        Stage('channel_scores', CHANNEL_SCORE_INPUTS, CHANNEL_SCORE_FIELDS + ('preferred_channel', 'preferred_channel_score'),
+              score_channels, version=scorer.config_hash(), batch=True, description='Per-channel scores and preferred channel'),
+        Stage('preferred_contact_time', (), ('preferred_contact_time',), preferred_contact_time,
+              fill_missing=True, description='Preferred contact time window'),
+        Stage('profile_picture', ('Name',), ('profile_picture_url',), profile_picture,
+              fill_missing=True, description='Avatar URL'),
+    ]
+
+
+# ----------------------------------------------------------------------------
+# Insights stages
+# ----------------------------------------------------------------------------
+
+EXERCISES = [
+    'Treadmill Running', 'Rowing Machine', 'Bench Press', 'Squats', 'Deadlifts', 'Cycling',
+    'Elliptical', 'Battle Ropes', 'Kettlebell Swings', 'Pull-ups', 'Push-ups', 'Yoga Flow',
+    'HIIT Circuit', 'Boxing', 'Pilates', 'Swimming', 'Rock Climbing', 'CrossFit'
+]
+
+EXERCISES_BY_HOBBY = {
+    'Running': ['Treadmill Running', 'Elliptical', 'HIIT Circuit'],
+    'Cycling': ['Cycling', 'Rowing Machine', 'Elliptical'],
+    'Yoga': ['Yoga Flow', 'Pilates', 'Stretching'],
+    'Hiking': ['Treadmill Running', 'Squats', 'Rock Climbing'],
+    'Swimming': ['Swimming', 'Rowing Machine', 'Battle Ropes'],
+    'Reading': ['Yoga Flow', 'Walking', 'Light Cardio'],
+}
+
+
+def favourite_exercise(record, ctx):
+    """One exercise per individual, chosen from their hobby"""
+    individual_id = record.get('Individual_Id')
+    if individual_id not in ctx:
+        ctx[individual_id] = random.choice(EXERCISES_BY_HOBBY.get(record.get('Hobby', 'Running'), EXERCISES))
+    return {'Favourite_Exercise': ctx[individual_id]}
+
+
+def _observe_favourite_exercise(record, ctx):
+    if record.get('Favourite_Exercise'):
+        ctx.setdefault(record.get('Individual_Id'), record['Favourite_Exercise'])
+
+
+INSIGHT_STAGES = [
+    Stage('favourite_exercise', ('Hobby',), ('Favourite_Exercise',), favourite_exercise,
+          fill_missing=True, observe=_observe_favourite_exercise, description='Favourite exercise per individual'),
+]
+
+
+def engagement_pipeline(data_file=ENGAGEMENT_FILE, scorer=None):
+    return EnrichmentPipeline(data_file, engagement_stages(scorer), key_field='id')
+
+
+def insights_pipeline(data_file=INSIGHTS_FILE):
+    return EnrichmentPipeline(data_file, INSIGHT_STAGES, key_field='InsightId')
+
+
+def run_stages(stage_names, force=True):
+    """Run named stages from whichever pipelines define them (one read/write per file)"""
+    results = []
+    for pipeline in (engagement_pipeline(), insights_pipeline()):
+        selected = [name for name in stage_names if name in pipeline.stage_names()]
+        if selected:
+            results.append(pipeline.run(only=selected, force=force))
+    return results
@@ -0,0 +1,583 @@
+"""
+Insights Cube
+Pre-aggregated counts over the Individual Insights events: a dense count cube across the
+core categorical fields, per-field counters for the long-tail ones and the time range
+"""
+
+import copy
+import fcntl
+import json
+import os
+import threading
+from datetime import datetime
+
+import numpy as np
+
+from modules.app_logging import get_logger
+from modules.data_store import JsonArrayWriter, iter_json_array, write_json_atomic
+
+CUBE_FILE = 'data/insights_cube.json'
+CUBE_VERSION = 4
+
+# Appended insights, folded into the cube on arrival and into the dataset file on compaction
+INSIGHTS_LOG = 'data/individual_insights.log'
+
+# Log size (bytes) past which an append starts a background compaction into individual_insights.json
+COMPACT_BYTES = int(os.environ.get('INSIGHTS_COMPACT_BYTES', 8 * 1024 * 1024))
+
+# Dimensions of the count cube (any cross-tab / filter combination of these is a slice)
+CUBE_FIELDS = ('Current_Sentiment', 'Lifestyle_Quotient', 'Health_Profile', 'Purchase_Intent')
+
+# Fields with many values - overall counts only, reported top-k
+COUNTED_FIELDS = ('Fitness_Milestone', 'Favourite_Brand', 'Favourite_Destination', 'Hobby')
+
+# Fields with daily buckets for trend series
+TREND_FIELDS = CUBE_FIELDS + COUNTED_FIELDS
+
+TREND_PERIODS = ('day', 'week', 'month')
+
+# Value counted for records without one of the cube/counted fields
+UNKNOWN_VALUE = 'Unknown'
+
+logger = get_logger(__name__)
+
+
+def _normalize_timestamp(value):
+    return datetime.fromisoformat(str(value).replace('Z', '+00:00')).isoformat()
+
+
+def _day_of(value):
+    """Event day (YYYY-MM-DD) of an ISO timestamp"""
+    return datetime.fromisoformat(str(value).replace('Z', '+00:00')).date().isoformat()
+
+
+def _period_of(day, period):
+    """Bucket label of a day: the day itself, the Monday of its ISO week, or YYYY-MM"""
+    if period == 'day':
+        return day
+    if period == 'month':
+        return day[:7]
+    date = datetime.fromisoformat(day).date()
+    return date.fromordinal(date.toordinal() - date.weekday()).isoformat()
+
+
+def normalize_insight(record):
+    """
+    Validated copy of an appended insight record
+
+    Individual_Id and Event_Timestamp are required; a missing or empty cube/counted field
+    is recorded as UNKNOWN_VALUE so every aggregated value is a string.
+    """
+    if not isinstance(record, dict) or not record.get('Individual_Id') or not record.get('Event_Timestamp'):
+        raise ValueError('Each insight needs Individual_Id and Event_Timestamp')
+    _normalize_timestamp(record['Event_Timestamp'])
+    record = dict(record)
+    for field in TREND_FIELDS:
+        value = record.get(field)
+        if value is None or value == '':
+            record[field] = UNKNOWN_VALUE
+        elif not isinstance(value, str):
+            raise ValueError(f"{field} must be a string")
+    return record
+
+
+def _read_log(path, offset=0):
+    """Records appended after offset, and the offset at the end of the log"""
+    if not os.path.exists(path):
+        return [], offset
+    records = []
+    with open(path, 'r') as f:
+        f.seek(offset)
+        for line in f:
+            if not line.endswith('\n'):
+                break  # partially written line - leave it for the next read
+            offset += len(line.encode())
+            if line.strip():
+                records.append(json.loads(line))
+    return records, offset
+
+
+def _log_size(path):
+    try:
+        return os.stat(path).st_size
+    except FileNotFoundError:
+        return 0
+
+
+def _most_common(counts, limit=None):
+    """(value, count) pairs like Counter.most_common: by count, ties in first-seen order"""
+    pairs = sorted(counts.items(), key=lambda item: -item[1])
+    return pairs[:limit] if limit else pairs
+
+
+class InsightsCube:
+    """
+    Count cube over the insights dataset, stored in data/insights_cube.json
+
+    The cube file holds the aggregates of one version (signature) of the insights file
+    and is only written when that version is first aggregated or by compact(). append()
+    writes records to the log; each process folds the log into its in-memory copy of
+    the cube from where it left off, so an append costs the new records, not the
+    population. Once the log passes COMPACT_BYTES an append starts compact() in a
+    background thread, which moves the log into the dataset file and builds the new
+    file's columnar copy before swapping it in. Any other change to the file
+    (regenerated data) makes the next read rebuild the cube from the columnar copy.
+    """
+
+    def __init__(self, data_store, path=CUBE_FILE, log_path=INSIGHTS_LOG, compact_bytes=None):
+        self.data_store = data_store
+        self.path = path
+        self.log_path = log_path
+        self.compact_bytes = COMPACT_BYTES if compact_bytes is None else compact_bytes
+        self._lock = threading.Lock()
+        self._state = None  # cube of the current file plus the folded log (this process)
+        self._base_ids = (None, set())  # (file signature, Individual_Ids in the file)
+        self._compact_lock = threading.Lock()
+        self._compact_thread = None
+
+    # ------------------------------------------------------------------
+    # Build / load / save
+    # ------------------------------------------------------------------
+
+    def _empty(self):
+        return {
+            'version': CUBE_VERSION,
+            'source_signature': None,
+            'total': 0,
+            'values': {field: [] for field in CUBE_FIELDS},
+            'cube': np.zeros([0] * len(CUBE_FIELDS), dtype=np.int64),
+            'counts': {field: {} for field in COUNTED_FIELDS},
+            'unique_individuals': 0,
+            'oldest': None,
+            'newest': None,
+            'daily': {field: {} for field in TREND_FIELDS},  # field -> day -> value -> count
+        }
+
+    @staticmethod
+    def _row_days(table):
+        """(distinct days, day position per row; -1 where the row has no timestamp)"""
+        if 'Event_Timestamp' not in table.columns:
+            return [], np.full(len(table), -1, dtype=np.int64)
+        timestamps = table.dictionary('Event_Timestamp')
+        day_of_code = [_day_of(t) if t else None for t in timestamps]
+        days = sorted({day for day in day_of_code if day})
+        position = {day: i for i, day in enumerate(days)}
+        lookup = np.array([position[day] if day else -1 for day in day_of_code] + [-1], dtype=np.int64)
+        return days, lookup[np.asarray(table.raw('Event_Timestamp'), dtype=np.int64)]
+
+    @staticmethod
+    def _field_codes(table, field):
+        """
+        (values, code per row) for a categorical field
+
+        Rows without the field, or with a null/empty value, get the code of UNKNOWN_VALUE.
+        """
+        if field in table.columns:
+            labels = [UNKNOWN_VALUE if value is None or value == '' else value for value in table.dictionary(field)]
+            codes = np.asarray(table.raw(field), dtype=np.int64)
+        else:
+            labels, codes = [], np.full(len(table), -1, dtype=np.int64)
+        if (codes < 0).any():
+            labels.append(UNKNOWN_VALUE)
+            codes = np.where(codes < 0, len(labels) - 1, codes)
+        values = list(dict.fromkeys(labels))
+        remap = np.array([values.index(label) for label in labels] + [0], dtype=np.int64)
+        return values, remap[codes]
+
+    @staticmethod
+    def _individual_ids(table):
+        """Distinct Individual_Ids of a table (the column's dictionary when it is encoded)"""
+        if 'Individual_Id' not in table.columns:
+            return set()
+        if table.kind('Individual_Id') == 'dict':
+            return set(table.dictionary('Individual_Id'))
+        return set(np.asarray(table.raw('Individual_Id'))[table.present('Individual_Id')].tolist())
+
+    @classmethod
+    def _daily_counts(cls, table, field, days, row_days, rows=None):
+        """{day: {value: count}} for a field over all rows (or a boolean row mask)"""
+        if not days:
+            return {}
+        values, codes = cls._field_codes(table, field)
+        keep = row_days >= 0
+        if rows is not None:
+            keep &= rows
+        counts = np.bincount(row_days[keep] * len(values) + codes[keep], minlength=len(days) * len(values))
+        daily = {}
+        for flat in np.flatnonzero(counts).tolist():
+            day, code = divmod(flat, len(values))
+            daily.setdefault(days[day], {})[values[code]] = int(counts[flat])
+        return daily
+
+    def _build(self):
+        """Aggregate the whole dataset from its columnar table (counts run on dictionary codes)"""
+        state = self._empty()
+        state['source_signature'] = self.data_store.signature('insights')
+        table = self.data_store.table('insights')
+        state['total'] = len(table)
+        if not len(table):
+            return state
+
+        indexes = []
+        for field in CUBE_FIELDS:
+            state['values'][field], codes = self._field_codes(table, field)
+            indexes.append(codes)
+        shape = tuple(len(state['values'][field]) for field in CUBE_FIELDS)
+        flat = np.ravel_multi_index(tuple(indexes), shape)
+        state['cube'] = np.bincount(flat, minlength=int(np.prod(shape))).reshape(shape)
+
+        for field in COUNTED_FIELDS:
+            values, codes = self._field_codes(table, field)
+            counts = np.bincount(codes, minlength=len(values))
+            state['counts'][field] = {values[i]: int(counts[i])
+                                      for i in np.argsort(-counts, kind='stable').tolist() if counts[i]}
+        state['unique_individuals'] = len(self._individual_ids(table))
+
+        if 'Event_Timestamp' in table.columns:
+            timestamps = [_normalize_timestamp(t) for t in table.dictionary('Event_Timestamp') if t]
+            state['oldest'] = min(timestamps) if timestamps else None
+            state['newest'] = max(timestamps) if timestamps else None
+
+        days, row_days = self._row_days(table)
+        for field in TREND_FIELDS:
+            state['daily'][field] = self._daily_counts(table, field, days, row_days)
+        return state
+
+    def _read_file(self):
+        try:
+            with open(self.path, 'r') as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            return None
+        if state.get('version') != CUBE_VERSION:
+            return None
+        state['cube'] = np.array(state['cube'], dtype=np.int64).reshape(state.pop('shape'))
+        return state
+
+    def _save(self, state):
+        """Write the aggregates of a file version (the in-memory log fields are not stored)"""
+        base = {key: value for key, value in state.items() if key in self._empty()}
+        payload = dict(base, cube=state['cube'].ravel().tolist(), shape=list(state['cube'].shape))
+        write_json_atomic(self.path, payload, indent=None)
+
+    def _base(self, signature):
+        """Aggregates of the dataset file with this signature: the cube file, or a rebuild saved to it"""
+        state = self._read_file()
+        if state is None or state['source_signature'] != signature:
+            state = self._build()
+            self._save(state)
+        return state
+
+    def _with_log(self, base):
+        """In-memory state: the file's aggregates plus the log records folded so far"""
+        return dict(base, log_offset=0, appended=[], new_individuals=set())
+
+    def _fresh(self, state):
+        """Whether state describes the current dataset file and all of the append log"""
+        return (state is not None and
+                state['source_signature'] == self.data_store.signature('insights') and
+                state['log_offset'] == _log_size(self.log_path))
+
+    def _current(self):
+        """Up-to-date aggregates; the caller holds data_store.locked('insights')"""
+        with self._lock:
+            state = self._state
+            if self._fresh(state):
+                return state
+            signature = self.data_store.signature('insights')
+            if state is None or state['source_signature'] != signature or state['log_offset'] > _log_size(self.log_path):
+                state = self._with_log(self._base(signature))
+            # Fold log records appended since this process last looked (all of them for a new file version)
+            records, state['log_offset'] = _read_log(self.log_path, state['log_offset'])
+            self._add(state, records)
+            self._state = state
+            return state
+
+    def state(self):
+        """Current aggregates, rebuilt if the insights file changed outside append()/compact()"""
+        if not self.data_store.exists('insights'):
+            raise FileNotFoundError(self.data_store.path('insights'))
+        with self._lock:
+            if self._fresh(self._state):
+                return self._state
+        with self.data_store.locked('insights'):
+            return self._current()
+
+    # ------------------------------------------------------------------
+    # Incremental updates
+    # ------------------------------------------------------------------
+
+    def _file_individuals(self, signature):
+        """Individual_Ids in the dataset file, read once per file version"""
+        if self._base_ids[0] != signature:
+            self._base_ids = (signature, self._individual_ids(self.data_store.table('insights')))
+        return self._base_ids[1]
+
+    def _add(self, state, records):
+        """Fold new log records into the aggregates (new values grow the cube along their axis)"""
+        for record in records:
+            position = []
+            for axis, field in enumerate(CUBE_FIELDS):
+                values = state['values'][field]
+                value = record.get(field)
+                if value not in values:
+                    values.append(value)
+                    padding = [(0, 0)] * len(CUBE_FIELDS)
+                    padding[axis] = (0, 1)
+                    state['cube'] = np.pad(state['cube'], padding)
+                position.append(values.index(value))
+            state['cube'][tuple(position)] += 1
+
+            for field in COUNTED_FIELDS:
+                if field in record:
+                    counts = state['counts'][field]
+                    counts[record[field]] = counts.get(record[field], 0) + 1
+            individual_id = record.get('Individual_Id')
+            if individual_id is not None and individual_id not in state['new_individuals']:
+                if individual_id not in self._file_individuals(state['source_signature']):
+                    state['new_individuals'].add(individual_id)
+            if record.get('Event_Timestamp'):
+                timestamp = _normalize_timestamp(record['Event_Timestamp'])
+                state['oldest'] = min(filter(None, (state['oldest'], timestamp)))
+                state['newest'] = max(filter(None, (state['newest'], timestamp)))
+                day = _day_of(record['Event_Timestamp'])
+                for field in TREND_FIELDS:
+                    if field in record:
+                        counts = state['daily'][field].setdefault(day, {})
+                        counts[record[field]] = counts.get(record[field], 0) + 1
+        state['appended'].extend(records)
+        state['total'] += len(records)
+
+    def append(self, records):
+        """
+        Append insight records to the log and fold them into the cube
+
+        Only the log is written; the cube file stays as it is until the next compaction.
+        Returns the normalized records (see normalize_insight) and the new total.
+        """
+        records = [normalize_insight(record) for record in records]
+        lines = ''.join(json.dumps(record) + '\n' for record in records)
+
+        with self.data_store.locked('insights'):
+            state = self._current()
+            with open(self.log_path, 'a') as f:
+                f.write(lines)
+                f.flush()
+                os.fsync(f.fileno())
+            with self._lock:
+                self._add(state, records)
+                state['log_offset'] = _log_size(self.log_path)
+                total = state['total']
+        if state['log_offset'] >= self.compact_bytes:
+            self.start_compaction()
+        return records, total
+
+    def appended(self):
+        """Records appended since the last compaction (not in the dataset file yet), oldest first"""
+        if not self.data_store.exists('insights'):
+            return []
+        return list(self.state()['appended'])
+
+    def start_compaction(self):
+        """Run compact() in a background thread unless this process is already compacting"""
+        with self._compact_lock:
+            if self._compact_thread is not None and self._compact_thread.is_alive():
+                return
+            self._compact_thread = threading.Thread(target=self._background_compact, name='insights-compaction', daemon=True)
+            self._compact_thread.start()
+
+    def _background_compact(self):
+        try:
+            self.compact()
+        except Exception as e:
+            logger.warning("Insights compaction failed: %s", e)
+
+    def compact(self):
+        """
+        Move the append log into the dataset file, returns the number of records moved
+
+        Only one process compacts at a time. The records in the log are noted under the
+        dataset lock; the new file (old file plus those records) and its columnar copy are
+        then built without the lock, so appends and reads go on meanwhile. Back under the
+        lock the new file is renamed into place, the cube is saved for its signature
+        (carried over, not rebuilt) and the log keeps only records appended since. If the
+        file was replaced in between, nothing is swapped.
+        """
+        with open(self.data_store.path('insights') + '.compact.lock', 'a') as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return 0  # another process is compacting
+            try:
+                return self._compact()
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _compact(self):
+        with self.data_store.locked('insights'):
+            state = self._current()
+            if not state['appended']:
+                return 0
+            with self._lock:
+                signature, end = state['source_signature'], state['log_offset']
+                records = list(state['appended'])
+                base = copy.deepcopy({key: state[key] for key in self._empty()})
+                base['unique_individuals'] += len(state['new_individuals'])
+
+        path = self.data_store.path('insights')
+        writer = JsonArrayWriter(path)
+        try:
+            for record in iter_json_array(path):
+                writer.write(record)
+            for record in records:
+                writer.write(record)
+            writer.finish()
+            base['source_signature'] = self.data_store.prepare_table('insights', writer.tmp_path)
+        except Exception:
+            writer.abort()
+            raise
+
+        with self.data_store.locked('insights'):
+            if self.data_store.signature('insights') != signature or _log_size(self.log_path) < end:
+                writer.abort()
+                logger.info("Insights file changed during compaction, nothing swapped")
+                return 0
+            with open(self.log_path, 'r') as f:
+                f.seek(end)
+                tail = f.read()
+            self._save(base)
+            writer.commit()
+            with open(self.log_path + '.tmp', 'w') as f:
+                f.write(tail)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(self.log_path + '.tmp', self.log_path)
+            with self._lock:
+                self._state = None
+        logger.info("Compacted %d appended insights", len(records))
+        return len(records)
+
+    # ------------------------------------------------------------------
+    # Queries
+    # ------------------------------------------------------------------
+
+    def _slice(self, state, filters):
+        """Cube with the cells outside filters {field: value or [values]} zeroed (cube fields only)"""
+        cube = state['cube']
+        for field, wanted in (filters or {}).items():
+            if field not in CUBE_FIELDS:
+                raise Exception(f"Cannot filter on {field} (cube fields: {', '.join(CUBE_FIELDS)})")
+            wanted = wanted if isinstance(wanted, (list, tuple)) else [wanted]
+            mask = np.array([value in wanted for value in state['values'][field]], dtype=np.int64)
+            shape = [1] * len(CUBE_FIELDS)
+            shape[CUBE_FIELDS.index(field)] = len(mask)
+            cube = cube * mask.reshape(shape)
+        return cube
+
+    def distribution(self, field, filters=None, limit=None):
+        """(value, count) pairs for a field, most common first (filters only on cube fields)"""
+        state = self.state()
+        if field in CUBE_FIELDS:
+            axis = CUBE_FIELDS.index(field)
+            other = tuple(i for i in range(len(CUBE_FIELDS)) if i != axis)
+            totals = self._slice(state, filters).sum(axis=other).tolist()
+            counts = {value: count for value, count in zip(state['values'][field], totals) if count}
+            return _most_common(counts, limit)
+        if field not in COUNTED_FIELDS:
+            raise Exception(f"Unknown insights field: {field}")
+        if filters:
+            raise Exception(f"{field} has overall counts only; filters apply to {', '.join(CUBE_FIELDS)}")
+        return _most_common(state['counts'][field], limit)
+
+    def crosstab(self, rows, columns, filters=None):
+        """Counts of every (rows value, columns value) pair among the filtered events"""
+        for field in (rows, columns):
+            if field not in CUBE_FIELDS:
+                raise Exception(f"Cross-tabs are available for {', '.join(CUBE_FIELDS)}")
+        if rows == columns:
+            raise Exception('rows and columns must be different fields')
+        state = self.state()
+        row_axis, column_axis = CUBE_FIELDS.index(rows), CUBE_FIELDS.index(columns)
+        other = tuple(i for i in range(len(CUBE_FIELDS)) if i not in (row_axis, column_axis))
+        table = self._slice(state, filters).sum(axis=other)
+        if row_axis > column_axis:
+            table = table.T
+        row_keep = np.flatnonzero(table.sum(axis=1))
+        column_keep = np.flatnonzero(table.sum(axis=0))
+        return {
+            'rows': [state['values'][rows][i] for i in row_keep.tolist()],
+            'columns': [state['values'][columns][i] for i in column_keep.tolist()],
+            'counts': table[np.ix_(row_keep, column_keep)].tolist(),
+            'total': int(table.sum())
+        }
+
+    def overview(self):
+        state = self.state()
+        unique_individuals = state['unique_individuals'] + len(state['new_individuals'])
+        return {
+            'total_records': state['total'],
+            'unique_individuals': unique_individuals,
+            'records_per_individual': state['total'] // unique_individuals if unique_individuals > 0 else 0,
+            'oldest_timestamp': state['oldest'],
+            'newest_timestamp': state['newest']
+        }
+
+    def distributions(self):
+        """The distributions block of the insights analytics payload"""
+        return {
+            'sentiments': dict(self.distribution('Current_Sentiment', limit=10)),
+            'lifestyles': dict(self.distribution('Lifestyle_Quotient', limit=10)),
+            'health_profiles': dict(self.distribution('Health_Profile', limit=10)),
+            'fitness_milestones': dict(self.distribution('Fitness_Milestone')),
+            'purchase_intents': dict(self.distribution('Purchase_Intent')),
+            'favorite_brands': dict(self.distribution('Favourite_Brand', limit=15)),
+            'favorite_destinations': dict(self.distribution('Favourite_Destination', limit=15)),
+            'hobbies': dict(self.distribution('Hobby', limit=15))
+        }
+
+    def trend(self, field, period='day', individual_ids=None):
+        """
+        Counts per bucket for each value of a field, oldest bucket first
+
+        Served from the daily buckets; restricted to individual_ids (e.g. a segment's
+        members) the buckets are recounted from the integer codes of the columnar table.
+        """
+        if field not in TREND_FIELDS:
+            raise Exception(f"Trends are available for {', '.join(TREND_FIELDS)}")
+        if period not in TREND_PERIODS:
+            raise Exception(f"period must be one of {', '.join(TREND_PERIODS)}")
+
+        if individual_ids is None:
+            daily = self.state()['daily'][field]
+        else:
+            table = self.data_store.table('insights')
+            members = set(individual_ids)
+            member_codes = [code for code, value in enumerate(table.dictionary('Individual_Id')) if value in members]
+            rows = np.isin(np.asarray(table.raw('Individual_Id')), member_codes)
+            days, row_days = self._row_days(table)
+            daily = self._daily_counts(table, field, days, row_days, rows)
+            # Appended records not compacted into the file yet
+            for record in self.appended():
+                if record['Individual_Id'] in members:
+                    counts = daily.setdefault(_day_of(record['Event_Timestamp']), {})
+                    counts[record[field]] = counts.get(record[field], 0) + 1
+
+        buckets = {}
+        for day in sorted(daily):
+            counts = buckets.setdefault(_period_of(day, period), {})
+            for value, count in daily[day].items():
+                counts[value] = counts.get(value, 0) + count
+
+        labels = sorted(buckets)
+        totals = {}
+        for counts in buckets.values():
+            for value, count in counts.items():
+                totals[value] = totals.get(value, 0) + count
+        return {
+            'field': field,
+            'period': period,
+            'buckets': labels,
+            'series': {value: [buckets[label].get(value, 0) for label in labels]
+                       for value, _ in _most_common(totals)},
+            'totals': [sum(buckets[label].values()) for label in labels]
+        }
@@ -0,0 +1,206 @@
+"""
+Insights Frame
+Compact in-memory form of the Individual Insights events: categorical fields as small
+integer codes, individual attributes stored once per individual instead of per event
+"""
+
+import sys
+import threading
+from datetime import datetime
+
+import numpy as np
+
+# Event fields with few distinct values - kept as codes into a per-field vocabulary
+CATEGORICAL_FIELDS = (
+    'Current_Sentiment', 'Lifestyle_Quotient', 'Health_Profile', 'Fitness_Milestone', 'Purchase_Intent',
+    'Favourite_Brand', 'Favourite_Destination', 'Hobby', 'Imminent_Event', 'Favourite_Exercise', 'data_source',
+)
+
+# Fields that describe the individual, not the event
+INDIVIDUAL_FIELDS = (
+    'Individual_Name', 'Individual_FirstName', 'Individual_LastName', 'Individual_Email', 'Individual_Phone',
+)
+
+_MISSING_TS = np.iinfo(np.int64).min
+
+
+def _timestamp_us(value):
+    """Microseconds since epoch of an ISO timestamp (naive timestamps read as UTC)"""
+    parsed = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    if parsed.tzinfo is not None:
+        parsed = parsed.replace(tzinfo=None) - parsed.utcoffset()
+    return int((parsed - datetime(1970, 1, 1)).total_seconds() * 1_000_000)
+
+
+def _codes_dtype(size):
+    return np.int8 if size < 127 else np.int16 if size < 32767 else np.int32
+
+
+class InsightsFrame:
+    """
+    Insight events as parallel arrays
+
+    individual[row] is a position into individual_ids / the individual attribute table;
+    codes[field][row] is a position into vocabulary[field] (-1 where the event has no value).
+    Remaining per-event fields (InsightId, the original timestamp text) are kept as lists.
+    """
+
+    def __init__(self, table):
+        """Build from a ColumnarTable of the insights dataset (reuses its dictionary codes)"""
+        self.columns = table.columns
+        self.rows = len(table)
+        self.vocabulary = {}
+        self.codes = {}
+        for field in CATEGORICAL_FIELDS:
+            if field not in self.columns:
+                continue
+            values = [sys.intern(v) if isinstance(v, str) else v for v in table.dictionary(field)]
+            self.vocabulary[field] = values
+            self.codes[field] = np.array(table.raw(field), dtype=_codes_dtype(len(values)))
+
+        if 'Individual_Id' in self.columns:
+            self.individual_ids = list(table.dictionary('Individual_Id'))
+            self.individual = np.array(table.raw('Individual_Id'), dtype=np.int32)
+        else:
+            self.individual_ids, self.individual = [], np.full(self.rows, -1, dtype=np.int32)
+        self._positions = {individual_id: i for i, individual_id in enumerate(self.individual_ids)}
+
+        # One row of attributes per individual (from their last event)
+        self.attributes = {}
+        last_rows = self.last_rows()
+        for field in INDIVIDUAL_FIELDS:
+            if field in self.columns:
+                column = table.column(field)
+                self.attributes[field] = [column[row] if row >= 0 else None for row in last_rows.tolist()]
+
+        self.timestamp = np.full(self.rows, _MISSING_TS, dtype=np.int64)
+        self.extra = {}
+        if 'Event_Timestamp' in self.columns:
+            texts = table.dictionary('Event_Timestamp')
+            parsed = np.array([_timestamp_us(t) if t else _MISSING_TS for t in texts] + [_MISSING_TS], dtype=np.int64)
+            self.timestamp = parsed[np.asarray(table.raw('Event_Timestamp'))]
+            self.extra['Event_Timestamp'] = table.column('Event_Timestamp').tolist()
+        for field in self.columns:
+            if field not in self.extra and field not in self.codes and field not in self.attributes and field != 'Individual_Id':
+                self.extra[field] = table.column(field).tolist()
+
+    def __len__(self):
+        return self.rows
+
+    # ------------------------------------------------------------------
+    # Codes
+    # ------------------------------------------------------------------
+
+    def code_of(self, field, value):
+        """Code of a value in a categorical field (None if it never occurs)"""
+        try:
+            return self.vocabulary[field].index(value)
+        except ValueError:
+            return None
+
+    def mask(self, field, values):
+        """Boolean row mask: field in values (categorical fields are compared as codes)"""
+        if field in self.codes:
+            wanted = [code for code in (self.code_of(field, value) for value in values) if code is not None]
+            return np.isin(self.codes[field], wanted)
+        values = set(values)
+        if field == 'Individual_Id':
+            return self.individual_rows(values)
+        if field in self.attributes:
+            matching = np.array([value in values for value in self.attributes[field]] + [False], dtype=bool)
+            return matching[self.individual]  # individual -1 picks the trailing False
+        if field in self.extra:
+            return np.array([value in values for value in self.extra[field]], dtype=bool)
+        return np.zeros(self.rows, dtype=bool)
+
+    def count_by(self, field, rows=None):
+        """(value, count) pairs of a categorical field, most common first"""
+        codes = self.codes[field] if rows is None else self.codes[field][rows]
+        counts = np.bincount(codes[codes >= 0].astype(np.int64), minlength=len(self.vocabulary[field]))
+        order = np.argsort(-counts, kind='stable')
+        return [(self.vocabulary[field][i], int(counts[i])) for i in order.tolist() if counts[i]]
+
+    def individual_rows(self, individual_ids):
+        """Row mask for the events of the given individuals"""
+        positions = [self._positions[i] for i in individual_ids if i in self._positions]
+        return np.isin(self.individual, positions)
+
+    # ------------------------------------------------------------------
+    # Per-individual selection
+    # ------------------------------------------------------------------
+
+    def last_rows(self):
+        """Row of each individual's last event in file order (-1 if none)"""
+        rows = np.full(len(self.individual_ids), -1, dtype=np.int64)
+        present = self.individual >= 0
+        # Later rows overwrite earlier ones in fancy assignment
+        rows[self.individual[present]] = np.flatnonzero(present)
+        return rows
+
+    def latest_rows(self):
+        """Row of each individual's newest event by timestamp (ties: first in file order, -1 if none)"""
+        rows = np.full(len(self.individual_ids), -1, dtype=np.int64)
+        present = np.flatnonzero(self.individual >= 0)
+        newest_first = -np.unique(self.timestamp[present], return_inverse=True)[1]
+        order = present[np.lexsort((present, newest_first, self.individual[present]))]
+        first = np.r_[True, self.individual[order][1:] != self.individual[order][:-1]] if len(order) else order
+        rows[self.individual[order[first]]] = order[first]
+        return rows
+
+    # ------------------------------------------------------------------
+    # Records
+    # ------------------------------------------------------------------
+
+    def record(self, row):
+        """The event as a JSON record (same fields as the insights file)"""
+        position = int(self.individual[row])
+        record = {}
+        for field in self.columns:
+            if field == 'Individual_Id':
+                value = self.individual_ids[position] if position >= 0 else None
+            elif field in self.codes:
+                code = int(self.codes[field][row])
+                value = self.vocabulary[field][code] if code >= 0 else None
+            elif field in self.attributes:
+                value = self.attributes[field][position] if position >= 0 else None
+            else:
+                value = self.extra[field][row]
+            if value is not None:
+                record[field] = value
+        return record
+
+    def records_by_individual(self, rows):
+        """{Individual_Id: record} for per-individual rows (as from last_rows / latest_rows)"""
+        return {self.individual_ids[position]: self.record(row)
+                for position, row in enumerate(rows.tolist()) if row >= 0}
+
+    def memory_bytes(self):
+        """Approximate footprint of the arrays and the distinct strings"""
+        size = self.individual.nbytes + self.timestamp.nbytes + sum(codes.nbytes for codes in self.codes.values())
+        size += sum(sys.getsizeof(v) for values in self.vocabulary.values() for v in values)
+        size += sum(sys.getsizeof(v) for values in self.attributes.values() for v in values)
+        size += sum(sys.getsizeof(values) + sum(sys.getsizeof(v) for v in values) for values in self.extra.values())
+        return size + sum(sys.getsizeof(i) for i in self.individual_ids)
+
+
+_frames = {}
+_frames_lock = threading.Lock()
+
+
+def load_insights_frame(data_store=None):
+    """Frame of the insights dataset, rebuilt when the file changes (shared per process)"""
+    if data_store is None:
+        from modules.data_store import DataStore
+        data_store = DataStore()
+    signature = data_store.signature('insights')
+    if signature is None:
+        raise FileNotFoundError(data_store.path('insights'))
+    key = data_store.path('insights')
+    with _frames_lock:
+        cached = _frames.get(key)
+        if cached and cached[0] == signature:
+            return cached[1]
+    frame = InsightsFrame(data_store.table('insights'))
+    with _frames_lock:
+        _frames[key] = (signature, frame)
+    return frame
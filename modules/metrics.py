@@ -0,0 +1,275 @@
+"""
+Request Metrics
+Per-route latency histograms, named stage spans inside a request and a
+slow-request log, exposed in the Prometheus text format
+
+Stages used across the app: data_load, salesforce, filter, enrichment,
+render, image_api and upload. Metrics are kept per process - with several
+gunicorn workers each one reports its own series (pid is in the output).
+"""
+
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+
+from modules.app_logging import get_logger
+
+# Seconds - the Prometheus client defaults plus the long tail of image generation
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Label used for spans that run outside a request (startup, CLI scripts, background threads)
+NO_ROUTE = '-'
+
+logger = get_logger(__name__)
+
+_current_trace = ContextVar('request_trace', default=None)
+_active_stages = ContextVar('active_stages', default=())
+
+
+class Histogram:
+    """Cumulative-bucket histogram (not thread-safe on its own - guarded by the registry lock)"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.count += 1
+        self.sum += value
+
+    def cumulative(self):
+        """(upper bound, cumulative count) pairs ending with +Inf"""
+        total = 0
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            yield bound, total
+        yield float('inf'), self.count
+
+
+class RequestTrace:
+    """Timing of one request: total wall time plus the time spent in each stage"""
+
+    def __init__(self, method, path):
+        self.method = method
+        self.path = path
+        self.route = NO_ROUTE
+        self.status = None
+        self.started = time.perf_counter()
+        self.stages = {}
+        self.render_started = None
+
+    def add(self, stage, seconds):
+        total, calls = self.stages.get(stage, (0.0, 0))
+        self.stages[stage] = (total + seconds, calls + 1)
+
+    def breakdown(self):
+        """Stage -> {'ms', 'calls'}, slowest first"""
+        ordered = sorted(self.stages.items(), key=lambda item: -item[1][0])
+        return {stage: {'ms': round(total * 1000, 2), 'calls': calls} for stage, (total, calls) in ordered}
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}'
+
+
+class MetricsRegistry:
+    """Request/stage histograms, request counters and the slow-request log of this process"""
+
+    def __init__(self, slow_ms=None, slow_log_size=None, buckets=DEFAULT_BUCKETS):
+        self.slow_ms = float(slow_ms if slow_ms is not None else os.environ.get('SLOW_REQUEST_MS', 1000))
+        self.buckets = buckets
+        self.slow_requests = deque(maxlen=int(slow_log_size or os.environ.get('SLOW_REQUEST_LOG_SIZE', 100)))
+        self.started_at = time.time()
+        self._requests = {}  # (route, method) -> Histogram
+        self._stages = {}  # (stage, route) -> Histogram
+        self._responses = {}  # (route, method, status) -> count
+        self._lock = threading.Lock()
+
+    def observe_stage(self, stage, route, seconds):
+        with self._lock:
+            histogram = self._stages.get((stage, route))
+            if histogram is None:
+                histogram = self._stages[(stage, route)] = Histogram(self.buckets)
+            histogram.observe(seconds)
+
+    def observe_request(self, trace, seconds):
+        """Record a finished request; slow ones also go to the slow-request log"""
+        key = (trace.route, trace.method)
+        with self._lock:
+            histogram = self._requests.get(key)
+            if histogram is None:
+                histogram = self._requests[key] = Histogram(self.buckets)
+            histogram.observe(seconds)
+            status_key = key + (trace.status,)
+            self._responses[status_key] = self._responses.get(status_key, 0) + 1
+
+        duration_ms = seconds * 1000
+        if duration_ms >= self.slow_ms:
+            entry = {
+                'timestamp': datetime.now().isoformat(),
+                'method': trace.method,
+                'path': trace.path,
+                'route': trace.route,
+                'status': trace.status,
+                'duration_ms': round(duration_ms, 2),
+                'stages': trace.breakdown(),
+            }
+            self.slow_requests.append(entry)
+            stages = ', '.join(f"{stage} {info['ms']:.0f}ms" for stage, info in entry['stages'].items())
+            logger.warning("Slow request: %s %s -> %s in %.0fms%s", trace.method, trace.path, trace.status,
+                           duration_ms, f" ({stages})" if stages else '')
+
+    def slow_log(self, limit=None):
+        """Slow requests, newest first"""
+        entries = list(self.slow_requests)[::-1]
+        return entries[:limit] if limit else entries
+
+    def reset(self):
+        with self._lock:
+            self._requests.clear()
+            self._stages.clear()
+            self._responses.clear()
+            self.slow_requests.clear()
+            self.started_at = time.time()
+
+    def render_prometheus(self):
+        """All series in the Prometheus text exposition format (version 0.0.4)"""
+        with self._lock:
+            requests = {key: (list(h.cumulative()), h.sum, h.count) for key, h in self._requests.items()}
+            stages = {key: (list(h.cumulative()), h.sum, h.count) for key, h in self._stages.items()}
+            responses = dict(self._responses)
+
+        lines = [
+            '# HELP app_process_start_time_seconds Start time of this worker since the Unix epoch.',
+            '# TYPE app_process_start_time_seconds gauge',
+            f'app_process_start_time_seconds{_labels(["pid"], [os.getpid()])} {self.started_at:.3f}',
+        ]
+        lines += self._histogram_lines('app_request_duration_seconds', 'Wall time per route.',
+                                       ('route', 'method'), requests)
+        lines += ['# HELP app_requests_total Responses per route, method and status.',
+                  '# TYPE app_requests_total counter']
+        for (route, method, status), count in sorted(responses.items(), key=lambda item: tuple(map(str, item[0]))):
+            lines.append(f'app_requests_total{_labels(("route", "method", "status"), (route, method, status))} {count}')
+        lines += self._histogram_lines('app_stage_duration_seconds', 'Time spent in a named stage of a request.',
+                                       ('stage', 'route'), stages)
+        return '\n'.join(lines) + '\n'
+
+    @staticmethod
+    def _histogram_lines(name, help_text, label_names, series):
+        lines = [f'# HELP {name} {help_text}', f'# TYPE {name} histogram']
+        for key in sorted(series, key=lambda k: tuple(map(str, k))):
+            buckets, total, count = series[key]
+            for bound, cumulative in buckets:
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                bucket_labels = _labels(label_names, key, f'le="{le}"')
+                lines.append(f'{name}_bucket{bucket_labels} {cumulative}')
+            lines.append(f'{name}_sum{_labels(label_names, key)} {total:.6f}')
+            lines.append(f'{name}_count{_labels(label_names, key)} {count}')
+        return lines
+
+
+registry = MetricsRegistry()
+
+
+@contextmanager
+def span(stage):
+    """
+    Time a named stage of the current request
+
+    Safe to use anywhere: outside a request the time is still recorded, under route '-'.
+    A span nested inside another span of the same stage is not counted twice.
+    """
+    active = _active_stages.get()
+    if stage in active:
+        yield
+        return
+    token = _active_stages.set(active + (stage,))
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - started
+        _active_stages.reset(token)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.add(stage, seconds)
+        registry.observe_stage(stage, trace.route if trace is not None else NO_ROUTE, seconds)
+
+
+def current_trace():
+    """Trace of the request being handled in this context (None outside a request)"""
+    return _current_trace.get()
+
+
+def instrument(app):
+    """Register the timing hooks on a Flask app: route timing, template and JSON rendering"""
+    from flask import before_render_template, g, request, template_rendered
+    from flask.json.provider import DefaultJSONProvider
+
+    class TimedJSONProvider(DefaultJSONProvider):
+        """jsonify() with serialization counted as the render stage"""
+
+        def response(self, *args, **kwargs):
+            with span('render'):
+                return super().response(*args, **kwargs)
+
+    app.json = TimedJSONProvider(app)
+
+    @app.before_request
+    def _start_trace():
+        trace = RequestTrace(request.method, request.path)
+        trace.route = request.url_rule.rule if request.url_rule is not None else '<unmatched>'
+        g._metrics_token = _current_trace.set(trace)
+
+    @app.after_request
+    def _record_status(response):
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.status = response.status_code
+        return response
+
+    @app.teardown_request
+    def _finish_trace(exc):
+        trace = _current_trace.get()
+        if trace is None:
+            return
+        if trace.status is None:
+            trace.status = 500
+        registry.observe_request(trace, time.perf_counter() - trace.started)
+        token = g.pop('_metrics_token', None)
+        if token is not None:
+            _current_trace.reset(token)
+
+    def _template_started(sender, template, context, **extra):
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.render_started = time.perf_counter()
+
+    def _template_finished(sender, template, context, **extra):
+        trace = _current_trace.get()
+        if trace is not None and trace.render_started is not None:
+            seconds = time.perf_counter() - trace.render_started
+            trace.render_started = None
+            trace.add('render', seconds)
+            registry.observe_stage('render', trace.route, seconds)
+
+    before_render_template.connect(_template_started, app, weak=False)
+    template_rendered.connect(_template_finished, app, weak=False)
+    return registry
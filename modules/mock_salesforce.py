@@ -0,0 +1,1094 @@
+"""
+Mock Salesforce
+Local stand-in for the Salesforce REST/SOAP APIs the app calls (query, describe, sObject
+CRUD and collections, invocable actions, tooling execute-anonymous, SOAP login), serving
+records built from the data/ files with configurable latency and error injection
+"""
+
+import json
+import os
+import random
+import re
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from xml.sax.saxutils import escape
+
+from flask import Flask, Response, jsonify, request
+
+API_VERSION = '59.0'
+DEFAULT_PAGE_SIZE = 2000
+MAX_CURSORS = 200
+ORG_ID = '00DLM0000000001AAA'
+ORG_NAME = 'Local Mock Org'
+
+ENGAGEMENT_FILE = 'synthetic_engagement.json'
+
+# sObject -> (label, key prefix, fields); a field is (name, type) or (name, 'reference', target).
+# Id and CreatedDate are added to every object.
+SOBJECTS = {
+    'Organization': ('Organization', '00D', [('Name', 'string'), ('OrganizationType', 'string'), ('InstanceName', 'string')]),
+    'User': ('User', '005', [('Username', 'string'), ('Name', 'string'), ('Email', 'email')]),
+    'Individual': ('Individual', '0PK', [('FirstName', 'string'), ('LastName', 'string'), ('Name', 'string'),
+                                         ('Salutation', 'picklist')]),
+    'Account': ('Account', '001', [('Name', 'string'), ('Industry', 'picklist'), ('Type', 'picklist')]),
+    'Contact': ('Contact', '003', [('IndividualId', 'reference', 'Individual'), ('AccountId', 'reference', 'Account'),
+                                   ('FirstName', 'string'), ('LastName', 'string'), ('Name', 'string'),
+                                   ('Email', 'email'), ('Phone', 'phone'), ('MailingCountry', 'string')]),
+    'ContactPointEmail': ('Contact Point Email', '9CE', [('ParentId', 'reference', 'Individual'), ('EmailAddress', 'email')]),
+    'AccountContactRelation': ('Account Contact Relationship', '07k', [('AccountId', 'reference', 'Account'),
+                                                                         ('ContactId', 'reference', 'Contact')]),
+    'Lead': ('Lead', '00Q', [('FirstName', 'string'), ('LastName', 'string'), ('Name', 'string'),
+                             ('Company', 'string'), ('Email', 'email'), ('Status', 'picklist')]),
+    'Opportunity': ('Opportunity', '006', [('Name', 'string'), ('AccountId', 'reference', 'Account'),
+                                           ('StageName', 'picklist'), ('Amount', 'currency'), ('CloseDate', 'date')]),
+    'Case': ('Case', '500', [('Subject', 'string'), ('Status', 'picklist'), ('ContactId', 'reference', 'Contact')]),
+    'Campaign': ('Campaign', '701', [('Name', 'string'), ('Description', 'textarea'), ('Status', 'picklist'),
+                                     ('Type', 'picklist'), ('IsActive', 'boolean')]),
+    'CampaignMember': ('Campaign Member', '00v', [('CampaignId', 'reference', 'Campaign'), ('ContactId', 'reference', 'Contact'),
+                                                 ('LeadId', 'reference', 'Lead'), ('Status', 'picklist')]),
+    'Order': ('Order', '801', [('AccountId', 'reference', 'Account'), ('Status', 'picklist'), ('EffectiveDate', 'date')]),
+    'Product2': ('Product', '01t', [('Name', 'string'), ('Family', 'picklist'), ('IsActive', 'boolean')]),
+    'Asset': ('Asset', '02i', [('Name', 'string'), ('ContactId', 'reference', 'Contact'), ('Product2Id', 'reference', 'Product2')]),
+    # Data Cloud data model objects (read-only)
+    'ssot__Individual__dlm': ('Individual (Data Cloud)', '1dl', [('ssot__Id__c', 'string'), ('ssot__FirstName__c', 'string'),
+                                                               ('ssot__LastName__c', 'string')]),
+    'UnifiedIndividual__dlm': ('Unified Individual', '1du', [('ssot__Id__c', 'string'), ('ssot__FirstName__c', 'string'),
+                                                            ('ssot__LastName__c', 'string')]),
+    'ssot__Lead__dlm': ('Lead (Data Cloud)', '1dq', [('ssot__Id__c', 'string'), ('ssot__Email__c', 'email')]),
+    'BU2_EmailEngagement__dlm': ('Email Engagement', '1de', [('IndividualId__c', 'string'), ('EngagementChannelActionId__c', 'string'),
+                                                            ('EmailName__c', 'string')]),
+    'BU2_MessageEngagement__dlm': ('Message Engagement', '1dm', [('IndividualId__c', 'string'), ('EngagementChannelTypeId__c', 'string'),
+                                                                ('EngagementChannelActionId__c', 'string')]),
+    'E_Commerce_App_Behavioral_Event_E4C9EA42__dlm': ('Behavioral Event', '1db', [
+        ('IndividualId__c', 'string'), ('ItemViewedWeb_productName__c', 'string'),
+        ('AddToCartWeb_productName__c', 'string'), ('productPurchaseWeb_productName__c', 'string')]),
+    'ExternalOrders__dlm': ('External Order', '1do', [('IndividualId__c', 'string'), ('ProductName__c', 'string'),
+                                                     ('Amount__c', 'currency')]),
+}
+
+REQUIRED_FIELDS = {
+    'Account': ['Name'], 'Contact': ['LastName'], 'Lead': ['LastName', 'Company'], 'Campaign': ['Name'],
+    'CampaignMember': ['CampaignId'], 'Opportunity': ['Name', 'StageName', 'CloseDate'], 'Product2': ['Name'],
+}
+
+STANDARD_ACTIONS = {
+    'emailSimple': ('Send Email', ['emailAddresses', 'emailSubject', 'emailBody']),
+    'chatterPost': ('Post to Chatter', ['text', 'subjectNameOrId']),
+}
+
+# (engagement field, EngagementChannelActionId__c) per channel, as DataCloudAnalytics maps them
+EMAIL_ACTIONS = [('email_campaigns_received', '1'), ('email_opens', '2'), ('email_clicks', '3'),
+                 ('email_bounces', '4'), ('email_unsubscribes', '5')]
+MESSAGE_ACTIONS = {'4': [('sms_sends', '1'), ('sms_opens', '2'), ('sms_clicks', '3')],
+                   '5': [('push_sends', '1'), ('push_opens', '2'), ('push_clicks', '3')],
+                   '6': [('whatsapp_sends', '1'), ('whatsapp_reads', '2'), ('whatsapp_replies', '3')]}
+
+
+class SalesforceError(Exception):
+    """An API error, returned as [{'message', 'errorCode'}] with an HTTP status"""
+
+    def __init__(self, message, error_code='INVALID_REQUEST', status=400):
+        super().__init__(message)
+        self.error_code = error_code
+        self.status = status
+
+    def to_response(self):
+        return jsonify([{'message': str(self), 'errorCode': self.error_code}]), self.status
+
+
+# ----------------------------------------------------------------------
+# SOQL
+# ----------------------------------------------------------------------
+
+_TOKEN = re.compile(r"""\s*(?:
+    (?P<string>'(?:[^'\\]|\\.)*')
+  | (?P<date>\d{4}-\d{2}-\d{2}(?:T\d{2}:\d{2}:\d{2}(?:\.\d+)?(?:Z|[+-]\d{2}:\d{2}))?)
+  | (?P<number>-?\d+(?:\.\d+)?)
+  | (?P<op><=|>=|!=|<>|=|<|>)
+  | (?P<punct>[(),])
+  | (?P<word>[A-Za-z_][A-Za-z0-9_.]*)
+)""", re.VERBOSE)
+_UNESCAPE = re.compile(r'\\(.)')
+_ESCAPES = {'n': '\n', 'r': '\r', 't': '\t'}
+AGGREGATES = ('COUNT', 'SUM', 'AVG', 'MIN', 'MAX')
+
+
+def _tokenize(soql):
+    tokens, position, text = [], 0, soql.strip()
+    while position < len(text):
+        match = _TOKEN.match(text, position)
+        if not match or match.end() == position:
+            raise SalesforceError(f"unexpected token: '{text[position:position + 20]}'", 'MALFORMED_QUERY')
+        kind = match.lastgroup
+        value = match.group(kind)
+        if kind == 'string':
+            value = _UNESCAPE.sub(lambda m: _ESCAPES.get(m.group(1), m.group(1)), value[1:-1])
+        elif kind == 'number':
+            value = float(value) if '.' in value else int(value)
+        tokens.append((kind, value))
+        position = match.end()
+    return tokens
+
+
+class _Parser:
+    """Recursive-descent parser for the SOQL subset the app and the SOQL builder produce"""
+
+    def __init__(self, soql):
+        self.tokens = _tokenize(soql)
+        self.position = 0
+
+    def peek(self, offset=0):
+        index = self.position + offset
+        return self.tokens[index] if index < len(self.tokens) else (None, None)
+
+    def next(self):
+        token = self.peek()
+        if token[0] is None:
+            raise SalesforceError('unexpected end of query', 'MALFORMED_QUERY')
+        self.position += 1
+        return token
+
+    def is_keyword(self, *words):
+        kind, value = self.peek()
+        return kind == 'word' and value.upper() in words
+
+    def expect_keyword(self, word):
+        kind, value = self.next()
+        if kind != 'word' or value.upper() != word:
+            raise SalesforceError(f"expecting '{word}', found '{value}'", 'MALFORMED_QUERY')
+
+    def expect_punct(self, char):
+        kind, value = self.next()
+        if kind != 'punct' or value != char:
+            raise SalesforceError(f"expecting '{char}', found '{value}'", 'MALFORMED_QUERY')
+
+    def identifier(self):
+        kind, value = self.next()
+        if kind != 'word':
+            raise SalesforceError(f"expecting a field name, found '{value}'", 'MALFORMED_QUERY')
+        return value
+
+    def parse(self):
+        query = {'where': None, 'group_by': [], 'order_by': [], 'limit': None, 'offset': 0}
+        self.expect_keyword('SELECT')
+        query['fields'] = self.select_list()
+        self.expect_keyword('FROM')
+        query['object'] = self.identifier()
+        if self.is_keyword('WHERE'):
+            self.next()
+            query['where'] = self.expression()
+        if self.is_keyword('GROUP'):
+            self.next()
+            self.expect_keyword('BY')
+            query['group_by'] = self.identifier_list()
+        if self.is_keyword('ORDER'):
+            self.next()
+            self.expect_keyword('BY')
+            query['order_by'] = self.order_list()
+        if self.is_keyword('LIMIT'):
+            self.next()
+            query['limit'] = self.integer()
+        if self.is_keyword('OFFSET'):
+            self.next()
+            query['offset'] = self.integer()
+        if self.peek()[0] is not None:
+            raise SalesforceError(f"unexpected token: '{self.peek()[1]}'", 'MALFORMED_QUERY')
+        return query
+
+    def integer(self):
+        kind, value = self.next()
+        if kind != 'number' or not isinstance(value, int) or value < 0:
+            raise SalesforceError(f"expecting a non-negative integer, found '{value}'", 'MALFORMED_QUERY')
+        return value
+
+    def select_list(self):
+        fields = []
+        while True:
+            name = self.identifier()
+            if name.upper() in AGGREGATES and self.peek() == ('punct', '('):
+                self.next()
+                argument = None if self.peek() == ('punct', ')') else self.identifier()
+                self.expect_punct(')')
+                alias = None
+                if self.peek()[0] == 'word' and not self.is_keyword('FROM'):
+                    alias = self.identifier()
+                fields.append(('aggregate', name.upper(), argument, alias))
+            else:
+                fields.append(('field', name))
+            if self.peek() != ('punct', ','):
+                return fields
+            self.next()
+
+    def identifier_list(self):
+        names = [self.identifier()]
+        while self.peek() == ('punct', ','):
+            self.next()
+            names.append(self.identifier())
+        return names
+
+    def order_list(self):
+        order = []
+        while True:
+            field = self.identifier()
+            descending = False
+            if self.is_keyword('ASC', 'DESC'):
+                descending = self.next()[1].upper() == 'DESC'
+            nulls_last = descending
+            if self.is_keyword('NULLS'):
+                self.next()
+                nulls_last = self.next()[1].upper() == 'LAST'
+            order.append((field, descending, nulls_last))
+            if self.peek() != ('punct', ','):
+                return order
+            self.next()
+
+    def expression(self):
+        terms = [self.term()]
+        while self.is_keyword('OR'):
+            self.next()
+            terms.append(self.term())
+        return terms[0] if len(terms) == 1 else ('or', terms)
+
+    def term(self):
+        factors = [self.factor()]
+        while self.is_keyword('AND'):
+            self.next()
+            factors.append(self.factor())
+        return factors[0] if len(factors) == 1 else ('and', factors)
+
+    def factor(self):
+        if self.is_keyword('NOT'):
+            self.next()
+            return ('not', self.factor())
+        if self.peek() == ('punct', '('):
+            self.next()
+            node = self.expression()
+            self.expect_punct(')')
+            return node
+
+        field = self.identifier()
+        negate = False
+        if self.is_keyword('NOT'):
+            self.next()
+            negate = True
+        if self.is_keyword('IN'):
+            self.next()
+            self.expect_punct('(')
+            values = [self.literal()]
+            while self.peek() == ('punct', ','):
+                self.next()
+                values.append(self.literal())
+            self.expect_punct(')')
+            return ('in', field, values, negate)
+        if self.is_keyword('LIKE'):
+            self.next()
+            pattern = self.literal()
+            return ('like', field, _like_regex(str(pattern)))
+        if negate:
+            raise SalesforceError("expecting 'IN' after 'NOT'", 'MALFORMED_QUERY')
+
+        kind, operator = self.next()
+        if kind != 'op':
+            raise SalesforceError(f"expecting a comparison operator, found '{operator}'", 'MALFORMED_QUERY')
+        return ('compare', field, '!=' if operator == '<>' else operator, self.literal())
+
+    def literal(self):
+        kind, value = self.next()
+        if kind in ('string', 'number', 'date'):
+            return value
+        if kind == 'word' and value.lower() in ('true', 'false'):
+            return value.lower() == 'true'
+        if kind == 'word' and value.lower() == 'null':
+            return None
+        raise SalesforceError(f"unsupported value: '{value}'", 'MALFORMED_QUERY')
+
+
+def _like_regex(pattern):
+    parts, index = [], 0
+    while index < len(pattern):
+        char = pattern[index]
+        if char == '\\' and index + 1 < len(pattern):
+            parts.append(re.escape(pattern[index + 1]))
+            index += 2
+            continue
+        parts.append('.*' if char == '%' else '.' if char == '_' else re.escape(char))
+        index += 1
+    return re.compile(''.join(parts) + r'\Z', re.IGNORECASE | re.DOTALL)
+
+
+def _number(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _compare(actual, operator, literal):
+    if literal is None or actual is None or actual == '':
+        both_null = literal is None and (actual is None or actual == '')
+        return both_null if operator == '=' else (not both_null if operator == '!=' else False)
+    if isinstance(literal, bool):
+        actual = actual if isinstance(actual, bool) else str(actual).lower() == 'true'
+    elif isinstance(literal, (int, float)):
+        actual = _number(actual)
+        if actual is None:
+            return operator == '!='
+    else:
+        actual, literal = str(actual).lower(), literal.lower()
+    if operator == '=':
+        return actual == literal
+    if operator == '!=':
+        return actual != literal
+    if isinstance(literal, bool):
+        raise SalesforceError('Boolean fields only support = and !=', 'MALFORMED_QUERY')
+    if operator == '<':
+        return actual < literal
+    if operator == '<=':
+        return actual <= literal
+    if operator == '>':
+        return actual > literal
+    return actual >= literal
+
+
+def _matches(node, record):
+    kind = node[0]
+    if kind == 'and':
+        return all(_matches(child, record) for child in node[1])
+    if kind == 'or':
+        return any(_matches(child, record) for child in node[1])
+    if kind == 'not':
+        return not _matches(node[1], record)
+    if kind == 'in':
+        _, field, values, negate = node
+        found = any(_compare(record.get(field), '=', value) for value in values)
+        return found != negate
+    if kind == 'like':
+        value = record.get(node[1])
+        return value is not None and bool(node[2].match(str(value)))
+    _, field, operator, literal = node
+    return _compare(record.get(field), operator, literal)
+
+
+def _sort_key(value):
+    if value is None or value == '':
+        return (1, 0, '')
+    number = value if isinstance(value, (int, float)) and not isinstance(value, bool) else None
+    return (0, 0, number) if number is not None else (0, 1, str(value).lower())
+
+
+def _aggregate(function, argument, rows):
+    if function == 'COUNT':
+        return len(rows) if argument is None else sum(1 for row in rows if row.get(argument) not in (None, ''))
+    values = [number for number in (_number(row.get(argument)) for row in rows) if number is not None]
+    if not values:
+        return None
+    if function == 'SUM':
+        return sum(values)
+    if function == 'AVG':
+        return sum(values) / len(values)
+    return min(values) if function == 'MIN' else max(values)
+
+
+# ----------------------------------------------------------------------
+# Org data
+# ----------------------------------------------------------------------
+
+def _now():
+    return datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.000+0000')
+
+
+def _split_list(value):
+    return [item.strip() for item in str(value or '').split(',') if item.strip()]
+
+
+def _count(record, field):
+    try:
+        return max(0, int(float(record.get(field) or 0)))
+    except (TypeError, ValueError):
+        return 0
+
+
+class MockOrg:
+    """In-memory sObject tables, loaded from the data/ files the first time each is used"""
+
+    def __init__(self, data_dir='data'):
+        self.data_dir = data_dir
+        self._tables = {}
+        self._fields = {name: self._field_map(name) for name in SOBJECTS}
+        self._counters = {}
+        self._engagement = None
+        self._lock = threading.RLock()
+
+    # ------------------------------------------------------------------
+    # Schema
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _field_map(name):
+        fields = [('Id', 'id'), ('CreatedDate', 'datetime')] + SOBJECTS[name][2]
+        return {field[0].lower(): field for field in fields}
+
+    def sobject(self, name):
+        """Canonical sObject name (API names are case-insensitive)"""
+        for candidate in SOBJECTS:
+            if candidate.lower() == str(name).lower():
+                return candidate
+        raise SalesforceError(f"sObject type '{name}' is not supported.", 'NOT_FOUND', 404)
+
+    def field(self, sobject, name):
+        field = self._fields[sobject].get(str(name).lower())
+        if field is None:
+            raise SalesforceError(f"No such column '{name}' on entity '{sobject}'.", 'INVALID_FIELD')
+        return field[0]
+
+    def is_writable(self, sobject):
+        return not sobject.endswith('__dlm') and sobject not in ('Organization', 'User')
+
+    def describe_field(self, sobject, field):
+        name, kind = field[0], field[1]
+        system = name in ('Id', 'CreatedDate')
+        return {
+            'name': name,
+            'label': re.sub(r'(?<=[a-z])(?=[A-Z])', ' ', name.replace('__c', '').replace('ssot__', '').replace('_', ' ')),
+            'type': kind,
+            'length': 255 if kind in ('string', 'email', 'phone', 'picklist', 'textarea') else 18 if kind in ('id', 'reference') else 0,
+            'nillable': not system and name not in REQUIRED_FIELDS.get(sobject, []),
+            'createable': not system and self.is_writable(sobject),
+            'updateable': not system and self.is_writable(sobject),
+            'defaultedOnCreate': system,
+            'referenceTo': [field[2]] if kind == 'reference' else [],
+            'relationshipName': name[:-2] if kind == 'reference' and name.endswith('Id') else None,
+            'picklistValues': [],
+        }
+
+    def describe(self, name):
+        sobject = self.sobject(name)
+        children = [{'childSObject': child, 'field': field[0], 'relationshipName': f"{child}s"}
+                    for child, (_, _, fields) in SOBJECTS.items()
+                    for field in fields if field[1] == 'reference' and field[2] == sobject]
+        return dict(self.describe_global_entry(sobject), fields=[
+            self.describe_field(sobject, field) for field in self._fields[sobject].values()
+        ], childRelationships=children)
+
+    def describe_global_entry(self, sobject):
+        label, prefix, _ = SOBJECTS[sobject]
+        writable = self.is_writable(sobject)
+        return {
+            'name': sobject, 'label': label, 'labelPlural': f"{label}s", 'keyPrefix': prefix,
+            'custom': sobject.endswith('__c') or sobject.endswith('__dlm'),
+            'queryable': True, 'createable': writable, 'updateable': writable, 'deletable': writable,
+            'urls': {'sobject': f"/services/data/v{API_VERSION}/sobjects/{sobject}",
+                     'describe': f"/services/data/v{API_VERSION}/sobjects/{sobject}/describe"},
+        }
+
+    # ------------------------------------------------------------------
+    # Tables
+    # ------------------------------------------------------------------
+
+    def new_id(self, sobject):
+        prefix = SOBJECTS[sobject][1]
+        self._counters[sobject] = self._counters.get(sobject, 0) + 1
+        return f"{prefix}LM{self._counters[sobject]:010d}AAA"
+
+    def engagement(self):
+        if self._engagement is None:
+            path = os.path.join(self.data_dir, ENGAGEMENT_FILE)
+            if os.path.exists(path):
+                with open(path) as f:
+                    self._engagement = [record for record in json.load(f) if record.get('id')]
+            else:
+                self._engagement = []
+        return self._engagement
+
+    def table(self, sobject):
+        """{Id: record} of one sObject (caller holds the lock)"""
+        if sobject not in self._tables:
+            created = _now()
+            records = {}
+            for record in self._load(sobject):
+                record.setdefault('Id', self.new_id(sobject))
+                record.setdefault('CreatedDate', created)
+                records[record['Id']] = record
+            self._tables[sobject] = records
+        return self._tables[sobject]
+
+    def _load(self, sobject):
+        people = self.engagement()
+        if sobject == 'Organization':
+            return [{'Id': ORG_ID, 'Name': ORG_NAME, 'OrganizationType': 'Developer Edition', 'InstanceName': 'LOCAL'}]
+        if sobject == 'Individual':
+            return [{'Id': p['id'], 'FirstName': p.get('FirstName'), 'LastName': p.get('LastName'),
+                     'Name': p.get('Name'), 'Salutation': None} for p in people]
+        if sobject == 'Contact':
+            return [{'IndividualId': p['id'], 'AccountId': None, 'FirstName': p.get('FirstName'),
+                     'LastName': p.get('LastName'), 'Name': p.get('Name'), 'Email': p.get('Email'),
+                     'Phone': p.get('Phone'), 'MailingCountry': p.get('Country')} for p in people]
+        if sobject == 'ContactPointEmail':
+            return [{'ParentId': p['id'], 'EmailAddress': p['Email']} for p in people if p.get('Email')]
+        if sobject in ('ssot__Individual__dlm', 'UnifiedIndividual__dlm'):
+            return [{'ssot__Id__c': p['id'], 'ssot__FirstName__c': p.get('FirstName'),
+                     'ssot__LastName__c': p.get('LastName')} for p in people]
+        if sobject == 'BU2_EmailEngagement__dlm':
+            campaigns = {p['id']: _split_list(p.get('email_campaigns_engaged')) or ['Newsletter'] for p in people}
+            return [{'IndividualId__c': p['id'], 'EngagementChannelActionId__c': action,
+                     'EmailName__c': campaigns[p['id']][i % len(campaigns[p['id']])]}
+                    for p in people for field, action in EMAIL_ACTIONS for i in range(_count(p, field))]
+        if sobject == 'BU2_MessageEngagement__dlm':
+            return [{'IndividualId__c': p['id'], 'EngagementChannelTypeId__c': channel, 'EngagementChannelActionId__c': action}
+                    for p in people for channel, actions in MESSAGE_ACTIONS.items()
+                    for field, action in actions for _ in range(_count(p, field))]
+        if sobject == 'E_Commerce_App_Behavioral_Event_E4C9EA42__dlm':
+            events = []
+            for p in people:
+                browsed = _split_list(p.get('products_browsed'))
+                events += [{'IndividualId__c': p['id'], 'ItemViewedWeb_productName__c': product} for product in browsed]
+                events += [{'IndividualId__c': p['id'], 'AddToCartWeb_productName__c': product}
+                           for product in browsed[:_count(p, 'website_add_to_cart')]]
+                events += [{'IndividualId__c': p['id'], 'productPurchaseWeb_productName__c': product}
+                           for product in _split_list(p.get('products_purchased'))]
+            return events
+        if sobject == 'ExternalOrders__dlm':
+            orders = []
+            for p in people:
+                products = _split_list(p.get('products_purchased'))
+                amount = round((_number(p.get('total_order_value')) or 0) / len(products), 2) if products else 0
+                orders += [{'IndividualId__c': p['id'], 'ProductName__c': product, 'Amount__c': amount} for product in products]
+            return orders
+        return []
+
+    def reset(self):
+        with self._lock:
+            self._tables = {}
+            self._counters = {}
+            self._engagement = None
+
+    # ------------------------------------------------------------------
+    # Query
+    # ------------------------------------------------------------------
+
+    def _resolve(self, sobject, node):
+        """Replace field names in a WHERE tree with their canonical spelling"""
+        kind = node[0]
+        if kind in ('and', 'or'):
+            return (kind, [self._resolve(sobject, child) for child in node[1]])
+        if kind == 'not':
+            return ('not', self._resolve(sobject, node[1]))
+        return (kind, self.field(sobject, node[1])) + tuple(node[2:])
+
+    def query(self, soql):
+        """Run a SOQL statement -> (records, total_size); COUNT() returns no records"""
+        parsed = _Parser(soql).parse()
+        sobject = self.sobject(parsed['object'])
+        where = self._resolve(sobject, parsed['where']) if parsed['where'] else None
+        order_by = [(self.field(sobject, field), descending, nulls_last)
+                    for field, descending, nulls_last in parsed['order_by']]
+        group_by = [self.field(sobject, field) for field in parsed['group_by']]
+        selected = [('field', self.field(sobject, item[1])) if item[0] == 'field' else
+                    (item[0], item[1], item[2] and self.field(sobject, item[2]), item[3]) for item in parsed['fields']]
+
+        with self._lock:
+            rows = [record for record in self.table(sobject).values() if where is None or _matches(where, record)]
+
+        if selected == [('aggregate', 'COUNT', None, None)] and not group_by:
+            return [], len(rows)
+
+        if group_by or any(item[0] == 'aggregate' for item in selected):
+            for item in selected:
+                if item[0] == 'field' and item[1] not in group_by:
+                    raise SalesforceError(f"Field {item[1]} must be grouped or aggregated", 'MALFORMED_QUERY')
+            groups = OrderedDict()
+            for row in rows:
+                groups.setdefault(tuple(row.get(field) for field in group_by), []).append(row)
+            if not group_by and not groups:
+                groups[()] = []
+            results = []
+            for key, members in groups.items():
+                result, expression = {'attributes': {'type': 'AggregateResult'}}, 0
+                values = dict(zip(group_by, key))
+                for item in selected:
+                    if item[0] == 'field':
+                        result[item[1]] = values[item[1]]
+                    else:
+                        result[item[3] or f"expr{expression}"] = _aggregate(item[1], item[2], members)
+                        expression += item[3] is None
+                results.append(result)
+            rows, fields = results, None
+        else:
+            fields = [item[1] for item in selected]
+
+        for field, descending, nulls_last in reversed(order_by):
+            present = [row for row in rows if row.get(field) not in (None, '')]
+            missing = [row for row in rows if row.get(field) in (None, '')]
+            present.sort(key=lambda row: _sort_key(row.get(field)), reverse=descending)
+            rows = present + missing if nulls_last else missing + present
+        rows = rows[parsed['offset']:]
+        if parsed['limit'] is not None:
+            rows = rows[:parsed['limit']]
+
+        if fields is None:
+            return rows, len(rows)
+        records = [dict({'attributes': {'type': sobject, 'url': f"/services/data/v{API_VERSION}/sobjects/{sobject}/{row['Id']}"}},
+                        **{field: row.get(field) for field in fields}) for row in rows]
+        return records, len(records)
+
+    # ------------------------------------------------------------------
+    # CRUD
+    # ------------------------------------------------------------------
+
+    def _writable_fields(self, sobject, data):
+        if not self.is_writable(sobject):
+            raise SalesforceError(f"entity type cannot be inserted or updated: {sobject}", 'CANNOT_INSERT_UPDATE_ACTIVATE_ENTITY')
+        fields = {}
+        for name, value in data.items():
+            if name == 'attributes':
+                continue
+            field = self.field(sobject, name)
+            if field in ('Id', 'CreatedDate'):
+                raise SalesforceError(f"Unable to create/update fields: {field}.", 'INVALID_FIELD_FOR_INSERT_UPDATE')
+            fields[field] = value
+        return fields
+
+    @staticmethod
+    def _derive(sobject, record):
+        if sobject in ('Contact', 'Lead') and ('FirstName' in record or 'LastName' in record):
+            record['Name'] = ' '.join(part for part in (record.get('FirstName'), record.get('LastName')) if part)
+
+    def create(self, name, data):
+        sobject = self.sobject(name)
+        fields = self._writable_fields(sobject, data)
+        missing = [field for field in REQUIRED_FIELDS.get(sobject, []) if fields.get(field) in (None, '')]
+        if missing:
+            raise SalesforceError(f"Required fields are missing: [{', '.join(missing)}]", 'REQUIRED_FIELD_MISSING')
+        with self._lock:
+            table = self.table(sobject)
+            record = {'Id': self.new_id(sobject), 'CreatedDate': _now()}
+            record.update(fields)
+            self._derive(sobject, record)
+            table[record['Id']] = record
+        return record['Id']
+
+    def get(self, name, record_id, fields=None):
+        sobject = self.sobject(name)
+        with self._lock:
+            record = self.table(sobject).get(record_id)
+        if record is None:
+            raise SalesforceError('The requested resource does not exist', 'NOT_FOUND', 404)
+        names = [self.field(sobject, field) for field in fields] if fields else \
+            [field[0] for field in self._fields[sobject].values()]
+        return dict({'attributes': {'type': sobject, 'url': f"/services/data/v{API_VERSION}/sobjects/{sobject}/{record_id}"}},
+                    **{field: record.get(field) for field in names})
+
+    def update(self, name, record_id, data):
+        sobject = self.sobject(name)
+        fields = self._writable_fields(sobject, data)
+        with self._lock:
+            record = self.table(sobject).get(record_id)
+            if record is None:
+                raise SalesforceError('The requested resource does not exist', 'NOT_FOUND', 404)
+            record.update(fields)
+            self._derive(sobject, record)
+
+    def delete(self, name, record_id):
+        sobject = self.sobject(name)
+        if not self.is_writable(sobject):
+            raise SalesforceError(f"entity type cannot be deleted: {sobject}", 'INVALID_TYPE')
+        with self._lock:
+            if self.table(sobject).pop(record_id, None) is None:
+                raise SalesforceError('The requested resource does not exist', 'NOT_FOUND', 404)
+
+    def sobject_of_id(self, record_id):
+        prefix = str(record_id)[:3]
+        for name, (_, key_prefix, _) in SOBJECTS.items():
+            if key_prefix == prefix:
+                return name
+        raise SalesforceError(f"invalid cross reference id: {record_id}", 'INVALID_CROSS_REFERENCE_KEY')
+
+
+# ----------------------------------------------------------------------
+# Apex
+# ----------------------------------------------------------------------
+
+_TO_ADDRESSES = re.compile(r"setToAddresses\(\s*new\s+String\[\]\s*\{\s*'([^']*)'")
+_SUBJECT = re.compile(r"setSubject\(\s*'((?:[^'\\]|\\.)*)'")
+
+
+def execute_anonymous(body):
+    """Result of the tooling executeAnonymous call: a bracket/quote check stands in for the compiler"""
+    result = {'line': -1, 'column': -1, 'compiled': True, 'success': True, 'compileProblem': None,
+              'exceptionStackTrace': None, 'exceptionMessage': None}
+    stack, quoted, escaped = [], False, False
+    pairs = {')': '(', ']': '[', '}': '{'}
+    for line_number, line in enumerate(body.splitlines() or [''], start=1):
+        for column, char in enumerate(line, start=1):
+            if quoted:
+                if escaped:
+                    escaped = False
+                elif char == '\\':
+                    escaped = True
+                elif char == "'":
+                    quoted = False
+            elif char == "'":
+                quoted = True
+            elif char in '([{':
+                stack.append(char)
+            elif char in pairs and (not stack or stack.pop() != pairs[char]):
+                result.update(line=line_number, column=column, compiled=False, success=False,
+                              compileProblem=f"Unexpected token '{char}'.")
+                return result
+    if quoted or stack:
+        result.update(compiled=False, success=False, compileProblem='Unexpected end of input')
+    return result
+
+
+# ----------------------------------------------------------------------
+# Server
+# ----------------------------------------------------------------------
+
+SOAP_ENVELOPE = ('<?xml version="1.0" encoding="UTF-8"?>'
+                 '<soapenv:Envelope xmlns:soapenv="http://schemas.xmlsoap.org/soap/envelope/" {namespaces}>'
+                 '<soapenv:Body>{body}</soapenv:Body></soapenv:Envelope>')
+_SOAP_VALUE = '<(?:\\w+:)?{0}>(.*?)</(?:\\w+:)?{0}>'
+
+
+def _soap_value(xml, tag):
+    match = re.search(_SOAP_VALUE.format(tag), xml, re.DOTALL)
+    return match.group(1).strip() if match else None
+
+
+class MockSalesforce:
+    """
+    Flask app serving the mock org
+
+    latency_ms (+ up to jitter_ms) is added to every API request and a share error_rate
+    of them fail with error_status; both can be changed at runtime through
+    PUT /__mock__/config. password, when set, is the only password SOAP login accepts.
+    """
+
+    CONFIG_FIELDS = ('latency_ms', 'jitter_ms', 'error_rate', 'error_status', 'page_size')
+
+    def __init__(self, data_dir='data', latency_ms=0, jitter_ms=0, error_rate=0.0, error_status=503,
+                 page_size=DEFAULT_PAGE_SIZE, password=None, seed=None):
+        self.org = MockOrg(data_dir)
+        self.config = {'latency_ms': latency_ms, 'jitter_ms': jitter_ms, 'error_rate': error_rate,
+                       'error_status': error_status, 'page_size': page_size}
+        self.password = password
+        self.sessions = {}
+        self.cursors = OrderedDict()
+        self.outbox = []
+        self.stats = {'requests': {}, 'injected_errors': 0}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.app = self._create_app()
+
+    # ------------------------------------------------------------------
+    # Helpers
+    # ------------------------------------------------------------------
+
+    def _inject(self):
+        """Latency and random failures for one API request (None = carry on)"""
+        with self._lock:
+            delay = self.config['latency_ms'] + self._random.uniform(0, self.config['jitter_ms'])
+            fail = self._random.random() < self.config['error_rate']
+            if fail:
+                self.stats['injected_errors'] += 1
+        if delay > 0:
+            time.sleep(delay / 1000)
+        if fail:
+            return SalesforceError('Injected failure (mock error_rate)', 'SERVER_UNAVAILABLE', self.config['error_status']).to_response()
+        return None
+
+    def _authenticate(self):
+        header = request.headers.get('Authorization', '')
+        token = header.split(' ', 1)[1] if ' ' in header else ''
+        if token not in self.sessions:
+            raise SalesforceError('Session expired or invalid', 'INVALID_SESSION_ID', 401)
+        return self.sessions[token]
+
+    def _page_size(self):
+        options = request.headers.get('Sforce-Query-Options', '')
+        match = re.search(r'batchSize\s*=\s*(\d+)', options)
+        size = int(match.group(1)) if match else self.config['page_size']
+        return max(1, min(size, self.config['page_size']))
+
+    def _page(self, locator, records, offset, total_size, page_size):
+        page = records[offset:offset + page_size]
+        result = {'totalSize': total_size, 'done': offset + page_size >= len(records), 'records': page}
+        if not result['done']:
+            with self._lock:
+                self.cursors[locator] = records
+                self.cursors.move_to_end(locator)
+                while len(self.cursors) > MAX_CURSORS:
+                    self.cursors.popitem(last=False)
+            result['nextRecordsUrl'] = f"/services/data/v{API_VERSION}/query/{locator}-{offset + page_size}"
+        return result
+
+    def _login(self):
+        body = request.get_data(as_text=True)
+        username = _soap_value(body, 'username')
+        password = _soap_value(body, 'password')
+        if not username or password is None or (self.password is not None and password != self.password):
+            fault = ('<soapenv:Fault><faultcode>sf:INVALID_LOGIN</faultcode><faultstring>INVALID_LOGIN: Invalid username, '
+                     'password, security token; or user locked out.</faultstring></soapenv:Fault>')
+            return Response(SOAP_ENVELOPE.format(namespaces='xmlns:sf="urn:fault.partner.soap.sforce.com"', body=fault),
+                            status=500, content_type='text/xml; charset=utf-8')
+
+        username = username.replace('&amp;', '&').replace('&lt;', '<').replace('&gt;', '>')
+        with self.org._lock:
+            users = self.org.table('User')
+            user = next((u for u in users.values() if u['Username'] == username), None)
+            if user is None:
+                user = {'Id': self.org.new_id('User'), 'CreatedDate': _now(), 'Username': username,
+                        'Name': username.split('@')[0], 'Email': username}
+                users[user['Id']] = user
+        session_id = f"{ORG_ID}!{secrets.token_urlsafe(32)}"
+        with self._lock:
+            self.sessions[session_id] = user['Id']
+
+        base = request.host_url.rstrip('/')
+        result = (f"<loginResponse><result>"
+                  f"<metadataServerUrl>{base}/services/Soap/m/{API_VERSION}/{ORG_ID}</metadataServerUrl>"
+                  f"<passwordExpired>false</passwordExpired><sandbox>true</sandbox>"
+                  f"<serverUrl>{base}/services/Soap/u/{API_VERSION}/{ORG_ID}</serverUrl>"
+                  f"<sessionId>{session_id}</sessionId><userId>{user['Id']}</userId>"
+                  f"<userInfo><organizationId>{ORG_ID}</organizationId><organizationName>{ORG_NAME}</organizationName>"
+                  f"<userEmail>{escape(user['Email'])}</userEmail><userFullName>{escape(user['Name'])}</userFullName>"
+                  f"<userId>{user['Id']}</userId><userName>{escape(username)}</userName></userInfo>"
+                  f"</result></loginResponse>")
+        return Response(SOAP_ENVELOPE.format(namespaces='xmlns="urn:partner.soap.sforce.com"', body=result),
+                        content_type='text/xml; charset=utf-8')
+
+    def _invoke_action(self, action, inputs, required):
+        results = []
+        for values in inputs:
+            missing = [name for name in required if not values.get(name)]
+            if missing:
+                results.append({'actionName': action, 'isSuccess': False, 'outputValues': None,
+                                'errors': [{'statusCode': 'REQUIRED_FIELD_MISSING',
+                                            'message': f"Missing required input parameter: {missing[0]}"}]})
+                continue
+            if action == 'emailSimple':
+                with self._lock:
+                    self.outbox.append({'to': values['emailAddresses'], 'subject': values['emailSubject'],
+                                        'body_length': len(values['emailBody']), 'format': values.get('emailFormat', 'PlainText'),
+                                        'via': 'emailSimple', 'sent_at': _now()})
+            results.append({'actionName': action, 'isSuccess': True, 'errors': None, 'outputValues': {}})
+        return results
+
+    def _collection_results(self, records, operation, all_or_none):
+        results, created = [], []
+        for record in records:
+            try:
+                record_id = operation(record)
+                created.append(record_id)
+                results.append({'id': record_id, 'success': True, 'errors': []})
+            except SalesforceError as e:
+                if all_or_none:
+                    for record_id in created:
+                        self.org.delete(self.org.sobject_of_id(record_id), record_id)
+                    error = {'statusCode': 'ALL_OR_NONE_OPERATION_ROLLED_BACK', 'message': 'Record rolled back because not all records were valid', 'fields': []}
+                    return [{'id': None, 'success': False, 'errors': [error]} for _ in records]
+                results.append({'id': record.get('Id'), 'success': False,
+                                'errors': [{'statusCode': e.error_code, 'message': str(e), 'fields': []}]})
+        return results
+
+    # ------------------------------------------------------------------
+    # Routes
+    # ------------------------------------------------------------------
+
+    def _create_app(self):
+        app = Flask(__name__)
+        app.url_map.strict_slashes = False
+        api = "/services/data/v<version>"
+
+        @app.before_request
+        def inject_and_count():
+            if request.path.startswith('/__mock__'):
+                return None
+            endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+            with self._lock:
+                key = f"{request.method} {endpoint}"
+                self.stats['requests'][key] = self.stats['requests'].get(key, 0) + 1
+            return self._inject()
+
+        @app.errorhandler(SalesforceError)
+        def salesforce_error(e):
+            return e.to_response()
+
+        @app.route('/services/Soap/u/<version>', methods=['POST'])
+        @app.route('/services/Soap/u/<version>/<org_id>', methods=['POST'])
+        def soap_login(version, org_id=None):
+            return self._login()
+
+        @app.route('/services/data')
+        def versions():
+            return jsonify([{'label': 'Mock', 'url': f"/services/data/v{API_VERSION}", 'version': API_VERSION}])
+
+        @app.route(f"{api}/query")
+        @app.route(f"{api}/queryAll")
+        def query(version):
+            self._authenticate()
+            soql = request.args.get('q')
+            if not soql:
+                raise SalesforceError("Missing query parameter 'q'", 'MALFORMED_QUERY')
+            records, total_size = self.org.query(soql)
+            return jsonify(self._page(secrets.token_hex(8), records, 0, total_size, self._page_size()))
+
+        @app.route(f"{api}/query/<cursor>")
+        def query_more(version, cursor):
+            self._authenticate()
+            locator, _, offset = cursor.rpartition('-')
+            with self._lock:
+                records = self.cursors.get(locator)
+            if records is None or not offset.isdigit():
+                raise SalesforceError('invalid query locator', 'INVALID_QUERY_LOCATOR')
+            return jsonify(self._page(locator, records, int(offset), len(records), self._page_size()))
+
+        @app.route(f"{api}/sobjects")
+        def describe_global(version):
+            self._authenticate()
+            return jsonify({'encoding': 'UTF-8', 'maxBatchSize': 200,
+                            'sobjects': [self.org.describe_global_entry(name) for name in SOBJECTS]})
+
+        @app.route(f"{api}/sobjects/<name>", methods=['GET', 'POST'])
+        def sobject(version, name):
+            self._authenticate()
+            if request.method == 'POST':
+                record_id = self.org.create(name, request.get_json(force=True) or {})
+                return jsonify({'id': record_id, 'success': True, 'errors': []}), 201
+            return jsonify({'objectDescribe': self.org.describe_global_entry(self.org.sobject(name)), 'recentItems': []})
+
+        @app.route(f"{api}/sobjects/<name>/describe")
+        def describe(version, name):
+            self._authenticate()
+            return jsonify(self.org.describe(name))
+
+        @app.route(f"{api}/sobjects/<name>/<record_id>", methods=['GET', 'PATCH', 'DELETE'])
+        def record(version, name, record_id):
+            self._authenticate()
+            if request.method == 'PATCH':
+                self.org.update(name, record_id, request.get_json(force=True) or {})
+                return '', 204
+            if request.method == 'DELETE':
+                self.org.delete(name, record_id)
+                return '', 204
+            fields = request.args.get('fields')
+            return jsonify(self.org.get(name, record_id, fields.split(',') if fields else None))
+
+        @app.route(f"{api}/composite/sobjects", methods=['POST', 'PATCH', 'DELETE'])
+        def collections(version):
+            self._authenticate()
+            if request.method == 'DELETE':
+                ids = [i for i in request.args.get('ids', '').split(',') if i]
+                if len(ids) > 200:
+                    raise SalesforceError('Maximum number of records exceeded (200)', 'EXCEEDED_ID_LIMIT')
+                records = [{'Id': record_id} for record_id in ids]
+                operation = lambda r: self.org.delete(self.org.sobject_of_id(r['Id']), r['Id']) or r['Id']
+                all_or_none = request.args.get('allOrNone', 'false').lower() == 'true'
+            else:
+                payload = request.get_json(force=True) or {}
+                records = payload.get('records') or []
+                all_or_none = bool(payload.get('allOrNone'))
+                if len(records) > 200:
+                    raise SalesforceError('Maximum number of records exceeded (200)', 'EXCEEDED_ID_LIMIT')
+                for r in records:
+                    if not (r.get('attributes') or {}).get('type'):
+                        raise SalesforceError('Each record needs attributes.type', 'INVALID_TYPE')
+                if request.method == 'POST':
+                    operation = lambda r: self.org.create(r['attributes']['type'], r)
+                else:
+                    def operation(r):
+                        if not r.get('Id'):
+                            raise SalesforceError('Id is required for update', 'MISSING_ARGUMENT')
+                        self.org.update(r['attributes']['type'], r['Id'], {k: v for k, v in r.items() if k != 'Id'})
+                        return r['Id']
+            return jsonify(self._collection_results(records, operation, all_or_none))
+
+        @app.route(f"{api}/composite/sobjects/<name>", methods=['GET', 'POST'])
+        def collection_retrieve(version, name):
+            self._authenticate()
+            if request.method == 'POST':
+                payload = request.get_json(force=True) or {}
+                ids, fields = payload.get('ids') or [], payload.get('fields') or []
+            else:
+                ids = [i for i in request.args.get('ids', '').split(',') if i]
+                fields = [f for f in request.args.get('fields', '').split(',') if f]
+            if not fields:
+                raise SalesforceError("The 'fields' parameter is required", 'MISSING_ARGUMENT')
+            records = []
+            for record_id in ids:
+                try:
+                    records.append(self.org.get(name, record_id, fields))
+                except SalesforceError:
+                    records.append(None)
+            return jsonify(records)
+
+        @app.route(f"{api}/actions/standard")
+        def standard_actions(version):
+            self._authenticate()
+            return jsonify({'actions': [{'name': name, 'label': label, 'type': 'STANDARD',
+                                         'url': f"/services/data/v{API_VERSION}/actions/standard/{name}"}
+                                        for name, (label, _) in STANDARD_ACTIONS.items()]})
+
+        @app.route(f"{api}/actions/standard/<action>", methods=['POST'])
+        @app.route(f"{api}/actions/custom/<kind>/<action>", methods=['POST'])
+        def invoke_action(version, action, kind=None):
+            self._authenticate()
+            if kind is None and action not in STANDARD_ACTIONS:
+                raise SalesforceError(f"Action not found: {action}", 'NOT_FOUND', 404)
+            payload = request.get_json(force=True) or {}
+            inputs = payload.get('inputs')
+            if not isinstance(inputs, list) or not inputs:
+                raise SalesforceError("Request body must contain a non-empty 'inputs' list", 'JSON_PARSER_ERROR')
+            required = STANDARD_ACTIONS[action][1] if kind is None else []
+            return jsonify(self._invoke_action(action, inputs, required))
+
+        @app.route(f"{api}/tooling/executeAnonymous")
+        def execute_anonymous_route(version):
+            self._authenticate()
+            body = request.args.get('anonymousBody', '')
+            result = execute_anonymous(body)
+            if result['success'] and 'Messaging.sendEmail' in body:
+                recipients = _TO_ADDRESSES.search(body)
+                subject = _SUBJECT.search(body)
+                with self._lock:
+                    self.outbox.append({'to': recipients.group(1) if recipients else None,
+                                        'subject': subject.group(1) if subject else None,
+                                        'body_length': len(body), 'format': 'Html', 'via': 'executeAnonymous', 'sent_at': _now()})
+            return jsonify(result)
+
+        @app.route('/__mock__/config', methods=['GET', 'PUT'])
+        def mock_config():
+            if request.method == 'PUT':
+                updates = request.get_json(force=True) or {}
+                unknown = set(updates) - set(self.CONFIG_FIELDS)
+                if unknown:
+                    return jsonify({'success': False, 'error': f"Unknown setting(s): {', '.join(sorted(unknown))}"}), 400
+                with self._lock:
+                    self.config.update(updates)
+            return jsonify({'success': True, 'config': self.config})
+
+        @app.route('/__mock__/stats')
+        def mock_stats():
+            with self._lock:
+                return jsonify({'success': True, 'sessions': len(self.sessions), 'open_cursors': len(self.cursors),
+                                'outbox': len(self.outbox), **self.stats})
+
+        @app.route('/__mock__/outbox')
+        def mock_outbox():
+            with self._lock:
+                return jsonify({'success': True, 'emails': list(self.outbox)})
+
+        @app.route('/__mock__/reset', methods=['POST'])
+        def mock_reset():
+            self.org.reset()
+            with self._lock:
+                self.sessions.clear()
+                self.cursors.clear()
+                self.outbox.clear()
+                self.stats = {'requests': {}, 'injected_errors': 0}
+            return jsonify({'success': True})
+
+        return app
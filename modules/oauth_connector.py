@@ -3,7 +3,6 @@ OAuth-based Salesforce Connection
 Uses browser-based authentication - no security token needed!
 """
 
-from simple_salesforce import Salesforce
 import webbrowser
 import http.server
 import socketserver
@@ -11,6 +10,8 @@ import urllib.parse
 from datetime import datetime
 import threading
 
+from modules.salesforce_connector import api_session
+
 class OAuthConnector:
     def __init__(self):
         self.sf = None
@@ -83,6 +84,7 @@ class OAuthConnector:
         }
         
         import requests
+        from simple_salesforce import Salesforce
         response = requests.post(token_url, data=token_data)
         
         if response.status_code != 200:
@@ -97,7 +99,8 @@ class OAuthConnector:
         # Create Salesforce connection with token
         self.sf = Salesforce(
             instance_url=self.instance_url,
-            session_id=self.access_token
+            session_id=self.access_token,
+            session=api_session(self.instance_url)
         )
         
         self.connected_at = datetime.now()
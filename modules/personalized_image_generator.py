@@ -8,13 +8,13 @@ import os
 import json
 import base64
 import io
+import logging
 from datetime import datetime
-from PIL import Image, ImageDraw, ImageFont
-import requests
-import cloudinary
-import cloudinary.uploader
-import replicate
-import urllib.request
+
+from modules.app_logging import debug_exc_info, get_logger, sampled
+from modules.metrics import span
+
+logger = get_logger(__name__)
 
 class PersonalizedImageGenerator:
     def __init__(self):
@@ -25,22 +25,38 @@ class PersonalizedImageGenerator:
         # Determine which API to use (default: Replicate, can be overridden)
         self.image_api = os.environ.get('IMAGE_GENERATION_API', 'replicate')  # 'replicate' or 'gemini'
         
-        # Configure Cloudinary
-        cloudinary.config(
-            cloud_name=os.environ.get('CLOUDINARY_CLOUD_NAME', 'demo'),
-            api_key=os.environ.get('CLOUDINARY_API_KEY', ''),
-            api_secret=os.environ.get('CLOUDINARY_API_SECRET', '')
-        )
-        
-        # Initialize Gemini client if API key is available
-        self.gemini_client = None
-        if self.gemini_api_key:
+        # Cloudinary, Replicate, PIL and the Gemini SDK are imported on first use - they
+        # dominate import time and most workers never generate an image
+        self._cloudinary_configured = False
+        self._gemini_client = None
+        self._gemini_failed = False
+    
+    @property
+    def gemini_client(self):
+        """Gemini client, created on first use if an API key is available"""
+        if self._gemini_client is None and self.gemini_api_key and not self._gemini_failed:
             try:
                 from google import genai
-                self.gemini_client = genai.Client(api_key=self.gemini_api_key)
-                print("✅ Google Gemini Nano Banana client initialized")
+                self._gemini_client = genai.Client(api_key=self.gemini_api_key)
+                logger.info("Google Gemini Nano Banana client initialized")
             except Exception as e:
-                print(f"⚠️ Could not initialize Gemini client: {e}")
+                self._gemini_failed = True
+                logger.warning("Could not initialize Gemini client: %s", e)
+        return self._gemini_client
+    
+    def _uploader(self):
+        """cloudinary.uploader, configured from the environment on first use"""
+        import cloudinary
+        import cloudinary.uploader
+        
+        if not self._cloudinary_configured:
+            cloudinary.config(
+                cloud_name=os.environ.get('CLOUDINARY_CLOUD_NAME', 'demo'),
+                api_key=os.environ.get('CLOUDINARY_API_KEY', ''),
+                api_secret=os.environ.get('CLOUDINARY_API_SECRET', '')
+            )
+            self._cloudinary_configured = True
+        return cloudinary.uploader
         
     def generate_personalized_image(self, individual_data, scenario_prompt=None):
         """
@@ -242,10 +258,11 @@ class PersonalizedImageGenerator:
             }
         
         try:
+            import requests
             from google.genai import types
             
-            print(f"🎨 Starting Gemini Nano Banana generation for {individual_data.get('Name', 'Unknown')}")
-            print(f"📝 Scenario: {scenario_prompt[:150]}...")
+            logger.debug("Starting Gemini generation for %s", individual_data.get('Name', 'Unknown'))
+            logger.debug("Scenario: %s...", scenario_prompt[:150])
             
             # Prepare face image for context (Gemini can use reference images)
             face_image_url = self._prepare_face_image(profile_pic_url)
@@ -259,31 +276,33 @@ class PersonalizedImageGenerator:
             )
             
             # Generate image with Gemini
-            print("⚡ Generating image with Gemini Nano Banana...")
+            logger.debug("Generating image with Gemini Nano Banana")
             
             # If we have a face image URL, download it and include as reference
             image_parts = []
             if face_image_url and face_image_url.startswith('http'):
                 try:
-                    response = requests.get(face_image_url, timeout=30)
+                    with span('image_api'):
+                        response = requests.get(face_image_url, timeout=30)
                     if response.status_code == 200:
                         face_image_data = response.content
                         image_parts.append(types.Part.from_bytes(
                             data=face_image_data,
                             mime_type="image/jpeg"
                         ))
-                        print(f"✅ Included reference face image")
+                        logger.debug("Included reference face image")
                 except Exception as e:
-                    print(f"⚠️ Could not include face reference: {e}")
+                    logger.warning("Could not include face reference: %s", e)
             
             # Add text prompt
             image_parts.append(enhanced_prompt)
             
             # Generate content
-            response = self.gemini_client.models.generate_content(
-                model="gemini-2.5-flash-image",
-                contents=image_parts,
-            )
+            with span('image_api'):
+                response = self.gemini_client.models.generate_content(
+                    model="gemini-2.5-flash-image",
+                    contents=image_parts,
+                )
             
             # Extract image from response - handle different response structures
             generated_image = None
@@ -317,11 +336,12 @@ class PersonalizedImageGenerator:
                                 generated_image = Image.open(io.BytesIO(part.inline_data.data))
                                 break
             
-            # Debug: print response structure
-            print(f"🔍 Response type: {type(response)}")
-            print(f"🔍 Response attributes: {dir(response)}")
-            if hasattr(response, 'candidates'):
-                print(f"🔍 Candidates: {len(response.candidates) if response.candidates else 0}")
+            # Response structure, for debugging
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Response type: %s", type(response))
+                logger.debug("Response attributes: %s", dir(response))
+                if hasattr(response, 'candidates'):
+                    logger.debug("Candidates: %d", len(response.candidates) if response.candidates else 0)
             
             if not generated_image:
                 return {
@@ -336,26 +356,27 @@ class PersonalizedImageGenerator:
             
             # Save image to Cloudinary with naming convention for email embedding
             individual_name = individual_data.get('Name', 'Unknown').replace(' ', '_')
-            print("☁️ Uploading generated image to Cloudinary...")
-            result = cloudinary.uploader.upload(
-                img_bytes,
-                folder="personalized_images_gemini",
-                public_id=f"gemini_{individual_name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}",
-                resource_type="image",
-                overwrite=False  # Keep all versions
-            )
+            logger.debug("Uploading generated image to Cloudinary")
+            with span('upload'):
+                result = self._uploader().upload(
+                    img_bytes,
+                    folder="personalized_images_gemini",
+                    public_id=f"gemini_{individual_name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}",
+                    resource_type="image",
+                    overwrite=False  # Keep all versions
+                )
             
             final_image_url = result.get('secure_url')
-            print(f"✅ Image generated and uploaded to Cloudinary: {final_image_url[:100]}...")
+            logger.info("Image generated and uploaded to Cloudinary: %s...", final_image_url[:100], extra=sampled())
             
             # Add promotional text overlay
             try:
                 final_image_with_text = self._add_promotional_overlay(final_image_url, individual_data)
                 if final_image_with_text:
                     final_image_url = final_image_with_text
-                    print(f"✅ Added promotional text overlay to image")
+                    logger.debug("Added promotional text overlay to image")
             except Exception as text_error:
-                print(f"⚠️ Could not add text overlay: {text_error}")
+                logger.warning("Could not add text overlay: %s", text_error)
             
             return {
                 'success': True,
@@ -373,9 +394,7 @@ class PersonalizedImageGenerator:
         except Exception as e:
             import traceback
             error_details = traceback.format_exc()
-            print(f"❌ Error during Gemini generation: {str(e)}")
-            print(f"❌ Full traceback:")
-            print(error_details)
+            logger.error("Gemini generation failed: %s\n%s", e, error_details)
             
             return {
                 'success': False,
@@ -396,7 +415,7 @@ class PersonalizedImageGenerator:
                 'error': 'REPLICATE_API_TOKEN not set. Please add it to Heroku config.'
             }
         
-        print(f"🔑 Replicate API key present: {self.replicate_api_key[:10]}...")
+        logger.debug("Replicate API key present: %s...", self.replicate_api_key[:10])
         
         # Prepare the face image (convert base64 to public URL via Cloudinary)
         face_image_url = self._prepare_face_image(profile_pic_url)
@@ -409,12 +428,14 @@ class PersonalizedImageGenerator:
         
         # Two-step process for face-swap
         try:
-            print(f"🎨 Starting face-swap generation for {individual_data.get('Name', 'Unknown')}")
-            print(f"👤 Face image URL: {face_image_url[:100]}...")
-            print(f"📝 Scenario: {scenario_prompt[:150]}...")
+            import replicate
+            
+            logger.debug("Starting face-swap generation for %s", individual_data.get('Name', 'Unknown'))
+            logger.debug("Face image URL: %s...", face_image_url[:100])
+            logger.debug("Scenario: %s...", scenario_prompt[:150])
             
             # Step 1: Generate base scene image with SDXL
-            print("⚡ Step 1: Generating base scene with SDXL...")
+            logger.debug("Step 1: generating base scene with SDXL")
             
             # Enhanced prompt for better accuracy
             enhanced_prompt = f"{scenario_prompt}, professional photography, clear face details, accurate human anatomy, photorealistic skin texture, natural body proportions, realistic fitness setting"
@@ -431,21 +452,22 @@ class PersonalizedImageGenerator:
             else:
                 gender_negative = "male, man, masculine features, male body, beard, mustache, masculine clothing"
             
-            base_output = replicate.run(
-                "stability-ai/sdxl:7762fd07cf82c948538e41f63f77d685e02b063e37e496e96eefd46c929f9bdc",
-                input={
-                    "prompt": enhanced_prompt,
-                    "negative_prompt": f"blurry, distorted face, wrong gender, {gender_negative}, cartoon, anime, low quality, bad anatomy, deformed, disfigured, poorly drawn face, mutation, gym, indoor, ceiling, roof",
-                    "width": 1024,
-                    "height": 768,
-                    "num_inference_steps": 40,
-                    "guidance_scale": 8.5
-                }
-            )
+            with span('image_api'):
+                base_output = replicate.run(
+                    "stability-ai/sdxl:7762fd07cf82c948538e41f63f77d685e02b063e37e496e96eefd46c929f9bdc",
+                    input={
+                        "prompt": enhanced_prompt,
+                        "negative_prompt": f"blurry, distorted face, wrong gender, {gender_negative}, cartoon, anime, low quality, bad anatomy, deformed, disfigured, poorly drawn face, mutation, gym, indoor, ceiling, roof",
+                        "width": 1024,
+                        "height": 768,
+                        "num_inference_steps": 40,
+                        "guidance_scale": 8.5
+                    }
+                )
             
             # Get the generated image URL
-            print(f"🔍 Base output type: {type(base_output)}")
-            print(f"🔍 Base output value: {base_output}")
+            logger.debug("Base output type: %s", type(base_output))
+            logger.debug("Base output value: %s", base_output)
             
             if isinstance(base_output, list) and len(base_output) > 0:
                 target_image_url = base_output[0]
@@ -455,21 +477,22 @@ class PersonalizedImageGenerator:
             if not target_image_url or target_image_url == 'None':
                 raise Exception(f"SDXL failed to generate base image. Output was: {base_output}")
             
-            print(f"✅ Base scene generated: {target_image_url[:100]}...")
+            logger.debug("Base scene generated: %s...", target_image_url[:100])
             
             # Step 2: Face-swap using Replicate's face-swap model
-            print("🔄 Step 2: Swapping face with profile picture...")
-            swap_output = replicate.run(
-                "lucataco/faceswap:9a4298548422074c3f57258c5d544497314ae4112df80d116f0d2109e843d20d",
-                input={
-                    "target_image": target_image_url,
-                    "swap_image": face_image_url
-                }
-            )
+            logger.debug("Step 2: swapping face with profile picture")
+            with span('image_api'):
+                swap_output = replicate.run(
+                    "lucataco/faceswap:9a4298548422074c3f57258c5d544497314ae4112df80d116f0d2109e843d20d",
+                    input={
+                        "target_image": target_image_url,
+                        "swap_image": face_image_url
+                    }
+                )
             
             # Get the face-swapped image URL
-            print(f"🔍 Swap output type: {type(swap_output)}")
-            print(f"🔍 Swap output value: {swap_output}")
+            logger.debug("Swap output type: %s", type(swap_output))
+            logger.debug("Swap output value: %s", swap_output)
             
             if isinstance(swap_output, list) and len(swap_output) > 0:
                 final_image_url = swap_output[0]
@@ -478,19 +501,19 @@ class PersonalizedImageGenerator:
             
             if not final_image_url or final_image_url == 'None':
                 # Face swap failed, but we have the base image
-                print(f"⚠️ Face-swap failed, using base image instead")
+                logger.warning("Face-swap failed, using base image instead")
                 final_image_url = target_image_url
             
-            print(f"🎉 Face-swap complete: {final_image_url[:100]}...")
+            logger.info("Face-swap complete: %s...", final_image_url[:100], extra=sampled())
             
             # Add promotional text overlay to the image
             try:
                 final_image_with_text = self._add_promotional_overlay(final_image_url, individual_data)
                 if final_image_with_text:
                     final_image_url = final_image_with_text
-                    print(f"✅ Added promotional text overlay to image")
+                    logger.debug("Added promotional text overlay to image")
             except Exception as text_error:
-                print(f"⚠️ Could not add text overlay: {text_error}")
+                logger.warning("Could not add text overlay: %s", text_error)
             
             return {
                 'success': True,
@@ -508,11 +531,7 @@ class PersonalizedImageGenerator:
         except Exception as e:
             import traceback
             error_details = traceback.format_exc()
-            print(f"❌ Error during generation: {str(e)}")
-            print(f"❌ Full traceback:")
-            print(error_details)
-            print(f"❌ Error type: {type(e).__name__}")
-            print(f"❌ Error args: {e.args}")
+            logger.error("Replicate generation failed (%s: %s)\n%s", type(e).__name__, e.args, error_details)
             
             return {
                 'success': False,
@@ -531,7 +550,6 @@ class PersonalizedImageGenerator:
             import requests
             from PIL import Image, ImageDraw, ImageFont
             from io import BytesIO
-            import cloudinary.uploader
             
             # Check if we should add any promotional messages
             health_profile = individual_data.get('health_profile', individual_data.get('Health_Profile'))
@@ -582,8 +600,9 @@ class PersonalizedImageGenerator:
                 return image_url
             
             # Download the image
-            print(f"📥 Downloading image to add overlay...")
-            response = requests.get(image_url)
+            logger.debug("Downloading image to add overlay")
+            with span('image_api'):
+                response = requests.get(image_url)
             img = Image.open(BytesIO(response.content))
             
             # Create drawing context
@@ -692,24 +711,23 @@ class PersonalizedImageGenerator:
             
             # Upload the modified image back to Cloudinary with naming for email embedding
             individual_name = individual_data.get('Name', 'Unknown').replace(' ', '_')
-            print(f"☁️ Uploading image with overlay to Cloudinary...")
-            result = cloudinary.uploader.upload(
-                output,
-                folder="personalized_images_with_text",
-                public_id=f"email_{individual_name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}",
-                resource_type="image",
-                overwrite=False  # Keep all versions for email embedding
-            )
+            logger.debug("Uploading image with overlay to Cloudinary")
+            with span('upload'):
+                result = self._uploader().upload(
+                    output,
+                    folder="personalized_images_with_text",
+                    public_id=f"email_{individual_name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}",
+                    resource_type="image",
+                    overwrite=False  # Keep all versions for email embedding
+                )
             
             modified_url = result.get('secure_url')
-            print(f"✅ Image with overlay uploaded to Cloudinary: {modified_url[:100]}...")
+            logger.debug("Image with overlay uploaded to Cloudinary: %s...", modified_url[:100])
             
             return modified_url
             
         except Exception as e:
-            print(f"⚠️ Error adding promotional overlay: {e}")
-            import traceback
-            print(traceback.format_exc())
+            logger.warning("Could not add promotional overlay: %s", e, exc_info=debug_exc_info(logger))
             # Return original image if overlay fails
             return image_url
     
@@ -727,21 +745,22 @@ class PersonalizedImageGenerator:
         if profile_pic_url.startswith('data:image'):
             try:
                 # Upload to Cloudinary
-                print("📤 Uploading base64 image to Cloudinary...")
-                result = cloudinary.uploader.upload(
-                    profile_pic_url,
-                    folder="profile_pictures",
-                    resource_type="image",
-                    transformation=[
-                        {'width': 512, 'height': 512, 'crop': 'fill', 'gravity': 'face'}
-                    ]
-                )
+                logger.debug("Uploading base64 image to Cloudinary")
+                with span('upload'):
+                    result = self._uploader().upload(
+                        profile_pic_url,
+                        folder="profile_pictures",
+                        resource_type="image",
+                        transformation=[
+                            {'width': 512, 'height': 512, 'crop': 'fill', 'gravity': 'face'}
+                        ]
+                    )
                 uploaded_url = result.get('secure_url')
-                print(f"✅ Uploaded successfully: {uploaded_url}")
+                logger.debug("Uploaded successfully: %s", uploaded_url)
                 return uploaded_url
                 
             except Exception as e:
-                print(f"❌ Error uploading image: {e}")
+                logger.error("Error uploading image: %s", e)
                 return profile_pic_url
         
         return profile_pic_url
@@ -751,9 +770,11 @@ class PersonalizedImageGenerator:
         Generate personalized images for a batch of individuals in a segment
         """
         results = []
+        total = min(len(individuals_data), max_images)
+        logger.info("Generating %d campaign images", total)
         
         for idx, individual in enumerate(individuals_data[:max_images]):
-            print(f"Generating image {idx+1}/{min(len(individuals_data), max_images)} for {individual.get('Name', 'Unknown')}")
+            logger.info("Generating image %d/%d for %s", idx + 1, total, individual.get('Name', 'Unknown'), extra=sampled())
             
             result = self.generate_personalized_image(individual)
             result['individual_name'] = individual.get('Name', 'Unknown')
@@ -3,19 +3,162 @@ Salesforce Connection Manager
 Handles authentication and connection to Salesforce
 """
 
-from simple_salesforce import Salesforce
+import os
+import uuid
 from datetime import datetime
+from urllib.parse import urlparse
+
+import requests
+
+from modules.metrics import span
+
+DEFAULT_LOGIN_URL = 'https://login.salesforce.com'
+API_VERSION = '59.0'
+
+
+def login_url():
+    """Login host - SF_LOGIN_URL points the app at another domain or the local mock server"""
+    return os.environ.get('SF_LOGIN_URL', DEFAULT_LOGIN_URL).rstrip('/')
+
+
+class TimedSession(requests.Session):
+    """requests session whose calls are timed as the 'salesforce' stage of the current request"""
+
+    def request(self, method, url, *args, **kwargs):
+        with span('salesforce'):
+            return super().request(method, url, *args, **kwargs)
+
+
+class PlainHttpSession(TimedSession):
+    """simple_salesforce always builds https:// URLs; send the ones for a plain-HTTP host over HTTP"""
+
+    def __init__(self, netloc):
+        super().__init__()
+        self.prefix = f'https://{netloc}/'
+        self.netloc = netloc
+
+    def request(self, method, url, *args, **kwargs):
+        if url.startswith(self.prefix):
+            url = f'http://{self.netloc}/' + url[len(self.prefix):]
+        return super().request(method, url, *args, **kwargs)
+
+
+def api_session(instance_url=None):
+    """requests session for a Salesforce connection (login and API calls)"""
+    if instance_url and instance_url.startswith('http://'):
+        return PlainHttpSession(urlparse(instance_url).netloc)
+    return TimedSession()
+
+
+def execute_anonymous(sf, apex_code):
+    """Run anonymous Apex through the tooling API"""
+    return sf.toolingexecute('executeAnonymous/', params={'anonymousBody': apex_code})
+
 
 class SalesforceManager:
-    def __init__(self):
+    """
+    The app's Salesforce connection, shared by every gunicorn worker
+
+    With a state backend, a login handled by one worker publishes the connection;
+    the other workers pick it up on their next request (sync), and a disconnect
+    anywhere drops it everywhere. Backends kept in memory (memory, Redis) carry the
+    session id so workers rebuild their client from it. On-disk backends (SQLite)
+    only get the connection metadata - a bearer token must not sit in a local file -
+    and each worker logs in itself through the reauthenticate callback given to sync.
+    """
+
+    SHARED_KEY = 'salesforce:connection'
+    SHARED_TTL = 8 * 60 * 60  # matches PERMANENT_SESSION_LIFETIME
+
+    def __init__(self, state=None):
+        self.state = state
         self.sf = None
         self.username = None
         self.instance_url = None
         self.org_id = None
         self.connected_at = None
+        self._login_id = None
+
+    @property
+    def shares_token(self):
+        """Whether the session id may be published to the state backend"""
+        return self.state is not None and not self.state.on_disk
+
+    def _publish(self):
+        """Share this worker's connection with the others"""
+        session_id = getattr(self.sf, 'session_id', None)
+        self._login_id = uuid.uuid4().hex if session_id else None
+        if self.state is None or not session_id:
+            return
+        shared = {
+            'login_id': self._login_id,
+            'instance_url': self.instance_url,
+            'username': self.username,
+            'org_id': self.org_id,
+            'connected_at': self.connected_at.isoformat() if self.connected_at else None
+        }
+        if self.shares_token:
+            shared['session_id'] = session_id
+        self.state.set(self.SHARED_KEY, shared, ex=self.SHARED_TTL)
+
+    def sync(self, reauthenticate=None):
+        """
+        Adopt the connection another worker published (or drop one that was disconnected)
+
+        When the shared connection carries no session id, reauthenticate() is called
+        to log this worker in; it returns a connected connector (SimpleAuthConnector)
+        or None when no credentials are at hand.
+        """
+        if self.state is None:
+            return
+        shared = self.state.get(self.SHARED_KEY)
+        if shared is None:
+            if self._login_id is not None:
+                self._clear()
+            return
+        if shared.get('login_id') == self._login_id:
+            return
+        if shared.get('session_id'):
+            from simple_salesforce import Salesforce
+            self.sf = Salesforce(
+                instance_url=shared['instance_url'],
+                session_id=shared['session_id'],
+                session=api_session(shared['instance_url'])
+            )
+        elif not (self.sf is not None and self.username == shared['username']
+                  and self.instance_url == shared['instance_url']):
+            connector = reauthenticate() if reauthenticate else None
+            if connector is None or connector.username != shared['username']:
+                return
+            self.sf = connector.sf
+        self.username = shared['username']
+        self.instance_url = shared['instance_url']
+        self.org_id = shared['org_id']
+        self.connected_at = datetime.fromisoformat(shared['connected_at']) if shared['connected_at'] else None
+        self._login_id = shared.get('login_id')
+
+    def adopt(self, connector):
+        """Use the connection of another connector (SimpleAuthConnector) as the app's connection"""
+        self.sf = connector.sf
+        self.username = connector.username
+        self.instance_url = connector.instance_url
+        self.org_id = connector.org_id
+        self.connected_at = connector.connected_at
+        self._publish()
     
     def connect(self, username, password, security_token=''):
         """Connect to Salesforce"""
+        if login_url() != DEFAULT_LOGIN_URL:
+            # Custom login host (sandbox, My Domain or the mock server) - SOAP login against it
+            from modules.simple_auth import SimpleAuthConnector
+            auth = SimpleAuthConnector()
+            auth.connect_soap(username, password, security_token)
+            self.adopt(auth)
+            return True
+        
+        # simple_salesforce (and zeep under it) is slow to import - only load it to connect
+        from simple_salesforce import Salesforce
+        
         # Try with security token first if provided
         if security_token and security_token.strip():
             try:
@@ -23,21 +166,24 @@ class SalesforceManager:
                     username=username,
                     password=password,
                     security_token=security_token,
-                    domain='login'
+                    domain='login',
+                    session=api_session()
                 )
             except Exception as e:
                 # If that fails, try concatenating (some orgs need this)
                 self.sf = Salesforce(
                     username=username,
                     password=password + security_token,
-                    domain='login'
+                    domain='login',
+                    session=api_session()
                 )
         else:
             # No security token - IP must be whitelisted
             self.sf = Salesforce(
                 username=username,
                 password=password,
-                domain='login'
+                domain='login',
+                session=api_session()
             )
         
         self.username = username
@@ -49,6 +195,7 @@ class SalesforceManager:
         if org_query['records']:
             self.org_id = org_query['records'][0]['Id']
         
+        self._publish()
         return True
     
     def is_connected(self):
@@ -82,7 +229,13 @@ class SalesforceManager:
             }
     
     def disconnect(self):
-        """Disconnect from Salesforce"""
+        """Disconnect from Salesforce (in every worker)"""
+        if self.state is not None:
+            self.state.delete(self.SHARED_KEY)
+        self._clear()
+
+    def _clear(self):
+        self._login_id = None
         self.sf = None
         self.username = None
         self.instance_url = None
@@ -0,0 +1,387 @@
+"""
+Segment Algebra
+Materializes segment membership as NumPy bitsets over a dense individual index
+and combines them with AND / OR / NOT, overlap matrices and cardinalities
+"""
+
+import json
+import threading
+
+import numpy as np
+
+from modules.app_logging import get_logger
+from modules.insights_frame import load_insights_frame
+from modules.telemetry_store import parse_timestamp
+
+# Number of set bits for every byte value, used for popcount on numpy < 2.0
+_POPCOUNT_TABLE = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+logger = get_logger(__name__)
+
+
+class IndividualIndex:
+    """Dense mapping between Individual ids and bit positions"""
+
+    def __init__(self, ids=None):
+        self.ids = []
+        self.positions = {}
+        for individual_id in ids or []:
+            self.add(individual_id)
+
+    def add(self, individual_id):
+        """Add an id if unseen, returns its position"""
+        position = self.positions.get(individual_id)
+        if position is None:
+            position = len(self.ids)
+            self.positions[individual_id] = position
+            self.ids.append(individual_id)
+        return position
+
+    def copy(self):
+        index = IndividualIndex()
+        index.ids = list(self.ids)
+        index.positions = dict(self.positions)
+        return index
+
+    def __len__(self):
+        return len(self.ids)
+
+
+class SegmentBitmap:
+    """Fixed-size bitset backed by uint64 words"""
+
+    # Set on evaluate() results: the index their bit positions refer to
+    index = None
+
+    def __init__(self, size, words=None):
+        self.size = size
+        n_words = (size + 63) // 64
+        self.words = words if words is not None else np.zeros(n_words, dtype=np.uint64)
+
+    @classmethod
+    def from_positions(cls, size, positions):
+        bitmap = cls(size)
+        positions = np.asarray(positions, dtype=np.int64)
+        if positions.size:
+            bits = np.zeros(len(bitmap.words) * 64, dtype=bool)
+            bits[positions] = True
+            bitmap.words = np.packbits(bits, bitorder='little').view(np.uint64)
+        return bitmap
+
+    def resized(self, size):
+        """Same members in a larger universe (new positions are clear)"""
+        words = np.zeros((size + 63) // 64, dtype=np.uint64)
+        words[:len(self.words)] = self.words
+        return SegmentBitmap(size, words)
+
+    def __and__(self, other):
+        return SegmentBitmap(self.size, self.words & other.words)
+
+    def __or__(self, other):
+        return SegmentBitmap(self.size, self.words | other.words)
+
+    def __sub__(self, other):
+        return SegmentBitmap(self.size, self.words & ~other.words)
+
+    def __invert__(self):
+        words = ~self.words
+        # Complement within the universe, so padding bits in the last word stay clear
+        padding = len(words) * 64 - self.size
+        if padding and len(words):
+            words[-1] &= np.uint64((1 << (64 - padding)) - 1)
+        return SegmentBitmap(self.size, words)
+
+    def cardinality(self):
+        """Exact number of members (table popcount over the raw bytes)"""
+        return int(_POPCOUNT_TABLE[self.words.view(np.uint8)].sum(dtype=np.int64))
+
+    def positions(self):
+        bits = np.unpackbits(self.words.view(np.uint8), bitorder='little')[:self.size]
+        return np.flatnonzero(bits)
+
+
+class _AlgebraState:
+    """One consistent generation of the index and bitmaps (replaced as a whole, never mutated)"""
+
+    def __init__(self, index=None, bitmaps=None, fingerprints=None, unavailable=None, signature=None):
+        self.index = index if index is not None else IndividualIndex()
+        self.size = len(self.index)
+        self.bitmaps = bitmaps or {}
+        self.fingerprints = fingerprints or {}
+        # segment id -> (fingerprint, sf) of the last attempt that could not list its members
+        self.unavailable = unavailable or {}
+        self.signature = signature
+        self.facets = {}
+
+
+def _fingerprint(segment):
+    return json.dumps(segment, sort_keys=True, default=str)
+
+
+class SegmentAlgebra:
+    """Combine saved segments into new audiences without re-running their filters"""
+
+    def __init__(self, segmentation_engine, data_store=None, spatial_index=None):
+        self.segmentation_engine = segmentation_engine
+        if data_store is None:
+            from modules.data_store import DataStore
+            data_store = DataStore()
+        self.data_store = data_store
+        self.spatial_index = spatial_index
+        self._state = _AlgebraState()
+        self._lock = threading.Lock()
+
+    @property
+    def bitmaps(self):
+        return self._state.bitmaps
+
+    @property
+    def index(self):
+        return self._state.index
+
+    @property
+    def unavailable(self):
+        """Ids of saved segments that could not be materialized (SOQL segments while offline, errors)"""
+        return list(self._state.unavailable)
+
+    def _data_signature(self):
+        """Change marker for the files membership is computed from"""
+        return tuple(self.data_store.signature(name) for name in ('engagement', 'insights'))
+
+    def _load_universe(self):
+        """Index every individual in the engagement data"""
+        try:
+            engagement_data = self.data_store.load('engagement')
+        except FileNotFoundError:
+            engagement_data = []
+        return IndividualIndex(e['id'] for e in engagement_data if e.get('id'))
+
+    def _segment_member_ids(self, sf, segment):
+        """Member ids of a saved segment, using the engine's own evaluation rules"""
+        if segment.get('type') == 'combined':
+            return segment.get('member_ids', [])
+        result = self.segmentation_engine.get_segment_members(sf, segment['id'])
+        return [m.get('IndividualId') or m.get('Id') for m in result['members'] if m.get('IndividualId') or m.get('Id')]
+
+    @staticmethod
+    def _pending(state, segments, sf):
+        """Segments that are new or changed since state was built, minus those known to need a connection"""
+        pending = []
+        for segment in segments:
+            fingerprint = _fingerprint(segment)
+            if state.fingerprints.get(segment['id']) == fingerprint:
+                continue
+            attempt = state.unavailable.get(segment['id'])
+            # Retry a failed segment only when its definition or the connection changed
+            if attempt and attempt[0] == fingerprint and attempt[1] is sf:
+                continue
+            pending.append(segment)
+        return pending
+
+    def materialize(self, sf=None, force=False):
+        """
+        Bitmaps of the saved segments, built incrementally
+
+        Only segments that are new or changed are evaluated; everything is rebuilt when
+        the engagement or insights data changes. Segments that need Salesforce are left
+        out while sf is None and retried once a connection is passed.
+        """
+        return self._materialize(sf, force).bitmaps
+
+    def _materialize(self, sf=None, force=False):
+        signature = self._data_signature()
+        segments = self.segmentation_engine.list_segments()
+        state = self._state
+        if not force and state.signature == signature and len(state.bitmaps) + len(state.unavailable) == len(segments) \
+                and not self._pending(state, segments, sf):
+            return state
+
+        with self._lock:
+            state = self._state
+            rebuild = force or state.signature != signature
+            if rebuild:
+                state = _AlgebraState(signature=signature)
+            live_ids = {segment['id'] for segment in segments}
+            pending = segments if rebuild else self._pending(state, segments, sf)
+
+            member_ids, fingerprints, unavailable = {}, {}, {}
+            for segment in pending:
+                fingerprint = _fingerprint(segment)
+                if sf is None and self.segmentation_engine.requires_salesforce(segment):
+                    unavailable[segment['id']] = (fingerprint, sf)
+                    continue
+                try:
+                    member_ids[segment['id']] = self._segment_member_ids(sf, segment)
+                    fingerprints[segment['id']] = fingerprint
+                except Exception as e:
+                    logger.warning("Could not materialize segment %s: %s", segment.get('name'), e)
+                    unavailable[segment['id']] = (fingerprint, sf)
+
+            index = self._load_universe() if rebuild else state.index
+            new_ids = [i for ids in member_ids.values() for i in ids if i not in index.positions]
+            if new_ids:
+                index = index.copy()
+                for individual_id in new_ids:
+                    index.add(individual_id)
+            size = len(index)
+
+            bitmaps = {
+                segment_id: bitmap if bitmap.size == size else bitmap.resized(size)
+                for segment_id, bitmap in state.bitmaps.items()
+                if segment_id in live_ids and segment_id not in member_ids and segment_id not in unavailable
+            }
+            for segment_id, ids in member_ids.items():
+                bitmaps[segment_id] = SegmentBitmap.from_positions(size, [index.positions[i] for i in ids])
+
+            fingerprints = {**{k: v for k, v in state.fingerprints.items() if k in bitmaps}, **fingerprints}
+            kept = {k: v for k, v in state.unavailable.items()
+                    if k in live_ids and k not in member_ids and k not in unavailable}
+            new_state = _AlgebraState(index, bitmaps, fingerprints, {**kept, **unavailable}, signature)
+            if size == state.size and not rebuild:
+                new_state.facets = state.facets
+            self._state = new_state
+        return new_state
+
+    def facet_bitmap(self, field, values, state=None):
+        """Bitmap of individuals whose latest insight has field in values"""
+        state = state or self._state
+        key = (field, tuple(sorted(values)))
+        if key not in state.facets:
+            positions = []
+            try:
+                # Latest insight per individual, matched on the field's integer codes
+                frame = load_insights_frame(self.data_store)
+                latest = frame.latest_rows()
+                latest = latest[latest >= 0]
+                matching = latest[frame.mask(field, values)[latest]]
+                for position in frame.individual[matching].tolist():
+                    individual_id = frame.individual_ids[position]
+                    if individual_id in state.index.positions:
+                        positions.append(state.index.positions[individual_id])
+            except FileNotFoundError:
+                pass
+            state.facets[key] = SegmentBitmap.from_positions(state.size, positions)
+        return state.facets[key]
+
+    def location_individual_ids(self, area):
+        """
+        Owners of the vehicles with readings in an area
+
+        area is {'bbox': [south, west, north, east]} or {'lat': .., 'lon': .., 'radius_km': ..},
+        optionally with 'start' / 'end' timestamps.
+        """
+        if self.spatial_index is None:
+            raise Exception('Location expressions need the telemetry spatial index')
+        if not isinstance(area, dict):
+            raise Exception(f"Invalid location: {area}")
+        start = parse_timestamp(area['start']) if area.get('start') else None
+        end = parse_timestamp(area['end']) if area.get('end') else None
+        if area.get('bbox'):
+            south, west, north, east = [float(v) for v in area['bbox']]
+            if south > north or west > east:
+                raise Exception('bbox must be south,west,north,east')
+            points = self.spatial_index.points_in_bbox(south, west, north, east, start=start, end=end)
+        elif area.get('lat') is not None and area.get('lon') is not None:
+            points = self.spatial_index.points_in_radius(float(area['lat']), float(area['lon']),
+                                                         float(area.get('radius_km', 5.0)), start, end)
+        else:
+            raise Exception('Location needs bbox or lat/lon/radius_km')
+
+        vehicle_ids = set(self.spatial_index.vehicle_ids(points))
+        try:
+            vehicles = self.data_store.load('individual_vehicles')
+        except FileNotFoundError:
+            vehicles = []
+        return sorted({v['Individual_Id'] for v in vehicles if v.get('VehicleId') in vehicle_ids and v.get('Individual_Id')})
+
+    def location_bitmap(self, area, state=None):
+        """Bitmap of individuals owning a vehicle seen in an area (not cached: telemetry keeps arriving)"""
+        state = state or self._state
+        positions = [state.index.positions[i] for i in self.location_individual_ids(area) if i in state.index.positions]
+        return SegmentBitmap.from_positions(state.size, positions)
+
+    def evaluate(self, expression, sf=None):
+        """
+        Evaluate a set expression into a bitmap
+
+        Expressions are a segment id string or a dict with one key:
+            {'and': [expr, ...]}, {'or': [expr, ...]}, {'not': expr},
+            {'minus': [expr, expr]}, {'segment': id},
+            {'facet': {'field': 'Purchase_Intent', 'values': [...]}},
+            {'location': {'bbox': [south, west, north, east]}} or
+            {'location': {'lat': .., 'lon': .., 'radius_km': .., 'start': .., 'end': ..}}
+        """
+        state = self._materialize(sf)
+        bitmap = self._evaluate(expression, state)
+        if bitmap.index is None:
+            bitmap = SegmentBitmap(bitmap.size, bitmap.words)
+            bitmap.index = state.index
+        return bitmap
+
+    def _evaluate(self, expression, state):
+        if isinstance(expression, str):
+            expression = {'segment': expression}
+        if not isinstance(expression, dict) or len(expression) != 1:
+            raise Exception(f"Invalid segment expression: {expression}")
+
+        op, operand = next(iter(expression.items()))
+        if op == 'segment':
+            if operand not in state.bitmaps:
+                raise Exception(f"Segment not found or not materialized: {operand}")
+            return state.bitmaps[operand]
+        if op == 'facet':
+            return self.facet_bitmap(operand['field'], operand['values'], state)
+        if op == 'location':
+            return self.location_bitmap(operand, state)
+        if op == 'not':
+            return ~self._evaluate(operand, state)
+        if op in ('and', 'or', 'minus'):
+            if not operand:
+                raise Exception(f"'{op}' needs at least one operand")
+            result = self._evaluate(operand[0], state)
+            for sub_expression in operand[1:]:
+                other = self._evaluate(sub_expression, state)
+                if op == 'and':
+                    result = result & other
+                elif op == 'or':
+                    result = result | other
+                else:
+                    result = result - other
+            return result
+        raise Exception(f"Unknown segment operator: {op}")
+
+    def member_ids(self, bitmap):
+        """Individual ids for the set bits of a bitmap"""
+        ids = (bitmap.index or self._state.index).ids
+        return [ids[p] for p in bitmap.positions()]
+
+    def cardinality(self, expression, sf=None):
+        return self.evaluate(expression, sf).cardinality()
+
+    def overlap_matrix(self, sf=None, segment_ids=None, chunk_bits=1 << 16):
+        """Pairwise intersection sizes for saved segments (plus Jaccard similarity)"""
+        state = self._materialize(sf)
+        ids = [s for s in (segment_ids or list(state.bitmaps)) if s in state.bitmaps]
+        size = state.size
+        counts = np.zeros((len(ids), len(ids)), dtype=np.float64)
+
+        if ids and size:
+            words = np.stack([state.bitmaps[s].words for s in ids])
+            # Unpack a block of bits at a time and let a matrix product count co-members
+            chunk_words = max(1, chunk_bits // 64)
+            for start in range(0, words.shape[1], chunk_words):
+                block = np.unpackbits(words[:, start:start + chunk_words].view(np.uint8), axis=1, bitorder='little')
+                block = block.astype(np.float32)
+                counts += block @ block.T
+
+        counts = counts.astype(np.int64)
+        sizes = np.diag(counts)
+        unions = sizes[:, None] + sizes[None, :] - counts
+        jaccard = np.divide(counts, unions, out=np.zeros(counts.shape), where=unions > 0)
+
+        return {
+            'segment_ids': ids,
+            'sizes': sizes.tolist(),
+            'intersections': counts.tolist(),
+            'jaccard': np.round(jaccard, 4).tolist()
+        }
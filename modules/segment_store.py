@@ -0,0 +1,154 @@
+"""
+Segment Store
+SQLite-backed repository for saved segments with atomic per-segment upserts
+"""
+
+import json
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+
+class SegmentStore:
+    """Persist segments one row at a time instead of rewriting segments.json"""
+
+    def __init__(self, db_path='data/segments.db', legacy_file='data/segments.json'):
+        self.db_path = db_path
+        self.legacy_file = legacy_file
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        self._init_schema()
+        self._import_legacy_file()
+
+    def _connection(self):
+        """Get a connection for the current thread (reopened after a fork)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or getattr(self._local, 'pid', None) != os.getpid():
+            # isolation_level=None lets us issue BEGIN IMMEDIATE ourselves
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('PRAGMA busy_timeout=30000')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        """Write transaction holding the database write lock across processes"""
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield conn
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+
+    def _init_schema(self):
+        """Create tables and indexes if they don't exist"""
+        with self._transaction() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS segments (
+                    id TEXT PRIMARY KEY,
+                    name TEXT NOT NULL,
+                    created_at TEXT,
+                    data TEXT NOT NULL
+                )
+            """)
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_segments_name ON segments(name)')
+            conn.execute('CREATE TABLE IF NOT EXISTS store_meta (key TEXT PRIMARY KEY, value TEXT)')
+
+    def _import_legacy_file(self):
+        """One-time import of segments saved by older versions in segments.json"""
+        with self._transaction() as conn:
+            row = conn.execute("SELECT value FROM store_meta WHERE key = 'legacy_imported'").fetchone()
+            if row:
+                return
+
+            segments = []
+            if self.legacy_file and os.path.exists(self.legacy_file):
+                try:
+                    with open(self.legacy_file, 'r') as f:
+                        segments = json.load(f)
+                except Exception as e:
+                    print(f"Warning: Could not import {self.legacy_file}: {e}")
+
+            for segment in segments:
+                if segment.get('id'):
+                    self._upsert(conn, segment)
+
+            conn.execute("INSERT INTO store_meta (key, value) VALUES ('legacy_imported', ?)", (str(len(segments)),))
+
+    def _upsert(self, conn, segment):
+        conn.execute(
+            """
+            INSERT INTO segments (id, name, created_at, data) VALUES (?, ?, ?, ?)
+            ON CONFLICT(id) DO UPDATE SET
+                name = excluded.name,
+                created_at = excluded.created_at,
+                data = excluded.data
+            """,
+            (segment['id'], segment.get('name', ''), segment.get('created_at'), json.dumps(segment))
+        )
+        self._bump_version(conn)
+
+    def _bump_version(self, conn):
+        conn.execute(
+            """
+            INSERT INTO store_meta (key, value) VALUES ('version', '1')
+            ON CONFLICT(key) DO UPDATE SET value = CAST(value AS INTEGER) + 1
+            """
+        )
+
+    def list_segments(self):
+        """List all segments in creation order"""
+        rows = self._connection().execute('SELECT data FROM segments ORDER BY rowid').fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def get(self, segment_id):
+        """Get a single segment by id"""
+        row = self._connection().execute('SELECT data FROM segments WHERE id = ?', (segment_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def find_by_name(self, name):
+        """Get segments with an exact name match"""
+        rows = self._connection().execute('SELECT data FROM segments WHERE name = ? ORDER BY rowid', (name,)).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def upsert(self, segment):
+        """Insert or replace a single segment"""
+        if not segment.get('id'):
+            raise Exception("Segment must have an id")
+        with self._transaction() as conn:
+            self._upsert(conn, segment)
+        return segment
+
+    def update(self, segment_id, updates):
+        """Atomically merge fields into an existing segment, returns the updated segment"""
+        with self._transaction() as conn:
+            row = conn.execute('SELECT data FROM segments WHERE id = ?', (segment_id,)).fetchone()
+            if not row:
+                return None
+            segment = json.loads(row[0])
+            segment.update(updates)
+            self._upsert(conn, segment)
+        return segment
+
+    def delete(self, segment_id):
+        """Delete a segment, returns True if it existed"""
+        with self._transaction() as conn:
+            cursor = conn.execute('DELETE FROM segments WHERE id = ?', (segment_id,))
+            if cursor.rowcount:
+                self._bump_version(conn)
+        return cursor.rowcount > 0
+
+    def count(self):
+        """Number of saved segments"""
+        return self._connection().execute('SELECT COUNT(*) FROM segments').fetchone()[0]
+
+    def version(self):
+        """Counter bumped by every write, lets readers cache derived views of the segments"""
+        row = self._connection().execute("SELECT value FROM store_meta WHERE key = 'version'").fetchone()
+        return int(row[0]) if row else 0
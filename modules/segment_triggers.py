@@ -0,0 +1,175 @@
+"""
+Segment Triggers
+Emits enter/exit events when a changed engagement or insight record moves an
+individual into or out of a saved segment, re-evaluating only the segments whose
+criteria read changed fields
+"""
+
+import threading
+from datetime import datetime
+
+from modules.insights_frame import load_insights_frame
+from modules.segmentation_engine import LOCAL_MEMBER_FIELDS
+
+EVENT_TTL = 24 * 3600
+SEQUENCE_KEY = 'segment_events:seq'
+
+
+class SegmentTriggers:
+    """
+    Predicate index over saved segments: member field -> ids of segments filtering on it
+
+    Membership is decided by evaluating a segment's criteria on the member before and
+    after the change, so no membership snapshot has to be kept in sync between workers.
+    Events go to local subscribers and to the shared state backend (readable by any worker).
+    """
+
+    def __init__(self, segmentation_engine, data_store, state=None, insights_cube=None):
+        self.engine = segmentation_engine
+        self.data_store = data_store
+        self.state = state
+        self.insights_cube = insights_cube
+        self._subscribers = []
+        self._lock = threading.Lock()
+        self._version = None
+        self._segments = {}
+        self._index = {}
+        self._unsupported = []
+        self._insights = (None, {})
+
+    def is_supported(self, segment):
+        """
+        Only engagement segments over Individuals whose criteria all run on local data can
+        be triggered; top-N segments are not, as membership depends on everyone else's scores
+        """
+        fields = self.engine.member_fields(segment)
+        return bool(segment.get('base_object') == 'Individual' and segment.get('type') not in ('combined', 'driving') and
+                    not self.engine.requires_salesforce(segment) and not segment.get('limit') and
+                    fields and fields <= LOCAL_MEMBER_FIELDS)
+
+    def _refresh(self):
+        """Rebuild the predicate index when the saved segments change"""
+        version = self.engine.segment_store.version()
+        with self._lock:
+            if version == self._version:
+                return
+            segments, index, unsupported = {}, {}, []
+            for segment in self.engine.list_segments():
+                if not self.is_supported(segment):
+                    unsupported.append(segment['id'])
+                    continue
+                segments[segment['id']] = segment
+                for field in self.engine.member_fields(segment):
+                    index.setdefault(field, set()).add(segment['id'])
+            self._segments, self._index, self._unsupported = segments, index, unsupported
+            self._version = version
+
+    def _insights_by_id(self):
+        """Last insight per individual in the insights file, rebuilt when the file changes"""
+        signature = self.data_store.signature('insights')
+        if signature is None:
+            return {}
+        if self._insights[0] != signature:
+            frame = load_insights_frame(self.data_store)
+            self._insights = (signature, frame.records_by_individual(frame.last_rows()))
+        return self._insights[1]
+
+    def latest_insights(self, individual_ids):
+        """{id: latest insight} for the given individuals, including appends not compacted yet"""
+        in_file = self._insights_by_id()
+        latest = {individual_id: in_file[individual_id] for individual_id in individual_ids if individual_id in in_file}
+        if self.insights_cube is not None:
+            wanted = set(individual_ids)
+            for record in self.insights_cube.appended():
+                if record['Individual_Id'] in wanted:
+                    latest[record['Individual_Id']] = record
+        return latest
+
+    def subscribe(self, callback, segment_id=None):
+        """Call callback(event) for enter/exit events (optionally for one segment only)"""
+        self._subscribers.append((segment_id, callback))
+
+    def summary(self):
+        self._refresh()
+        return {
+            'watched_fields': {field: sorted(ids) for field, ids in sorted(self._index.items())},
+            'segments': len(self._segments),
+            'unsupported_segments': list(self._unsupported)
+        }
+
+    def engagement_changed(self, changes):
+        """changes: (before, after) engagement record pairs; returns the emitted events"""
+        insights = self.latest_insights([after.get('id') for _, after in changes])
+        pairs = []
+        for before, after in changes:
+            individual_id = after.get('id')
+            insight = insights.get(individual_id)
+            pairs.append((individual_id,
+                          self.engine.member_record(individual_id, before, insight),
+                          self.engine.member_record(individual_id, after, insight)))
+        return self._evaluate(pairs)
+
+    def insights_changed(self, before, records, engagement):
+        """
+        records: appended insight records; before: {id: latest insight} read before the
+        append (see latest_insights); engagement: {id: current engagement record}.
+        Returns the emitted events
+        """
+        latest = {}
+        for record in records:
+            latest[record['Individual_Id']] = record
+        pairs = []
+        for individual_id, insight in latest.items():
+            eng_data = engagement.get(individual_id)
+            if eng_data is None:
+                continue  # Not a segment member candidate without engagement data
+            pairs.append((individual_id,
+                          self.engine.member_record(individual_id, eng_data, before.get(individual_id)),
+                          self.engine.member_record(individual_id, eng_data, insight)))
+        return self._evaluate(pairs)
+
+    def _evaluate(self, pairs):
+        self._refresh()
+        events = []
+        for individual_id, before, after in pairs:
+            changed = {field for field in self._index if before.get(field) != after.get(field)}
+            candidates = set().union(*(self._index[field] for field in changed)) if changed else set()
+            for segment_id in sorted(candidates):
+                segment = self._segments[segment_id]
+                was_member = self.engine.is_member(segment, before)
+                is_member = self.engine.is_member(segment, after)
+                if was_member != is_member:
+                    events.append({
+                        'event': 'enter' if is_member else 'exit',
+                        'segment_id': segment_id,
+                        'segment_name': segment.get('name'),
+                        'individual_id': individual_id,
+                        'changed_fields': sorted(changed & self.engine.member_fields(segment)),
+                        'timestamp': datetime.now().isoformat()
+                    })
+        for event in events:
+            self._emit(event)
+        return events
+
+    def _emit(self, event):
+        if self.state is not None:
+            event['seq'] = self.state.incr(SEQUENCE_KEY)
+            self.state.set(f"segment_events:{event['seq']}", event, ex=EVENT_TTL)
+        for segment_id, callback in self._subscribers:
+            if segment_id in (None, event['segment_id']):
+                try:
+                    callback(event)
+                except Exception as e:
+                    print(f"⚠️  Segment trigger subscriber failed: {e}")
+
+    def recent_events(self, since=0, limit=100):
+        """
+        Events with seq > since from the shared backend, oldest first
+
+        At most `limit` are returned, the oldest ones; page forward by passing the last seq as since.
+        """
+        if self.state is None:
+            return []
+        last = int(self.state.get(SEQUENCE_KEY, 0) or 0)
+        events = (self.state.get(f"segment_events:{seq}") for seq in range(since + 1, min(last, since + limit) + 1))
+        return [event for event in events if event]
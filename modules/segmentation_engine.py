@@ -8,29 +8,67 @@ import os
 from datetime import datetime
 import uuid
 
+import numpy as np
+
+from modules.insights_frame import load_insights_frame
+from modules.metrics import span
+from modules.segment_store import SegmentStore
+from modules.soql_builder import SOQLQueryBuilder, SUPPORTED_OPERATORS, normalize_operator, query_records_by_id
+
+# Numeric engagement fields (values are stored as strings or numbers in the data files)
+NUMERIC_FIELDS = {
+    'engagement_score', 'omnichannel_score',
+    'email_opens', 'email_clicks', 'email_bounces', 'email_unsubscribes',
+    'website_product_views', 'website_add_to_cart', 'website_cart_abandons', 'website_purchases',
+    'total_order_value',
+    'sms_sends', 'sms_opens', 'sms_clicks', 'sms_optouts', 'sms_open_rate',
+    'whatsapp_sends', 'whatsapp_reads', 'whatsapp_replies', 'whatsapp_optouts', 'whatsapp_read_rate',
+    'push_sends', 'push_opens', 'push_clicks', 'push_open_rate',
+    'total_message_sends', 'total_message_interactions'
+}
+
+# Member fields that come from the local engagement/insights files - filters on
+# these run in Python, filters on anything else are pushed down to Salesforce
+LOCAL_MEMBER_FIELDS = NUMERIC_FIELDS | {
+    'Id', 'Name', 'FirstName', 'LastName', 'profile_picture_url', 'preferred_channel',
+    'products_browsed', 'products_purchased', 'favorite_category', 'last_engagement',
+    'Purchase_Intent', 'Current_Sentiment', 'Favourite_Brand', 'Lifestyle_Quotient',
+    'Health_Profile', 'Imminent_Event'
+}
+
 class SegmentationEngine:
     
     def __init__(self):
-        self.segments_file = 'data/segments.json'
+        self.segments_file = 'data/segments.json'  # Legacy file, imported once into the segment store
+        self.segments_db = 'data/segments.db'
         self.engagement_file = 'data/synthetic_engagement.json'  # Using synthetic data with email + website
         self._ensure_data_dir()
+        self.segment_store = SegmentStore(self.segments_db, legacy_file=self.segments_file)
     
     def _ensure_data_dir(self):
         """Ensure data directory exists"""
         os.makedirs('data', exist_ok=True)
-        if not os.path.exists(self.segments_file):
-            with open(self.segments_file, 'w') as f:
-                json.dump([], f)
     
     def list_segments(self):
         """List all saved segments"""
         try:
-            with open(self.segments_file, 'r') as f:
-                segments = json.load(f)
-            return segments
-        except:
+            return self.segment_store.list_segments()
+        except Exception as e:
+            print(f"Error listing segments: {e}")
             return []
     
+    def get_segment(self, segment_id):
+        """Get a saved segment by id"""
+        return self.segment_store.get(segment_id)
+    
+    def save_segment(self, segment):
+        """Insert or replace a single segment"""
+        return self.segment_store.upsert(segment)
+    
+    def update_segment(self, segment_id, updates):
+        """Atomically update fields of a single segment"""
+        return self.segment_store.update(segment_id, updates)
+    
     def create_segment(self, sf, name, description, base_object, filters):
         """Create a new segment"""
         segment_id = str(uuid.uuid4())
@@ -51,7 +89,7 @@ class SegmentationEngine:
         
         if has_engagement_filters and base_object == 'Individual':
             # Use engagement data to filter
-            members = self._get_members_with_engagement(sf, filters)
+            members = self._get_members_with_engagement(sf, filters, order_by=None)
             member_count = len(members)
             query = f"Engagement-based segment: {len(engagement_filters)} engagement filter(s)"
         else:
@@ -60,8 +98,8 @@ class SegmentationEngine:
                 # No Salesforce connection - cannot create non-engagement segments
                 raise Exception("Salesforce connection required for non-engagement segments. Please login to Salesforce or use engagement-based filters.")
             query = self._build_query(base_object, filters)
-            results = sf.query(query)
-            member_count = results['totalSize']
+            count_query = SOQLQueryBuilder.from_filters(base_object, filters).build_count()
+            member_count = sf.query(count_query)['totalSize']
         
         segment = {
             'id': segment_id,
@@ -77,18 +115,37 @@ class SegmentationEngine:
         }
         
         # Save segment
-        segments = self.list_segments()
-        segments.append(segment)
-        
-        with open(self.segments_file, 'w') as f:
-            json.dump(segments, f, indent=2)
+        self.save_segment(segment)
         
         return segment
     
+    def create_combined_segment(self, name, description, expression, member_ids):
+        """Save an audience built with segment algebra (AND/OR/NOT of saved segments)"""
+        segment = {
+            'id': str(uuid.uuid4()),
+            'name': name,
+            'description': description,
+            'base_object': 'Individual',
+            'filters': [],
+            'member_count': len(member_ids),
+            'member_ids': list(member_ids),
+            'expression': expression,
+            'created_at': datetime.now().isoformat(),
+            'query': f"Combined segment: {json.dumps(expression)}",
+            'salesforce_campaign_id': None,
+            'type': 'combined'
+        }
+        self.save_segment(segment)
+        return segment
+    
+    @staticmethod
+    def requires_salesforce(segment):
+        """True for segments whose members can only be listed with a Salesforce connection (SOQL segments)"""
+        return segment.get('type') not in ('driving', 'combined') and not segment.get('uses_engagement', False)
+    
     def get_segment_members(self, sf, segment_id):
         """Get members of a segment"""
-        segments = self.list_segments()
-        segment = next((s for s in segments if s['id'] == segment_id), None)
+        segment = self.get_segment(segment_id)
         
         if not segment:
             raise Exception("Segment not found")
@@ -102,24 +159,26 @@ class SegmentationEngine:
                 'totalSize': len(members)
             }
         
+        # Check if this is a combined audience (member ids stored from segment algebra)
+        if segment.get('type') == 'combined':
+            member_ids = set(segment.get('member_ids', []))
+            members = [m for m in self._get_members_with_engagement(sf, [], order_by=None) if m['Id'] in member_ids]
+            members = self.select_top_members(members, segment.get('limit'))
+            return {
+                'segment': segment,
+                'members': members,
+                'totalSize': len(members)
+            }
+        
         # Check if this is an engagement-based segment
         if segment.get('uses_engagement', False):
-            members = self._get_members_with_engagement(sf, segment['filters'])
+            members = self._get_members_with_engagement(sf, segment['filters'], order_by=None)
             
-            # Apply purchase intent filter if specified
-            if segment.get('purchase_intent_filter'):
-                members = [m for m in members if m.get('Purchase_Intent') in segment.get('purchase_intent_filter')]
+            # Apply purchase intent / sentiment filters if specified
+            members = [m for m in members if self._passes_segment_filters(segment, m)]
             
-            # Apply sentiment filter if specified
-            if segment.get('sentiment_filter'):
-                members = [m for m in members if m.get('Current_Sentiment') in segment.get('sentiment_filter')]
-            
-            # Sort by omnichannel score (ensure numeric conversion)
-            members = sorted(members, key=lambda x: float(x.get('omnichannel_score', x.get('engagement_score', 0)) or 0), reverse=True)
-            
-            # Apply limit if specified in segment metadata
-            if segment.get('limit') and len(members) > segment['limit']:
-                members = members[:segment['limit']]
+            # Top N by omnichannel score (partial selection, only the kept rows get sorted)
+            members = self.select_top_members(members, segment.get('limit'))
             
             return {
                 'segment': segment,
@@ -127,8 +186,11 @@ class SegmentationEngine:
                 'totalSize': len(members)
             }
         else:
-            # Execute standard query
-            results = sf.query(segment['query'])
+            # Execute standard query (pushing the segment limit into SOQL)
+            query = segment['query']
+            if segment.get('limit') and ' LIMIT ' not in query.upper():
+                query += f" LIMIT {int(segment['limit'])}"
+            results = sf.query_all(query)
             members = results['records']
             
             # Apply limit if specified in segment metadata
@@ -141,6 +203,69 @@ class SegmentationEngine:
                 'totalSize': len(members)
             }
     
+    @staticmethod
+    def _passes_segment_filters(segment, member):
+        """Evaluate the purchase_intent_filter / sentiment_filter of a segment against a member"""
+        if segment.get('purchase_intent_filter') and member.get('Purchase_Intent') not in segment['purchase_intent_filter']:
+            return False
+        if segment.get('sentiment_filter') and member.get('Current_Sentiment') not in segment['sentiment_filter']:
+            return False
+        return True
+    
+    @staticmethod
+    def member_fields(segment):
+        """Member fields a segment's criteria read (filters plus purchase intent / sentiment metadata)"""
+        fields = {f.get('field') for f in segment.get('filters') or []}
+        if segment.get('purchase_intent_filter'):
+            fields.add('Purchase_Intent')
+        if segment.get('sentiment_filter'):
+            fields.add('Current_Sentiment')
+        return fields
+    
+    def member_record(self, ind_id, eng_data, insight):
+        """Segment member built from an engagement record and the individual's latest insight (or None)"""
+        return self._merge_engagement(ind_id, eng_data, insight)
+    
+    def is_member(self, segment, member):
+        """
+        Whether a member record meets all of a segment's criteria: its filters and its
+        purchase intent / sentiment metadata. A top-N limit depends on the rest of the
+        population and is not applied here.
+        """
+        return self._passes_filters(member, segment.get('filters') or []) and self._passes_segment_filters(segment, member)
+    
+    @staticmethod
+    def _member_score(member, score_field):
+        """Numeric score of a member (scores are stored as strings or numbers)"""
+        value = member.get(score_field, member.get('engagement_score', 0))
+        try:
+            return float(value or 0)
+        except (TypeError, ValueError):
+            return 0.0
+    
+    def select_top_members(self, members, limit=None, score_field='omnichannel_score'):
+        """
+        Order members by score (highest first), keeping only the top `limit`
+        
+        With a limit this is an O(n) numpy partition over the typed score column
+        followed by a sort of just the selected rows. Ties keep their input order.
+        """
+        if not members:
+            return []
+        
+        scores = np.fromiter((self._member_score(m, score_field) for m in members), dtype=np.float64, count=len(members))
+        
+        if not limit or limit >= len(members):
+            order = np.argsort(-scores, kind='stable')
+        else:
+            kth_score = np.partition(scores, len(scores) - limit)[len(scores) - limit]
+            above = np.flatnonzero(scores > kth_score)
+            ties = np.flatnonzero(scores == kth_score)[:limit - len(above)]
+            selected = np.concatenate([above, ties])
+            order = selected[np.lexsort((selected, -scores[selected]))]
+        
+        return [members[i] for i in order]
+    
     def preview_segment(self, sf, base_object, filters):
         """Preview segment results"""
         query = self._build_query(base_object, filters, limit=100)
@@ -167,14 +292,7 @@ class SegmentationEngine:
         campaign_id = campaign_result['id']
         
         # Update segment with campaign ID
-        segments = self.list_segments()
-        for seg in segments:
-            if seg['id'] == segment_id:
-                seg['salesforce_campaign_id'] = campaign_id
-                break
-        
-        with open(self.segments_file, 'w') as f:
-            json.dump(segments, f, indent=2)
+        self.update_segment(segment_id, {'salesforce_campaign_id': campaign_id})
         
         return {
             'campaign_id': campaign_id,
@@ -183,46 +301,8 @@ class SegmentationEngine:
         }
     
     def _build_query(self, base_object, filters, limit=None):
-        """Build SOQL query from filters"""
-        # Get object fields
-        fields = ['Id', 'Name']
-        
-        # Build WHERE clause
-        where_clauses = []
-        for f in filters:
-            field = f['field']
-            operator = f['operator']
-            value = f['value']
-            
-            if operator == 'equals':
-                if isinstance(value, str):
-                    where_clauses.append(f"{field} = '{value}'")
-                else:
-                    where_clauses.append(f"{field} = {value}")
-            elif operator == 'not_equals':
-                if isinstance(value, str):
-                    where_clauses.append(f"{field} != '{value}'")
-                else:
-                    where_clauses.append(f"{field} != {value}")
-            elif operator == 'greater_than':
-                where_clauses.append(f"{field} > {value}")
-            elif operator == 'less_than':
-                where_clauses.append(f"{field} < {value}")
-            elif operator == 'contains':
-                where_clauses.append(f"{field} LIKE '%{value}%'")
-            elif operator == 'starts_with':
-                where_clauses.append(f"{field} LIKE '{value}%'")
-        
-        # Build query
-        query = f"SELECT {', '.join(fields)} FROM {base_object}"
-        
-        if where_clauses:
-            query += f" WHERE {' AND '.join(where_clauses)}"
-        
-        if limit:
-            query += f" LIMIT {limit}"
-        
-        return query
+        """Build SOQL query from filters (values escaped, field names validated)"""
+        return SOQLQueryBuilder.from_filters(base_object, filters, fields=('Id', 'Name'), limit=limit).build()
     
     def get_segment_analytics(self, sf):
         """Get analytics for all segments"""
@@ -244,11 +324,19 @@ class SegmentationEngine:
         
         return analytics
     
-    def _get_members_with_engagement(self, sf, filters):
-        """Get Individual records with engagement data applied"""
+    def _get_members_with_engagement(self, sf, filters, order_by='engagement_score', limit=None):
+        """Get Individual records with engagement data applied
+        
+        Filters on fields from the local engagement/insights files are evaluated
+        here first; the surviving Ids are then sent to Salesforce together with
+        every remaining predicate, so only matching Individuals are transferred.
+        
+        Results are ordered by `order_by` (highest first) and cut to `limit`;
+        pass order_by=None when the caller orders the members itself.
+        """
         # Load engagement data
         try:
-            with open(self.engagement_file, 'r') as f:
+            with span('data_load'), open(self.engagement_file, 'r') as f:
                 engagement_data = json.load(f)
         except FileNotFoundError:
             raise Exception("Engagement data not found. Please run add_engagement_scores.py first.")
@@ -256,176 +344,179 @@ class SegmentationEngine:
         # Load insights data for purchase intent and sentiment filtering
         insights_by_id = {}
         try:
-            insights_file = 'data/individual_insights.json'
-            with open(insights_file, 'r') as f:
-                insights_data = json.load(f)
-            
-            # Create lookup by Individual_Id - get the most recent insight for each individual
-            for insight in insights_data:
-                ind_id = insight.get('Individual_Id')
-                if ind_id:
-                    insights_by_id[ind_id] = insight
+            # Lookup by Individual_Id - the last insight of each individual in the file
+            # (only those rows are materialized from the encoded frame)
+            with span('data_load'):
+                frame = load_insights_frame()
+                insights_by_id = frame.records_by_individual(frame.last_rows())
         except Exception as e:
             print(f"Warning: Could not load insights data: {e}")
         
-        # Get all Individuals
-        if sf is None:
-            # No Salesforce - use synthetic data directly
-            individuals = [{'Id': e['id'], 'Name': e.get('Name', '')} for e in engagement_data]
-        else:
-            query = "SELECT Id, Name FROM Individual"
-            individuals = sf.query(query)['records']
+        # Every operator must be evaluable both in SOQL and locally (the offline path)
+        filters = [dict(f, operator=normalize_operator(f.get('operator'))) for f in filters]
+        unsupported = sorted({f['operator'] for f in filters if f['operator'] not in SUPPORTED_OPERATORS}, key=str)
+        if unsupported:
+            raise Exception(f"Unsupported filter operator(s): {', '.join(map(str, unsupported))}")
         
-        # Create lookup dict
-        engagement_lookup = {e['id']: e for e in engagement_data}
+        local_filters = [f for f in filters if f.get('field') in LOCAL_MEMBER_FIELDS]
+        remote_filters = [f for f in filters if f.get('field') not in LOCAL_MEMBER_FIELDS]
         
-        # Merge engagement data with Salesforce records
+        # Merge and filter on local data first
         members = []
-        for ind in individuals:
-            eng_data = engagement_lookup.get(ind['Id'])
-            if eng_data:
-                # Merge the data (omnichannel: email + website + messages)
-                # Use Name from engagement data (real names) instead of Salesforce (Test Person names)
-                merged = {
-                    'Id': ind['Id'],
-                    'Name': eng_data.get('Name', ind['Name']),  # Prefer engagement data Name
-                    'engagement_score': eng_data.get('engagement_score', 0),
-                    'omnichannel_score': eng_data.get('omnichannel_score', 0),
-                    'profile_picture_url': eng_data.get('profile_picture_url', ''),  # Include profile picture!
-                    # Email engagement
-                    'email_opens': eng_data.get('email_opens', 0),
-                    'email_clicks': eng_data.get('email_clicks', 0),
-                    'email_bounces': eng_data.get('email_bounces', 0),
-                    'email_unsubscribes': eng_data.get('email_unsubscribes', 0),
-                    # Website engagement
-                    'website_product_views': eng_data.get('website_product_views', 0),
-                    'website_add_to_cart': eng_data.get('website_add_to_cart', 0),
-                    'website_cart_abandons': eng_data.get('website_cart_abandons', 0),
-                    'website_purchases': eng_data.get('website_purchases', 0),
-                    'total_order_value': eng_data.get('total_order_value', 0.0),
-                    # SMS engagement
-                    'sms_sends': eng_data.get('sms_sends', 0),
-                    'sms_opens': eng_data.get('sms_opens', 0),
-                    'sms_clicks': eng_data.get('sms_clicks', 0),
-                    'sms_optouts': eng_data.get('sms_optouts', 0),
-                    'sms_open_rate': eng_data.get('sms_open_rate', 0),
-                    # WhatsApp engagement
-                    'whatsapp_sends': eng_data.get('whatsapp_sends', 0),
-                    'whatsapp_reads': eng_data.get('whatsapp_reads', 0),
-                    'whatsapp_replies': eng_data.get('whatsapp_replies', 0),
-                    'whatsapp_optouts': eng_data.get('whatsapp_optouts', 0),
-                    'whatsapp_read_rate': eng_data.get('whatsapp_read_rate', 0),
-                    # Push notifications
-                    'push_sends': eng_data.get('push_sends', 0),
-                    'push_opens': eng_data.get('push_opens', 0),
-                    'push_clicks': eng_data.get('push_clicks', 0),
-                    'push_open_rate': eng_data.get('push_open_rate', 0),
-                    # Combined message metrics
-                    'total_message_sends': eng_data.get('total_message_sends', 0),
-                    'total_message_interactions': eng_data.get('total_message_interactions', 0),
-                    'preferred_channel': eng_data.get('preferred_channel', ''),
-                    # Other fields
-                    'products_browsed': ', '.join(eng_data.get('products_browsed', [])[:5]) if eng_data.get('products_browsed') else '',
-                    'products_purchased': ', '.join(eng_data.get('products_purchased', [])[:5]) if eng_data.get('products_purchased') else '',
-                    'favorite_category': eng_data.get('favorite_category', ''),
-                    'last_engagement': eng_data.get('last_engagement_date', '')
-                }
-                
-                # Add insights data if available (for purchase intent and sentiment filtering)
-                if ind['Id'] in insights_by_id:
-                    insight = insights_by_id[ind['Id']]
-                    merged['Purchase_Intent'] = insight.get('Purchase_Intent', 'N/A')
-                    merged['Current_Sentiment'] = insight.get('Current_Sentiment', 'N/A')
-                    merged['Favourite_Brand'] = insight.get('Favourite_Brand', 'N/A')
-                    merged['Lifestyle_Quotient'] = insight.get('Lifestyle_Quotient', 'N/A')
-                    merged['Health_Profile'] = insight.get('Health_Profile', 'N/A')
-                    merged['Imminent_Event'] = insight.get('Imminent_Event', '')
-                    merged['FirstName'] = eng_data.get('FirstName', '')
-                    merged['LastName'] = eng_data.get('LastName', '')
-                else:
-                    merged['Purchase_Intent'] = 'N/A'
-                    merged['Current_Sentiment'] = 'N/A'
-                    merged['Favourite_Brand'] = 'N/A'
-                    merged['Lifestyle_Quotient'] = 'N/A'
-                    merged['Health_Profile'] = 'N/A'
-                    merged['Imminent_Event'] = ''
-                    merged['FirstName'] = eng_data.get('FirstName', '')
-                    merged['LastName'] = eng_data.get('LastName', '')
-                
-                members.append(merged)
-        
-        # Apply filters
-        filtered_members = []
-        for member in members:
-            passes_all_filters = True
-            for f in filters:
-                field = f['field']
-                operator = f['operator']
-                value = f['value']
-                
-                # Convert value to number if it's a numeric field
-                numeric_fields = [
-                    'engagement_score', 'omnichannel_score',
-                    'email_opens', 'email_clicks', 'email_bounces', 'email_unsubscribes',
-                    'website_product_views', 'website_add_to_cart', 'website_cart_abandons', 'website_purchases',
-                    'total_order_value',
-                    'sms_sends', 'sms_opens', 'sms_clicks', 'sms_optouts', 'sms_open_rate',
-                    'whatsapp_sends', 'whatsapp_reads', 'whatsapp_replies', 'whatsapp_optouts', 'whatsapp_read_rate',
-                    'push_sends', 'push_opens', 'push_clicks', 'push_open_rate',
-                    'total_message_sends', 'total_message_interactions'
-                ]
-                
-                member_value = member.get(field)
-                
-                # Convert both value and member_value to float for numeric fields to avoid str/float comparison errors
-                if field in numeric_fields:
-                    try:
-                        value = float(value)
-                    except:
-                        value = 0
-                    try:
-                        member_value = float(member_value or 0)
-                    except:
-                        member_value = 0
-                
-                if operator == 'equals':
-                    if member_value != value:
-                        passes_all_filters = False
-                        break
-                elif operator == 'not_equals':
-                    if member_value == value:
-                        passes_all_filters = False
-                        break
-                elif operator == 'greater_than':
-                    if member_value <= value:
-                        passes_all_filters = False
-                        break
-                elif operator == 'greater_than_or_equal':
-                    if member_value < value:
-                        passes_all_filters = False
-                        break
-                elif operator == 'less_than':
-                    if member_value >= value:
-                        passes_all_filters = False
-                        break
-                elif operator == 'less_than_or_equal':
-                    if member_value > value:
-                        passes_all_filters = False
-                        break
-                elif operator == 'contains':
-                    if value not in str(member_value):
-                        passes_all_filters = False
-                        break
+        engagement_lookup = {e['id']: e for e in engagement_data if e.get('id')}
+        with span('filter'):
+            for ind_id, eng_data in engagement_lookup.items():
+                merged = self._merge_engagement(ind_id, eng_data, insights_by_id.get(ind_id))
+                if self._passes_filters(merged, local_filters):
+                    members.append(merged)
+        
+        if sf is None:
+            # No Salesforce - use synthetic data directly
+            members = [m for m in members if self._passes_filters(m, remote_filters)]
+        elif members:
+            # Semi-join pushdown: only surviving Ids plus the Salesforce-side predicates.
+            # Always run, so membership never depends on whether remote filters exist:
+            # a member must be an Individual in the org either way
+            records = query_records_by_id(sf, 'Individual', [m['Id'] for m in members], filters=remote_filters)
+            salesforce_names = {r['Id']: r.get('Name', '') for r in records}
             
-            if passes_all_filters:
-                filtered_members.append(member)
+            matched = []
+            for member in members:
+                if member['Id'] in salesforce_names:
+                    # Use Name from engagement data (real names) instead of Salesforce (Test Person names)
+                    if 'Name' not in engagement_lookup[member['Id']]:
+                        member['Name'] = salesforce_names[member['Id']]
+                    matched.append(member)
+            members = matched
         
-        # Sort by engagement_score descending (ensure numeric conversion)
-        filtered_members.sort(key=lambda x: float(x.get('engagement_score', 0) or 0), reverse=True)
+        # Order by score descending (top-N selection when a limit is given)
+        if order_by:
+            with span('filter'):
+                members = self.select_top_members(members, limit, score_field=order_by)
+        elif limit:
+            members = members[:limit]
         
-        # Check if there's a limit in the description or filters
-        # For "top N" segments, we'll take just the first N
-        # This is a simple heuristic - you could make it more sophisticated
+        return members
+    
+    def _merge_engagement(self, ind_id, eng_data, insight):
+        """Build a segment member from an engagement record and its latest insight"""
+        # Merge the data (omnichannel: email + website + messages)
+        merged = {
+            'Id': ind_id,
+            'Name': eng_data.get('Name', ''),
+            'engagement_score': eng_data.get('engagement_score', 0),
+            'omnichannel_score': eng_data.get('omnichannel_score', 0),
+            'profile_picture_url': eng_data.get('profile_picture_url', ''),  # Include profile picture!
+            # Email engagement
+            'email_opens': eng_data.get('email_opens', 0),
+            'email_clicks': eng_data.get('email_clicks', 0),
+            'email_bounces': eng_data.get('email_bounces', 0),
+            'email_unsubscribes': eng_data.get('email_unsubscribes', 0),
+            # Website engagement
+            'website_product_views': eng_data.get('website_product_views', 0),
+            'website_add_to_cart': eng_data.get('website_add_to_cart', 0),
+            'website_cart_abandons': eng_data.get('website_cart_abandons', 0),
+            'website_purchases': eng_data.get('website_purchases', 0),
+            'total_order_value': eng_data.get('total_order_value', 0.0),
+            # SMS engagement
+            'sms_sends': eng_data.get('sms_sends', 0),
+            'sms_opens': eng_data.get('sms_opens', 0),
+            'sms_clicks': eng_data.get('sms_clicks', 0),
+            'sms_optouts': eng_data.get('sms_optouts', 0),
+            'sms_open_rate': eng_data.get('sms_open_rate', 0),
+            # WhatsApp engagement
+            'whatsapp_sends': eng_data.get('whatsapp_sends', 0),
+            'whatsapp_reads': eng_data.get('whatsapp_reads', 0),
+            'whatsapp_replies': eng_data.get('whatsapp_replies', 0),
+            'whatsapp_optouts': eng_data.get('whatsapp_optouts', 0),
+            'whatsapp_read_rate': eng_data.get('whatsapp_read_rate', 0),
+            # Push notifications
+            'push_sends': eng_data.get('push_sends', 0),
+            'push_opens': eng_data.get('push_opens', 0),
+            'push_clicks': eng_data.get('push_clicks', 0),
+            'push_open_rate': eng_data.get('push_open_rate', 0),
+            # Combined message metrics
+            'total_message_sends': eng_data.get('total_message_sends', 0),
+            'total_message_interactions': eng_data.get('total_message_interactions', 0),
+            'preferred_channel': eng_data.get('preferred_channel', ''),
+            # Other fields
+            'products_browsed': ', '.join(eng_data.get('products_browsed', [])[:5]) if eng_data.get('products_browsed') else '',
+            'products_purchased': ', '.join(eng_data.get('products_purchased', [])[:5]) if eng_data.get('products_purchased') else '',
+            'favorite_category': eng_data.get('favorite_category', ''),
+            'last_engagement': eng_data.get('last_engagement_date', '')
+        }
         
-        return filtered_members
-
+        # Add insights data if available (for purchase intent and sentiment filtering)
+        if insight:
+            merged['Purchase_Intent'] = insight.get('Purchase_Intent', 'N/A')
+            merged['Current_Sentiment'] = insight.get('Current_Sentiment', 'N/A')
+            merged['Favourite_Brand'] = insight.get('Favourite_Brand', 'N/A')
+            merged['Lifestyle_Quotient'] = insight.get('Lifestyle_Quotient', 'N/A')
+            merged['Health_Profile'] = insight.get('Health_Profile', 'N/A')
+            merged['Imminent_Event'] = insight.get('Imminent_Event', '')
+        else:
+            merged['Purchase_Intent'] = 'N/A'
+            merged['Current_Sentiment'] = 'N/A'
+            merged['Favourite_Brand'] = 'N/A'
+            merged['Lifestyle_Quotient'] = 'N/A'
+            merged['Health_Profile'] = 'N/A'
+            merged['Imminent_Event'] = ''
+        merged['FirstName'] = eng_data.get('FirstName', '')
+        merged['LastName'] = eng_data.get('LastName', '')
+        
+        return merged
+    
+    def _passes_filters(self, member, filters):
+        """Evaluate segment filters against a merged member record"""
+        for f in filters:
+            field = f['field']
+            operator = normalize_operator(f['operator'])
+            value = f['value']
+            
+            member_value = member.get(field)
+            
+            # Convert both value and member_value to float for numeric fields to avoid str/float comparison errors
+            if field in NUMERIC_FIELDS:
+                try:
+                    value = float(value)
+                except:
+                    value = 0
+                try:
+                    member_value = float(member_value or 0)
+                except:
+                    member_value = 0
+            
+            if operator == 'equals':
+                if member_value != value:
+                    return False
+            elif operator == 'not_equals':
+                if member_value == value:
+                    return False
+            elif operator == 'greater_than':
+                if member_value <= value:
+                    return False
+            elif operator == 'greater_than_or_equal':
+                if member_value < value:
+                    return False
+            elif operator == 'less_than':
+                if member_value >= value:
+                    return False
+            elif operator == 'less_than_or_equal':
+                if member_value > value:
+                    return False
+            elif operator == 'contains':
+                if str(value) not in str(member_value):
+                    return False
+            elif operator == 'starts_with':
+                if not str(member_value).startswith(str(value)):
+                    return False
+            elif operator in ('in', 'not_in'):
+                values = f['value'] if isinstance(f['value'], (list, tuple, set)) else [f['value']]
+                if field in NUMERIC_FIELDS:
+                    values = [self._member_score({field: v}, field) for v in values]
+                if (member_value in values) != (operator == 'in'):
+                    return False
+            else:
+                raise Exception(f"Unsupported filter operator: {operator}")
+        
+        return True
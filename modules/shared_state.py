@@ -0,0 +1,291 @@
+"""
+Shared State
+Pluggable key/value backends for caches and agent sessions that are shared
+by every gunicorn worker instead of living in per-process globals
+"""
+
+import fnmatch
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+
+
+class StateBackend(ABC):
+    """
+    Minimal Redis-style interface: get / set(ex=) / update / delete / exists / incr / keys
+
+    Values are JSON-serializable Python objects. Every get returns a fresh copy,
+    so callers can never mutate what another request (or worker) sees.
+    Backends that persist values in a local file set on_disk, and callers keep
+    credentials (session ids) out of them.
+    """
+
+    on_disk = False
+
+    @abstractmethod
+    def get(self, key, default=None):
+        ...
+
+    @abstractmethod
+    def set(self, key, value, ex=None):
+        ...
+
+    @abstractmethod
+    def update(self, key, fn, ex=None):
+        """
+        Atomically replace the value with fn(current value, None when missing), returns the new value
+
+        fn may be called more than once (Redis retries on a concurrent write), so it must
+        only compute the new value - and must not use the backend itself.
+        """
+        ...
+
+    @abstractmethod
+    def delete(self, *keys):
+        ...
+
+    def exists(self, key):
+        return self.get(key) is not None
+
+    @abstractmethod
+    def incr(self, key, amount=1):
+        ...
+
+    @abstractmethod
+    def keys(self, pattern='*'):
+        ...
+
+    def get_or_set(self, key, builder, ex=None):
+        """Return the cached value, building and storing it on a miss"""
+        value = self.get(key)
+        if value is None:
+            value = builder()
+            self.set(key, value, ex=ex)
+        return value
+
+
+class MemoryBackend(StateBackend):
+    """Single-process backend (development server, tests)"""
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def _live(self, key):
+        entry = self._data.get(key)
+        if entry and entry[1] is not None and entry[1] <= time.time():
+            del self._data[key]
+            return None
+        return entry
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._live(key)
+        return json.loads(entry[0]) if entry else default
+
+    def set(self, key, value, ex=None):
+        expires_at = time.time() + ex if ex else None
+        with self._lock:
+            self._data[key] = (json.dumps(value), expires_at)
+        return True
+
+    def update(self, key, fn, ex=None):
+        expires_at = time.time() + ex if ex else None
+        with self._lock:
+            entry = self._live(key)
+            value = fn(json.loads(entry[0]) if entry else None)
+            self._data[key] = (json.dumps(value), expires_at)
+        return value
+
+    def delete(self, *keys):
+        with self._lock:
+            return sum(1 for key in keys if self._data.pop(key, None) is not None)
+
+    def incr(self, key, amount=1):
+        with self._lock:
+            entry = self._live(key)
+            value = (json.loads(entry[0]) if entry else 0) + amount
+            self._data[key] = (json.dumps(value), entry[1] if entry else None)
+        return value
+
+    def keys(self, pattern='*'):
+        with self._lock:
+            return [k for k in list(self._data) if self._live(k) and fnmatch.fnmatchcase(k, pattern)]
+
+
+class SQLiteBackend(StateBackend):
+    """
+    Cross-process backend in a local SQLite file (safe for several gunicorn workers)
+
+    The file is created readable by the app's user only (0600); SQLite gives its
+    -wal and -shm files the same permissions.
+    """
+
+    on_disk = True
+
+    def __init__(self, db_path='data/shared_state.db'):
+        self.db_path = db_path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        os.close(os.open(db_path, os.O_RDWR | os.O_CREAT, 0o600))
+        for path in (db_path, f"{db_path}-wal", f"{db_path}-shm"):
+            if os.path.exists(path):
+                os.chmod(path, 0o600)
+        with self._transaction() as conn:
+            conn.execute('CREATE TABLE IF NOT EXISTS kv (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL)')
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or getattr(self._local, 'pid', None) != os.getpid():
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield conn
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+
+    def get(self, key, default=None):
+        row = self._connection().execute(
+            'SELECT value FROM kv WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)',
+            (key, time.time())
+        ).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def set(self, key, value, ex=None):
+        expires_at = time.time() + ex if ex else None
+        with self._transaction() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO kv (key, value, expires_at) VALUES (?, ?, ?)',
+                (key, json.dumps(value), expires_at)
+            )
+        return True
+
+    def update(self, key, fn, ex=None):
+        expires_at = time.time() + ex if ex else None
+        with self._transaction() as conn:
+            row = conn.execute(
+                'SELECT value FROM kv WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)',
+                (key, time.time())
+            ).fetchone()
+            value = fn(json.loads(row[0]) if row else None)
+            conn.execute(
+                'INSERT OR REPLACE INTO kv (key, value, expires_at) VALUES (?, ?, ?)',
+                (key, json.dumps(value), expires_at)
+            )
+        return value
+
+    def delete(self, *keys):
+        with self._transaction() as conn:
+            return sum(conn.execute('DELETE FROM kv WHERE key = ?', (key,)).rowcount for key in keys)
+
+    def incr(self, key, amount=1):
+        with self._transaction() as conn:
+            row = conn.execute(
+                'SELECT value, expires_at FROM kv WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)',
+                (key, time.time())
+            ).fetchone()
+            value = (json.loads(row[0]) if row else 0) + amount
+            conn.execute(
+                'INSERT OR REPLACE INTO kv (key, value, expires_at) VALUES (?, ?, ?)',
+                (key, json.dumps(value), row[1] if row else None)
+            )
+        return value
+
+    def keys(self, pattern='*'):
+        rows = self._connection().execute(
+            'SELECT key FROM kv WHERE expires_at IS NULL OR expires_at > ?', (time.time(),)
+        ).fetchall()
+        return [row[0] for row in rows if fnmatch.fnmatchcase(row[0], pattern)]
+
+    def purge_expired(self):
+        """Drop expired entries (expired keys are already invisible to readers)"""
+        with self._transaction() as conn:
+            return conn.execute('DELETE FROM kv WHERE expires_at IS NOT NULL AND expires_at <= ?', (time.time(),)).rowcount
+
+
+class RedisBackend(StateBackend):
+    """Backend for Redis or any server speaking its protocol (requires the redis package)"""
+
+    def __init__(self, url):
+        try:
+            import redis
+        except ImportError:
+            raise Exception("STATE_BACKEND=redis requires the 'redis' package (pip install redis)")
+        self.client = redis.Redis.from_url(url)
+
+    def get(self, key, default=None):
+        value = self.client.get(key)
+        return json.loads(value) if value is not None else default
+
+    def set(self, key, value, ex=None):
+        return bool(self.client.set(key, json.dumps(value), ex=int(ex) if ex else None))
+
+    def update(self, key, fn, ex=None):
+        def apply(pipe):
+            current = pipe.get(key)
+            value = fn(json.loads(current) if current is not None else None)
+            pipe.multi()
+            pipe.set(key, json.dumps(value), ex=int(ex) if ex else None)
+            return value
+        # WATCH/MULTI: rerun apply if another client wrote the key in between
+        return self.client.transaction(apply, key, value_from_callable=True)
+
+    def delete(self, *keys):
+        return self.client.delete(*keys) if keys else 0
+
+    def incr(self, key, amount=1):
+        return self.client.incrby(key, amount)
+
+    def keys(self, pattern='*'):
+        return [k.decode() if isinstance(k, bytes) else k for k in self.client.keys(pattern)]
+
+
+def get_state_backend():
+    """
+    Backend selected by STATE_BACKEND: 'sqlite' (default, shared by workers on one
+    dyno/host), 'memory' (single process) or 'redis' (REDIS_URL, shared across hosts)
+    """
+    backend = os.environ.get('STATE_BACKEND', 'sqlite').lower()
+    if backend == 'memory':
+        return MemoryBackend()
+    if backend == 'redis':
+        return RedisBackend(os.environ.get('REDIS_URL', 'redis://localhost:6379/0'))
+    return SQLiteBackend(os.environ.get('STATE_DB_PATH', 'data/shared_state.db'))
+
+
+class QueryCache:
+    """Caches Salesforce query results in the shared backend for a short TTL"""
+
+    def __init__(self, backend, ttl=60):
+        self.backend = backend
+        self.ttl = ttl
+
+    def query(self, sf, soql, ttl=None):
+        """sf.query(soql) with the result shared between workers for ttl seconds"""
+        if self.backend is None:
+            return sf.query(soql)
+        digest = hashlib.sha1(f"{getattr(sf, 'sf_instance', '')}|{soql}".encode()).hexdigest()
+        key = f"query:{digest}"
+        result = self.backend.get(key)
+        if result is None:
+            result = sf.query(soql)
+            # Keep only the JSON parts (records may be OrderedDicts)
+            result = json.loads(json.dumps(result))
+            self.backend.set(key, result, ex=ttl or self.ttl)
+        return result
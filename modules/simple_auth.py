@@ -3,11 +3,13 @@ Simple SOAP-based Authentication
 Works with just username and password - no security token needed!
 """
 
-from simple_salesforce import Salesforce
 import requests
 from datetime import datetime
 import xml.etree.ElementTree as ET
 
+from modules.metrics import span
+from modules.salesforce_connector import API_VERSION, api_session, login_url
+
 class SimpleAuthConnector:
     def __init__(self):
         self.sf = None
@@ -22,11 +24,13 @@ class SimpleAuthConnector:
         Security token is appended to password if provided
         """
         
+        from simple_salesforce import Salesforce
+        
         # Append security token to password if provided (Salesforce standard)
         full_password = password + security_token if security_token else password
         
         # SOAP endpoint
-        soap_url = 'https://login.salesforce.com/services/Soap/u/59.0'
+        soap_url = f'{login_url()}/services/Soap/u/{API_VERSION}'
         
         # SOAP request body
         soap_body = f"""<?xml version="1.0" encoding="utf-8"?>
@@ -46,7 +50,8 @@ class SimpleAuthConnector:
         }
         
         # Make SOAP request
-        response = requests.post(soap_url, data=soap_body, headers=headers)
+        with span('salesforce'):
+            response = requests.post(soap_url, data=soap_body, headers=headers)
         
         if response.status_code != 200:
             # Parse error
@@ -82,7 +87,8 @@ class SimpleAuthConnector:
             # Create Salesforce connection with session
             self.sf = Salesforce(
                 instance_url=instance_url,
-                session_id=session_id
+                session_id=session_id,
+                session=api_session(instance_url)
             )
             
             self.username = username
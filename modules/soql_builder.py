@@ -0,0 +1,194 @@
+"""
+SOQL Query Builder
+Builds SOQL from segment filters with escaped values and validated field names
+"""
+
+import re
+
+# Segment filter operators -> SOQL comparison operators
+COMPARISON_OPERATORS = {
+    'equals': '=',
+    'not_equals': '!=',
+    'greater_than': '>',
+    'greater_than_or_equal': '>=',
+    'less_than': '<',
+    'less_than_or_equal': '<=',
+}
+
+LIKE_OPERATORS = ('contains', 'starts_with')
+
+SUPPORTED_OPERATORS = tuple(COMPARISON_OPERATORS) + LIKE_OPERATORS + ('in', 'not_in')
+
+# Symbolic spellings used by older saved segments and the AI agent ('>=' -> 'greater_than_or_equal')
+OPERATOR_ALIASES = {symbol: name for name, symbol in COMPARISON_OPERATORS.items()}
+OPERATOR_ALIASES['<>'] = 'not_equals'
+
+_IDENTIFIER = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*(\.[A-Za-z_][A-Za-z0-9_]*)*$')
+_NUMBER = re.compile(r'^-?\d+(\.\d+)?$')
+_DATE = re.compile(r'^\d{4}-\d{2}-\d{2}(T\d{2}:\d{2}:\d{2}(\.\d+)?(Z|[+-]\d{2}:\d{2}))?$')
+
+# SOQL date literals that may be emitted unquoted (TODAY, LAST_N_DAYS:30, ...)
+DATE_LITERALS = frozenset({
+    'YESTERDAY', 'TODAY', 'TOMORROW',
+    'LAST_WEEK', 'THIS_WEEK', 'NEXT_WEEK', 'LAST_MONTH', 'THIS_MONTH', 'NEXT_MONTH',
+    'LAST_90_DAYS', 'NEXT_90_DAYS', 'LAST_QUARTER', 'THIS_QUARTER', 'NEXT_QUARTER',
+    'LAST_YEAR', 'THIS_YEAR', 'NEXT_YEAR',
+    'LAST_FISCAL_QUARTER', 'THIS_FISCAL_QUARTER', 'NEXT_FISCAL_QUARTER',
+    'LAST_FISCAL_YEAR', 'THIS_FISCAL_YEAR', 'NEXT_FISCAL_YEAR',
+})
+N_DATE_LITERALS = frozenset({
+    'LAST_N_DAYS', 'NEXT_N_DAYS', 'N_DAYS_AGO', 'LAST_N_WEEKS', 'NEXT_N_WEEKS', 'N_WEEKS_AGO',
+    'LAST_N_MONTHS', 'NEXT_N_MONTHS', 'N_MONTHS_AGO', 'LAST_N_QUARTERS', 'NEXT_N_QUARTERS', 'N_QUARTERS_AGO',
+    'LAST_N_YEARS', 'NEXT_N_YEARS', 'N_YEARS_AGO', 'LAST_N_FISCAL_QUARTERS', 'NEXT_N_FISCAL_QUARTERS',
+    'N_FISCAL_QUARTERS_AGO', 'LAST_N_FISCAL_YEARS', 'NEXT_N_FISCAL_YEARS', 'N_FISCAL_YEARS_AGO',
+})
+_N_DATE_LITERAL = re.compile(r'^([A-Z_]+):\d+$')
+
+# SOQL statements are limited to 100,000 characters; keep Id IN lists well below that
+ID_CHUNK_SIZE = 500
+
+
+def escape_string(value):
+    """Escape a value for use inside a single-quoted SOQL string literal"""
+    return (str(value)
+            .replace('\\', '\\\\')
+            .replace("'", "\\'")
+            .replace('"', '\\"')
+            .replace('\n', '\\n')
+            .replace('\r', '\\r')
+            .replace('\t', '\\t'))
+
+
+def escape_like(value):
+    """Escape a value for a LIKE pattern (wildcards in the value are literal)"""
+    return escape_string(value).replace('%', '\\%').replace('_', '\\_')
+
+
+def normalize_operator(operator):
+    """Canonical name of a filter operator (symbolic aliases are mapped, unknown ones kept as is)"""
+    return OPERATOR_ALIASES.get(operator, operator)
+
+
+def validate_identifier(name):
+    """Only allow plain (optionally dotted) field/object names"""
+    if not isinstance(name, str) or not _IDENTIFIER.match(name):
+        raise Exception(f"Invalid field or object name: {name!r}")
+    return name
+
+
+def is_date_literal(text):
+    """True for a SOQL date literal such as TODAY or LAST_N_DAYS:30"""
+    if text in DATE_LITERALS:
+        return True
+    match = _N_DATE_LITERAL.match(text)
+    return bool(match) and match.group(1) in N_DATE_LITERALS
+
+
+def format_literal(value, bare=False):
+    """Render a Python value as a SOQL literal
+    
+    With bare=True, strings that are numbers, dates or date literals
+    (TODAY, LAST_N_DAYS:30) are emitted unquoted, as ordering comparisons need.
+    """
+    if value is None:
+        return 'null'
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, (int, float)):
+        return repr(value)
+    text = str(value).strip()
+    if bare and (_NUMBER.match(text) or _DATE.match(text) or is_date_literal(text)):
+        return text
+    return f"'{escape_string(value)}'"
+
+
+class SOQLQueryBuilder:
+    """Fluent builder for SELECT ... FROM ... WHERE ... queries"""
+
+    def __init__(self, base_object, fields=('Id', 'Name')):
+        self.base_object = validate_identifier(base_object)
+        self.fields = [validate_identifier(f) for f in fields]
+        self.conditions = []
+        self.order = None
+        self.row_limit = None
+
+    def select(self, *fields):
+        self.fields = [validate_identifier(f) for f in fields]
+        return self
+
+    def where(self, field, operator, value):
+        """Add a predicate (combined with AND)"""
+        self.conditions.append(self.condition(field, operator, value))
+        return self
+
+    def where_id_in(self, ids):
+        self.conditions.append(self.condition('Id', 'in', list(ids)))
+        return self
+
+    def order_by(self, field, descending=False):
+        self.order = f"{validate_identifier(field)}{' DESC' if descending else ''}"
+        return self
+
+    def limit(self, row_limit):
+        self.row_limit = int(row_limit) if row_limit else None
+        return self
+
+    @staticmethod
+    def condition(field, operator, value):
+        """Render one filter as a SOQL condition"""
+        field = validate_identifier(field)
+        operator = normalize_operator(operator)
+
+        if operator in COMPARISON_OPERATORS:
+            # Ordering comparisons take numbers/dates given as strings (e.g. '5')
+            bare = operator not in ('equals', 'not_equals')
+            return f"{field} {COMPARISON_OPERATORS[operator]} {format_literal(value, bare=bare)}"
+        if operator == 'contains':
+            return f"{field} LIKE '%{escape_like(value)}%'"
+        if operator == 'starts_with':
+            return f"{field} LIKE '{escape_like(value)}%'"
+        if operator in ('in', 'not_in'):
+            values = value if isinstance(value, (list, tuple, set)) else [value]
+            rendered = ', '.join(format_literal(v) for v in values)
+            return f"{field} {'IN' if operator == 'in' else 'NOT IN'} ({rendered})"
+
+        raise Exception(f"Unsupported filter operator: {operator}")
+
+    def build(self):
+        query = f"SELECT {', '.join(self.fields)} FROM {self.base_object}"
+        if self.conditions:
+            query += f" WHERE {' AND '.join(self.conditions)}"
+        if self.order:
+            query += f" ORDER BY {self.order}"
+        if self.row_limit:
+            query += f" LIMIT {self.row_limit}"
+        return query
+
+    def build_count(self):
+        """SELECT COUNT() variant - returns only totalSize, no rows"""
+        query = f"SELECT COUNT() FROM {self.base_object}"
+        if self.conditions:
+            query += f" WHERE {' AND '.join(self.conditions)}"
+        return query
+
+    @classmethod
+    def from_filters(cls, base_object, filters, fields=('Id', 'Name'), limit=None):
+        """Builder with every segment filter pushed into the WHERE clause"""
+        builder = cls(base_object, fields)
+        for f in filters:
+            builder.where(f['field'], f['operator'], f['value'])
+        return builder.limit(limit)
+
+
+def query_records_by_id(sf, base_object, ids, fields=('Id', 'Name'), filters=()):
+    """
+    Fetch records for a set of Ids (semi-join pushed down as chunked Id IN lists),
+    following query_all pagination. Extra filters are pushed into the same WHERE.
+    """
+    ids = list(ids)
+    records = []
+    for start in range(0, len(ids), ID_CHUNK_SIZE):
+        builder = SOQLQueryBuilder.from_filters(base_object, filters, fields)
+        builder.where_id_in(ids[start:start + ID_CHUNK_SIZE])
+        records.extend(sf.query_all(builder.build())['records'])
+    return records
@@ -0,0 +1,62 @@
+"""
+Startup
+Deferred construction of the managers whose modules are slow to import, so
+a dyno boot or worker restart only pays for what its requests actually use
+
+STARTUP_MODE=lazy (default) builds them on first use; STARTUP_MODE=eager
+builds them at import, e.g. for gunicorn --preload.
+"""
+
+import importlib
+import os
+import threading
+
+STARTUP_MODE = os.environ.get('STARTUP_MODE', 'lazy').lower()
+
+
+class LazyManager:
+    """
+    Stand-in for module.name(*args, **kwargs), imported and built on first attribute access
+
+    Attribute reads and writes go to the real manager, so callers use it like the
+    manager itself. Construction happens once, even with concurrent first requests.
+    """
+
+    def __init__(self, module, name, *args, **kwargs):
+        object.__setattr__(self, '_lazy_target', (module, name, args, kwargs))
+        object.__setattr__(self, '_lazy_instance', None)
+        object.__setattr__(self, '_lazy_lock', threading.Lock())
+
+    def resolve(self):
+        """The real manager (built now if it hasn't been yet)"""
+        instance = self._lazy_instance
+        if instance is None:
+            with self._lazy_lock:
+                instance = self._lazy_instance
+                if instance is None:
+                    module, name, args, kwargs = self._lazy_target
+                    instance = getattr(importlib.import_module(module), name)(*args, **kwargs)
+                    object.__setattr__(self, '_lazy_instance', instance)
+        return instance
+
+    @property
+    def built(self):
+        return self._lazy_instance is not None
+
+    def __getattr__(self, attr):
+        return getattr(self.resolve(), attr)
+
+    def __setattr__(self, attr, value):
+        setattr(self.resolve(), attr, value)
+
+    def __repr__(self):
+        module, name = self._lazy_target[:2]
+        state = 'built' if self.built else 'deferred'
+        return f"<LazyManager {module}.{name} ({state})>"
+
+
+def resolve_all(*managers):
+    """Build every deferred manager now"""
+    for manager in managers:
+        if isinstance(manager, LazyManager):
+            manager.resolve()
@@ -0,0 +1,730 @@
+"""
+Synthetic Data
+Seeded, vectorized generator of load-test populations: engagement profiles, insight time
+series, vehicles and telemetry with the same fields as the data files, written chunk by chunk
+"""
+
+import csv
+import json
+import os
+import operator
+import shutil
+from datetime import date, datetime, time
+from functools import reduce
+
+import numpy as np
+
+from modules.channel_scoring import CHANNEL_SCORE_FIELDS, CHANNELS, COUNTER_FIELDS, ChannelScorer, load_weights
+from modules.columnar_store import ColumnarStore, ColumnarWriter
+from modules.data_store import DATASETS
+from modules.enrichment_stages import (AVATAR_STYLES, CONTACT_TIME_WEIGHTS, CONTACT_TIME_WINDOWS, EXERCISES,
+                                       EXERCISES_BY_HOBBY, generate_avatar_url)
+from modules.insights_generator import InsightsGenerator
+
+# Datasets produced, in dependency-free write order (each chunk regenerates what it references)
+GENERATED_DATASETS = ('engagement', 'insights', 'individual_vehicles', 'vehicle_telematics')
+FORMATS = ('json', 'csv', 'columnar')
+
+# One random stream per (dataset, chunk) - chunks can be generated independently and in any order
+STREAMS = {'people': 1, 'engagement': 2, 'event_counts': 3, 'insights': 4,
+           'vehicle_layout': 5, 'individual_vehicles': 6, 'vehicle_telematics': 7}
+
+ID_PREFIX = '0PKSY'
+INSIGHT_DAYS = 90
+TELEMETRY_DAYS = 7
+
+FIRST_NAMES = [
+    'Aarti', 'Ajay', 'Ajit', 'Akash', 'Amit', 'Ananya', 'Ankit', 'Ankita', 'Archana', 'Ashish', 'Bhavna', 'Deepika',
+    'Dev', 'Dinesh', 'Divya', 'Harsh', 'Jatin', 'Jyoti', 'Kapil', 'Karan', 'Kiran', 'Komal', 'Kriti', 'Kunal',
+    'Manish', 'Manoj', 'Mansi', 'Megha', 'Naveen', 'Nidhi', 'Nikhil', 'Nikita', 'Nisha', 'Pallavi', 'Pankaj',
+    'Payal', 'Pooja', 'Prakash', 'Preeti', 'Priya', 'Radha', 'Rahul', 'Rajesh', 'Ravi', 'Rekha', 'Ritika', 'Rohan',
+    'Sanjay', 'Sarika', 'Seema', 'Shreya', 'Siddharth', 'Sneha', 'Sonal', 'Swati', 'Tanvi', 'Tarun', 'Varsha',
+    'Varun', 'Vikram', 'Vishal', 'Vivek'
+]
+LAST_NAMES = [
+    'Agarwal', 'Agnihotri', 'Ahluwalia', 'Ahmed', 'Ansari', 'Bajaj', 'Banerjee', 'Bhatia', 'Bhatt', 'Bose',
+    'Chatterjee', 'Chauhan', 'Chawla', 'Chopra', 'Choudhary', 'Desai', 'Dewan', 'Dhawan', 'Dutta', 'Goswami',
+    'Gupta', 'Hegde', 'Inamdar', 'Iyer', 'Kamath', 'Kapoor', 'Khanna', 'Kher', 'Krishnan', 'Kulkarni', 'Malhotra',
+    'Mankar', 'Mehta', 'Menon', 'Mishra', 'Mukherjee', 'Naidu', 'Naik', 'Nair', 'Pandey', 'Patel', 'Patil',
+    'Pillai', 'Qureshi', 'Raman', 'Rao', 'Reddy', 'Roy', 'Saxena', 'Shah', 'Sharma', 'Singh', 'Tandon', 'Thakur',
+    'Tripathi', 'Uppal', 'Varma', 'Verma', 'Wadhwa', 'Yadav'
+]
+EMAIL_DOMAINS = ['company.com', 'yahoo.com', 'gmail.com', 'business.in', 'enterprise.com', 'tech.in', 'hotmail.com', 'outlook.com']
+COUNTRIES = [('United States', 'US'), ('United Kingdom', 'GB'), ('Singapore', 'SG'), ('India', 'IN'), ('Australia', 'AU'), ('Canada', 'CA')]
+PHONE_TYPES = ['Work', 'Mobile', 'Home']
+MESSAGING_PLATFORMS = ['WhatsApp', 'Signal', 'Telegram', 'WeChat']
+DEVICE_TYPES = ['Web', 'iOS', 'Android']
+APP_VERSIONS = ['2.24.1', '3.0.0', '2.23.1', '2.23.2', '2.24.0']
+
+# Same catalog as create_synthetic_engagement.py
+PRODUCTS = [
+    ('Wireless Headphones', 79.99, 'Electronics'), ('Running Shoes', 129.99, 'Sports'),
+    ('Smart Watch', 249.99, 'Electronics'), ('Yoga Mat', 34.99, 'Sports'), ('Coffee Maker', 89.99, 'Home'),
+    ('Backpack', 59.99, 'Accessories'), ('Bluetooth Speaker', 99.99, 'Electronics'), ('Water Bottle', 24.99, 'Sports'),
+    ('Desk Lamp', 44.99, 'Home'), ('Phone Case', 19.99, 'Accessories'), ('Laptop Stand', 39.99, 'Office'),
+    ('Fitness Tracker', 149.99, 'Sports'), ('Wireless Mouse', 29.99, 'Electronics'), ('Notebook Set', 15.99, 'Office'),
+    ('Travel Mug', 22.99, 'Home')
+]
+PRODUCT_CATEGORIES = ['Electronics', 'Sports', 'Home', 'Accessories', 'Office']
+EMAIL_CAMPAIGNS = [
+    'Weekly Newsletter', 'Product Launch Announcement', 'Flash Sale Alert', 'Personalized Recommendations',
+    'Cart Abandonment Reminder', 'Welcome Email', 'Customer Survey', 'Seasonal Promotion'
+]
+
+# Engagement tiers: top 20%, middle 50%, bottom 30% (counter ranges per tier, inclusive)
+TIER_SHARES = [0.2, 0.5, 0.3]
+TIER_RANGES = {
+    'email_opens': [(15, 30), (5, 14), (0, 4)],
+    'email_clicks': [(10, 20), (2, 9), (0, 2)],
+    'email_bounces': [(0, 1), (0, 2), (0, 3)],
+    'email_campaigns_received': [(5, 15), (5, 15), (5, 15)],
+    'website_product_views': [(20, 50), (8, 19), (0, 7)],
+    'website_add_to_cart': [(5, 15), (2, 7), (0, 3)],
+    'website_cart_abandons': [(1, 5), (1, 3), (0, 2)],
+    'website_purchases': [(3, 10), (1, 4), (0, 1)],
+    'sms_sends': [(12, 25), (6, 14), (1, 6)],
+    'sms_opens': [(10, 22), (3, 12), (0, 4)],
+    'sms_clicks': [(5, 15), (1, 8), (0, 2)],
+    'whatsapp_sends': [(8, 20), (4, 10), (0, 5)],
+    'whatsapp_reads': [(7, 18), (2, 9), (0, 3)],
+    'whatsapp_replies': [(3, 12), (1, 5), (0, 2)],
+    'push_sends': [(15, 30), (8, 18), (2, 10)],
+    'push_opens': [(10, 25), (4, 14), (0, 6)],
+    'push_clicks': [(5, 15), (2, 8), (0, 3)],
+}
+TIER_FLAG_RATES = {'email_unsubscribes': [0, 0.1, 0.3], 'sms_optouts': [0, 0.1, 0.3], 'whatsapp_optouts': [0, 0, 0.2]}
+
+# Insight fields that drift between events (chance of a new value per event); Hobby is fixed per individual
+_VOCABULARY = InsightsGenerator()
+EVOLVING_FIELDS = [
+    ('Current_Sentiment', _VOCABULARY.sentiments, 0.3),
+    ('Lifestyle_Quotient', _VOCABULARY.lifestyle_quotients, 0.2),
+    ('Health_Profile', _VOCABULARY.health_profiles, 0.25),
+    ('Fitness_Milestone', _VOCABULARY.fitness_milestones, 0.15),
+    ('Purchase_Intent', _VOCABULARY.purchase_intents, 1.0),
+    ('Favourite_Brand', _VOCABULARY.favourite_brands, 0.1),
+    ('Favourite_Destination', _VOCABULARY.favourite_destinations, 0.1),
+]
+
+# Vehicles: 0-3 per individual, telematics on 80% of them
+VEHICLE_COUNT_SHARES = [0.15, 0.61, 0.19, 0.05]
+TELEMATICS_ACTIVE_SHARE = 0.8
+VEHICLE_MODELS = [
+    ('Maruti Suzuki', 'Alto', 'Hatchback', 400000), ('Maruti Suzuki', 'Swift', 'Hatchback', 650000),
+    ('Maruti Suzuki', 'Baleno', 'Hatchback', 750000), ('Maruti Suzuki', 'Brezza', 'Compact SUV', 1000000),
+    ('Maruti Suzuki', 'Ertiga', 'MPV', 1000000), ('Hyundai', 'Grand i10 Nios', 'Hatchback', 600000),
+    ('Hyundai', 'i20', 'Hatchback', 800000), ('Hyundai', 'Venue', 'Compact SUV', 1000000),
+    ('Hyundai', 'Creta', 'SUV', 1400000), ('Hyundai', 'Alcazar', 'SUV', 1900000),
+    ('Tata', 'Tiago', 'Hatchback', 600000), ('Tata', 'Altroz', 'Hatchback', 750000), ('Tata', 'Punch', 'Compact SUV', 700000),
+    ('Tata', 'Nexon', 'Compact SUV', 1000000), ('Tata', 'Safari', 'SUV', 2000000),
+    ('Mahindra', 'Bolero', 'SUV', 1000000), ('Mahindra', 'XUV300', 'Compact SUV', 1000000),
+    ('Mahindra', 'Scorpio', 'SUV', 1600000), ('Mahindra', 'XUV700', 'SUV', 2000000),
+    ('Toyota', 'Glanza', 'Hatchback', 800000), ('Toyota', 'Urban Cruiser', 'Compact SUV', 1100000),
+    ('Toyota', 'Innova Crysta', 'MPV', 2200000), ('Toyota', 'Fortuner', 'SUV', 3800000),
+    ('Honda', 'Amaze', 'Sedan', 800000), ('Honda', 'Jazz', 'Hatchback', 800000), ('Honda', 'City', 'Sedan', 1300000),
+    ('Honda', 'WR-V', 'Compact SUV', 1000000), ('Honda', 'Civic', 'Sedan', 2000000),
+    ('Kia', 'Sonet', 'Compact SUV', 1000000), ('Kia', 'Seltos', 'SUV', 1500000), ('Kia', 'Carens', 'MPV', 1400000),
+    ('MG', 'Astor', 'SUV', 1300000), ('MG', 'Hector', 'SUV', 1800000), ('MG', 'ZS EV', 'SUV', 2300000),
+    ('MG', 'Gloster', 'SUV', 3800000), ('Renault', 'Kwid', 'Hatchback', 450000), ('Renault', 'Triber', 'MPV', 650000),
+    ('Renault', 'Kiger', 'Compact SUV', 750000), ('Renault', 'Duster', 'SUV', 1000000),
+    ('Volkswagen', 'Polo', 'Hatchback', 700000), ('Volkswagen', 'Vento', 'Sedan', 1000000),
+    ('Volkswagen', 'Virtus', 'Sedan', 1300000), ('Volkswagen', 'Taigun', 'SUV', 1400000),
+]
+TRIMS = ['Base', 'Mid', 'Top', 'Sport', 'Luxury']
+COLORS = ['White', 'Silver', 'Grey', 'Black', 'Red', 'Blue', 'Brown', 'Beige']
+FUEL_TYPES = ['Petrol', 'Diesel', 'CNG', 'Hybrid', 'Electric']
+FUEL_TYPE_SHARES = [0.3, 0.2, 0.18, 0.17, 0.15]
+TRANSMISSIONS = ['Manual', 'Automatic', 'AMT', 'CVT', 'DCT']
+REGISTRATION_STATES = ['DL', 'GJ', 'HR', 'KA', 'MH', 'MP', 'RJ', 'TN', 'UP', 'WB']
+VIN_ALPHABET = list('ABCDEFGHJKLMNPRSTUVWXYZ0123456789')
+LETTERS = list('ABCDEFGHIJKLMNOPQRSTUVWXYZ')
+
+# Telemetry: every vehicle drives around one city, readings within ~0.1 degrees of the centre
+CITIES = [
+    ('Mumbai', 19.0760, 72.8777), ('Delhi', 28.7041, 77.1025), ('Bengaluru', 12.9716, 77.5946),
+    ('Hyderabad', 17.3850, 78.4867), ('Chennai', 13.0827, 80.2707), ('Kolkata', 22.5726, 88.3639),
+    ('Pune', 18.5204, 73.8567), ('Ahmedabad', 23.0225, 72.5714), ('Jaipur', 26.9124, 75.7873),
+    ('Lucknow', 26.8467, 80.9462),
+]
+DIAGNOSTIC_CODES = ['P0171', 'P0128', 'P0442', 'P0420', 'P0300']
+CONNECTION_STATUSES = ['Connected', 'Intermittent', 'Weak Signal']
+
+
+# ----------------------------------------------------------------------------
+# Vectorized helpers
+# ----------------------------------------------------------------------------
+
+# Strings are built as object arrays: Python str operations beat numpy.char by 2-4x here
+
+def _pick(rng, choices, size, p=None):
+    """Array of values drawn from choices"""
+    return np.asarray(choices, dtype=object)[rng.choice(len(choices), size=size, p=p)]
+
+
+def _chars(rng, alphabet, size, length):
+    """Random fixed-length strings over an alphabet"""
+    return np.asarray(alphabet)[rng.integers(0, len(alphabet), (size, length))].view(f'<U{length}').ravel().astype(object)
+
+
+def _concat(*parts):
+    """Element-wise string concatenation of string arrays / scalars"""
+    return reduce(operator.add, [part if isinstance(part, str) else np.asarray(part, dtype=object) for part in parts])
+
+
+def _text(fmt, values):
+    """fmt % value for every value"""
+    return np.array([fmt % value for value in np.asarray(values).tolist()], dtype=object)
+
+
+def _bool_text(values):
+    return np.where(values, 'true', 'false')
+
+
+def _between(rng, low, high):
+    """Integers in [low, high] per row (bounds are arrays)"""
+    return rng.integers(low, np.asarray(high) + 1)
+
+
+def _tiered(rng, tier, ranges):
+    low = np.array([r[0] for r in ranges])[tier]
+    high = np.array([r[1] for r in ranges])[tier]
+    return _between(rng, low, high)
+
+
+def _mostly(rng, size, usual, rare, rate):
+    """Integers in the usual [low, high] range, in the rare one with the given chance"""
+    return np.where(rng.random(size) < rate, rng.integers(rare[0], rare[1] + 1, size), rng.integers(usual[0], usual[1] + 1, size))
+
+
+def _share(rng, values, low, high):
+    """Integers between int(values * low) and int(values * high)"""
+    return _between(rng, (values * low).astype(np.int64), (values * high).astype(np.int64))
+
+
+def _iso(microseconds):
+    """ISO timestamps (with microseconds) of epoch-µs values"""
+    return np.datetime_as_string(microseconds.astype('datetime64[us]'), unit='us')
+
+
+def _drifting(rng, size, starts, rate):
+    """
+    Codes that keep their value from event to event and change with the given chance
+
+    starts marks each individual's first event (always a fresh draw); every event
+    takes the draw of the latest change at or before it.
+    """
+    draws = rng.integers(0, size, len(starts))
+    changed = starts | (rng.random(len(starts)) < rate)
+    latest = np.maximum.accumulate(np.where(changed, np.arange(len(starts)), 0))
+    return draws[latest]
+
+
+def _join_rows(names, order, counts, separator=', '):
+    """', '-joined names[order[row, :counts[row]]] per row"""
+    picked = names[order]
+    return np.array([separator.join(row[:count]) for row, count in zip(picked.tolist(), counts.tolist())])
+
+
+# ----------------------------------------------------------------------------
+# Population
+# ----------------------------------------------------------------------------
+
+class SyntheticPopulation:
+    """
+    A reproducible population of individuals and their engagement, insights, vehicles and telemetry
+
+    Individuals are generated in fixed-size chunks; each (dataset, chunk) pair draws from
+    its own seeded stream, so a chunk of any dataset can be rebuilt on its own and the
+    datasets agree on who the individuals are. A chunk is a dict of arrays in the field
+    order of the data file. Output depends on seed, anchor and chunk_size only.
+    """
+
+    def __init__(self, individuals, seed=0, events_per_individual=(3, 8), readings_per_vehicle=20,
+                 anchor=None, chunk_size=20000, weights=None):
+        self.individuals = int(individuals)
+        self.seed = int(seed)
+        self.events_per_individual = tuple(events_per_individual)
+        self.readings_per_vehicle = int(readings_per_vehicle)
+        self.anchor = anchor or datetime.combine(date.today(), time())
+        self.chunk_size = int(chunk_size)
+        self.weights = weights or load_weights()
+        self._anchor_us = int((self.anchor - datetime(1970, 1, 1)).total_seconds() * 1_000_000)
+        self._row_counts = {}
+
+    @property
+    def chunk_count(self):
+        return -(-self.individuals // self.chunk_size)
+
+    def _bounds(self, chunk):
+        start = chunk * self.chunk_size
+        return start, min(self.individuals, start + self.chunk_size)
+
+    def _rng(self, stream, chunk):
+        return np.random.default_rng([self.seed, STREAMS[stream], chunk])
+
+    # ------------------------------------------------------------------
+    # Sizes
+    # ------------------------------------------------------------------
+
+    def _event_counts(self, chunk):
+        start, stop = self._bounds(chunk)
+        low, high = self.events_per_individual
+        return self._rng('event_counts', chunk).integers(low, high + 1, stop - start)
+
+    def _vehicle_layout(self, chunk):
+        """Vehicles per individual and whether each vehicle reports telemetry"""
+        start, stop = self._bounds(chunk)
+        rng = self._rng('vehicle_layout', chunk)
+        counts = rng.choice(len(VEHICLE_COUNT_SHARES), size=stop - start, p=VEHICLE_COUNT_SHARES)
+        return counts, rng.random(int(counts.sum())) < TELEMATICS_ACTIVE_SHARE
+
+    def chunk_rows(self, dataset):
+        """Rows per chunk of a dataset (cheap - only the size draws are made)"""
+        if dataset not in self._row_counts:
+            chunks = range(self.chunk_count)
+            if dataset == 'engagement':
+                rows = [self._bounds(c)[1] - self._bounds(c)[0] for c in chunks]
+            elif dataset == 'insights':
+                rows = [int(self._event_counts(c).sum()) for c in chunks]
+            elif dataset == 'individual_vehicles':
+                rows = [len(self._vehicle_layout(c)[1]) for c in chunks]
+            elif dataset == 'vehicle_telematics':
+                rows = [int(self._vehicle_layout(c)[1].sum()) * self.readings_per_vehicle for c in chunks]
+            else:
+                raise Exception(f"Unknown synthetic dataset: {dataset}")
+            self._row_counts[dataset] = rows
+        return self._row_counts[dataset]
+
+    def rows(self, dataset):
+        return sum(self.chunk_rows(dataset))
+
+    def chunk(self, dataset, chunk):
+        generate = {
+            'engagement': self.engagement_chunk,
+            'insights': self.insights_chunk,
+            'individual_vehicles': self.vehicles_chunk,
+            'vehicle_telematics': self.telemetry_chunk,
+        }
+        if dataset not in generate:
+            raise Exception(f"Unknown synthetic dataset: {dataset}")
+        return generate[dataset](chunk)
+
+    def chunks(self, dataset):
+        for chunk in range(self.chunk_count):
+            yield self.chunk(dataset, chunk)
+
+    # ------------------------------------------------------------------
+    # Individuals
+    # ------------------------------------------------------------------
+
+    def people(self, chunk):
+        """Identity fields shared by every dataset"""
+        start, stop = self._bounds(chunk)
+        size = stop - start
+        rng = self._rng('people', chunk)
+        first = rng.integers(0, len(FIRST_NAMES), size)
+        last = rng.integers(0, len(LAST_NAMES), size)
+        domain = _pick(rng, EMAIL_DOMAINS, size)
+        number = rng.integers(7_000_000_000, 10_000_000_000, size)
+        first_names, last_names = np.array(FIRST_NAMES, dtype=object), np.array(LAST_NAMES, dtype=object)
+        mailbox = _concat(np.array([n.lower() for n in FIRST_NAMES], dtype=object)[first], '.',
+                          np.array([n.lower() for n in LAST_NAMES], dtype=object)[last])
+        return {
+            'id': _text(f'{ID_PREFIX}%0{18 - len(ID_PREFIX)}d', np.arange(start, stop)),
+            'FirstName': first_names[first],
+            'LastName': last_names[last],
+            'Name': _concat(first_names[first], ' ', last_names[last]),
+            'Phone': _text('+91%d', number),
+            'Phone_Display': _concat(_text('+91 %05d', number // 100000), _text(' %05d', number % 100000)),
+            'Email': _concat(mailbox, '@', domain),
+        }
+
+    def engagement_chunk(self, chunk):
+        start, stop = self._bounds(chunk)
+        size = stop - start
+        people = self.people(chunk)
+        rng = self._rng('engagement', chunk)
+        tier = rng.choice(len(TIER_SHARES), size=size, p=TIER_SHARES)
+
+        counters = {field: _tiered(rng, tier, ranges) for field, ranges in TIER_RANGES.items()}
+        for field, rates in TIER_FLAG_RATES.items():
+            counters[field] = (rng.random(size) < np.array(rates)[tier]).astype(np.int64)
+        counters['email_deletes'] = _share(rng, counters['email_opens'], 0.1, 0.3)
+        counters['sms_deletes'] = _share(rng, counters['sms_opens'], 0.05, 0.15)
+        counters['whatsapp_opens'] = counters['whatsapp_reads']
+        counters['whatsapp_clicks'] = _share(rng, counters['whatsapp_reads'], 0.4, 0.6)
+        counters['whatsapp_deletes'] = _share(rng, counters['whatsapp_reads'], 0.02, 0.08)
+        counters['push_deletes'] = _share(rng, counters['push_opens'], 0.2, 0.4)
+        counters['social_views'] = rng.integers(20, 101, size)
+        counters['social_clicks'] = _share(rng, counters['social_views'], 0.05, 0.15)
+        counters['website_clicks'] = _share(rng, counters['website_product_views'], 0.3, 0.5)
+
+        # Browsed products in random order; purchases are the first ones browsed
+        names = np.array([p[0] for p in PRODUCTS])
+        order = np.argsort(rng.random((size, len(PRODUCTS))), axis=1)
+        browsed = rng.integers(3, 11, size)
+        purchased = np.minimum(counters['website_purchases'], browsed)
+        position = np.arange(len(PRODUCTS))
+        prices = np.array([p[1] for p in PRODUCTS])[order]
+        order_value = np.where(position < purchased[:, None], prices, 0).sum(axis=1)
+        categories = np.array([PRODUCT_CATEGORIES.index(p[2]) for p in PRODUCTS])[order]
+        category_counts = np.stack([((categories == c) & (position < browsed[:, None])).sum(axis=1)
+                                    for c in range(len(PRODUCT_CATEGORIES))], axis=1)
+        engaged = np.minimum(counters['email_campaigns_received'], len(EMAIL_CAMPAIGNS))
+        campaign_order = np.argsort(rng.random((size, len(EMAIL_CAMPAIGNS))), axis=1)
+
+        scorer = ChannelScorer(self.weights, seed=rng)
+        data = {field: counters[field].astype(np.float64) for field in COUNTER_FIELDS}
+        data['omnichannel_score'] = np.zeros(size)
+        scores = scorer.score_columns(data, include_omnichannel=True)
+
+        days_ago = rng.integers(0, 31, size) * 86_400_000_000 + rng.integers(0, 86_400_000_000, size)
+        countries = rng.integers(0, len(COUNTRIES), size)
+        avatar_styles = np.arange(start, stop) % len(AVATAR_STYLES)
+
+        columns = {'id': people['id']}
+        for field in ('email_opens', 'email_clicks', 'email_bounces', 'email_unsubscribes', 'email_campaigns_received'):
+            columns[field] = counters[field].astype(str)
+        columns['email_campaigns_engaged'] = _join_rows(np.array(EMAIL_CAMPAIGNS), campaign_order, engaged)
+        for field in ('website_product_views', 'website_add_to_cart', 'website_cart_abandons', 'website_purchases'):
+            columns[field] = counters[field].astype(str)
+        columns['products_browsed'] = _join_rows(names, order, browsed)
+        columns['products_purchased'] = _join_rows(names, order, purchased)
+        columns['total_order_value'] = _text('%.2f', order_value)
+        columns['favorite_category'] = np.array(PRODUCT_CATEGORIES)[np.argmax(category_counts, axis=1)]
+        columns['engagement_score'] = scores['engagement_score']
+        columns['last_engagement_date'] = _iso(self._anchor_us - days_ago)
+        columns['data_source'] = np.full(size, 'synthetic_omnichannel')
+        for fields, rate_field in ((('sms_sends', 'sms_opens', 'sms_clicks', 'sms_optouts'), 'sms_open_rate'),
+                                   (('whatsapp_sends', 'whatsapp_reads', 'whatsapp_replies', 'whatsapp_optouts'), 'whatsapp_read_rate'),
+                                   (('push_sends', 'push_opens', 'push_clicks'), 'push_open_rate')):
+            for field in fields:
+                columns[field] = counters[field].astype(str)
+            sends, opens = counters[fields[0]], counters[fields[1]]
+            columns[rate_field] = _text('%.1f', np.divide(opens * 100, sends, out=np.zeros(size), where=sends > 0))
+        columns['total_message_sends'] = (counters['sms_sends'] + counters['whatsapp_sends'] + counters['push_sends']).astype(str)
+        columns['total_message_interactions'] = (
+            counters['sms_opens'] + counters['sms_clicks'] + counters['whatsapp_reads'] +
+            counters['whatsapp_replies'] + counters['push_opens'] + counters['push_clicks']).astype(str)
+        columns['preferred_channel'] = np.array(CHANNELS)[scores['preferred_channel']]
+        columns['omnichannel_score'] = np.round(scores['omnichannel_score'], 2)
+        for field in ('FirstName', 'LastName', 'Name', 'Phone', 'Phone_Display', 'Email'):
+            columns[field] = people[field]
+        columns['Country'] = np.array([c[0] for c in COUNTRIES])[countries]
+        columns['CountryCode'] = np.array([c[1] for c in COUNTRIES])[countries]
+        columns['PhoneType'] = _pick(rng, PHONE_TYPES, size)
+        columns['IsPrimaryPhone'] = np.full(size, 'true')
+        columns['DeviceId'] = _text('DEV_%d', rng.integers(10000, 100000, size))
+        columns['MessagingPlatform'] = _pick(rng, MESSAGING_PLATFORMS, size)
+        columns['DeviceType'] = _pick(rng, DEVICE_TYPES, size)
+        columns['AppVersion'] = _pick(rng, APP_VERSIONS, size)
+        columns['IsActiveDevice'] = _bool_text(rng.random(size) < 0.9)
+        weights = np.array(CONTACT_TIME_WEIGHTS) / sum(CONTACT_TIME_WEIGHTS)
+        columns['preferred_contact_time'] = _pick(rng, CONTACT_TIME_WINDOWS, size, p=weights)
+        for field in CHANNEL_SCORE_FIELDS:
+            columns[field] = np.round(scores[field], 1)
+        columns['preferred_channel_score'] = np.round(scores['preferred_channel_score'], 1)
+        for field in ('email_deletes', 'sms_deletes', 'whatsapp_opens', 'whatsapp_clicks', 'whatsapp_deletes',
+                      'push_deletes', 'social_views', 'social_clicks', 'website_clicks'):
+            columns[field] = counters[field]
+        columns['profile_picture_url'] = np.array([
+            generate_avatar_url(name, AVATAR_STYLES[style])
+            for name, style in zip(people['Name'].tolist(), avatar_styles.tolist())
+        ])
+        return columns
+
+    # ------------------------------------------------------------------
+    # Insights
+    # ------------------------------------------------------------------
+
+    def insights_chunk(self, chunk):
+        people = self.people(chunk)
+        counts = self._event_counts(chunk)
+        rng = self._rng('insights', chunk)
+        owner = np.repeat(np.arange(len(counts)), counts)
+        size = len(owner)
+
+        # Each individual's events in time order, so drifting fields evolve forwards
+        timestamps = self._anchor_us - rng.integers(0, INSIGHT_DAYS * 86_400_000_000, size)
+        order = np.lexsort((timestamps, owner))
+        timestamps = timestamps[order]
+        starts = np.r_[True, owner[1:] != owner[:-1]] if size else np.zeros(0, dtype=bool)
+
+        hobbies = np.array(_VOCABULARY.hobbies)
+        hobby = rng.integers(0, len(hobbies), len(counts))
+        options = [EXERCISES_BY_HOBBY.get(h, EXERCISES) for h in hobbies.tolist()]
+        exercises = np.array([o + [''] * (len(EXERCISES) - len(o)) for o in options])
+        lengths = np.array([len(o) for o in options])
+        exercise = exercises[hobby, (rng.random(len(counts)) * lengths[hobby]).astype(np.int64)]
+
+        first_id = sum(self.chunk_rows('insights')[:chunk])
+        columns = {'Individual_Id': people['id'][owner], 'Event_Timestamp': _iso(timestamps)}
+        for field, values, rate in EVOLVING_FIELDS:
+            columns[field] = np.array(values)[_drifting(rng, len(values), starts, rate)]
+        columns['Hobby'] = hobbies[hobby][owner]
+        columns['Imminent_Event'] = _pick(rng, _VOCABULARY.imminent_events, size)
+        columns['Favourite_Exercise'] = exercise[owner]
+        columns['data_source'] = np.full(size, 'synthetic_insights')
+        columns['Individual_Name'] = people['Name'][owner]
+        columns['Individual_FirstName'] = people['FirstName'][owner]
+        columns['Individual_LastName'] = people['LastName'][owner]
+        columns['Individual_Email'] = people['Email'][owner]
+        columns['Individual_Phone'] = people['Phone'][owner]
+        columns['InsightId'] = _text('INSIGHT_%04d', np.arange(first_id + 1, first_id + size + 1))
+        return columns
+
+    # ------------------------------------------------------------------
+    # Vehicles
+    # ------------------------------------------------------------------
+
+    def vehicles_chunk(self, chunk):
+        start, _ = self._bounds(chunk)
+        people = self.people(chunk)
+        counts, active = self._vehicle_layout(chunk)
+        rng = self._rng('individual_vehicles', chunk)
+        owner = np.repeat(np.arange(len(counts)), counts)
+        size = len(owner)
+        slot = np.arange(size) - np.repeat(np.cumsum(counts) - counts, counts)
+
+        model = rng.integers(0, len(VEHICLE_MODELS), size)
+        model_year = rng.integers(2015, self.anchor.year + 1, size)
+        today = np.datetime64(self.anchor.date(), 'D')
+        purchase = np.minimum((model_year - 1970).astype('datetime64[Y]').astype('datetime64[D]') +
+                              rng.integers(0, 730, size), today - 1)
+        age_years = (today - purchase).astype(np.int64) / 365.25
+        mileage = (age_years * rng.uniform(6000, 15000, size)).astype(np.int64) + rng.integers(0, 500, size)
+        condition = np.where(age_years < 1, 'New', _pick(rng, ['Used', 'Certified Pre-Owned'], size))
+        base_price = np.array([m[3] for m in VEHICLE_MODELS])[model]
+        state = _pick(rng, REGISTRATION_STATES, size)
+        vin = _chars(rng, VIN_ALPHABET, size, 17)
+
+        return {
+            'VehicleId': _concat(_text('VEH_%03d', start + owner + 1), _text('_%d', slot + 1)),
+            'Individual_Id': people['id'][owner],
+            'Individual_Name': people['Name'][owner],
+            'Individual_Email': people['Email'][owner],
+            'VIN': vin,
+            'Make': np.array([m[0] for m in VEHICLE_MODELS])[model],
+            'Model': np.array([m[1] for m in VEHICLE_MODELS])[model],
+            'ModelYear': model_year,
+            'Trim': _pick(rng, TRIMS, size),
+            'RegistrationNumber': _concat(state, _text('%02d', rng.integers(1, 51, size)),
+                                          _chars(rng, LETTERS, size, 2),
+                                          _text('%04d', rng.integers(1, 10000, size))),
+            'RegistrationState': state,
+            'Color': _pick(rng, COLORS, size),
+            'FuelType': _pick(rng, FUEL_TYPES, size, p=FUEL_TYPE_SHARES),
+            'BodyType': np.array([m[2] for m in VEHICLE_MODELS])[model],
+            'Transmission': _pick(rng, TRANSMISSIONS, size),
+            'PurchaseDate': np.datetime_as_string(purchase),
+            'Mileage': mileage,
+            'Condition': condition,
+            'MarketValue': (base_price * 0.85 ** age_years * rng.uniform(0.9, 1.1, size)).astype(np.int64),
+            'IsPrimaryVehicle': _bool_text(slot == 0),
+            'TelematicsDeviceId': _text('TELE_%d', rng.integers(100000, 1000000, size)),
+            'IsTelematicsActive': _bool_text(active),
+            'InsuranceExpiryDate': np.datetime_as_string(today + rng.integers(-365, 366, size)),
+            'ServiceDueDate': np.datetime_as_string(today + rng.integers(0, 181, size)),
+            'ServiceDueMileage': (mileage // 10000 + 1) * 10000,
+            'data_source': np.full(size, 'synthetic'),
+        }
+
+    def telemetry_chunk(self, chunk):
+        vehicles = self.vehicles_chunk(chunk)
+        _, active = self._vehicle_layout(chunk)
+        selected = np.flatnonzero(active)
+        readings = self.readings_per_vehicle
+        rng = self._rng('vehicle_telematics', chunk)
+        vehicle = np.repeat(selected, readings)
+        size = len(vehicle)
+
+        # Readings of a vehicle in time order; the odometer only moves forwards
+        seconds = (self._anchor_us // 1_000_000 - rng.integers(0, TELEMETRY_DAYS * 86400, (len(selected), readings)))
+        seconds = np.sort(seconds, axis=1).ravel()
+        odometer = vehicles['Mileage'][vehicle] + rng.integers(0, 4, (len(selected), readings)).cumsum(axis=1).ravel()
+        city = np.repeat(rng.integers(0, len(CITIES), len(selected)), readings)
+
+        speed = np.where(rng.random(size) < 0.85, rng.integers(5, 121, size), 0)
+        moving = speed > 0
+        engine_on = moving | (rng.random(size) < 0.5)
+        fuel_type = vehicles['FuelType'][vehicle]
+        electric = (fuel_type == 'Electric') | (fuel_type == 'Hybrid')
+        fuel_level = _mostly(rng, size, (10, 100), (0, 9), 0.04)
+        battery = np.where(electric, _mostly(rng, size, (15, 100), (5, 14), 0.05), 0)
+        engine_temp = np.where(engine_on, _mostly(rng, size, (80, 100), (101, 105), 0.03), rng.integers(20, 41, size))
+        tires = {corner: _mostly(rng, size, (30, 36), (26, 28), 0.02) for corner in ('FL', 'FR', 'RL', 'RR')}
+        acceleration = np.where(moving, np.clip(rng.normal(0, 1.2, size), -4, 3), 0.0)
+
+        # Alert of the worst condition in the reading (service reminders at random)
+        low_tire = np.min(np.stack(list(tires.values())), axis=0) < 29
+        alert_type = np.select(
+            [engine_temp > 100, electric & (battery < 15), fuel_level < 10, low_tire, rng.random(size) < 0.04],
+            ['Engine Check', 'Battery Low', 'Low Fuel', 'Low Tire Pressure', 'Service Due'], 'None')
+        severity = np.select(
+            [np.isin(alert_type, ['Engine Check', 'Battery Low']), np.isin(alert_type, ['Low Fuel', 'Low Tire Pressure']),
+             alert_type == 'Service Due'], ['Critical', 'Warning', 'Info'], 'None')
+        diagnostic = np.where(rng.random(size) < 0.13, _pick(rng, DIAGNOSTIC_CODES, size), '')
+
+        first_id = sum(self.chunk_rows('vehicle_telematics')[:chunk])
+        latitude = np.array([c[1] for c in CITIES])[city] + rng.uniform(-0.1, 0.1, size)
+        longitude = np.array([c[2] for c in CITIES])[city] + rng.uniform(-0.1, 0.1, size)
+        timestamps = np.array([t.replace('T', ' ') for t in np.datetime_as_string(seconds.astype('datetime64[s]')).tolist()], dtype=object)
+
+        columns = {
+            'TelematicsId': _text('TEL_%06d', np.arange(first_id + 1, first_id + size + 1)),
+            'Vehicle_Id': vehicles['VehicleId'][vehicle],
+            'VehicleVIN': vehicles['VIN'][vehicle],
+            'VehicleMake': vehicles['Make'][vehicle],
+            'VehicleModel': vehicles['Model'][vehicle],
+            'TelematicsDeviceId': vehicles['TelematicsDeviceId'][vehicle],
+            'Timestamp': timestamps,
+            'Latitude': _text('%.6f', latitude),
+            'Longitude': _text('%.6f', longitude),
+            'LocationCity': np.array([c[0] for c in CITIES])[city],
+            'Speed': speed,
+            'RPM': np.where(engine_on, np.minimum(4500, 800 + speed * 30 + rng.integers(0, 400, size)), 0),
+            'FuelLevel': fuel_level,
+            'FuelConsumption': _text('%.2f', rng.uniform(4, 15, size)),
+            'BatteryLevel': battery,
+            'EngineTemp': engine_temp,
+            'OilPressure': np.where(engine_on, rng.integers(25, 66, size), 0),
+            'Odometer': odometer,
+            'TripDistance': _text('%.2f', rng.uniform(0, 50, size)),
+        }
+        for corner, values in tires.items():
+            columns[f'TirePressure_{corner}'] = values
+        columns.update({
+            'IsEngineOn': _bool_text(engine_on),
+            'IsMoving': _bool_text(moving),
+            'Acceleration': _text('%.2f', acceleration),
+            'HarshBraking': _bool_text(acceleration < -3),
+            'RapidAcceleration': _bool_text(acceleration > 2.5),
+            'Idling': _bool_text(engine_on & ~moving),
+            'DiagnosticCode': diagnostic,
+            'AlertType': alert_type,
+            'AlertSeverity': severity,
+            'ConnectionStatus': _pick(rng, CONNECTION_STATUSES, size),
+            'SignalStrength': rng.integers(30, 101, size),
+            'data_source': np.full(size, 'synthetic'),
+        })
+        return columns
+
+
+# ----------------------------------------------------------------------------
+# Writers
+# ----------------------------------------------------------------------------
+
+def _column_lists(chunk):
+    return list(chunk), [np.asarray(values).tolist() for values in chunk.values()]
+
+
+class JsonArrayWriter:
+    """A JSON array written record by record (one record per line)"""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'w')
+        self._file.write('[')
+        self._first = True
+
+    def write(self, chunk):
+        names, values = _column_lists(chunk)
+        lines = [json.dumps(dict(zip(names, row))) for row in zip(*values)]
+        if lines:
+            self._file.write(('\n' if self._first else ',\n') + ',\n'.join(lines))
+            self._first = False
+
+    def close(self):
+        self._file.write('\n]\n')
+        self._file.close()
+
+
+class CsvWriter:
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'w', newline='')
+        self._writer = csv.writer(self._file)
+        self._header = None
+
+    def write(self, chunk):
+        names, values = _column_lists(chunk)
+        if self._header is None:
+            self._header = names
+            self._writer.writerow(names)
+        self._writer.writerows(zip(*values))
+
+    def close(self):
+        self._file.close()
+
+
+def write_population(population, out_dir, formats=FORMATS, datasets=GENERATED_DATASETS, progress=None):
+    """
+    Stream every dataset of a population to out_dir in the requested formats
+
+    Files are named like the data files (synthetic_engagement.json, ...). Columnar tables
+    go under out_dir/columnar; when JSON is written too, the table directory is named for
+    the JSON file's signature so a DataStore over out_dir opens it without converting.
+    Returns a manifest (parameters and row counts), also saved as manifest.json.
+    """
+    unknown = set(formats) - set(FORMATS)
+    if unknown:
+        raise Exception(f"Unknown format(s): {', '.join(sorted(unknown))} (expected {', '.join(FORMATS)})")
+    os.makedirs(out_dir, exist_ok=True)
+    columnar = ColumnarStore(os.path.join(out_dir, 'columnar'))
+    manifest = {
+        'individuals': population.individuals,
+        'seed': population.seed,
+        'events_per_individual': list(population.events_per_individual),
+        'readings_per_vehicle': population.readings_per_vehicle,
+        'anchor': population.anchor.isoformat(),
+        'chunk_size': population.chunk_size,
+        'datasets': {},
+    }
+
+    for name in datasets:
+        base = os.path.join(out_dir, os.path.splitext(os.path.basename(DATASETS[name]))[0])
+        rows = population.rows(name)
+        writers = []
+        if 'json' in formats:
+            writers.append(JsonArrayWriter(base + '.json'))
+        if 'csv' in formats:
+            writers.append(CsvWriter(base + '.csv'))
+        if 'columnar' in formats:
+            os.makedirs(columnar.root, exist_ok=True)
+            table_dir = os.path.join(columnar.root, f".{name}-writing")
+            shutil.rmtree(table_dir, ignore_errors=True)
+            writers.append(ColumnarWriter(table_dir, rows))
+
+        for chunk in range(population.chunk_count):
+            columns = population.chunk(name, chunk)
+            for writer in writers:
+                writer.write(columns)
+            if progress:
+                progress(name, chunk + 1, population.chunk_count)
+        for writer in writers:
+            writer.close()
+
+        entry = {'rows': rows, 'files': [w.path for w in writers if not isinstance(w, ColumnarWriter)]}
+        if 'columnar' in formats:
+            if 'json' in formats:
+                stat = os.stat(base + '.json')
+                target = columnar.directory(name, f"{stat.st_mtime_ns}:{stat.st_size}")
+            else:
+                target = os.path.join(columnar.root, name)
+            shutil.rmtree(target, ignore_errors=True)
+            os.rename(table_dir, target)
+            columnar.prune(name, keep=target, grace=0)
+            entry['files'].append(target)
+        manifest['datasets'][name] = entry
+
+    with open(os.path.join(out_dir, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def population_datasets(out_dir):
+    """DataStore dataset paths for a generated directory (pass as DataStore(datasets=...))"""
+    datasets = dict(DATASETS)
+    for name in GENERATED_DATASETS:
+        datasets[name] = os.path.join(out_dir, os.path.basename(DATASETS[name]))
+    return datasets
@@ -0,0 +1,280 @@
+"""
+Telemetry Rules
+Streaming alert rules evaluated on each ingest batch with a small windowed state per vehicle
+"""
+
+import json
+import os
+import threading
+from collections import deque
+from datetime import datetime
+
+import numpy as np
+
+from modules.app_logging import get_logger
+from modules.data_store import write_json_atomic
+from modules.telemetry_store import FLAG_BITS, NUMERIC_FIELDS, format_timestamp
+
+RULES_FILE = 'data/telemetry_rules.json'
+ALERT_TTL = 24 * 3600
+SEQUENCE_KEY = 'telemetry_alerts:seq'
+STATE_TTL = 7 * 24 * 3600
+LOCAL_QUEUE_SIZE = 1000
+
+logger = get_logger(__name__)
+
+OPERATORS = {'<': np.less, '<=': np.less_equal, '>': np.greater, '>=': np.greater_equal}
+
+DEFAULT_RULES = [
+    {'id': 'low_tire_pressure', 'type': 'threshold', 'alert_type': 'Low Tire Pressure', 'severity': 'Warning',
+     'fields': ['TirePressure_FL', 'TirePressure_FR', 'TirePressure_RL', 'TirePressure_RR'], 'op': '<', 'value': 29},
+    {'id': 'low_fuel', 'type': 'threshold', 'alert_type': 'Low Fuel', 'severity': 'Warning',
+     'fields': ['FuelLevel'], 'op': '<', 'value': 10},
+    {'id': 'battery_low', 'type': 'threshold', 'alert_type': 'Battery Low', 'severity': 'Critical',
+     'fields': ['BatteryLevel'], 'op': '<', 'value': 15},
+    {'id': 'engine_overheat', 'type': 'threshold', 'alert_type': 'Engine Check', 'severity': 'Critical',
+     'fields': ['EngineTemp'], 'op': '>', 'value': 100},
+    {'id': 'engine_temp_rising', 'type': 'rise', 'alert_type': 'Engine Check', 'severity': 'Warning',
+     'field': 'EngineTemp', 'delta': 25, 'window_minutes': 10},
+    {'id': 'repeated_harsh_braking', 'type': 'count', 'alert_type': 'Harsh Driving', 'severity': 'Warning',
+     'flag': 'HarshBraking', 'count': 3, 'window_minutes': 10},
+]
+
+
+def _column(field):
+    """Store column of a JSON field name (column names are accepted too)"""
+    if field in NUMERIC_FIELDS:
+        return NUMERIC_FIELDS[field][0]
+    if field in {column for column, _ in NUMERIC_FIELDS.values()}:
+        return field
+    raise Exception(f"Unknown telemetry field: {field}")
+
+
+def _window_min(ts, values, window):
+    """Minimum of values over the trailing time window ending at each row (ts sorted)"""
+    starts = np.searchsorted(ts, ts - window, side='left')
+    bounds = np.empty(2 * len(ts), dtype=np.int64)
+    bounds[0::2] = starts
+    bounds[1::2] = np.arange(1, len(ts) + 1)
+    # reduceat needs every bound < len, so reduce over values plus a sentinel row
+    padded = np.r_[values, np.inf]
+    return np.minimum.reduceat(padded, bounds)[0::2]
+
+
+class Rule:
+    """
+    A rule definition compiled to a vectorized check
+
+    active(ts, rows) returns (condition per row, value per row). Windowed rules
+    see the vehicle's recent rows (carried over from earlier batches) ahead of the batch.
+    """
+
+    def __init__(self, definition):
+        self.definition = dict(definition)
+        self.id = definition.get('id')
+        self.type = definition.get('type')
+        if not self.id:
+            raise Exception('Rule id is required')
+        self.alert_type = definition.get('alert_type', self.id)
+        self.severity = definition.get('severity', 'Warning')
+        self.window = int(float(definition.get('window_minutes', 0)) * 60)
+
+        if self.type == 'threshold':
+            if definition.get('op') not in OPERATORS:
+                raise Exception(f"Rule {self.id}: op must be one of {', '.join(OPERATORS)}")
+            self.columns = [_column(field) for field in definition.get('fields') or [definition.get('field')]]
+            self.value = float(definition['value'])
+        elif self.type == 'rise':
+            self.columns = [_column(definition['field'])]
+            self.delta = float(definition['delta'])
+        elif self.type == 'count':
+            if definition.get('flag') not in FLAG_BITS:
+                raise Exception(f"Rule {self.id}: flag must be one of {', '.join(FLAG_BITS)}")
+            self.columns = ['flags']
+            self.bit = FLAG_BITS[definition['flag']]
+            self.count = int(definition['count'])
+        else:
+            raise Exception(f"Rule {self.id}: unknown type {self.type} (threshold, rise, count)")
+        if self.type != 'threshold' and self.window <= 0:
+            raise Exception(f"Rule {self.id}: window_minutes must be positive")
+
+    def active(self, ts, rows):
+        if self.type == 'threshold':
+            values = np.stack([np.asarray(rows[column], dtype=np.float64) for column in self.columns])
+            hits = OPERATORS[self.definition['op']](values, self.value)
+            # Report the worst offending field (lowest for < / <=, highest for > / >=)
+            worst = values.min(axis=0) if self.definition['op'] in ('<', '<=') else values.max(axis=0)
+            return hits.any(axis=0), worst
+        if self.type == 'rise':
+            values = np.asarray(rows[self.columns[0]], dtype=np.float64)
+            rise = values - _window_min(ts, values, self.window)
+            return rise >= self.delta, rise
+        flagged = (np.asarray(rows['flags']) & self.bit) > 0
+        cumulative = np.cumsum(flagged)
+        starts = np.searchsorted(ts, ts - self.window, side='left')
+        counts = cumulative - np.r_[0, cumulative][starts]
+        return counts >= self.count, counts.astype(np.float64)
+
+    def message(self, value):
+        if self.type == 'threshold':
+            return f"{self.alert_type}: {value:g} {self.definition['op']} {self.value:g}"
+        if self.type == 'rise':
+            return f"{self.alert_type}: {self.definition['field']} rose {value:g} within {self.window // 60} min"
+        return f"{self.alert_type}: {int(value)} x {self.definition['flag']} within {self.window // 60} min"
+
+
+class TelemetryRuleEngine:
+    """
+    Evaluates alert rules on the readings of every telemetry append
+
+    Registered as a telemetry store listener, so only the new rows of a batch are
+    checked. Per vehicle the state holds, for each rule, whether it was active at the
+    last reading (alerts fire on the inactive -> active edge, once per episode) plus
+    the rows inside the longest rule window. State lives in the shared state backend,
+    which the store's write lock keeps consistent across workers. Alerts go to a local
+    queue, to subscribers and to the shared backend (readable by any worker).
+    """
+
+    def __init__(self, telemetry_store, state=None, rules_path=RULES_FILE):
+        self.store = telemetry_store
+        self.state = state
+        self.rules_path = rules_path
+        self.queue = deque(maxlen=LOCAL_QUEUE_SIZE)
+        self._subscribers = []
+        self._local_state = {}
+        self._lock = threading.Lock()
+        self._rules = (None, [])
+        self._local_seq = 0
+        telemetry_store.on_append(self.evaluate)
+
+    # ------------------------------------------------------------------
+    # Rules
+    # ------------------------------------------------------------------
+
+    def rules(self):
+        """Compiled rules, reloaded when the rules file changes"""
+        try:
+            signature = os.stat(self.rules_path).st_mtime_ns
+        except FileNotFoundError:
+            signature = None
+        if self._rules[0] != signature or not self._rules[1]:
+            definitions = DEFAULT_RULES
+            if signature is not None:
+                with open(self.rules_path, 'r') as f:
+                    definitions = json.load(f)
+            self._rules = (signature, [Rule(definition) for definition in definitions])
+        return self._rules[1]
+
+    def save_rules(self, definitions):
+        """Validate and store rule definitions (an empty list restores the defaults)"""
+        compiled = [Rule(definition) for definition in definitions]
+        ids = [rule.id for rule in compiled]
+        if len(set(ids)) != len(ids):
+            raise Exception('Rule ids must be unique')
+        if definitions:
+            write_json_atomic(self.rules_path, [rule.definition for rule in compiled])
+        elif os.path.exists(self.rules_path):
+            os.remove(self.rules_path)
+        return self.rules()
+
+    def subscribe(self, callback):
+        """Call callback(alert) for every alert"""
+        self._subscribers.append(callback)
+
+    # ------------------------------------------------------------------
+    # Evaluation
+    # ------------------------------------------------------------------
+
+    def _load_state(self, vehicle_id):
+        if self.state is None:
+            return self._local_state.get(vehicle_id)
+        return self.state.get(f"telemetry_rules:state:{vehicle_id}")
+
+    def _save_state(self, vehicle_id, state):
+        if self.state is None:
+            self._local_state[vehicle_id] = state
+        else:
+            self.state.set(f"telemetry_rules:state:{vehicle_id}", state, ex=STATE_TTL)
+
+    def evaluate(self, added):
+        """Store listener: check {vehicle_id: new rows} against every rule, returns the alerts"""
+        rules = self.rules()
+        if not rules:
+            return []
+        window = max(rule.window for rule in rules)
+        columns = sorted({column for rule in rules for column in rule.columns})
+        alerts = []
+        with self._lock:
+            for vehicle_id, rows in added.items():
+                alerts.extend(self._evaluate_vehicle(vehicle_id, rows, rules, window, columns))
+        for alert in alerts:
+            self._emit(alert)
+        return alerts
+
+    def _evaluate_vehicle(self, vehicle_id, rows, rules, window, columns):
+        state = self._load_state(vehicle_id) or {}
+        previous = state.get('tail') or {}
+        carried = len(previous.get('ts', []))
+
+        # Carried-over rows first, then the batch, in time order
+        ts = np.r_[np.asarray(previous.get('ts', []), dtype=np.int64), np.asarray(rows['ts'])]
+        data = {column: np.r_[np.asarray(previous.get(column, []), dtype=np.float64),
+                              np.asarray(rows[column], dtype=np.float64)] for column in columns}
+        if 'flags' in data:
+            data['flags'] = data['flags'].astype(np.int64)
+        order = np.argsort(ts, kind='stable')
+        ts = ts[order]
+        data = {column: values[order] for column, values in data.items()}
+        is_new = order >= carried
+
+        alerts = []
+        was_active = state.get('active', {})
+        for rule in rules:
+            active, values = rule.active(ts, data)
+            before = np.r_[bool(was_active.get(rule.id, False)), active[:-1]]
+            for i in np.flatnonzero(active & ~before & is_new).tolist():
+                alerts.append({
+                    'rule_id': rule.id,
+                    'alert_type': rule.alert_type,
+                    'severity': rule.severity,
+                    'vehicle_id': vehicle_id,
+                    'reading_time': format_timestamp(ts[i]),
+                    'value': round(float(values[i]), 2),
+                    'message': rule.message(float(values[i])),
+                    'timestamp': datetime.now().isoformat()
+                })
+            was_active[rule.id] = bool(active[-1])
+
+        keep = ts > ts[-1] - window if window else np.zeros(len(ts), dtype=bool)
+        tail = {'ts': ts[keep].tolist()}
+        for column, values in data.items():
+            tail[column] = values[keep].tolist()
+        self._save_state(vehicle_id, {'active': was_active, 'tail': tail})
+        return alerts
+
+    def _emit(self, alert):
+        if self.state is not None:
+            alert['seq'] = self.state.incr(SEQUENCE_KEY)
+            self.state.set(f"telemetry_alerts:{alert['seq']}", alert, ex=ALERT_TTL)
+        else:
+            with self._lock:
+                self._local_seq += 1
+                alert['seq'] = self._local_seq
+        self.queue.append(alert)
+        for callback in self._subscribers:
+            try:
+                callback(alert)
+            except Exception as e:
+                logger.warning("Telemetry alert subscriber failed: %s", e)
+
+    def recent_alerts(self, since=0, limit=100):
+        """
+        Alerts with seq > since from the shared backend (or the local queue), oldest first
+
+        At most `limit` are returned, the oldest ones; page forward by passing the last seq as since.
+        """
+        if self.state is None:
+            return [alert for alert in list(self.queue) if alert['seq'] > since][:limit]
+        last = int(self.state.get(SEQUENCE_KEY, 0) or 0)
+        alerts = (self.state.get(f"telemetry_alerts:{seq}") for seq in range(since + 1, min(last, since + limit) + 1))
+        return [alert for alert in alerts if alert]
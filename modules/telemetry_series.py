@@ -0,0 +1,225 @@
+"""
+Telemetry Series
+Downsampled per-vehicle metric series (LTTB / min-max buckets) backed by cached
+minute, hour and day rollups of the telemetry partitions
+"""
+
+import os
+
+import numpy as np
+
+from modules.telemetry_store import format_timestamp, save_array
+
+# Metric name -> telemetry store column
+SERIES_METRICS = {
+    'speed': 'speed', 'rpm': 'rpm', 'fuel_level': 'fuel_level', 'fuel_consumption': 'fuel_consumption',
+    'engine_temp': 'engine_temp', 'battery_level': 'battery_level', 'oil_pressure': 'oil_pressure',
+    'tire_fl': 'tire_fl', 'tire_fr': 'tire_fr', 'tire_rl': 'tire_rl', 'tire_rr': 'tire_rr',
+}
+
+RESOLUTIONS = {'minute': 60, 'hour': 3600, 'day': 86400}
+
+ROLLUP_DTYPE = np.dtype(
+    [('bucket', '<i8'), ('count', '<i4')] +
+    [(f"{column}_{stat}", '<f8' if stat == 'sum' else '<f4')
+     for column in SERIES_METRICS.values() for stat in ('min', 'max', 'sum')]
+)
+
+# LTTB works on raw readings up to this many, above that on the finest rollup that fits
+LTTB_MAX_INPUT = 500000
+
+
+def lttb(x, y, threshold):
+    """Largest-Triangle-Three-Buckets: indices of `threshold` points that keep the visual shape"""
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    # Bucket edges over the interior points (first and last are always kept)
+    edges = np.floor(np.linspace(1, n - 1, threshold - 1)).astype(np.int64)
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+
+    a = 0
+    for i in range(threshold - 2):
+        lo, hi = edges[i], edges[i + 1]
+        # Average of the next bucket (or the last point for the final bucket)
+        next_lo, next_hi = hi, edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[next_lo:next_hi].mean() if next_hi > next_lo else x[-1]
+        avg_y = y[next_lo:next_hi].mean() if next_hi > next_lo else y[-1]
+        areas = np.abs((x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a]))
+        a = lo + int(np.argmax(areas)) if hi > lo else lo
+        selected[i + 1] = a
+    return selected
+
+
+def minmax_buckets(x, y, buckets):
+    """Per equal-width time bucket: (first x, min, max, mean) - keeps spikes LTTB could drop"""
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    if not len(x):
+        return x, y, y, y
+    edges = np.linspace(x[0], x[-1], buckets + 1)
+    ids = np.clip(np.searchsorted(edges, x, side='right') - 1, 0, buckets - 1)
+    starts = np.flatnonzero(np.r_[True, ids[1:] != ids[:-1]])
+    counts = np.diff(np.r_[starts, len(x)])
+    return (x[starts], np.minimum.reduceat(y, starts), np.maximum.reduceat(y, starts),
+            np.add.reduceat(y, starts) / counts)
+
+
+def rollup(readings, seconds):
+    """Aggregate sorted readings into fixed buckets of `seconds` (count/min/max/sum per metric)"""
+    if not len(readings):
+        return np.zeros(0, dtype=ROLLUP_DTYPE)
+    buckets = np.asarray(readings['ts']) // seconds * seconds
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    result = np.zeros(len(starts), dtype=ROLLUP_DTYPE)
+    result['bucket'] = buckets[starts]
+    result['count'] = np.diff(np.r_[starts, len(buckets)])
+    for column in SERIES_METRICS.values():
+        values = np.asarray(readings[column], dtype=np.float64)
+        result[f"{column}_min"] = np.minimum.reduceat(values, starts)
+        result[f"{column}_max"] = np.maximum.reduceat(values, starts)
+        result[f"{column}_sum"] = np.add.reduceat(values, starts)
+    return result
+
+
+class TelemetrySeries:
+    """
+    Chart-sized series over the telemetry store
+
+    Rollups are computed per day partition and cached next to it
+    (<vehicle>/rollups/<date>.<resolution>.npy); a rollup is rebuilt when its
+    partition has been rewritten by an append.
+    """
+
+    def __init__(self, telemetry_store):
+        self.store = telemetry_store
+        self._cache = {}  # (vehicle_id, resolution) -> (index signature, all buckets)
+
+    def _rollup_path(self, partition_path, resolution):
+        directory = os.path.join(os.path.dirname(partition_path), 'rollups')
+        name = os.path.splitext(os.path.basename(partition_path))[0]
+        return os.path.join(directory, f"{name}.{resolution}.npy")
+
+    def rollups(self, vehicle_id, resolution, start=None, end=None):
+        """Buckets of one resolution with bucket start in [start, end]"""
+        seconds = RESOLUTIONS[resolution]
+        index = self.store.index(vehicle_id)
+        signature = index.tobytes()
+        cached = self._cache.get((vehicle_id, resolution))
+        if cached and cached[0] == signature:
+            result = cached[1]
+        else:
+            result = self._build_rollups(vehicle_id, resolution)
+            self._cache[(vehicle_id, resolution)] = (signature, result)
+
+        lo = np.searchsorted(result['bucket'], start // seconds * seconds, side='left') if start is not None else 0
+        hi = np.searchsorted(result['bucket'], end, side='right') if end is not None else len(result)
+        return result[lo:hi]
+
+    def _build_rollups(self, vehicle_id, resolution):
+        """All buckets of a vehicle, from the per-partition rollup files (rebuilding stale ones)"""
+        seconds = RESOLUTIONS[resolution]
+        parts = []
+        for _, path in self.store.partitions(vehicle_id):
+            cache_path = self._rollup_path(path, resolution)
+            try:
+                fresh = os.stat(cache_path).st_mtime_ns >= os.stat(path).st_mtime_ns
+            except FileNotFoundError:
+                fresh = False
+            if fresh:
+                parts.append(np.load(cache_path, mmap_mode='r'))
+            else:
+                buckets = rollup(np.load(path, mmap_mode='r'), seconds)
+                os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+                save_array(cache_path, buckets)
+                parts.append(buckets)
+        return np.concatenate(parts) if parts else np.zeros(0, dtype=ROLLUP_DTYPE)
+
+    def series(self, vehicle_id, metrics, start=None, end=None, points=300, method='auto'):
+        """
+        Downsample metrics for one vehicle to about `points` points
+
+        method='auto' (min/max): raw readings if they fit, else the finest of
+        minute/hour/day rollups with at most `points` buckets, else min/max
+        bucketing of the day rollup. method='lttb': LTTB over the raw readings
+        (or the finest rollup when there are too many readings).
+        """
+        unknown = [m for m in metrics if m not in SERIES_METRICS]
+        if unknown:
+            raise Exception(f"Unknown metrics: {', '.join(unknown)} (available: {', '.join(SERIES_METRICS)})")
+        if method not in ('auto', 'minmax', 'lttb'):
+            raise Exception(f"Unknown method: {method}")
+        points = max(3, int(points))
+
+        raw_count = self.store.count_range(vehicle_id, start, end)
+        if raw_count <= points or (method == 'lttb' and raw_count <= LTTB_MAX_INPUT):
+            readings = self.store.read(vehicle_id, start, end)
+            x = np.asarray(readings['ts'], dtype=np.float64)
+            if raw_count <= points:
+                return self._result('raw', x, {m: np.asarray(readings[SERIES_METRICS[m]], dtype=np.float64) for m in metrics})
+            series = {}
+            for metric in metrics:
+                y = np.asarray(readings[SERIES_METRICS[metric]], dtype=np.float64)
+                keep = lttb(x, y, points)
+                series[metric] = (x[keep], y[keep])
+            return self._result_xy('lttb', series)
+
+        # Finest rollup that fits (LTTB takes the finest that stays below its input cap),
+        # chosen from the time span so only one resolution is loaded
+        limit = LTTB_MAX_INPUT if method == 'lttb' else points
+        first, last = self.store.span(vehicle_id, start, end)
+        for resolution, seconds in RESOLUTIONS.items():
+            if min(raw_count, (last // seconds - first // seconds) + 1) <= limit:
+                break
+        buckets = self.rollups(vehicle_id, resolution, start, end)
+
+        x = np.asarray(buckets['bucket'], dtype=np.float64)
+        counts = np.maximum(np.asarray(buckets['count'], dtype=np.float64), 1)
+        means = {m: np.asarray(buckets[f"{SERIES_METRICS[m]}_sum"]) / counts for m in metrics}
+        if len(buckets) <= points:
+            return self._result(resolution, x, means, buckets=buckets)
+
+        if method == 'lttb':
+            series = {}
+            for metric in metrics:
+                keep = lttb(x, means[metric], points)
+                series[metric] = (x[keep], means[metric][keep])
+            return self._result_xy(f"lttb:{resolution}", series)
+
+        # More days than points: min/max over equal-width groups of day buckets
+        series = {}
+        for metric in metrics:
+            column = SERIES_METRICS[metric]
+            bx, _, _, bmean = minmax_buckets(x, means[metric], points)
+            _, bmin, _, _ = minmax_buckets(x, np.asarray(buckets[f"{column}_min"]), points)
+            _, _, bmax, _ = minmax_buckets(x, np.asarray(buckets[f"{column}_max"]), points)
+            series[metric] = [self._point(t, v, lo, hi) for t, v, lo, hi in zip(bx, bmean, bmin, bmax)]
+        return {'resolution': 'minmax:day', 'series': series}
+
+    @staticmethod
+    def _point(t, value, low=None, high=None):
+        point = {'t': format_timestamp(t), 'v': round(float(value), 2)}
+        if low is not None:
+            point['min'] = round(float(low), 2)
+            point['max'] = round(float(high), 2)
+        return point
+
+    def _result(self, resolution, x, values, buckets=None):
+        series = {}
+        for metric, y in values.items():
+            if buckets is None:
+                series[metric] = [self._point(t, v) for t, v in zip(x.tolist(), y.tolist())]
+            else:
+                column = SERIES_METRICS[metric]
+                series[metric] = [self._point(t, v, lo, hi) for t, v, lo, hi in
+                                  zip(x.tolist(), y.tolist(), buckets[f"{column}_min"].tolist(), buckets[f"{column}_max"].tolist())]
+        return {'resolution': resolution, 'series': series}
+
+    def _result_xy(self, resolution, series):
+        return {'resolution': resolution,
+                'series': {metric: [self._point(t, v) for t, v in zip(x.tolist(), y.tolist())]
+                           for metric, (x, y) in series.items()}}
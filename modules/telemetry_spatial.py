@@ -0,0 +1,274 @@
+"""
+Telemetry Spatial Index
+Uniform lat/lon grid over telemetry readings for area queries, heatmaps and city rollups
+"""
+
+import json
+import math
+import os
+
+import numpy as np
+
+from modules.data_store import write_json_atomic
+from modules.telemetry_store import format_timestamp, save_array
+
+# Grid cell size in degrees (0.01 deg is about 1.1 km north-south)
+CELL_SIZE = 0.01
+EARTH_RADIUS_KM = 6371.0
+
+POINT_DTYPE = np.dtype([
+    ('cell', '<i8'), ('lat', '<f8'), ('lon', '<f8'), ('ts', '<i8'),
+    ('vehicle', '<u4'), ('speed', '<f4'), ('alert', 'u1'), ('city', '<u2'),
+])
+
+CELL_DTYPE = np.dtype([
+    ('cell', '<i8'), ('count', '<i8'), ('speed_sum', '<f8'), ('alerts', '<i8'),
+    ('lat_sum', '<f8'), ('lon_sum', '<f8'),
+])
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+
+def aggregate_cells(points):
+    """Per-cell count / speed / alerts / centroid sums of points sorted by cell"""
+    if not len(points):
+        return np.zeros(0, dtype=CELL_DTYPE)
+    cells = np.asarray(points['cell'])
+    starts = np.flatnonzero(np.r_[True, cells[1:] != cells[:-1]])
+    result = np.zeros(len(starts), dtype=CELL_DTYPE)
+    result['cell'] = cells[starts]
+    result['count'] = np.diff(np.r_[starts, len(cells)])
+    result['speed_sum'] = np.add.reduceat(np.asarray(points['speed'], dtype=np.float64), starts)
+    result['alerts'] = np.add.reduceat(np.asarray(points['alert'], dtype=np.int64), starts)
+    result['lat_sum'] = np.add.reduceat(np.asarray(points['lat']), starts)
+    result['lon_sum'] = np.add.reduceat(np.asarray(points['lon']), starts)
+    return result
+
+
+class SpatialIndex:
+    """
+    Readings sorted by grid cell (points.npy) with per-cell aggregates (cells.npy)
+
+    Appends land in a small unsorted delta (delta.npy) that queries scan directly;
+    the delta is merged into the sorted base once it grows past a tenth of it.
+    The index rebuilds itself when the telemetry store changed behind its back
+    (e.g. an import from another process that had no listener registered).
+    """
+
+    def __init__(self, telemetry_store, cell_size=CELL_SIZE, root=None):
+        self.store = telemetry_store
+        self.cell_size = cell_size
+        self.root = root or os.path.join(telemetry_store.root, 'spatial')
+        self.columns = int(math.ceil(360 / cell_size))
+        self._loaded = None
+        telemetry_store.on_append(self._on_append)
+
+    # ------------------------------------------------------------------
+    # Cells
+    # ------------------------------------------------------------------
+
+    def _row_col(self, lat, lon):
+        row = np.floor((np.asarray(lat, dtype=np.float64) + 90) / self.cell_size).astype(np.int64)
+        col = np.floor((np.asarray(lon, dtype=np.float64) + 180) / self.cell_size).astype(np.int64)
+        return row, np.clip(col, 0, self.columns - 1)
+
+    def cell_of(self, lat, lon):
+        row, col = self._row_col(lat, lon)
+        return row * self.columns + col
+
+    def _cell_center(self, cells):
+        rows, cols = np.divmod(np.asarray(cells), self.columns)
+        return (rows + 0.5) * self.cell_size - 90, (cols + 0.5) * self.cell_size - 180
+
+    # ------------------------------------------------------------------
+    # Storage
+    # ------------------------------------------------------------------
+
+    def _path(self, name):
+        return os.path.join(self.root, name)
+
+    def _read_meta(self):
+        try:
+            with open(self._path('meta.json'), 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _write(self, points=None, cells=None, delta=None, vehicles=None):
+        os.makedirs(self.root, exist_ok=True)
+        for name, array in (('points', points), ('cells', cells), ('delta', delta)):
+            if array is not None:
+                save_array(self._path(f"{name}.npy"), array)
+        meta = self._read_meta() or {}
+        meta.update({'cell_size': self.cell_size, 'store_signature': self.store.signature()})
+        if vehicles is not None:
+            meta['vehicles'] = vehicles
+        write_json_atomic(self._path('meta.json'), meta)
+
+    def _points_for(self, vehicle_code, readings, no_alert_code):
+        points = np.zeros(len(readings), dtype=POINT_DTYPE)
+        points['cell'] = self.cell_of(readings['lat'], readings['lon'])
+        for column in ('lat', 'lon', 'ts', 'speed', 'city'):
+            points[column] = readings[column]
+        points['vehicle'] = vehicle_code
+        if no_alert_code is not None:
+            points['alert'] = np.asarray(readings['alert_type']) != no_alert_code
+        return points
+
+    def rebuild(self):
+        """Index every stored reading from scratch"""
+        with self.store._locked():
+            vehicles = self.store.vehicles()
+            no_alert = self.store.code_of('alert_type', 'None')
+            parts = [self._points_for(code, self.store.read(vehicle_id), no_alert)
+                     for code, vehicle_id in enumerate(vehicles)]
+            points = np.concatenate(parts) if parts else np.zeros(0, dtype=POINT_DTYPE)
+            points = points[np.argsort(points['cell'], kind='stable')]
+            self._write(points, aggregate_cells(points), np.zeros(0, dtype=POINT_DTYPE), vehicles)
+        self._loaded = None
+
+    def _on_append(self, added):
+        """Store listener: index new readings into the delta (runs under the store lock)"""
+        meta = self._read_meta()
+        if meta is None or meta.get('cell_size') != self.cell_size:
+            return  # built lazily on the next query
+        vehicles = meta['vehicles']
+        codes = {vehicle_id: code for code, vehicle_id in enumerate(vehicles)}
+        no_alert = self.store.code_of('alert_type', 'None')
+        new_points = []
+        for vehicle_id, readings in added.items():
+            if vehicle_id not in codes:
+                codes[vehicle_id] = len(vehicles)
+                vehicles.append(vehicle_id)
+            new_points.append(self._points_for(codes[vehicle_id], readings, no_alert))
+        if not new_points:
+            return
+
+        delta = np.concatenate([np.load(self._path('delta.npy'))] + new_points)
+        base_rows = len(np.load(self._path('points.npy'), mmap_mode='r'))
+        if len(delta) > max(10000, base_rows // 10):
+            points = np.concatenate([np.load(self._path('points.npy')), delta])
+            points = points[np.argsort(points['cell'], kind='stable')]
+            self._write(points, aggregate_cells(points), np.zeros(0, dtype=POINT_DTYPE), vehicles)
+        else:
+            self._write(delta=delta, vehicles=vehicles)
+        self._loaded = None
+
+    def _load(self):
+        """(meta, points, cells, delta), rebuilding if missing or stale"""
+        meta = self._read_meta()
+        if (meta is None or meta.get('cell_size') != self.cell_size or
+                meta.get('store_signature') != self.store.signature()):
+            self.rebuild()
+            meta = self._read_meta()
+        signature = os.stat(self._path('meta.json')).st_mtime_ns
+        if self._loaded is None or self._loaded[0] != signature:
+            self._loaded = (signature, meta,
+                            np.load(self._path('points.npy'), mmap_mode='r'),
+                            np.load(self._path('cells.npy'), mmap_mode='r'),
+                            np.load(self._path('delta.npy')))
+        return self._loaded[1:]
+
+    # ------------------------------------------------------------------
+    # Queries
+    # ------------------------------------------------------------------
+
+    def _cell_ranges(self, sorted_cells, south, west, north, east):
+        """Row slices of a cell-sorted array covering the bbox (one per grid row)"""
+        row0, col0 = self._row_col(south, west)
+        row1, col1 = self._row_col(north, east)
+        rows = np.arange(int(row0), int(row1) + 1)
+        lo = np.searchsorted(sorted_cells, rows * self.columns + int(col0), side='left')
+        hi = np.searchsorted(sorted_cells, rows * self.columns + int(col1), side='right')
+        return [(a, b) for a, b in zip(lo.tolist(), hi.tolist()) if b > a]
+
+    def points_in_bbox(self, south, west, north, east, start=None, end=None):
+        """Indexed points inside the bounding box (optionally within a time range)"""
+        _, points, _, delta = self._load()
+        parts = [points[a:b] for a, b in self._cell_ranges(points['cell'], south, west, north, east)]
+        parts.append(delta)
+        found = np.concatenate(parts) if parts else np.zeros(0, dtype=POINT_DTYPE)
+        mask = (found['lat'] >= south) & (found['lat'] <= north) & (found['lon'] >= west) & (found['lon'] <= east)
+        if start is not None:
+            mask &= found['ts'] >= start
+        if end is not None:
+            mask &= found['ts'] <= end
+        return found[mask]
+
+    def points_in_radius(self, lat, lon, radius_km, start=None, end=None):
+        """Indexed points within radius_km of (lat, lon)"""
+        dlat = math.degrees(radius_km / EARTH_RADIUS_KM)
+        dlon = dlat / max(math.cos(math.radians(lat)), 1e-6)
+        candidates = self.points_in_bbox(lat - dlat, lon - dlon, lat + dlat, lon + dlon, start, end)
+        return candidates[haversine_km(lat, lon, candidates['lat'], candidates['lon']) <= radius_km]
+
+    def heatmap(self, bbox=None, factor=1):
+        """
+        Per-cell density, average speed and alerts (cells merged factor x factor for zoomed-out maps)
+
+        Served from the cell aggregates, so cost depends on cells, not readings.
+        """
+        _, _, cells, delta = self._load()
+        if bbox:
+            cells = np.concatenate([cells[a:b] for a, b in self._cell_ranges(cells['cell'], *bbox)] or
+                                   [np.zeros(0, dtype=CELL_DTYPE)])
+        if len(delta):
+            delta = delta if not bbox else delta[
+                (delta['lat'] >= bbox[0]) & (delta['lat'] <= bbox[2]) & (delta['lon'] >= bbox[1]) & (delta['lon'] <= bbox[3])]
+            cells = np.concatenate([np.asarray(cells), aggregate_cells(np.sort(delta, order='cell'))])
+
+        keys = np.asarray(cells['cell'])
+        if factor > 1:
+            rows, cols = np.divmod(keys, self.columns)
+            keys = (rows // factor) * self.columns + cols // factor
+        unique, inverse = np.unique(keys, return_inverse=True)
+        count = np.bincount(inverse, weights=cells['count'], minlength=len(unique))
+        speed = np.bincount(inverse, weights=cells['speed_sum'], minlength=len(unique))
+        alerts = np.bincount(inverse, weights=cells['alerts'], minlength=len(unique))
+        lat = np.bincount(inverse, weights=cells['lat_sum'], minlength=len(unique))
+        lon = np.bincount(inverse, weights=cells['lon_sum'], minlength=len(unique))
+        return [{
+            'lat': round(la / c, 6), 'lon': round(lo / c, 6), 'count': int(c),
+            'avg_speed': round(s / c, 1), 'alerts': int(a)
+        } for la, lo, c, s, a in zip(lat.tolist(), lon.tolist(), count.tolist(), speed.tolist(), alerts.tolist())]
+
+    def city_rollup(self, points=None):
+        """Readings, vehicles, average speed and alerts per city"""
+        if points is None:
+            _, base, _, delta = self._load()
+            points = np.concatenate([np.asarray(base), delta])
+        if not len(points):
+            return []
+        cities = np.asarray(points['city'])
+        size = int(cities.max()) + 1
+        count = np.bincount(cities, minlength=size)
+        speed = np.bincount(cities, weights=points['speed'], minlength=size)
+        alerts = np.bincount(cities, weights=points['alert'], minlength=size)
+        pairs = np.unique(cities.astype(np.int64) << 32 | np.asarray(points['vehicle'], dtype=np.int64))
+        vehicles = np.bincount((pairs >> 32).astype(np.int64), minlength=size)
+        names = self.store.decode('city', np.arange(size)).tolist()
+        rows = [{
+            'city': names[code], 'readings': int(count[code]), 'vehicles': int(vehicles[code]),
+            'avg_speed': round(float(speed[code] / count[code]), 1), 'alerts': int(alerts[code])
+        } for code in np.flatnonzero(count).tolist()]
+        return sorted(rows, key=lambda row: row['readings'], reverse=True)
+
+    def vehicle_ids(self, points):
+        """Vehicle ids of a set of points"""
+        meta = self._load()[0]
+        return [meta['vehicles'][code] for code in np.unique(points['vehicle']).tolist()]
+
+    def to_records(self, points, limit=None):
+        meta = self._load()[0]
+        points = points[:limit] if limit else points
+        cities = self.store.decode('city', points['city']).tolist()
+        return [{
+            'Vehicle_Id': meta['vehicles'][vehicle], 'Timestamp': format_timestamp(ts),
+            'Latitude': lat, 'Longitude': lon, 'Speed': round(speed, 1), 'Alert': bool(alert), 'LocationCity': city
+        } for vehicle, ts, lat, lon, speed, alert, city in zip(
+            points['vehicle'].tolist(), points['ts'].tolist(), points['lat'].tolist(), points['lon'].tolist(),
+            points['speed'].tolist(), points['alert'].tolist(), cities)]
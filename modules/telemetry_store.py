@@ -0,0 +1,427 @@
+"""
+Telemetry Store
+Fixed-width NumPy records for vehicle telemetry, partitioned by vehicle and day
+"""
+
+import fcntl
+import json
+import os
+import re
+from calendar import timegm
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+import numpy as np
+
+from modules.data_store import write_json_atomic
+
+TELEMETRY_ROOT = 'data/telemetry'
+SECONDS_PER_DAY = 86400
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+READING_DTYPE = np.dtype([
+    ('ts', '<i8'),                 # seconds since epoch (wall-clock time of the reading)
+    ('seq', '<i8'),                # numeric part of TelematicsId
+    ('lat', '<f8'), ('lon', '<f8'),
+    ('speed', '<f4'), ('rpm', '<f4'), ('fuel_level', '<f4'), ('fuel_consumption', '<f4'),
+    ('battery_level', '<f4'), ('engine_temp', '<f4'), ('oil_pressure', '<f4'), ('odometer', '<f8'),
+    ('trip_distance', '<f4'), ('acceleration', '<f4'),
+    ('tire_fl', '<f4'), ('tire_fr', '<f4'), ('tire_rl', '<f4'), ('tire_rr', '<f4'),
+    ('signal_strength', '<f4'),
+    ('flags', 'u1'),
+    ('city', '<u2'), ('diagnostic_code', '<u2'), ('alert_type', '<u2'), ('alert_severity', '<u2'),
+    ('connection_status', '<u2'), ('data_source', '<u2'),
+])
+
+INDEX_DTYPE = np.dtype([('day', '<i4'), ('first_ts', '<i8'), ('last_ts', '<i8'), ('rows', '<i8')])
+
+# JSON field -> (column, decimals); decimals=None keeps the JSON number, otherwise a fixed-point string
+NUMERIC_FIELDS = {
+    'Latitude': ('lat', 6), 'Longitude': ('lon', 6),
+    'Speed': ('speed', None), 'RPM': ('rpm', None), 'FuelLevel': ('fuel_level', None),
+    'FuelConsumption': ('fuel_consumption', 2), 'BatteryLevel': ('battery_level', None),
+    'EngineTemp': ('engine_temp', None), 'OilPressure': ('oil_pressure', None), 'Odometer': ('odometer', None),
+    'TripDistance': ('trip_distance', 2), 'Acceleration': ('acceleration', 2),
+    'TirePressure_FL': ('tire_fl', None), 'TirePressure_FR': ('tire_fr', None),
+    'TirePressure_RL': ('tire_rl', None), 'TirePressure_RR': ('tire_rr', None),
+    'SignalStrength': ('signal_strength', None),
+}
+
+# "true"/"false" JSON fields packed into the flags byte
+FLAG_BITS = {'IsEngineOn': 1, 'IsMoving': 2, 'HarshBraking': 4, 'RapidAcceleration': 8, 'Idling': 16}
+
+# String fields stored as codes into append-only dictionaries
+CODED_FIELDS = {
+    'LocationCity': 'city', 'DiagnosticCode': 'diagnostic_code', 'AlertType': 'alert_type',
+    'AlertSeverity': 'alert_severity', 'ConnectionStatus': 'connection_status', 'data_source': 'data_source',
+}
+
+# Fields that describe the vehicle rather than the reading
+VEHICLE_FIELDS = ('VehicleVIN', 'VehicleMake', 'VehicleModel', 'TelematicsDeviceId')
+
+_TELEMATICS_ID = re.compile(r'^TEL_(\d+)$')
+_SAFE_VEHICLE_ID = re.compile(r'^[A-Za-z0-9_-][A-Za-z0-9_.-]*$')
+
+
+def parse_timestamp(value):
+    """Epoch seconds for 'YYYY-MM-DD HH:MM:SS' / ISO strings (naive times are kept as wall-clock)"""
+    parsed = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return timegm(parsed.timetuple())
+
+
+def format_timestamp(ts):
+    return datetime.fromtimestamp(int(ts), tz=timezone.utc).strftime(TIMESTAMP_FORMAT)
+
+
+def save_array(path, array):
+    """Atomically replace a .npy file (readers keep their mapping of the old one)"""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        np.save(f, array)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def _is_true(value):
+    return value is True or str(value).strip().lower() in ('true', '1', 'yes')
+
+
+def _number(value):
+    try:
+        return float(value or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+class TelemetryStore:
+    """
+    One directory per vehicle with a .npy partition per day (sorted by timestamp)
+    and an index.npy of (day, first_ts, last_ts, rows)
+
+    Partitions are written whole (temp file + rename) so readers holding a
+    memory map of the previous version are never affected by an append.
+    """
+
+    def __init__(self, root=TELEMETRY_ROOT):
+        self.root = root
+        self._listeners = []
+        self._dictionaries = None
+        self._vehicles = None
+        self._meta_mtime = None
+
+    # ------------------------------------------------------------------
+    # Metadata
+    # ------------------------------------------------------------------
+
+    def _meta_path(self):
+        return os.path.join(self.root, 'meta.json')
+
+    def _load_meta(self):
+        """Dictionaries and vehicle attributes, reloaded when another process changed them"""
+        try:
+            mtime = os.stat(self._meta_path()).st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+        if self._dictionaries is None or mtime != self._meta_mtime:
+            meta = {}
+            if mtime is not None:
+                with open(self._meta_path(), 'r') as f:
+                    meta = json.load(f)
+            self._dictionaries = {column: meta.get('dictionaries', {}).get(column, []) for column in CODED_FIELDS.values()}
+            self._vehicles = meta.get('vehicles', {})
+            self._next_seq = meta.get('next_seq', 1)
+            self._meta_mtime = mtime
+
+    def _save_meta(self):
+        os.makedirs(self.root, exist_ok=True)
+        write_json_atomic(self._meta_path(), {
+            'dictionaries': self._dictionaries, 'vehicles': self._vehicles, 'next_seq': self._next_seq
+        })
+        self._meta_mtime = os.stat(self._meta_path()).st_mtime_ns
+
+    @contextmanager
+    def _locked(self):
+        """Single writer across processes (appends touch the shared dictionaries)"""
+        os.makedirs(self.root, exist_ok=True)
+        with open(os.path.join(self.root, '.lock'), 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _code(self, column, value):
+        values = self._dictionaries[column]
+        value = '' if value is None else str(value)
+        try:
+            return values.index(value)
+        except ValueError:
+            values.append(value)
+            return len(values) - 1
+
+    def decode(self, column, codes):
+        """Strings for a coded column"""
+        self._load_meta()
+        values = np.array(self._dictionaries[column] + [''], dtype=object)
+        return values[np.minimum(np.asarray(codes), len(values) - 1)]
+
+    def code_of(self, column, value):
+        """Code of a string in a coded column (None if it never occurred)"""
+        self._load_meta()
+        values = self._dictionaries[column]
+        return values.index(value) if value in values else None
+
+    def is_empty(self):
+        return not os.path.exists(self._meta_path())
+
+    def vehicles(self):
+        self._load_meta()
+        return sorted(self._vehicles)
+
+    def vehicle(self, vehicle_id):
+        self._load_meta()
+        return self._vehicles.get(vehicle_id)
+
+    # ------------------------------------------------------------------
+    # Paths and index
+    # ------------------------------------------------------------------
+
+    def vehicle_dir(self, vehicle_id):
+        if not _SAFE_VEHICLE_ID.match(str(vehicle_id)):
+            raise Exception(f"Invalid vehicle id: {vehicle_id}")
+        return os.path.join(self.root, str(vehicle_id))
+
+    def _partition_path(self, vehicle_id, day):
+        date = datetime.fromtimestamp(int(day) * SECONDS_PER_DAY, tz=timezone.utc).strftime('%Y-%m-%d')
+        return os.path.join(self.vehicle_dir(vehicle_id), f"{date}.npy")
+
+    def index(self, vehicle_id):
+        """Per-day partition index for a vehicle (empty if it has no readings)"""
+        path = os.path.join(self.vehicle_dir(vehicle_id), 'index.npy')
+        if not os.path.exists(path):
+            return np.zeros(0, dtype=INDEX_DTYPE)
+        return np.load(path)
+
+    # ------------------------------------------------------------------
+    # Conversion
+    # ------------------------------------------------------------------
+
+    def _to_array(self, readings):
+        """JSON readings -> structured array (caller holds the lock; dictionaries may grow)"""
+        array = np.zeros(len(readings), dtype=READING_DTYPE)
+        array['ts'] = [parse_timestamp(reading['Timestamp']) for reading in readings]
+
+        seqs = []
+        for reading in readings:
+            match = _TELEMATICS_ID.match(str(reading.get('TelematicsId', '')))
+            seq = int(match.group(1)) if match else self._next_seq
+            self._next_seq = max(self._next_seq, seq + 1)
+            seqs.append(seq)
+        array['seq'] = seqs
+
+        for field, (column, _) in NUMERIC_FIELDS.items():
+            array[column] = [_number(reading.get(field)) for reading in readings]
+        for field, bit in FLAG_BITS.items():
+            array['flags'] |= np.array([_is_true(reading.get(field)) for reading in readings], dtype=np.uint8) * np.uint8(bit)
+        for field, column in CODED_FIELDS.items():
+            codes = {}
+            array[column] = [codes[value] if value in codes else codes.setdefault(value, self._code(column, value))
+                             for value in (reading.get(field, '') for reading in readings)]
+        return array
+
+    def to_records(self, vehicle_id, array):
+        """Structured readings -> the JSON shape of vehicle_telematics.json"""
+        self._load_meta()
+        vehicle = self._vehicles.get(vehicle_id, {})
+        columns = {column: array[column].tolist() for column in READING_DTYPE.names}
+        decoded = {column: self.decode(column, array[column]).tolist() for column in CODED_FIELDS.values()}
+        records = []
+        for row in range(len(array)):
+            record = {
+                'TelematicsId': f"TEL_{columns['seq'][row]:06d}",
+                'Vehicle_Id': vehicle_id,
+                'VehicleVIN': vehicle.get('VehicleVIN', ''),
+                'VehicleMake': vehicle.get('VehicleMake', ''),
+                'VehicleModel': vehicle.get('VehicleModel', ''),
+                'TelematicsDeviceId': vehicle.get('TelematicsDeviceId', ''),
+                'Timestamp': format_timestamp(columns['ts'][row]),
+            }
+            for field, (column, decimals) in NUMERIC_FIELDS.items():
+                value = columns[column][row]
+                if decimals is not None:
+                    record[field] = f"{value:.{decimals}f}"
+                else:
+                    record[field] = int(value) if float(value).is_integer() else round(value, 2)
+            for field, bit in FLAG_BITS.items():
+                record[field] = 'true' if columns['flags'][row] & bit else 'false'
+            for field, column in CODED_FIELDS.items():
+                record[field] = decoded[column][row]
+            records.append(record)
+        return records
+
+    # ------------------------------------------------------------------
+    # Writes
+    # ------------------------------------------------------------------
+
+    def append(self, readings):
+        """
+        Add JSON readings (each needs Vehicle_Id and Timestamp)
+
+        Only the vehicle/day partitions that receive readings are rewritten; readings
+        whose TelematicsId is already stored in the partition are skipped, so
+        re-importing a file is harmless. Returns {vehicle_id: rows_added}.
+        """
+        by_vehicle = {}
+        for reading in readings:
+            if not reading.get('Vehicle_Id') or not reading.get('Timestamp'):
+                raise Exception('Telemetry readings need Vehicle_Id and Timestamp')
+            self.vehicle_dir(reading['Vehicle_Id'])  # validate before writing anything
+            by_vehicle.setdefault(str(reading['Vehicle_Id']), []).append(reading)
+
+        added = {}
+        with self._locked():
+            self._load_meta()
+            for vehicle_id, vehicle_readings in by_vehicle.items():
+                attributes = self._vehicles.setdefault(vehicle_id, {})
+                for field in VEHICLE_FIELDS:
+                    if vehicle_readings[-1].get(field):
+                        attributes[field] = vehicle_readings[-1][field]
+                added[vehicle_id] = self._append_vehicle(vehicle_id, self._to_array(vehicle_readings))
+            self._save_meta()
+            # Listeners run under the store lock, after the partitions and metadata are written
+            for listener in self._listeners:
+                listener({vehicle_id: rows for vehicle_id, rows in added.items() if len(rows)})
+        return {vehicle_id: len(rows) for vehicle_id, rows in added.items()}
+
+    def on_append(self, listener):
+        """Call listener({vehicle_id: new_rows}) after every append (e.g. to maintain an index)"""
+        self._listeners.append(listener)
+
+    def signature(self):
+        """Change marker for the whole store (metadata is rewritten by every append)"""
+        try:
+            return os.stat(self._meta_path()).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def _append_vehicle(self, vehicle_id, array):
+        """Merge readings into the day partitions, returns the rows that were new"""
+        os.makedirs(self.vehicle_dir(vehicle_id), exist_ok=True)
+        index = {int(entry['day']): entry for entry in self.index(vehicle_id)}
+        days = array['ts'] // SECONDS_PER_DAY
+        added = []
+
+        for day in np.unique(days).tolist():
+            incoming = array[days == day]
+            path = self._partition_path(vehicle_id, day)
+            if os.path.exists(path):
+                existing = np.load(path)
+                incoming = incoming[~np.isin(incoming['seq'], existing['seq'])]
+                merged = np.concatenate([existing, incoming])
+            else:
+                merged = incoming
+            if not len(incoming):
+                continue
+            merged = merged[np.argsort(merged['ts'], kind='stable')]
+            save_array(path, merged)
+            index[day] = (day, merged['ts'][0], merged['ts'][-1], len(merged))
+            added.append(incoming)
+
+        entries = np.array([tuple(index[day]) for day in sorted(index)], dtype=INDEX_DTYPE)
+        save_array(os.path.join(self.vehicle_dir(vehicle_id), 'index.npy'), entries)
+        return np.concatenate(added) if added else np.zeros(0, dtype=READING_DTYPE)
+
+    def import_json(self, path='data/vehicle_telematics.json'):
+        with open(path, 'r') as f:
+            return self.append(json.load(f))
+
+    # ------------------------------------------------------------------
+    # Reads
+    # ------------------------------------------------------------------
+
+    def partitions(self, vehicle_id, start=None, end=None):
+        """(day, path) of the partitions holding readings between start and end"""
+        for entry in self.index(vehicle_id):
+            if (start is not None and entry['last_ts'] < start) or (end is not None and entry['first_ts'] > end):
+                continue
+            yield int(entry['day']), self._partition_path(vehicle_id, entry['day'])
+
+    def scan(self, vehicle_id, start=None, end=None):
+        """
+        Yield read-only views (memory-mapped, no copy) of one vehicle's readings with
+        start <= ts <= end, one view per day partition in time order
+        """
+        start = -np.inf if start is None else start
+        end = np.inf if end is None else end
+        for _, path in self.partitions(vehicle_id, start, end):
+            partition = np.load(path, mmap_mode='r')
+            lo = np.searchsorted(partition['ts'], start, side='left') if start != -np.inf else 0
+            hi = np.searchsorted(partition['ts'], end, side='right') if end != np.inf else len(partition)
+            if hi > lo:
+                yield partition[lo:hi]
+
+    def count_range(self, vehicle_id, start=None, end=None):
+        """Readings between start and end; only partitions cut by the range are opened"""
+        total = 0
+        for entry in self.index(vehicle_id):
+            if (start is not None and entry['last_ts'] < start) or (end is not None and entry['first_ts'] > end):
+                continue
+            if (start is None or entry['first_ts'] >= start) and (end is None or entry['last_ts'] <= end):
+                total += int(entry['rows'])
+            else:
+                ts = np.load(self._partition_path(vehicle_id, entry['day']), mmap_mode='r')['ts']
+                lo = np.searchsorted(ts, start, side='left') if start is not None else 0
+                hi = np.searchsorted(ts, end, side='right') if end is not None else len(ts)
+                total += max(0, int(hi - lo))
+        return total
+
+    def span(self, vehicle_id, start=None, end=None):
+        """(first_ts, last_ts) bounds of a vehicle's readings clipped to the range (None if empty)"""
+        index = self.index(vehicle_id)
+        if not len(index):
+            return None
+        first, last = int(index['first_ts'].min()), int(index['last_ts'].max())
+        first = max(first, start) if start is not None else first
+        last = min(last, end) if end is not None else last
+        return (first, last) if first <= last else None
+
+    def read(self, vehicle_id, start=None, end=None):
+        """All matching readings of a vehicle as one array (copies if they span several days)"""
+        views = list(self.scan(vehicle_id, start, end))
+        if len(views) == 1:
+            return views[0]
+        return np.concatenate(views) if views else np.zeros(0, dtype=READING_DTYPE)
+
+    def records(self, vehicle_ids=None, start=None, end=None, limit=None):
+        """
+        JSON readings of several vehicles (all by default) in TelematicsId order
+
+        With a limit only the newest `limit` readings are decoded.
+        """
+        vehicle_ids = self.vehicles() if vehicle_ids is None else [v for v in vehicle_ids if self.vehicle(v) is not None]
+        arrays = [(vehicle_id, self.read(vehicle_id, start, end)) for vehicle_id in vehicle_ids]
+        arrays = [(vehicle_id, array) for vehicle_id, array in arrays if len(array)]
+        if not arrays:
+            return []
+        ts = np.concatenate([array['ts'] for _, array in arrays])
+        seq = np.concatenate([array['seq'] for _, array in arrays])
+        owner = np.repeat(np.arange(len(arrays)), [len(array) for _, array in arrays])
+        row = np.concatenate([np.arange(len(array)) for _, array in arrays])
+
+        keep = np.arange(len(ts))
+        if limit is not None and limit < len(keep):
+            keep = np.argsort(ts, kind='stable')[len(keep) - max(0, limit):]
+        keep = keep[np.argsort(seq[keep], kind='stable')]
+
+        decoded = {}
+        for position, (vehicle_id, array) in enumerate(arrays):
+            rows = row[keep[owner[keep] == position]]
+            decoded[position] = iter(self.to_records(vehicle_id, array[rows]))
+        return [next(decoded[position]) for position in owner[keep].tolist()]
+
+    def count(self, vehicle_id=None):
+        vehicle_ids = [vehicle_id] if vehicle_id else self.vehicles()
+        return sum(int(self.index(v)['rows'].sum()) for v in vehicle_ids)
@@ -0,0 +1,184 @@
+"""
+Telemetry Trips
+Splits each vehicle's readings into trips and keeps a compact per-trip table
+"""
+
+import hashlib
+import os
+
+import numpy as np
+
+from modules.telemetry_store import FLAG_BITS, format_timestamp, save_array
+
+# A gap longer than this between readings ends a trip
+TRIP_GAP_SECONDS = 15 * 60
+
+TRIP_DTYPE = np.dtype([
+    ('start_ts', '<i8'), ('end_ts', '<i8'), ('duration_s', '<i8'), ('readings', '<i4'),
+    ('distance_km', '<f4'), ('max_speed', '<f4'), ('avg_speed', '<f4'),
+    ('harsh_braking', '<i4'), ('rapid_acceleration', '<i4'), ('alerts', '<i4'),
+    ('idling_readings', '<i4'), ('idling_s', '<i8'),
+    ('start_lat', '<f8'), ('start_lon', '<f8'), ('end_lat', '<f8'), ('end_lon', '<f8'),
+    ('start_city', '<u2'),
+])
+
+ACTIVE_FLAGS = FLAG_BITS['IsEngineOn'] | FLAG_BITS['IsMoving']
+
+
+def segment_trips(readings, gap_seconds=TRIP_GAP_SECONDS, no_alert_code=None):
+    """
+    Trip table for one vehicle's time-ordered readings
+
+    A trip is a run of readings with the engine on or the vehicle moving; it ends at a
+    reading with both off or at a gap longer than gap_seconds. Distance is the odometer
+    delta when it increases over the trip, otherwise speed integrated over time.
+    """
+    if not len(readings):
+        return np.zeros(0, dtype=TRIP_DTYPE)
+
+    ts = np.asarray(readings['ts'])
+    flags = np.asarray(readings['flags'])
+    active = (flags & ACTIVE_FLAGS) > 0
+    gap_before = np.r_[True, np.diff(ts) > gap_seconds]
+    starts_trip = active & (gap_before | ~np.r_[False, active[:-1]])
+    rows = np.flatnonzero(active)
+    if not len(rows):
+        return np.zeros(0, dtype=TRIP_DTYPE)
+
+    # Trip boundaries within the active rows
+    trip_of_row = np.cumsum(starts_trip)[rows]
+    first = np.flatnonzero(np.r_[True, trip_of_row[1:] != trip_of_row[:-1]])
+    last = np.r_[first[1:], len(rows)] - 1
+    counts = last - first + 1
+
+    t = ts[rows]
+    speed = np.asarray(readings['speed'], dtype=np.float64)[rows]
+    odometer = np.asarray(readings['odometer'], dtype=np.float64)[rows]
+    trip_flags = flags[rows]
+
+    # Intervals between consecutive readings of the same trip
+    dt = np.r_[np.diff(t), 0].astype(np.float64)
+    dt[last] = 0
+    segment_km = (speed + np.r_[speed[1:], 0]) / 2 * dt / 3600
+    integrated_km = np.add.reduceat(segment_km, first)
+    odometer_km = odometer[last] - odometer[first]
+
+    idling = (trip_flags & FLAG_BITS['Idling']) > 0
+    if no_alert_code is None:
+        alerts = np.zeros(len(rows), dtype=np.int64)
+    else:
+        alerts = (np.asarray(readings['alert_type'])[rows] != no_alert_code).astype(np.int64)
+
+    trips = np.zeros(len(first), dtype=TRIP_DTYPE)
+    trips['start_ts'] = t[first]
+    trips['end_ts'] = t[last]
+    trips['duration_s'] = t[last] - t[first]
+    trips['readings'] = counts
+    trips['distance_km'] = np.where(odometer_km > 0, odometer_km, integrated_km)
+    trips['max_speed'] = np.maximum.reduceat(speed, first)
+    trips['avg_speed'] = np.add.reduceat(speed, first) / counts
+    trips['harsh_braking'] = np.add.reduceat(((trip_flags & FLAG_BITS['HarshBraking']) > 0).astype(np.int64), first)
+    trips['rapid_acceleration'] = np.add.reduceat(((trip_flags & FLAG_BITS['RapidAcceleration']) > 0).astype(np.int64), first)
+    trips['alerts'] = np.add.reduceat(alerts, first)
+    trips['idling_readings'] = np.add.reduceat(idling.astype(np.int64), first)
+    trips['idling_s'] = np.add.reduceat(np.where(idling, dt, 0), first)
+    for end, positions in (('start', first), ('end', last)):
+        trips[f"{end}_lat"] = np.asarray(readings['lat'])[rows][positions]
+        trips[f"{end}_lon"] = np.asarray(readings['lon'])[rows][positions]
+    trips['start_city'] = np.asarray(readings['city'])[rows][first]
+    return trips
+
+
+class TripTable:
+    """
+    Per-vehicle trip tables stored next to the telemetry partitions (<vehicle>/trips.npy)
+
+    A vehicle's trips are recomputed only when its partition index changed since
+    they were built; trips are sorted by start time, so time ranges are a binary search.
+    """
+
+    def __init__(self, telemetry_store, gap_seconds=TRIP_GAP_SECONDS):
+        self.store = telemetry_store
+        self.gap_seconds = gap_seconds
+
+    def _signature(self, vehicle_id):
+        payload = self.store.index(vehicle_id).tobytes() + str(self.gap_seconds).encode()
+        return hashlib.sha1(payload).hexdigest()
+
+    def _paths(self, vehicle_id):
+        directory = self.store.vehicle_dir(vehicle_id)
+        return os.path.join(directory, 'trips.npy'), os.path.join(directory, 'trips.sig')
+
+    def vehicle_trips(self, vehicle_id):
+        """All trips of a vehicle, rebuilt if its readings changed"""
+        trips_path, signature_path = self._paths(vehicle_id)
+        signature = self._signature(vehicle_id)
+        try:
+            with open(signature_path, 'r') as f:
+                if f.read() == signature:
+                    return np.load(trips_path, mmap_mode='r')
+        except FileNotFoundError:
+            pass
+
+        trips = segment_trips(self.store.read(vehicle_id), self.gap_seconds, self.store.code_of('alert_type', 'None'))
+        save_array(trips_path, trips)
+        with open(signature_path + '.tmp', 'w') as f:
+            f.write(signature)
+        os.replace(signature_path + '.tmp', signature_path)
+        return trips
+
+    def trips(self, vehicle_id, start=None, end=None):
+        """Trips of a vehicle that start between start and end"""
+        trips = self.vehicle_trips(vehicle_id)
+        lo = np.searchsorted(trips['start_ts'], start, side='left') if start is not None else 0
+        hi = np.searchsorted(trips['start_ts'], end, side='right') if end is not None else len(trips)
+        return trips[lo:hi]
+
+    def build(self):
+        """Bring every vehicle's trip table up to date, returns {vehicle_id: trips}"""
+        return {vehicle_id: len(self.vehicle_trips(vehicle_id)) for vehicle_id in self.store.vehicles()}
+
+    def to_records(self, vehicle_id, trips):
+        """JSON rows for an array of trips"""
+        cities = self.store.decode('city', trips['start_city']).tolist()
+        records = []
+        for trip, city in zip(trips.tolist(), cities):
+            row = dict(zip(TRIP_DTYPE.names, trip))
+            records.append({
+                'Vehicle_Id': vehicle_id,
+                'Start': format_timestamp(row['start_ts']),
+                'End': format_timestamp(row['end_ts']),
+                'Duration_Minutes': round(row['duration_s'] / 60, 1),
+                'Readings': row['readings'],
+                'Distance_Km': round(row['distance_km'], 2),
+                'Max_Speed': round(row['max_speed'], 1),
+                'Avg_Speed': round(row['avg_speed'], 1),
+                'Harsh_Braking': row['harsh_braking'],
+                'Rapid_Acceleration': row['rapid_acceleration'],
+                'Alerts': row['alerts'],
+                'Idling_Readings': row['idling_readings'],
+                'Idling_Minutes': round(row['idling_s'] / 60, 1),
+                'Start_Location': [row['start_lat'], row['start_lon']],
+                'End_Location': [row['end_lat'], row['end_lon']],
+                'Start_City': city,
+            })
+        return records
+
+    def summary(self, start=None, end=None):
+        """Per-vehicle trip totals across the fleet"""
+        rows = []
+        for vehicle_id in self.store.vehicles():
+            trips = self.trips(vehicle_id, start, end)
+            if not len(trips):
+                continue
+            rows.append({
+                'Vehicle_Id': vehicle_id,
+                'Trips': len(trips),
+                'Distance_Km': round(float(trips['distance_km'].sum()), 2),
+                'Driving_Hours': round(float(trips['duration_s'].sum()) / 3600, 2),
+                'Max_Speed': round(float(trips['max_speed'].max()), 1),
+                'Harsh_Braking': int(trips['harsh_braking'].sum()),
+                'Rapid_Acceleration': int(trips['rapid_acceleration'].sum()),
+                'Idling_Minutes': round(float(trips['idling_s'].sum()) / 60, 1),
+            })
+        return rows
@@ -0,0 +1,129 @@
+"""
+Warm-up
+Builds the data-store caches, insights rollups, telemetry indexes and segment
+bitmaps in a background thread at boot and reports progress for readiness checks
+
+WARMUP=background (default) starts the thread at import, WARMUP=blocking runs the
+tasks before the app finishes importing and WARMUP=off leaves every cache to be
+built by the first request that needs it.
+"""
+
+import os
+import threading
+import time
+from datetime import datetime
+
+from modules.app_logging import get_logger
+
+WARMUP_MODE = os.environ.get('WARMUP', 'background').lower()
+
+logger = get_logger(__name__)
+
+
+class WarmUp:
+    """
+    Ordered warm-up tasks run once per worker process
+
+    A task that raises FileNotFoundError is skipped (its dataset doesn't exist here)
+    and any other error marks it failed; neither stops the remaining tasks. The worker
+    is ready once every task has finished, whatever the outcome - a failed task only
+    means its cache gets built by a request instead.
+    """
+
+    def __init__(self):
+        self.tasks = []
+        self.mode = WARMUP_MODE
+        self._thread = None
+        self._lock = threading.Lock()
+        self._reset()
+        # gunicorn --preload forks workers after import; threads don't survive a fork
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    def _reset(self):
+        self.results = {}
+        self.started_at = None
+        self.finished_at = None
+
+    def task(self, name, description=''):
+        """Decorator registering a warm-up task (tasks run in registration order)"""
+        def register(fn):
+            self.tasks.append((name, description, fn))
+            return fn
+        return register
+
+    def start(self):
+        """Run the tasks as WARMUP says: in a daemon thread, right now, or not at all"""
+        if self.mode == 'off':
+            return self
+        if self.mode == 'blocking':
+            self.run()
+            return self
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self.run, name='warmup', daemon=True)
+                self._thread.start()
+        return self
+
+    def run(self):
+        """Run every task in order (in the calling thread)"""
+        self.started_at = time.time()
+        self.finished_at = None
+        self.results = {name: {'state': 'pending'} for name, _, _ in self.tasks}
+        logger.info("Warm-up started (%d tasks)", len(self.tasks))
+        for name, _, fn in self.tasks:
+            self.results[name] = {'state': 'running'}
+            started = time.perf_counter()
+            try:
+                detail = fn()
+                result = {'state': 'done'}
+                if detail is not None:
+                    result['detail'] = detail
+            except FileNotFoundError as e:
+                result = {'state': 'skipped', 'reason': f"missing {e.filename or e}"}
+            except Exception as e:
+                result = {'state': 'failed', 'error': str(e)}
+                logger.warning("Warm-up task %s failed: %s", name, e)
+            result['ms'] = round((time.perf_counter() - started) * 1000, 1)
+            self.results[name] = result
+            logger.debug("Warm-up task %s: %s in %sms", name, result['state'], result['ms'])
+        self.finished_at = time.time()
+        logger.info("Warm-up finished in %.0fms", (self.finished_at - self.started_at) * 1000)
+
+    def _after_fork(self):
+        self._lock = threading.Lock()
+        was_started = self._thread is not None or self.started_at is not None
+        self._thread = None
+        self._reset()
+        if was_started and self.mode == 'background':
+            # Caches built before the fork are inherited, so this mostly re-validates them
+            self.start()
+
+    @property
+    def ready(self):
+        return self.mode == 'off' or self.finished_at is not None
+
+    def status(self):
+        """Readiness and per-task progress, for /health"""
+        results = dict(self.results)
+        finished = sum(1 for r in results.values() if r['state'] not in ('pending', 'running'))
+        if self.mode == 'off':
+            state = 'disabled'
+        elif self.finished_at is not None:
+            state = 'ready' if all(r['state'] != 'failed' for r in results.values()) else 'degraded'
+        elif self.started_at is None:
+            state = 'pending'
+        else:
+            state = 'warming'
+        end = self.finished_at or time.time()
+        return {
+            'state': state,
+            'ready': self.ready,
+            'progress': f"{finished}/{len(self.tasks)}",
+            'started_at': datetime.fromtimestamp(self.started_at).isoformat() if self.started_at else None,
+            'elapsed_ms': round((end - self.started_at) * 1000, 1) if self.started_at else None,
+            'tasks': [
+                dict(name=name, description=description, **results.get(name, {'state': 'pending'}))
+                for name, description, _ in self.tasks
+            ]
+        }
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Import-time profile of the app: how long a fresh worker takes to import app.py and which modules it spends it on
+
+Usage:
+    python profile_startup.py                          # lazy and eager startup, 5 runs each
+    python profile_startup.py --mode lazy --top 30     # longer module list
+    python profile_startup.py --check-data             # also time check_data_files.py (the Procfile step)
+
+Each run is a new interpreter with `python -X importtime -c "import app"`, so the numbers
+are what a dyno boot or gunicorn worker restart pays. Wall times are medians over --runs;
+the module tables come from the median run. Environment variables (STATE_BACKEND,
+SF_USERNAME, ...) are passed through, so an auto-connect at import is included if configured.
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+MODES = ('lazy', 'eager')
+
+
+def parse_importtime(stderr):
+    """[(module, self_us, cumulative_us, depth)] from -X importtime output"""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line.split(':', 1)[1].split('|')
+        # Nesting is shown by two spaces of indent per level
+        depth = (len(name) - len(name.lstrip(' ')) - 1) // 2
+        rows.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return rows
+
+
+def profile_import(mode):
+    """Import app in a fresh interpreter; returns (wall seconds, importtime rows)"""
+    env = dict(os.environ, STARTUP_MODE=mode)
+    started = time.perf_counter()
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import app'],
+                            env=env, capture_output=True, text=True)
+    elapsed = time.perf_counter() - started
+    if result.returncode != 0:
+        raise Exception(f"import app failed ({mode}):\n{result.stderr[-2000:]}")
+    return elapsed, parse_importtime(result.stderr)
+
+
+def time_check_data_files():
+    started = time.perf_counter()
+    subprocess.run([sys.executable, 'check_data_files.py'], capture_output=True, check=True)
+    return time.perf_counter() - started
+
+
+def print_report(mode, wall_times, rows, top):
+    by_name = {name: (self_us, cumulative_us, depth) for name, self_us, cumulative_us, depth in rows}
+    app_total = by_name.get('app', (0, 0, 0))[1] / 1e6
+    print(f"\n📦 STARTUP_MODE={mode}: interpreter + import median {statistics.median(wall_times):.3f}s "
+          f"(min {min(wall_times):.3f}s, max {max(wall_times):.3f}s), import app {app_total:.3f}s")
+
+    # What app.py pulls in directly (depth 1) - where deferral pays off
+    direct = sorted((r for r in rows if r[3] == 1), key=lambda r: -r[2])[:top]
+    print(f"\n   {'Imported by app.py':45s} {'cumulative':>11s} {'share':>7s}")
+    for name, _, cumulative_us, _ in direct:
+        share = 100 * cumulative_us / 1e6 / app_total if app_total else 0
+        print(f"   {name:45s} {cumulative_us / 1000:9.1f}ms {share:6.1f}%")
+
+    heaviest = sorted(rows, key=lambda r: -r[1])[:top]
+    print(f"\n   {'Heaviest modules (self time)':45s} {'self':>11s}")
+    for name, self_us, _, _ in heaviest:
+        print(f"   {name:45s} {self_us / 1000:9.1f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Profile app import time (cold start)')
+    parser.add_argument('--mode', action='append', choices=MODES, help='Startup mode(s) to profile (default: both)')
+    parser.add_argument('--runs', type=int, default=5, help='Fresh interpreters per mode')
+    parser.add_argument('--top', type=int, default=15, help='Modules to list per table')
+    parser.add_argument('--check-data', action='store_true', help='Also time check_data_files.py')
+    args = parser.parse_args()
+
+    print("=" * 80)
+    print("STARTUP PROFILE")
+    print("=" * 80)
+
+    summary = {}
+    for mode in args.mode or MODES:
+        runs = [profile_import(mode) for _ in range(args.runs)]
+        runs.sort(key=lambda run: run[0])
+        wall_times = [wall for wall, _ in runs]
+        print_report(mode, wall_times, runs[len(runs) // 2][1], args.top)
+        summary[mode] = statistics.median(wall_times)
+
+    if args.check_data:
+        check_times = [time_check_data_files() for _ in range(args.runs)]
+        print(f"\n🗂️  check_data_files.py median {statistics.median(check_times):.3f}s")
+
+    if len(summary) > 1:
+        print("\n" + "=" * 80)
+        for mode, wall in summary.items():
+            print(f"   {mode:6s} {wall:.3f}s")
+
+
+if __name__ == '__main__':
+    main()
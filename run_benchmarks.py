@@ -0,0 +1,506 @@
+#!/usr/bin/env python3
+"""
+Benchmark the hot HTTP and module paths against generated data (offline, no Salesforce connection)
+
+Usage:
+    python run_benchmarks.py                                    # 1k and 100k individuals
+    python run_benchmarks.py --scale 1k --scale 1m --iterations 50
+    python run_benchmarks.py --scale 25000 --case insights --case telemetry
+    python run_benchmarks.py --save-baseline                    # store this run as the baseline
+    python run_benchmarks.py --baseline old.json --threshold 10 # fail (exit 1) on >10% regressions
+    python run_benchmarks.py --salesforce mock --sf-latency-ms 50 # Salesforce paths against mock_salesforce_server.py
+
+Each scale gets a workspace under data/benchmarks/workspaces/<scale> whose data/ directory
+holds the synthetic datasets (generated once per parameter set). The app is imported in a
+fresh process running inside that workspace, so its relative data paths, caches and peak
+RSS belong to that scale alone. Results go to data/benchmarks/results/<timestamp>.json and
+are compared with data/benchmarks/baseline.json when it exists. Cases that need Salesforce
+are skipped unless --salesforce mock starts a mock org over the workspace's data. The app's
+cache warm-up is off by default (--warmup blocking measures the warmed first calls instead).
+"""
+
+import argparse
+import glob
+import itertools
+import json
+import os
+import platform
+import resource
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+
+BENCHMARK_ROOT = 'data/benchmarks'
+BASELINE_PATH = os.path.join(BENCHMARK_ROOT, 'baseline.json')
+SCALES = {'1k': 1000, '100k': 100000, '1m': 1000000}
+DEFAULT_SCALES = ['1k', '100k']
+
+# Fixed so that runs (and baselines) at the same scale see identical data
+ANCHOR = datetime(2025, 11, 1)
+SEED = 0
+
+# Formats the benchmarked code paths read: JSON for DataStore.load and the insights
+# enrichment, CSV for driving segments, columnar for the table-backed routes
+DATASET_FORMATS = {
+    'engagement': ('json', 'columnar'),
+    'insights': ('json', 'columnar'),
+    'individual_vehicles': ('json', 'csv'),
+    'vehicle_telematics': ('csv', 'columnar'),
+}
+
+HIGH_ENGAGEMENT = [{'field': 'engagement_score', 'operator': 'greater_than_or_equal', 'value': 3}]
+# Preview runs the filters as SOQL, so it needs fields that exist on the Salesforce side
+PREVIEW_FILTERS = [{'field': 'Name', 'operator': 'contains', 'value': 'an'}]
+DRIVING_PROMPT = 'Create a segment of top 10 drivers with speed above 80 kmph'
+INGEST_SEQ_START = 900000000
+SALESFORCE_USER = {'username': 'benchmark@example.com', 'password': 'benchmark'}
+SEND_BATCH = 10
+
+# Files the app writes under data/ while the cases run, removed before every run
+MUTABLE_STATE = ['segments.db*', 'shared_state.db*', 'insights_cube.json', 'individual_insights.log',
+                 'engagement_events.log*', 'engagement_deltas.db*', 'telemetry_rules.json', 'telemetry',
+                 '*.lock', '.*.tmp']
+
+
+# ----------------------------------------------------------------------
+# Workspaces
+# ----------------------------------------------------------------------
+
+def _scale_size(value):
+    if value.lower() in SCALES:
+        return SCALES[value.lower()]
+    try:
+        size = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected one of {', '.join(SCALES)} or a number, got {value}")
+    if size <= 0:
+        raise argparse.ArgumentTypeError(f"scale must be positive, got {value}")
+    return size
+
+
+def prepare_workspace(scale, individuals, args):
+    """Generate the datasets and telemetry store of one scale (reused while the parameters match)"""
+    from modules.columnar_store import ColumnarTable
+    from modules.synthetic_data import SyntheticPopulation, write_population
+    from modules.telemetry_spatial import SpatialIndex
+    from modules.telemetry_store import TelemetryStore
+    from modules.telemetry_trips import TripTable
+
+    workspace = os.path.abspath(os.path.join(BENCHMARK_ROOT, 'workspaces', scale))
+    data_dir = os.path.join(workspace, 'data')
+    manifest_path = os.path.join(workspace, 'benchmark.json')
+    params = {'individuals': individuals, 'seed': SEED, 'anchor': ANCHOR.isoformat(),
+              'readings_per_vehicle': args.readings, 'telemetry_vehicles': args.telemetry_vehicles,
+              'formats': {name: list(formats) for name, formats in DATASET_FORMATS.items()}}
+
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        if manifest.get('params') == params:
+            print(f"   Reusing {workspace}")
+            return workspace, manifest
+    shutil.rmtree(workspace, ignore_errors=True)
+    os.makedirs(data_dir)
+
+    start = time.time()
+    population = SyntheticPopulation(individuals, seed=SEED, readings_per_vehicle=args.readings, anchor=ANCHOR)
+    rows, files = {}, {}
+    for name, formats in DATASET_FORMATS.items():
+        written = write_population(population, data_dir, formats=formats, datasets=[name])
+        rows[name] = written['datasets'][name]['rows']
+        files[name] = written['datasets'][name]['files']
+        print(f"   {name}: {rows[name]:,} rows ({time.time() - start:.1f}s)")
+    os.remove(os.path.join(data_dir, 'manifest.json'))
+
+    # Seed a pristine telemetry store straight from the columnar table (the JSON is never
+    # written), keeping the first telemetry_vehicles vehicles; codes follow first appearance
+    telemetry = TelemetryStore(os.path.join(workspace, 'telemetry'))
+    table = ColumnarTable(files['vehicle_telematics'][-1])
+    vehicle_codes = table.raw('Vehicle_Id')
+    selected = np.flatnonzero(vehicle_codes < args.telemetry_vehicles) if args.telemetry_vehicles else np.arange(len(table))
+    for offset in range(0, len(selected), 50000):
+        telemetry.append(table.records(rows=selected[offset:offset + 50000]))
+    trips = TripTable(telemetry).build()
+    SpatialIndex(telemetry).rebuild()
+    print(f"   telemetry: {len(selected):,} readings, {len(telemetry.vehicles()):,} vehicles, "
+          f"{sum(trips.values()):,} trips ({time.time() - start:.1f}s)")
+
+    manifest = {'params': params, 'rows': rows, 'telemetry_readings': int(len(selected)),
+                'files': files, 'setup_seconds': round(time.time() - start, 2)}
+    with open(manifest_path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    return workspace, manifest
+
+
+def reset_workspace(workspace):
+    """Drop what a previous run left behind (segments, caches, state, ingested telemetry)"""
+    data_dir = os.path.join(workspace, 'data')
+    for pattern in MUTABLE_STATE:
+        for path in glob.glob(os.path.join(data_dir, pattern)):
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            else:
+                os.remove(path)
+    shutil.copytree(os.path.join(workspace, 'telemetry'), os.path.join(data_dir, 'telemetry'))
+
+
+def start_mock_salesforce(workspace, args):
+    """Start mock_salesforce_server.py over the workspace data -> (process, login URL)"""
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'mock_salesforce_server.py')
+    process = subprocess.Popen([sys.executable, script, '--port', '0', '--data-dir', os.path.join(workspace, 'data'),
+                                '--latency-ms', str(args.sf_latency_ms), '--error-rate', str(args.sf_error_rate), '--seed', str(SEED)],
+                               stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+    line = process.stdout.readline()
+    if 'http://' not in line:
+        process.kill()
+        raise Exception(f"Mock Salesforce did not start: {line.strip() or 'no output'}")
+    return process, line.strip().split()[-1]
+
+
+# ----------------------------------------------------------------------
+# Cases
+# ----------------------------------------------------------------------
+
+class CaseTimeout(Exception):
+    pass
+
+
+class SkipCase(Exception):
+    pass
+
+
+def _on_alarm(signum, frame):
+    raise CaseTimeout()
+
+
+def _peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def _request(client, method, url, body=None):
+    response = client.open(url, method=method, json=body)
+    if response.status_code >= 400:
+        raise Exception(f"{method} {url} -> HTTP {response.status_code}: {response.get_data(as_text=True)[:200]}")
+    return response
+
+
+def _get(client, urls):
+    urls = itertools.cycle(urls)
+    return lambda: _request(client, 'GET', next(urls))
+
+
+def _ingest_batches(telemetry, vehicles, batch_size):
+    """Endless batches of new readings, continuing each sample vehicle's last reading"""
+    from modules.telemetry_store import format_timestamp
+
+    last = {vehicle_id: telemetry.to_records(vehicle_id, telemetry.read(vehicle_id)[-1:])[0] for vehicle_id in vehicles}
+    clock = {vehicle_id: int(telemetry.read(vehicle_id)['ts'][-1]) for vehicle_id in vehicles}
+    seq = itertools.count(INGEST_SEQ_START)
+    cycle = itertools.cycle(vehicles)
+    while True:
+        batch = []
+        for _ in range(batch_size):
+            vehicle_id = next(cycle)
+            clock[vehicle_id] += 60
+            batch.append(dict(last[vehicle_id], TelematicsId=f"TEL_{next(seq)}", Timestamp=format_timestamp(clock[vehicle_id])))
+        yield batch
+
+
+def build_cases(app_module, manifest, args):
+    """(name, description, call) for every benchmark; setup here is not timed"""
+    from modules.columnar_store import ColumnarTable
+
+    client = app_module.app.test_client()
+    if args.salesforce != 'none':
+        _request(client, 'POST', '/login/oauth', SALESFORCE_USER)
+    engine = app_module.segmentation_engine
+    insights = ColumnarTable(manifest['files']['insights'][-1])
+    individual_ids = insights.dictionary('Individual_Id')[:args.sample_ids]
+    telemetry = app_module.telemetry_store
+    vehicles = telemetry.vehicles()[:args.sample_ids]
+
+    segment = engine.create_segment(None, 'Benchmark high engagement', 'run_benchmarks.py', 'Individual', HIGH_ENGAGEMENT)
+    audience = engine.create_segment(None, 'Benchmark email audience', 'run_benchmarks.py', 'Individual', HIGH_ENGAGEMENT)
+    engine.update_segment(audience['id'], {'limit': args.email_recipients})
+    emails = app_module.email_generator.generate_personalized_emails(None, audience['id'], 'vip_welcome')[:SEND_BATCH]
+    names = itertools.count(1)
+    batches = _ingest_batches(telemetry, vehicles, args.ingest_batch)
+
+    def connected(call):
+        def run():
+            if app_module.sf_manager.sf is None:
+                raise SkipCase('needs a Salesforce connection (--salesforce mock)')
+            return call()
+        return run
+
+    return [
+        ('engagement.list', 'GET /api/individuals/engagement', _get(client, ['/api/individuals/engagement'])),
+        ('segments.create', 'POST /api/segments/create (engagement filter)',
+         lambda: _request(client, 'POST', '/api/segments/create', {
+             'name': f"Benchmark segment {next(names)}", 'description': 'run_benchmarks.py',
+             'base_object': 'Individual', 'filters': HIGH_ENGAGEMENT})),
+        ('segments.preview', 'POST /api/segments/preview', connected(
+            lambda: _request(client, 'POST', '/api/segments/preview', {'base_object': 'Individual', 'filters': PREVIEW_FILTERS}))),
+        ('segments.members', 'GET /api/segments/<id>/members', _get(client, [f"/api/segments/{segment['id']}/members"])),
+        ('insights.analytics', 'GET /api/analytics/insights', _get(client, ['/api/analytics/insights'])),
+        ('insights.trends', 'GET /api/analytics/insights/trends', _get(client, ['/api/analytics/insights/trends'])),
+        ('insights.individual', 'GET /api/individuals/<id>/insights',
+         _get(client, [f"/api/individuals/{individual_id}/insights" for individual_id in individual_ids])),
+        ('emails.generate', f"EmailGenerator.generate_personalized_emails ({args.email_recipients} recipients)",
+         lambda: app_module.email_generator.generate_personalized_emails(None, audience['id'], 'vip_welcome')),
+        ('emails.send', f"POST /api/emails/send ({len(emails)} emails)", connected(
+            lambda: _request(client, 'POST', '/api/emails/send', {'emails': emails}))),
+        ('salesforce.query', 'POST /api/query', connected(
+            lambda: _request(client, 'POST', '/api/query', {'query': 'SELECT Id, Name FROM Individual LIMIT 200'}))),
+        ('salesforce.dashboard', 'GET / (dashboard counts)', connected(lambda: _request(client, 'GET', '/'))),
+        ('salesforce.datacloud', 'GET /api/analytics/datacloud', connected(
+            lambda: _request(client, 'GET', '/api/analytics/datacloud'))),
+        ('driving.segment', 'POST /api/agent/chat (driving segment)',
+         lambda: _request(client, 'POST', '/api/agent/chat', {'message': DRIVING_PROMPT})),
+        ('telemetry.readings', 'GET /api/vehicles/<id>/telemetry',
+         _get(client, [f"/api/vehicles/{vehicle_id}/telemetry" for vehicle_id in vehicles])),
+        ('telemetry.series', 'GET /api/vehicles/<id>/series',
+         _get(client, [f"/api/vehicles/{vehicle_id}/series" for vehicle_id in vehicles])),
+        ('telemetry.trips', 'GET /api/vehicles/<id>/trips',
+         _get(client, [f"/api/vehicles/{vehicle_id}/trips" for vehicle_id in vehicles])),
+        ('telemetry.trip_summary', 'GET /api/trips/summary', _get(client, ['/api/trips/summary'])),
+        ('telemetry.heatmap', 'GET /api/telemetry/spatial/heatmap', _get(client, ['/api/telemetry/spatial/heatmap'])),
+        ('telemetry.cities', 'GET /api/telemetry/spatial/cities', _get(client, ['/api/telemetry/spatial/cities'])),
+        ('telemetry.ingest', f"POST /api/telemetry/ingest ({args.ingest_batch} readings)",
+         lambda: _request(client, 'POST', '/api/telemetry/ingest', {'readings': next(batches)})),
+    ]
+
+
+def run_case(call, args):
+    """Time one case: the first call is reported as cold, then up to --iterations warm calls"""
+    result = {'status': 'ok'}
+    rss_before = _peak_rss_mb()
+    latencies = []
+    errors = []
+    started = time.perf_counter()
+    for i in range(args.iterations + 1):
+        signal.setitimer(signal.ITIMER_REAL, args.timeout)
+        call_start = time.perf_counter()
+        try:
+            call()
+        except SkipCase as e:
+            return {'status': 'skipped', 'reason': str(e)}
+        except CaseTimeout:
+            result.update(status='timeout', error=f"call {i + 1} exceeded {args.timeout}s")
+            break
+        except Exception as e:
+            errors.append(str(e))
+        finally:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+        elapsed = (time.perf_counter() - call_start) * 1000
+        if i == 0:
+            result['cold_ms'] = round(elapsed, 3)
+        else:
+            latencies.append(elapsed)
+        if time.perf_counter() - started > args.max_seconds:
+            break
+
+    if errors:
+        result['errors'] = len(errors)
+        result['first_error'] = errors[0]
+        if len(errors) == i + 1:
+            result['status'] = 'error'
+    if latencies:
+        samples = np.array(latencies)
+        p50, p90, p95, p99 = np.percentile(samples, [50, 90, 95, 99])
+        result.update({
+            'iterations': len(samples),
+            'mean_ms': round(float(samples.mean()), 3),
+            'p50_ms': round(float(p50), 3),
+            'p90_ms': round(float(p90), 3),
+            'p95_ms': round(float(p95), 3),
+            'p99_ms': round(float(p99), 3),
+            'max_ms': round(float(samples.max()), 3),
+            'throughput_rps': round(len(samples) / (samples.sum() / 1000), 2),
+        })
+    result['peak_rss_mb'] = _peak_rss_mb()
+    result['rss_growth_mb'] = round(result['peak_rss_mb'] - rss_before, 1)
+    return result
+
+
+def run_worker(settings_path):
+    """Benchmark process for one scale: import the app inside the workspace and run every case"""
+    with open(settings_path) as f:
+        settings = json.load(f)
+    args = argparse.Namespace(**settings['args'])
+    os.chdir(settings['workspace'])
+    signal.signal(signal.SIGALRM, _on_alarm)
+
+    start = time.time()
+    import app as app_module
+    report = {'import_seconds': round(time.time() - start, 3), 'import_rss_mb': _peak_rss_mb(), 'cases': {}}
+
+    for name, description, call in build_cases(app_module, settings['manifest'], args):
+        if args.case and not any(pattern in name for pattern in args.case):
+            continue
+        result = run_case(call, args)
+        result['description'] = description
+        report['cases'][name] = result
+        print(f"   {_case_line(name, result)}", flush=True)
+
+    report['peak_rss_mb'] = _peak_rss_mb()
+    with open(settings['output'], 'w') as f:
+        json.dump(report, f, indent=2)
+
+
+# ----------------------------------------------------------------------
+# Reporting
+# ----------------------------------------------------------------------
+
+def _case_line(name, result):
+    if result['status'] == 'skipped':
+        return f"⏭️  {name:<24} skipped ({result['reason']})"
+    if 'p50_ms' not in result:
+        return f"❌ {name:<24} {result['status']}: {result.get('error') or result.get('first_error', '')}"
+    icon = '✅' if result['status'] == 'ok' and not result.get('errors') else '⚠️ '
+    return (f"{icon} {name:<24} cold {result['cold_ms']:>9.1f}ms  p50 {result['p50_ms']:>9.2f}ms  "
+            f"p95 {result['p95_ms']:>9.2f}ms  p99 {result['p99_ms']:>9.2f}ms  "
+            f"{result['throughput_rps']:>8.1f} req/s  rss {result['peak_rss_mb']:.0f}MB"
+            + (f"  ({result['errors']} errors)" if result.get('errors') else ''))
+
+
+def compare(results, baseline, threshold, min_delta_ms):
+    """Regressions of results against baseline: slower p50/p95, higher peak RSS, or a case that stopped passing"""
+    regressions = []
+    for scale, run in results['scales'].items():
+        base_run = baseline.get('scales', {}).get(scale)
+        if not base_run:
+            continue
+        if base_run.get('peak_rss_mb') and run.get('peak_rss_mb', 0) > base_run['peak_rss_mb'] * (1 + threshold / 100):
+            regressions.append(f"{scale} peak RSS {base_run['peak_rss_mb']:.0f}MB -> {run['peak_rss_mb']:.0f}MB")
+        for name, case in run['cases'].items():
+            base = base_run.get('cases', {}).get(name)
+            if not base or base['status'] != 'ok':
+                continue
+            if case['status'] != 'ok':
+                regressions.append(f"{scale} {name}: {case['status']} (baseline ok)")
+                continue
+            for metric in ('p50_ms', 'p95_ms'):
+                before, after = base.get(metric), case.get(metric)
+                if before is None or after is None:
+                    continue
+                if after > before * (1 + threshold / 100) and after - before > min_delta_ms:
+                    regressions.append(f"{scale} {name} {metric[:-3]}: {before:.2f}ms -> {after:.2f}ms "
+                                       f"(+{(after / before - 1) * 100:.0f}%)")
+    return regressions
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the hot HTTP and module paths against synthetic data')
+    parser.add_argument('--scale', action='append', help=f"Population size: {', '.join(SCALES)} or a number (repeatable, default 1k and 100k)")
+    parser.add_argument('--case', action='append', help='Only run cases whose name contains this (repeatable)')
+    parser.add_argument('--iterations', type=int, default=20, help='Warm calls per case (after one cold call)')
+    parser.add_argument('--max-seconds', type=float, default=60, help='Stop a case early once it has run this long')
+    parser.add_argument('--timeout', type=float, default=120, help='Abort a case when one call takes longer than this')
+    parser.add_argument('--readings', type=int, default=20, help='Telemetry readings per connected vehicle')
+    parser.add_argument('--telemetry-vehicles', type=int, default=2000, help='Vehicles loaded into the telemetry store (0 = all)')
+    parser.add_argument('--sample-ids', type=int, default=50, help='Individuals/vehicles the per-id cases rotate through')
+    parser.add_argument('--email-recipients', type=int, default=200, help='Segment size for the email generation case')
+    parser.add_argument('--ingest-batch', type=int, default=100, help='Readings per telemetry ingest request')
+    parser.add_argument('--salesforce', choices=['none', 'mock'], default='none', help='Salesforce for the cases that need it')
+    parser.add_argument('--sf-latency-ms', type=float, default=0, help='Latency the mock adds to every Salesforce call')
+    parser.add_argument('--sf-error-rate', type=float, default=0, help='Share of mock Salesforce calls that fail (0-1)')
+    parser.add_argument('--warmup', choices=['off', 'blocking', 'background'], default='off',
+                        help="WARMUP of the benchmarked app (off keeps each case's cold call cold)")
+    parser.add_argument('--baseline', default=BASELINE_PATH, help='Baseline results to compare with')
+    parser.add_argument('--threshold', type=float, default=20, help='Regression threshold in percent')
+    parser.add_argument('--min-delta-ms', type=float, default=1.0, help='Ignore latency changes smaller than this')
+    parser.add_argument('--save-baseline', action='store_true', help='Save this run as the baseline')
+    parser.add_argument('--worker', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args.worker)
+        return
+
+    scales = args.scale or DEFAULT_SCALES
+    sizes = {scale: _scale_size(scale) for scale in scales}
+    forwarded = {key: value for key, value in vars(args).items() if key not in ('worker', 'scale')}
+    results = {
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'commit': _git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'settings': forwarded,
+        'scales': {},
+    }
+
+    print("="*80)
+    print("BENCHMARKS")
+    print("="*80)
+    for scale in scales:
+        print(f"\n📊 {scale}: {sizes[scale]:,} individuals")
+        workspace, manifest = prepare_workspace(scale, sizes[scale], args)
+        reset_workspace(workspace)
+
+        fd, output = tempfile.mkstemp(suffix='.json')
+        os.close(fd)
+        with tempfile.NamedTemporaryFile('w', suffix='.json', delete=False) as f:
+            json.dump({'workspace': workspace, 'manifest': manifest, 'output': output, 'args': forwarded}, f)
+        env, mock = dict(os.environ, WARMUP=args.warmup), None
+        if args.salesforce == 'mock':
+            mock, env['SF_LOGIN_URL'] = start_mock_salesforce(workspace, args)
+            print(f"   Mock Salesforce at {env['SF_LOGIN_URL']}")
+        try:
+            subprocess.run([sys.executable, os.path.abspath(__file__), '--worker', f.name], check=True, env=env)
+            with open(output) as report:
+                run = json.load(report)
+        except subprocess.CalledProcessError as e:
+            print(f"❌ {scale}: benchmark process failed (exit {e.returncode})")
+            continue
+        finally:
+            if mock:
+                mock.terminate()
+                mock.wait()
+            os.remove(f.name)
+            os.remove(output)
+        run.update(individuals=sizes[scale], rows=manifest['rows'], telemetry_readings=manifest['telemetry_readings'])
+        results['scales'][scale] = run
+        print(f"   Import {run['import_seconds']:.2f}s, peak RSS {run['peak_rss_mb']:.0f}MB")
+
+    results_dir = os.path.join(BENCHMARK_ROOT, 'results')
+    os.makedirs(results_dir, exist_ok=True)
+    results_path = os.path.join(results_dir, f"{datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+    with open(results_path, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"\n✅ Results saved to {results_path}")
+
+    regressions = []
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold, args.min_delta_ms)
+        print(f"\n🔍 Compared with {args.baseline} ({baseline.get('created_at')}, commit {baseline.get('commit')})")
+        for regression in regressions:
+            print(f"   ❌ {regression}")
+        if not regressions:
+            print(f"   ✅ No regressions above {args.threshold:.0f}%")
+    if args.save_baseline:
+        shutil.copyfile(results_path, args.baseline)
+        print(f"✅ Baseline saved to {args.baseline}")
+
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+// Telemetry Charts JavaScript
+// Line charts drawn as inline SVG from the chart-sized series of /api/vehicles/<id>/series,
+// and the reading-density heatmap of /api/telemetry/spatial/heatmap
+
+const SVG_NS = 'http://www.w3.org/2000/svg';
+
+const SERIES_LABELS = {
+    speed: 'Speed (km/h)',
+    rpm: 'RPM',
+    fuel_level: 'Fuel %',
+    engine_temp: 'Engine Temp °C',
+    battery_level: 'Battery %',
+    oil_pressure: 'Oil Pressure PSI'
+};
+
+// One point per pixel column is all a chart can show
+function seriesPointsFor(element, fallback = 300) {
+    const width = Math.floor(element.clientWidth || 0);
+    return Math.max(50, Math.min(width || fallback, 2000));
+}
+
+async function loadVehicleSeries(vehicleId, metrics, points, range = {}) {
+    const params = new URLSearchParams({ metrics: metrics.join(','), points: points });
+    if (range.start) params.set('start', range.start);
+    if (range.end) params.set('end', range.end);
+    const response = await fetch(`/api/vehicles/${encodeURIComponent(vehicleId)}/series?${params}`);
+    const data = await response.json();
+    if (!data.success) {
+        throw new Error(data.error || 'Could not load series');
+    }
+    return data;
+}
+
+function svgElement(name, attributes) {
+    const element = document.createElementNS(SVG_NS, name);
+    Object.entries(attributes).forEach(([key, value]) => element.setAttribute(key, value));
+    return element;
+}
+
+// Draw one metric's points ({t, v, min?, max?}) into an <svg>; rollup buckets also get a min/max band
+function renderSeriesChart(svg, points, options = {}) {
+    const width = svg.clientWidth || 600;
+    const height = options.height || 160;
+    const color = options.color || '#ff5722';
+    const pad = { left: 44, right: 8, top: 8, bottom: 20 };
+    svg.innerHTML = '';
+    svg.setAttribute('viewBox', `0 0 ${width} ${height}`);
+    svg.setAttribute('height', height);
+
+    if (!points || points.length === 0) {
+        const empty = svgElement('text', { x: width / 2, y: height / 2, 'text-anchor': 'middle', fill: '#999', 'font-size': 12 });
+        empty.textContent = 'No readings';
+        svg.appendChild(empty);
+        return;
+    }
+
+    const times = points.map(p => Date.parse(p.t.replace(' ', 'T') + 'Z'));
+    const lows = points.map(p => p.min !== undefined ? p.min : p.v);
+    const highs = points.map(p => p.max !== undefined ? p.max : p.v);
+    const t0 = Math.min(...times), t1 = Math.max(...times);
+    let y0 = Math.min(...lows), y1 = Math.max(...highs);
+    if (y0 === y1) { y0 -= 1; y1 += 1; }
+
+    const x = t => pad.left + (t1 === t0 ? 0.5 : (t - t0) / (t1 - t0)) * (width - pad.left - pad.right);
+    const y = v => height - pad.bottom - (v - y0) / (y1 - y0) * (height - pad.top - pad.bottom);
+
+    if (points.some(p => p.min !== undefined)) {
+        const upper = points.map((p, i) => `${x(times[i])},${y(highs[i])}`);
+        const lower = points.map((p, i) => `${x(times[i])},${y(lows[i])}`).reverse();
+        svg.appendChild(svgElement('polygon', { points: upper.concat(lower).join(' '), fill: color, 'fill-opacity': 0.15 }));
+    }
+    svg.appendChild(svgElement('polyline', {
+        points: points.map((p, i) => `${x(times[i])},${y(p.v)}`).join(' '),
+        fill: 'none', stroke: color, 'stroke-width': 1.5
+    }));
+
+    [[y1, pad.top + 10], [y0, height - pad.bottom]].forEach(([value, position]) => {
+        const label = svgElement('text', { x: pad.left - 6, y: position, 'text-anchor': 'end', fill: '#666', 'font-size': 11 });
+        label.textContent = Math.round(value * 10) / 10;
+        svg.appendChild(label);
+    });
+    [[t0, pad.left, 'start'], [t1, width - pad.right, 'end']].forEach(([time, position, anchor]) => {
+        const label = svgElement('text', { x: position, y: height - 4, 'text-anchor': anchor, fill: '#666', 'font-size': 11 });
+        label.textContent = new Date(time).toISOString().slice(0, 16).replace('T', ' ');
+        svg.appendChild(label);
+    });
+}
+
+// Bounding box [south, west, north, east] of the grid cell holding a point
+function heatmapCellBounds(lat, lon, cellSize) {
+    const south = Math.floor((lat + 90) / cellSize) * cellSize - 90;
+    const west = Math.floor((lon + 180) / cellSize) * cellSize - 180;
+    return [south, west, south + cellSize, west + cellSize].map(v => Math.round(v * 1e6) / 1e6);
+}
+
+// Draw heatmap cells ({lat, lon, count, avg_speed, alerts}) as dots shaded by density; onSelect gets the clicked cell
+function renderHeatmap(svg, cells, options = {}) {
+    const width = svg.clientWidth || 600;
+    const height = options.height || 320;
+    const pad = 12;
+    svg.innerHTML = '';
+    svg.setAttribute('viewBox', `0 0 ${width} ${height}`);
+    svg.setAttribute('height', height);
+
+    if (!cells || cells.length === 0) {
+        const empty = svgElement('text', { x: width / 2, y: height / 2, 'text-anchor': 'middle', fill: '#999', 'font-size': 12 });
+        empty.textContent = 'No readings';
+        svg.appendChild(empty);
+        return;
+    }
+
+    const lats = cells.map(c => c.lat), lons = cells.map(c => c.lon);
+    const south = Math.min(...lats), north = Math.max(...lats);
+    const west = Math.min(...lons), east = Math.max(...lons);
+    const scale = Math.min((width - 2 * pad) / Math.max(east - west, 1e-6), (height - 2 * pad) / Math.max(north - south, 1e-6));
+    const x = lon => pad + (lon - west) * scale;
+    const y = lat => height - pad - (lat - south) * scale;
+    const maxCount = Math.max(...cells.map(c => c.count));
+
+    [...cells].sort((a, b) => a.count - b.count).forEach(cell => {
+        const intensity = Math.sqrt(cell.count / maxCount);
+        const dot = svgElement('circle', {
+            cx: x(cell.lon), cy: y(cell.lat), r: 4 + 10 * intensity,
+            fill: cell.alerts > 0 ? '#d32f2f' : '#ff5722', 'fill-opacity': 0.25 + 0.6 * intensity,
+            stroke: 'white', 'stroke-width': 1
+        });
+        dot.style.cursor = 'pointer';
+        const title = svgElement('title', {});
+        title.textContent = `${cell.count} readings · ${cell.avg_speed} km/h avg · ${cell.alerts} alerts`;
+        dot.appendChild(title);
+        if (options.onSelect) {
+            dot.addEventListener('click', () => options.onSelect(cell));
+        }
+        svg.appendChild(dot);
+    });
+}